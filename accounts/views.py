@@ -14,7 +14,7 @@ from django.utils import timezone
 from django.db import transaction
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
-from cart.models import Cart, CartItem
+from cart.operations import ADD, CartOperation, apply_cart_operations
 from .models import User, OTP, PasswordResetToken, SupplierRequest
 from .serializers import (
     UserRegisterSerializer, UserLoginSerializer, UserSerializer, 
@@ -236,16 +236,20 @@ class LoginView(APIView):
 
 # Function to sync guest cart to user's cart
 def sync_guest_cart_to_user(request, user):
+    """
+    Merge the session cart into the user's cart as one batch of 'add'
+    operations (see cart.operations); lines that are no longer available
+    are dropped
+    """
     session_cart = request.session.get('guest_cart')
     if session_cart:
-        cart, _ = Cart.objects.get_or_create(user=user)
-        for item in session_cart:
-            product_id = item['product_id']
-            quantity = item['quantity']
-            obj, created = CartItem.objects.get_or_create(cart=cart, product_id=product_id)
-            if not created:
-                obj.quantity += quantity
-                obj.save()
+        operations = [
+            CartOperation(ADD, int(item['product_id']), item.get('variant_id') or None, int(item.get('quantity', 1)))
+            for item in session_cart
+            if item.get('product_id') and int(item.get('quantity', 1)) > 0
+        ]
+        if operations:
+            apply_cart_operations(user.id, operations, skip_invalid=True)
         del request.session['guest_cart']
         request.session.modified = True
 
@@ -242,6 +242,24 @@ class ExportDataView(APIView):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @property
+    def bulk_import_models(self):
+        from products.models import Product, ProductVariant
+        return (Product, ProductVariant)
+
+    def _import_catalog(self, model, import_file, import_format, update_existing):
+        """Products and variants go through the chunked bulk importer"""
+        from products.bulk_import import CatalogImporter, iter_records
+        from products.models import Product
+
+        with CatalogImporter(self.request.user, update_existing=update_existing) as importer:
+            records = iter_records(import_file, import_format)
+            if model is Product:
+                importer.import_products(records)
+            else:
+                importer.import_variants(records)
+        return importer.report.as_dict()
+
     def _get_model_class(self, model_name):
         """Get model class from string name"""
         from django.apps import apps
@@ -334,7 +352,9 @@ class ImportDataView(APIView):
             )
 
         try:
-            if import_format == 'json':
+            if model in self.bulk_import_models:
+                result = self._import_catalog(model, import_file, import_format, update_existing)
+            elif import_format == 'json':
                 result = self._import_json(model, import_file, update_existing)
             elif import_format == 'csv':
                 result = self._import_csv(model, import_file, update_existing)
@@ -344,19 +364,41 @@ class ImportDataView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            return Response({
+            response = {
                 'status': 'success',
                 'created': result['created'],
                 'updated': result['updated'],
                 'skipped': result['skipped'],
                 'errors': result['errors']
-            })
+            }
+            for key in ('rows', 'elapsed', 'rows_per_second'):
+                if key in result:
+                    response[key] = result[key]
+            return Response(response)
         except Exception as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @property
+    def bulk_import_models(self):
+        from products.models import Product, ProductVariant
+        return (Product, ProductVariant)
+
+    def _import_catalog(self, model, import_file, import_format, update_existing):
+        """Products and variants go through the chunked bulk importer"""
+        from products.bulk_import import CatalogImporter, iter_records
+        from products.models import Product
+
+        with CatalogImporter(self.request.user, update_existing=update_existing) as importer:
+            records = iter_records(import_file, import_format)
+            if model is Product:
+                importer.import_products(records)
+            else:
+                importer.import_variants(records)
+        return importer.report.as_dict()
+
     def _get_model_class(self, model_name):
         """Get model class from string name"""
         from django.apps import apps
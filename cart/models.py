@@ -1,11 +1,32 @@
+from decimal import Decimal
+from typing import NamedTuple
+
 from django.db import models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.core.exceptions import ValidationError
 
-from products.models import Product, ProductVariant
+from products.models import Product, ProductAttributeValue, ProductVariant
+from products.pricing import resolve_price, unit_price_expression
 
 User = settings.AUTH_USER_MODEL
 
+ZERO = Decimal('0.00')
+
+
+class CartTotals(NamedTuple):
+    total_price: Decimal
+    total_items: int
+    items_count: int
+    has_unavailable_items: bool
+
+
+class CartQuerySet(models.QuerySet):
+    def for_display(self):
+        """Carts with their items, products and variants in one prefetch"""
+        return self.prefetch_related(models.Prefetch('items', queryset=CartItem.objects.for_display()))
+
 
 class Cart(models.Model):
     user = models.ForeignKey(
@@ -16,6 +37,8 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     class Meta:
         ordering = ['-updated_at']
         verbose_name = "Shopping Cart"
@@ -24,19 +47,54 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart {self.id} - {self.user.email}"
 
+    def get_totals(self) -> CartTotals:
+        """Price, quantity and availability totals of the cart in one aggregate query"""
+        totals = self.items.with_prices().aggregate(
+            total_price=Sum('line_total', default=ZERO),
+            total_items=Sum('quantity', default=0),
+            items_count=Count('id'),
+            unavailable=Count('id', filter=Q(quantity__gt=F('available_stock'))),
+        )
+        return CartTotals(
+            totals['total_price'], totals['total_items'], totals['items_count'], totals['unavailable'] > 0,
+        )
+
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.get_totals().total_price
 
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.get_totals().total_items
 
     def clear(self):
         """Empty the cart"""
         self.items.all().delete()
 
 
+class CartItemQuerySet(models.QuerySet):
+    def with_prices(self):
+        """
+        Annotate ``unit_price_amount``, ``line_total`` and ``available_stock``
+        (same rules as CartItem.unit_price / total_price, in SQL); prices are
+        the ones checkout charges without a delivery location (orders.pricing)
+        """
+        unit_price = unit_price_expression('variant', 'product')
+        return self.annotate(
+            unit_price_amount=unit_price,
+            line_total=ExpressionWrapper(
+                unit_price * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)
+            ),
+            available_stock=Coalesce(F('variant__stock'), F('product__stock')),
+        )
+
+    def for_display(self):
+        """Items with their product and variant (one query) plus variant attributes"""
+        return self.with_prices().select_related('product', 'variant', 'variant__product').prefetch_related(
+            models.Prefetch('variant__attributes', queryset=ProductAttributeValue.objects.select_related('attribute'))
+        )
+
+
 class CartItem(models.Model):
     cart = models.ForeignKey(
         Cart,
@@ -57,6 +115,8 @@ class CartItem(models.Model):
     )
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = ('cart', 'product', 'variant')
         ordering = ['-id']
@@ -69,10 +129,17 @@ class CartItem(models.Model):
         return f"{self.quantity} x {self.product.name}"
 
     @property
-    def total_price(self):
-        if self.variant:
-            return (float(self.product.price) + float(self.variant.additional_price)) * self.quantity
-        return float(self.product.price) * self.quantity
+    def unit_price(self) -> Decimal:
+        if hasattr(self, 'unit_price_amount'):
+            return self.unit_price_amount
+        resolved = resolve_price(self.variant_id) if self.variant_id else None
+        return resolved.price if resolved is not None else (self.product.price or ZERO)
+
+    @property
+    def total_price(self) -> Decimal:
+        if hasattr(self, 'line_total'):
+            return self.line_total
+        return self.unit_price * self.quantity
 
     def clean(self):
         if self.variant and self.variant.product != self.product:
@@ -0,0 +1,130 @@
+"""
+Bulk cart operations.
+
+``apply_cart_operations`` applies a list of add/set/remove operations to a
+user's cart as one unit: the resulting lines are computed from the cart
+store, every product and variant involved is checked with a single
+catalog query, and the cart is only changed (and persisted straight away)
+when all operations are valid. The bulk endpoint and the login-time merge
+of guest carts both go through it; the merge skips invalid lines instead
+of rejecting the batch.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.db.models import FilteredRelation, Q
+
+from products.models import Product
+from . import store
+
+ADD, SET, REMOVE = 'add', 'set', 'remove'
+OPERATIONS = (ADD, SET, REMOVE)
+
+
+class CartOperation(NamedTuple):
+    op: str
+    product_id: int
+    variant_id: Optional[int] = None
+    quantity: int = 1
+
+
+class CatalogRow(NamedTuple):
+    status: str
+    stock: int
+
+
+class OperationsResult(NamedTuple):
+    lines: Dict[str, int]
+    # One list of messages per operation, empty when the operation is valid
+    errors: List[List[str]]
+
+    @property
+    def is_valid(self) -> bool:
+        return not any(self.errors)
+
+
+def fetch_catalog_rows(keys) -> Tuple[Dict[int, CatalogRow], Dict[Tuple[int, int], CatalogRow]]:
+    """
+    Status and stock of the products and (product, variant) pairs in
+    ``keys``, in one query: products LEFT JOIN the requested variants
+    """
+    product_ids = {product_id for product_id, _ in keys}
+    variant_ids = {variant_id for _, variant_id in keys if variant_id}
+    queryset = Product.objects.filter(id__in=product_ids)
+    columns = ['id', 'status', 'stock']
+    if variant_ids:
+        queryset = queryset.annotate(
+            requested_variant=FilteredRelation('variants', condition=Q(variants__id__in=variant_ids))
+        )
+        columns += ['requested_variant__id', 'requested_variant__status', 'requested_variant__stock']
+
+    products, variants = {}, {}
+    for row in queryset.values_list(*columns):
+        products[row[0]] = CatalogRow(row[1], row[2])
+        if variant_ids and row[3] is not None:
+            variants[(row[0], row[3])] = CatalogRow(row[4], row[5])
+    return products, variants
+
+
+def _line_errors(product_id, variant_id, quantity, products, variants) -> List[str]:
+    """Same rules as AddToCartSerializer, applied to the resulting line quantity"""
+    product = products.get(product_id)
+    if product is None:
+        return ["Product not found"]
+    if product.status != 'published':
+        return ["This product is not available"]
+    if variant_id:
+        variant = variants.get((product_id, variant_id))
+        if variant is None:
+            return ["Variant not found or does not belong to the selected product"]
+        if variant.status != 'approved':
+            return ["This variant is not available"]
+        if quantity > variant.stock:
+            return [f"Only {variant.stock} items available for this variant"]
+    elif quantity > product.stock:
+        return [f"Only {product.stock} items available"]
+    return []
+
+
+def resolve_operations(lines: Dict[str, int], operations: List[CartOperation]) -> OperationsResult:
+    """The lines after ``operations`` and the errors of each operation; ``lines`` is not changed"""
+    lines = dict(lines)
+    keys = [(operation.product_id, operation.variant_id) for operation in operations]
+    products, variants = fetch_catalog_rows(keys)
+
+    errors = []
+    for operation, (product_id, variant_id) in zip(operations, keys):
+        key = store.line_key(product_id, variant_id)
+        if operation.op == REMOVE:
+            lines.pop(key, None)
+            errors.append([])
+            continue
+        quantity = lines.get(key, 0) + operation.quantity if operation.op == ADD else operation.quantity
+        if not quantity:
+            lines.pop(key, None)
+            errors.append([])
+            continue
+        line_errors = _line_errors(product_id, variant_id, quantity, products, variants)
+        if not line_errors:
+            lines[key] = quantity
+        errors.append(line_errors)
+    return OperationsResult(lines, errors)
+
+
+def apply_cart_operations(user_id: int, operations: List[CartOperation], skip_invalid: bool = False) -> OperationsResult:
+    """
+    Apply ``operations`` to the user's cart and persist it. With invalid
+    operations nothing is changed unless ``skip_invalid``, in which case the
+    valid ones are applied
+    """
+    backend = store.get_cart_backend()
+    with backend.lock(user_id):
+        entry = store.load_entry(backend, user_id)
+        result = resolve_operations(entry['lines'], operations)
+        if not (result.is_valid or skip_invalid):
+            return result
+        current = entry['lines']
+        changes = {key: result.lines.get(key) for key in current.keys() | result.lines.keys()}
+        store.apply_changes(backend, user_id, entry, changes)
+    store.persist_cart(user_id)
+    return result
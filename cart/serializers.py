@@ -1,16 +1,46 @@
 from rest_framework import serializers
 from .models import Cart, CartItem
-from products.serializers import BaseProductSerializer, ProductVariantSerializer
+from .operations import OPERATIONS, SET
+from products.serializers import ProductAttributeValueSerializer
 from products.models import Product, ProductVariant
 from django.core.exceptions import ValidationError
 
 
+class CartProductSerializer(serializers.ModelSerializer):
+    """Product summary shown on a cart line (no variants, images or detail objects)"""
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'slug', 'sku', 'image', 'price', 'mrp', 'stock',
+            'product_type', 'status'
+        ]
+        read_only_fields = fields
+
+
+class CartVariantSerializer(serializers.ModelSerializer):
+    """Variant summary shown on a cart line; attributes come prefetched"""
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    attributes = ProductAttributeValueSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ProductVariant
+        fields = [
+            'id', 'sku', 'price', 'additional_price', 'total_price', 'mrp',
+            'stock', 'image', 'is_active', 'attributes'
+        ]
+        read_only_fields = fields
+
+
 class CartItemSerializer(serializers.ModelSerializer):
-    """Enhanced serializer for cart items with better variant information"""
-    product = BaseProductSerializer(read_only=True)
-    variant = ProductVariantSerializer(read_only=True)
-    total_price = serializers.SerializerMethodField()
-    unit_price = serializers.SerializerMethodField()
+    """
+    Cart line; reads the prices annotated by ``CartItem.objects.for_display()``
+    when present
+    """
+    product = CartProductSerializer(read_only=True)
+    variant = CartVariantSerializer(read_only=True)
+    total_price = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    unit_price = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
     available_stock = serializers.SerializerMethodField()
     variant_display = serializers.SerializerMethodField()
     is_available = serializers.SerializerMethodField()
@@ -23,18 +53,10 @@ class CartItemSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'unit_price', 'total_price', 'available_stock', 'variant_display', 'is_available']
 
-    def get_unit_price(self, obj):
-        """Get the unit price including variant additional price"""
-        base_price = float(obj.product.price)
-        if obj.variant:
-            base_price += float(obj.variant.additional_price)
-        return base_price
-
-    def get_total_price(self, obj):
-        return obj.total_price
-
     def get_available_stock(self, obj):
         """Get available stock for this item"""
+        if hasattr(obj, 'available_stock'):
+            return obj.available_stock
         if obj.variant:
             return obj.variant.stock
         return obj.product.stock
@@ -58,64 +80,61 @@ class AddToCartSerializer(serializers.Serializer):
     variant_id = serializers.IntegerField(required=False, allow_null=True)
     quantity = serializers.IntegerField(default=1, min_value=1)
 
-    def validate_product_id(self, value):
-        """Validate that product exists and is available"""
-        try:
-            product = Product.objects.get(id=value)
-            if product.status != 'published':
-                raise serializers.ValidationError("This product is not available")
-            return value
-        except Product.DoesNotExist:
-            raise serializers.ValidationError("Product not found")
-
-    def validate_variant_id(self, value):
-        """Validate that variant exists if provided"""
-        if value is not None:
-            try:
-                variant = ProductVariant.objects.get(id=value)
-                if variant.status != 'approved':
-                    raise serializers.ValidationError("This variant is not available")
-                return value
-            except ProductVariant.DoesNotExist:
-                raise serializers.ValidationError("Variant not found")
-        return value
-
     def validate(self, data):
-        """Cross-field validation"""
+        """
+        Fetch the variant with its product (or the product alone) in one
+        query and check availability; the instances are passed on as
+        ``validated_data['product']`` and ``['variant']``
+        """
         product_id = data['product_id']
         variant_id = data.get('variant_id')
         quantity = data['quantity']
 
-        try:
-            product = Product.objects.get(id=product_id)
-            
-            # If variant is provided, validate it belongs to the product
-            if variant_id:
-                try:
-                    variant = ProductVariant.objects.get(id=variant_id)
-                    if variant.product_id != product_id:
-                        raise serializers.ValidationError("Variant does not belong to the selected product")
-                    
-                    # Check stock availability for variant
-                    if quantity > variant.stock:
-                        raise serializers.ValidationError(
-                            f"Only {variant.stock} items available for this variant"
-                        )
-                except ProductVariant.DoesNotExist:
-                    raise serializers.ValidationError("Invalid variant")
-            else:
-                # Check stock availability for product
-                if quantity > product.stock:
-                    raise serializers.ValidationError(
-                        f"Only {product.stock} items available"
-                    )
-
-        except Product.DoesNotExist:
-            raise serializers.ValidationError("Invalid product")
+        if variant_id:
+            variant = ProductVariant.objects.select_related('product').filter(id=variant_id).first()
+            if variant is None:
+                raise serializers.ValidationError({'variant_id': "Variant not found"})
+            if variant.product_id != product_id:
+                raise serializers.ValidationError("Variant does not belong to the selected product")
+            if variant.status != 'approved':
+                raise serializers.ValidationError({'variant_id': "This variant is not available"})
+            product = variant.product
+            available_stock, label = variant.stock, " for this variant"
+        else:
+            variant = None
+            product = Product.objects.filter(id=product_id).first()
+            if product is None:
+                raise serializers.ValidationError({'product_id': "Product not found"})
+            available_stock, label = product.stock, ""
+
+        if product.status != 'published':
+            raise serializers.ValidationError({'product_id': "This product is not available"})
+        if quantity > available_stock:
+            raise serializers.ValidationError(f"Only {available_stock} items available{label}")
+
+        data['product'] = product
+        data['variant'] = variant
+        return data
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """One line of a bulk cart request; catalog checks happen in cart.operations"""
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    product_id = serializers.IntegerField()
+    variant_id = serializers.IntegerField(required=False, allow_null=True)
+    quantity = serializers.IntegerField(default=1, min_value=0)
 
+    def validate(self, data):
+        if data['op'] != SET and data['quantity'] < 1:
+            raise serializers.ValidationError({'quantity': "Must be at least 1 (use 'set' with 0 to remove a line)"})
         return data
 
 
+class BulkCartSerializer(serializers.Serializer):
+    """Operations applied in order, all or nothing"""
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     """Enhanced serializer for updating cart items with stock validation"""
     quantity = serializers.IntegerField(min_value=1)
@@ -138,12 +157,18 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
 
 
 class CartSerializer(serializers.ModelSerializer):
-    """Enhanced cart serializer with better information and summary"""
+    """
+    Cart with its lines and totals. Items should come from
+    ``Cart.objects.for_display()``; totals are one aggregate query
+    (``Cart.get_totals()``) per representation.
+    """
     items = CartItemSerializer(many=True, read_only=True)
-    total_price = serializers.SerializerMethodField()
-    total_items = serializers.SerializerMethodField()
-    items_count = serializers.SerializerMethodField()
-    has_unavailable_items = serializers.SerializerMethodField()
+    total_price = serializers.DecimalField(
+        source='totals.total_price', max_digits=14, decimal_places=2, read_only=True
+    )
+    total_items = serializers.IntegerField(source='totals.total_items', read_only=True)
+    items_count = serializers.IntegerField(source='totals.items_count', read_only=True)
+    has_unavailable_items = serializers.BooleanField(source='totals.has_unavailable_items', read_only=True)
 
     class Meta:
         model = Cart
@@ -156,20 +181,7 @@ class CartSerializer(serializers.ModelSerializer):
             'has_unavailable_items', 'created_at', 'updated_at'
         ]
 
-    def get_total_price(self, obj):
-        return obj.total_price
-
-    def get_total_items(self, obj):
-        return obj.total_items
-
-    def get_items_count(self, obj):
-        """Get number of unique items in cart"""
-        return obj.items.count()
-
-    def get_has_unavailable_items(self, obj):
-        """Check if cart has any unavailable items"""
-        for item in obj.items.all():
-            available_stock = item.variant.stock if item.variant else item.product.stock
-            if available_stock < item.quantity:
-                return True
-        return False
+    def to_representation(self, instance):
+        # Read by the ``totals.*`` fields above
+        instance.totals = instance.get_totals()
+        return super().to_representation(instance)
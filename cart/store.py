@@ -0,0 +1,430 @@
+"""
+Hot cart store with write-behind persistence.
+
+The primary copy of a cart is a compact hash in a key-value store
+(CacheCartBackend, which needs a shared cache such as Redis; LocalCartBackend
+in tests) keyed by user:
+
+    {'lines': {'<product_id>:<variant_id or 0>': quantity}, 'dirty': bool}
+
+Cart operations read and write that hash only. Changed carts are written
+back to the Cart/CartItem tables by ``persist_cart``, which diffs the hash
+against the stored rows and applies the difference with one upsert
+(``bulk_create(update_conflicts=True)``) and one delete:
+
+- with ``settings.CART_WRITE_BEHIND_ASYNC`` a background thread persists
+  dirty carts in batches, ``CART_WRITE_BEHIND_DELAY`` seconds after their
+  first change;
+- otherwise every operation persists its cart straight away.
+
+Anything that reads the tables (the cart endpoint, checkout, payments,
+orders) calls ``persist_cart`` first, which is a no-op for clean carts. A
+missing hash is loaded from the tables. Writes to the tables made outside
+this module evict the user's hash, so call ``persist_cart`` before
+changing the tables directly.
+
+The default DatabaseCartBackend keeps no hash: every read loads the tables
+and every change is written back straight away.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'cart.store.DatabaseCartBackend'
+DEFAULT_WRITE_BEHIND_DELAY = 2.0  # seconds
+
+
+def line_key(product_id: int, variant_id: Optional[int] = None) -> str:
+    return f'{product_id}:{variant_id or 0}'
+
+
+def parse_line_key(key: str) -> Tuple[int, Optional[int]]:
+    product_id, variant_id = key.split(':')
+    return int(product_id), int(variant_id) or None
+
+
+# ----- backends -----
+
+class BaseCartBackend:
+    """Key-value store holding one cart hash per user"""
+
+    def load(self, user_id: int) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def save(self, user_id: int, entry: Dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, user_id: int) -> None:
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self, user_id: int):
+        """Serialize read-modify-write cycles on one user's cart"""
+        raise NotImplementedError
+        yield
+
+
+class DatabaseCartBackend(BaseCartBackend):
+    """No hash: carts are read from and written to the tables directly"""
+
+    def load(self, user_id: int) -> Optional[Dict]:
+        return None
+
+    def save(self, user_id: int, entry: Dict) -> None:
+        if entry['dirty']:
+            write_lines(user_id, entry['lines'])
+            entry['dirty'] = False
+
+    def delete(self, user_id: int) -> None:
+        pass
+
+    @contextmanager
+    def lock(self, user_id: int):
+        # The cart row lock serializes writers across processes
+        with transaction.atomic():
+            list(Cart.objects.select_for_update().filter(user_id=user_id).values_list('pk', flat=True))
+            yield
+
+
+class CacheCartBackend(BaseCartBackend):
+    """
+    Carts in the Django cache, locked with a short-lived ``cache.add`` key.
+    Refuses process-local caches: each worker would keep its own copy of a
+    cart and write it back over the others'.
+    """
+    KEY_PREFIX = 'cart'
+    TIMEOUT = 60 * 60 * 24 * 30  # idle carts are reloaded from the tables
+    LOCK_TIMEOUT = 10
+    LOCK_WAIT = 5.0
+    LOCK_POLL_INTERVAL = 0.01
+
+    def __init__(self):
+        if isinstance(caches['default'], (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured(
+                'CacheCartBackend needs a shared cache (e.g. Redis) as the default cache; '
+                'use cart.store.DatabaseCartBackend otherwise'
+            )
+
+    def _key(self, user_id: int) -> str:
+        return f'{self.KEY_PREFIX}:{user_id}'
+
+    def load(self, user_id: int) -> Optional[Dict]:
+        return cache.get(self._key(user_id))
+
+    def save(self, user_id: int, entry: Dict) -> None:
+        cache.set(self._key(user_id), entry, self.TIMEOUT)
+
+    def delete(self, user_id: int) -> None:
+        cache.delete(self._key(user_id))
+
+    @contextmanager
+    def lock(self, user_id: int):
+        key = f'{self.KEY_PREFIX}:lock:{user_id}'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.LOCK_WAIT
+        while not cache.add(key, token, self.LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'Cart of user {user_id} is locked')
+            time.sleep(self.LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            if cache.get(key) == token:
+                cache.delete(key)
+
+
+class LocalCartBackend(BaseCartBackend):
+    """Process-local stand-in for tests and single-process development"""
+
+    def __init__(self):
+        self._entries: Dict[int, Dict] = {}
+        self._locks: Dict[int, threading.RLock] = {}
+        self._guard = threading.Lock()
+
+    def load(self, user_id: int) -> Optional[Dict]:
+        entry = self._entries.get(user_id)
+        return {'lines': dict(entry['lines']), 'dirty': entry['dirty']} if entry is not None else None
+
+    def save(self, user_id: int, entry: Dict) -> None:
+        self._entries[user_id] = {'lines': dict(entry['lines']), 'dirty': entry['dirty']}
+
+    def delete(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    @contextmanager
+    def lock(self, user_id: int):
+        with self._guard:
+            lock = self._locks.setdefault(user_id, threading.RLock())
+        with lock:
+            yield
+
+
+_backend = None
+_backend_path = None
+
+
+def get_cart_backend() -> BaseCartBackend:
+    """Return the configured backend instance (cached per process)"""
+    global _backend, _backend_path
+    path = getattr(settings, 'CART_STORE_BACKEND', DEFAULT_BACKEND)
+    if _backend is None or path != _backend_path:
+        _backend = import_string(path)()
+        _backend_path = path
+    return _backend
+
+
+# ----- reading and writing carts -----
+
+def load_lines(user_id: int) -> Dict[str, int]:
+    """``{line key: quantity}`` of the user's most recent cart in the tables"""
+    cart_id = Cart.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+    if cart_id is None:
+        return {}
+    return {
+        line_key(product_id, variant_id): quantity
+        for product_id, variant_id, quantity in CartItem.objects.filter(cart_id=cart_id).values_list(
+            'product_id', 'variant_id', 'quantity'
+        )
+    }
+
+
+def load_entry(backend: BaseCartBackend, user_id: int) -> Dict:
+    """The user's hash, loaded from the tables when missing; call under ``backend.lock``"""
+    entry = backend.load(user_id)
+    if entry is None:
+        entry = {'lines': load_lines(user_id), 'dirty': False}
+    return entry
+
+
+def get_lines(user_id: int) -> Dict[str, int]:
+    """Current lines of the user's cart"""
+    backend = get_cart_backend()
+    entry = backend.load(user_id)
+    if entry is None:
+        with backend.lock(user_id):
+            entry = load_entry(backend, user_id)
+            backend.save(user_id, entry)
+    return entry['lines']
+
+
+def get_quantity(user_id: int, product_id: int, variant_id: Optional[int] = None) -> int:
+    return get_lines(user_id).get(line_key(product_id, variant_id), 0)
+
+
+def apply_changes(backend: BaseCartBackend, user_id: int, entry: Dict, changes: Dict[str, Optional[int]]) -> None:
+    """Apply ``{line key: quantity}`` to ``entry`` and save it; call under ``backend.lock``"""
+    lines = entry['lines']
+    for key, quantity in changes.items():
+        if quantity:
+            lines[key] = quantity
+        else:
+            lines.pop(key, None)
+    entry['dirty'] = True
+    backend.save(user_id, entry)
+
+
+def update_lines(user_id: int, changes: Dict[str, Optional[int]]) -> Dict[str, int]:
+    """
+    Apply ``{line key: quantity}`` to the user's cart (``None`` or 0 removes
+    the line) and schedule its persistence; returns the new lines
+    """
+    backend = get_cart_backend()
+    with backend.lock(user_id):
+        entry = load_entry(backend, user_id)
+        apply_changes(backend, user_id, entry, changes)
+    schedule_persist(user_id)
+    return entry['lines']
+
+
+def add_item(user_id: int, product_id: int, variant_id: Optional[int], quantity: int) -> Tuple[int, bool]:
+    """Add ``quantity`` to a line; returns the line quantity and whether the line is new"""
+    key = line_key(product_id, variant_id)
+    backend = get_cart_backend()
+    with backend.lock(user_id):
+        entry = load_entry(backend, user_id)
+        current = entry['lines'].get(key, 0)
+        apply_changes(backend, user_id, entry, {key: current + quantity})
+    schedule_persist(user_id)
+    return current + quantity, not current
+
+
+def set_quantity(user_id: int, product_id: int, variant_id: Optional[int], quantity: int) -> None:
+    update_lines(user_id, {line_key(product_id, variant_id): quantity})
+
+
+def remove_item(user_id: int, product_id: int, variant_id: Optional[int] = None) -> None:
+    update_lines(user_id, {line_key(product_id, variant_id): None})
+
+
+def clear_cart(user_id: int) -> int:
+    """Remove every line; returns how many there were"""
+    lines = get_lines(user_id)
+    if lines:
+        update_lines(user_id, {key: None for key in lines})
+    return len(lines)
+
+
+# ----- write-behind -----
+
+_state = threading.local()
+
+
+@contextmanager
+def _persisting():
+    _state.persisting = True
+    try:
+        yield
+    finally:
+        _state.persisting = False
+
+
+def write_lines(user_id: int, lines: Dict[str, int]) -> None:
+    """Make the user's Cart/CartItem rows hold ``lines`` (one upsert, one delete)"""
+    with _persisting(), transaction.atomic():
+        cart = Cart.objects.filter(user_id=user_id).first() or Cart.objects.create(user_id=user_id)
+        existing = {
+            line_key(product_id, variant_id): (pk, quantity)
+            for pk, product_id, variant_id, quantity in cart.items.values_list(
+                'pk', 'product_id', 'variant_id', 'quantity'
+            )
+        }
+        # New lines and changed quantities in one upsert; the conflict
+        # target is the primary key because unique_together does not
+        # catch lines without a variant (NULLs never conflict)
+        upserts = []
+        for key, quantity in lines.items():
+            pk, stored_quantity = existing.get(key, (None, None))
+            if quantity != stored_quantity:
+                product_id, variant_id = parse_line_key(key)
+                upserts.append(CartItem(
+                    pk=pk, cart=cart, product_id=product_id, variant_id=variant_id, quantity=quantity
+                ))
+        removed = [pk for key, (pk, _) in existing.items() if key not in lines]
+        if upserts:
+            CartItem.objects.bulk_create(
+                upserts, update_conflicts=True, unique_fields=['id'], update_fields=['quantity']
+            )
+        if removed:
+            CartItem.objects.filter(pk__in=removed).delete()
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+
+def persist_cart(user_id: int) -> bool:
+    """Write the user's hash back to Cart/CartItem if it changed; returns whether it did"""
+    backend = get_cart_backend()
+    with backend.lock(user_id):
+        entry = backend.load(user_id)
+        if entry is None or not entry['dirty']:
+            return False
+        write_lines(user_id, entry['lines'])
+        entry['dirty'] = False
+        backend.save(user_id, entry)
+    return True
+
+
+def persist_carts(user_ids: Iterable[int]) -> int:
+    """Persist several carts; returns how many were written"""
+    written = 0
+    for user_id in user_ids:
+        try:
+            written += persist_cart(user_id)
+        except Exception:
+            logger.exception('Could not persist the cart of user %s', user_id)
+    return written
+
+
+class CartPersistWorker:
+    """Daemon thread persisting dirty carts in batches"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._pending: Set[int] = set()
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='cart-write-behind', daemon=True)
+        self._thread.start()
+
+    def put(self, user_id: int) -> None:
+        with self._condition:
+            self._pending.add(user_id)
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+            # Let further changes to the same carts join the batch
+            time.sleep(self.delay)
+            with self._condition:
+                batch, self._pending = self._pending, set()
+            close_old_connections()
+            persist_carts(batch)
+
+
+_worker_instance: Optional[CartPersistWorker] = None
+_worker_lock = threading.Lock()
+
+
+def _worker() -> CartPersistWorker:
+    global _worker_instance
+    if _worker_instance is None:
+        with _worker_lock:
+            if _worker_instance is None:
+                _worker_instance = CartPersistWorker(
+                    getattr(settings, 'CART_WRITE_BEHIND_DELAY', DEFAULT_WRITE_BEHIND_DELAY)
+                )
+    return _worker_instance
+
+
+def schedule_persist(user_id: int) -> None:
+    if getattr(settings, 'CART_WRITE_BEHIND_ASYNC', False):
+        _worker().put(user_id)
+    else:
+        persist_cart(user_id)
+
+
+def evict_cart(user_id: int) -> None:
+    """Drop the user's hash so the next read loads the tables"""
+    get_cart_backend().delete(user_id)
+
+
+# Signal handlers
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def evict_cart_on_item_change(sender, instance, **kwargs):
+    if getattr(_state, 'persisting', False):
+        return
+    # Cart.updated_at is the cart version (checkout quotes are keyed by it)
+    Cart.objects.filter(pk=instance.cart_id).update(updated_at=timezone.now())
+    cart = instance._state.fields_cache.get('cart')
+    user_id = cart.user_id if cart is not None else (
+        Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True).first()
+    )
+    if user_id is not None:
+        evict_cart(user_id)
+
+
+@receiver(post_delete, sender=Cart)
+def evict_cart_on_delete(sender, instance, **kwargs):
+    if not getattr(_state, 'persisting', False):
+        evict_cart(instance.user_id)
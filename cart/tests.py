@@ -1,10 +1,16 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.core.exceptions import ValidationError
 from products.models import Product, ProductVariant, ProductCategory
+from . import store
 from .models import Cart, CartItem
+from .serializers import AddToCartSerializer
 
 User = get_user_model()
 
@@ -134,6 +140,7 @@ class CartModelTests(TestCase):
 
 class CartAPITests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = User.objects.create_user(
             email='test@example.com',
@@ -411,3 +418,263 @@ class CartAPITests(TestCase):
         self.assertEqual(item_data['product']['name'], 'Test Product')
         self.assertEqual(item_data['variant']['size'], 'Large')
         self.assertEqual(float(item_data['variant']['additional_price']), 20.00)
+
+
+class CartReadPathTests(TestCase):
+    def setUp(self):
+        from products.models import ProductAttribute, ProductAttributeValue
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='reader@example.com',
+            password='testpass123',
+            full_name='Cart Reader'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = ProductCategory.objects.create(name='Read Category', created_by=self.user)
+        colour = ProductAttribute.objects.create(name='Read Colour')
+        self.values = [ProductAttributeValue.objects.create(attribute=colour, value=v) for v in ('Red', 'Blue')]
+        self.cart = Cart.objects.create(user=self.user)
+
+    def _add_items(self, count):
+        for index in range(count):
+            product = Product.objects.create(
+                name=f'Read Product {index}', price='10.10', stock=10,
+                created_by=self.user, category=self.category
+            )
+            variant = ProductVariant.objects.create(product=product, additional_price='0.20', stock=1)
+            variant.attributes.add(*self.values)
+            CartItem.objects.create(cart=self.cart, product=product, variant=variant, quantity=1)
+
+    def _count_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get('/api/cart/')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(queries), res
+
+    def test_query_budget_does_not_grow_with_items(self):
+        self._add_items(1)
+        small, _ = self._count_queries()
+        self._add_items(19)
+        large, res = self._count_queries()
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 6)
+        self.assertEqual(len(res.data['items']), 20)
+
+    def test_totals_are_exact_decimals(self):
+        self._add_items(3)
+        item = self.cart.items.first()
+        item.quantity = 1
+        self.assertEqual(item.total_price, Decimal('10.30'))
+
+        _, res = self._count_queries()
+        self.assertEqual(res.data['total_price'], '30.90')
+        self.assertEqual(res.data['items'][0]['unit_price'], '10.30')
+        self.assertEqual((res.data['total_items'], res.data['items_count']), (3, 3))
+        # Variant stock is 1: asking for 2 makes the line unavailable
+        CartItem.objects.filter(pk=item.pk).update(quantity=2)
+        _, res = self._count_queries()
+        self.assertTrue(res.data['has_unavailable_items'])
+        self.assertEqual(res.data['total_price'], '41.20')
+
+
+    def test_totals_follow_checkout_pricing(self):
+        from orders.pricing import quote_cart
+
+        product = Product.objects.create(
+            name='Priced Product', price='10.00', stock=10, created_by=self.user, category=self.category
+        )
+        variant = ProductVariant.objects.create(product=product, price='15.00', additional_price='2.00', stock=5)
+        CartItem.objects.create(cart=self.cart, product=product, variant=variant, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=product, quantity=1)
+
+        _, res = self._count_queries()
+        self.assertEqual([item['unit_price'] for item in res.data['items']], ['10.00', '15.00'])
+        self.assertEqual(res.data['total_price'], '40.00')
+        self.assertEqual(self.cart.get_totals().total_price, quote_cart(self.cart).subtotal)
+        self.assertEqual(self.cart.items.get(variant=variant).unit_price, Decimal('15.00'))
+
+@override_settings(CART_STORE_BACKEND='cart.store.LocalCartBackend', CART_WRITE_BEHIND_ASYNC=False)
+class CartStoreTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='store@example.com',
+            password='testpass123',
+            full_name='Cart Store'
+        )
+        self.client.force_authenticate(user=self.user)
+        store.evict_cart(self.user.id)
+        self.category = ProductCategory.objects.create(name='Store Category', created_by=self.user)
+        self.product = Product.objects.create(
+            name='Store Product', price='10.00', stock=10, status='published',
+            created_by=self.user, category=self.category
+        )
+        self.variant = ProductVariant.objects.create(
+            product=self.product, additional_price='2.50', stock=5, status='approved'
+        )
+        self.plain = Product.objects.create(
+            name='Plain Product', price='4.00', stock=10, status='published',
+            created_by=self.user, category=self.category
+        )
+
+    def _rows(self):
+        return set(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'variant_id', 'quantity'))
+
+    def test_add_validates_with_one_query(self):
+        serializer = AddToCartSerializer(
+            data={'product_id': self.product.id, 'variant_id': self.variant.id, 'quantity': 2}
+        )
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['variant'], self.variant)
+        self.assertEqual(serializer.validated_data['product'], self.product)
+
+        serializer = AddToCartSerializer(data={'product_id': self.plain.id, 'variant_id': self.variant.id})
+        self.assertFalse(serializer.is_valid())
+        serializer = AddToCartSerializer(data={'product_id': self.plain.id, 'quantity': 11})
+        self.assertFalse(serializer.is_valid())
+
+    def test_api_operations_go_through_the_store(self):
+        payload = {'product_id': self.product.id, 'variant_id': self.variant.id, 'quantity': 1}
+        self.assertEqual(self.client.post('/api/cart/add/', payload).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post('/api/cart/add/', payload).status_code, status.HTTP_200_OK)
+        self.client.post('/api/cart/add/', {'product_id': self.plain.id, 'quantity': 3})
+        self.assertEqual(self._rows(), {(self.product.id, self.variant.id, 2), (self.plain.id, None, 3)})
+
+        res = self.client.get('/api/cart/')
+        self.assertEqual(res.data['total_price'], '37.00')
+        item = next(i for i in res.data['items'] if i['product']['id'] == self.plain.id)
+        res = self.client.put(f"/api/cart/items/{item['id']}/update/", {'quantity': 1})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['total_price'], Decimal('4.00'))
+        self.assertEqual(self.client.delete(f"/api/cart/items/{item['id']}/remove/").status_code, status.HTTP_200_OK)
+        self.assertEqual(self._rows(), {(self.product.id, self.variant.id, 2)})
+
+        res = self.client.delete('/api/cart/clear/')
+        self.assertIn('1 items removed', res.data['message'])
+        self.assertEqual(self._rows(), set())
+
+    def test_deferred_changes_are_written_in_one_batch(self):
+        with mock.patch.object(store, 'schedule_persist') as schedule:
+            store.add_item(self.user.id, self.product.id, self.variant.id, 1)
+            store.add_item(self.user.id, self.product.id, self.variant.id, 2)
+            store.add_item(self.user.id, self.plain.id, None, 1)
+            store.remove_item(self.user.id, self.plain.id)
+        self.assertEqual(schedule.call_count, 4)
+        self.assertEqual(self._rows(), set())
+
+        self.assertTrue(store.persist_cart(self.user.id))
+        self.assertEqual(self._rows(), {(self.product.id, self.variant.id, 3)})
+        with self.assertNumQueries(0):
+            self.assertFalse(store.persist_cart(self.user.id))
+
+    def test_direct_table_writes_evict_the_store(self):
+        store.add_item(self.user.id, self.plain.id, None, 1)
+        self.assertEqual(store.get_lines(self.user.id), {store.line_key(self.plain.id): 1})
+
+        cart = Cart.objects.get(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, variant=self.variant, quantity=2)
+        self.assertEqual(store.get_lines(self.user.id), {
+            store.line_key(self.plain.id): 1,
+            store.line_key(self.product.id, self.variant.id): 2,
+        })
+        cart.clear()
+        self.assertEqual(store.get_lines(self.user.id), {})
+
+    @override_settings(CART_STORE_BACKEND='cart.store.DatabaseCartBackend')
+    def test_database_backend_writes_every_change_through(self):
+        with mock.patch.object(store, 'schedule_persist'):
+            store.add_item(self.user.id, self.product.id, self.variant.id, 2)
+            self.assertEqual(self._rows(), {(self.product.id, self.variant.id, 2)})
+            store.add_item(self.user.id, self.product.id, self.variant.id, 1)
+            store.remove_item(self.user.id, self.plain.id)
+        self.assertEqual(self._rows(), {(self.product.id, self.variant.id, 3)})
+        self.assertFalse(store.persist_cart(self.user.id))
+
+    def test_cache_backend_refuses_a_process_local_cache(self):
+        from django.core.exceptions import ImproperlyConfigured
+
+        with self.assertRaises(ImproperlyConfigured):
+            store.CacheCartBackend()
+
+
+@override_settings(CART_STORE_BACKEND='cart.store.LocalCartBackend', CART_WRITE_BEHIND_ASYNC=False)
+class CartBulkOperationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='bulk@example.com',
+            password='testpass123',
+            full_name='Bulk Cart'
+        )
+        self.client.force_authenticate(user=self.user)
+        store.evict_cart(self.user.id)
+        category = ProductCategory.objects.create(name='Bulk Category', created_by=self.user)
+        self.products = [
+            Product.objects.create(
+                name=f'Bulk Product {index}', price='5.00', stock=10, status='published',
+                created_by=self.user, category=category
+            )
+            for index in range(3)
+        ]
+        self.variant = ProductVariant.objects.create(
+            product=self.products[0], additional_price='1.00', stock=4, status='approved'
+        )
+
+    def _rows(self):
+        return set(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'variant_id', 'quantity'))
+
+    def test_catalog_is_checked_with_one_query(self):
+        from .operations import fetch_catalog_rows
+
+        keys = [(product.id, None) for product in self.products] + [(self.products[0].id, self.variant.id)]
+        with self.assertNumQueries(1):
+            products, variants = fetch_catalog_rows(keys)
+        self.assertEqual(set(products), {product.id for product in self.products})
+        self.assertEqual(variants[(self.products[0].id, self.variant.id)].stock, 4)
+
+    def test_bulk_endpoint_applies_operations_and_returns_cart(self):
+        first, second, third = self.products
+        store.add_item(self.user.id, third.id, None, 2)
+        res = self.client.post('/api/cart/bulk/', {'operations': [
+            {'op': 'add', 'product_id': first.id, 'variant_id': self.variant.id, 'quantity': 2},
+            {'op': 'add', 'product_id': first.id, 'variant_id': self.variant.id, 'quantity': 1},
+            {'op': 'set', 'product_id': second.id, 'quantity': 4},
+            {'op': 'remove', 'product_id': third.id},
+        ]}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._rows(), {(first.id, self.variant.id, 3), (second.id, None, 4)})
+        self.assertEqual(res.data['total_price'], '38.00')
+        self.assertEqual(res.data['items_count'], 2)
+
+    def test_invalid_operation_rejects_the_whole_batch(self):
+        first, second, _ = self.products
+        res = self.client.post('/api/cart/bulk/', {'operations': [
+            {'op': 'add', 'product_id': second.id, 'quantity': 1},
+            {'op': 'add', 'product_id': first.id, 'variant_id': self.variant.id, 'quantity': 5},
+        ]}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['operations'][0], [])
+        self.assertIn('4 items available', res.data['operations'][1][0])
+        self.assertEqual(self._rows(), set())
+        self.assertEqual(store.get_lines(self.user.id), {})
+
+    def test_guest_cart_merge_uses_the_bulk_engine(self):
+        from django.contrib.sessions.backends.base import SessionBase
+        from accounts.views import sync_guest_cart_to_user
+
+        first, second, _ = self.products
+        store.add_item(self.user.id, second.id, None, 1)
+        request = mock.Mock(session=SessionBase())
+        request.session['guest_cart'] = [
+            {'product_id': first.id, 'variant_id': self.variant.id, 'quantity': 2},
+            {'product_id': second.id, 'quantity': 2},
+            {'product_id': first.id, 'variant_id': self.variant.id, 'quantity': 9},  # over stock: dropped
+        ]
+        sync_guest_cart_to_user(request, self.user)
+        self.assertEqual(self._rows(), {(first.id, self.variant.id, 2), (second.id, None, 3)})
+        self.assertNotIn('guest_cart', request.session)
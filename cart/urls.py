@@ -4,7 +4,8 @@ from .views import (
     AddToCartView,
     UpdateCartItemView,
     RemoveFromCartView,
-    ClearCartView
+    ClearCartView,
+    BulkCartView
 )
 
 urlpatterns = [
@@ -13,4 +14,5 @@ urlpatterns = [
     path('items/<int:pk>/update/', UpdateCartItemView.as_view(), name='update-cart-item'),
     path('items/<int:pk>/remove/', RemoveFromCartView.as_view(), name='remove-from-cart'),
     path('clear/', ClearCartView.as_view(), name='clear-cart'),
+    path('bulk/', BulkCartView.as_view(), name='bulk-cart'),
 ]
\ No newline at end of file
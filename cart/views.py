@@ -2,17 +2,18 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
-from django.shortcuts import get_object_or_404
 from django.core.exceptions import ValidationError
 from rest_framework.exceptions import NotFound, PermissionDenied
 
+from . import store as cart_store
+from .operations import CartOperation, apply_cart_operations
 from .models import Cart, CartItem
 from .serializers import (
     CartSerializer,
     AddToCartSerializer,
-    UpdateCartItemSerializer
+    UpdateCartItemSerializer,
+    BulkCartSerializer
 )
-from products.models import Product, ProductVariant
 
 
 class IsUserOrSupplier(IsAuthenticated):
@@ -32,7 +33,8 @@ class CartView(generics.RetrieveAPIView):
     permission_classes = [IsUserOrSupplier]
 
     def get_object(self):
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
+        cart_store.persist_cart(self.request.user.id)
+        cart, _ = Cart.objects.for_display().get_or_create(user=self.request.user)
         return cart
 
 
@@ -42,32 +44,21 @@ class AddToCartView(generics.CreateAPIView):
     permission_classes = [IsUserOrSupplier]
 
     def create(self, request, *args, **kwargs):
-        cart = Cart.objects.get_or_create(user=request.user)[0]
         serializer = self.get_serializer(data=request.data)
-        
+
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            product = get_object_or_404(Product, id=serializer.validated_data['product_id'])
-            variant_id = serializer.validated_data.get('variant_id')
-            quantity = serializer.validated_data.get('quantity', 1)
-
-            variant = None
-            if variant_id:
-                variant = get_object_or_404(ProductVariant, id=variant_id)
-
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                product=product,
-                variant=variant,
-                defaults={'quantity': quantity}
+            product = serializer.validated_data['product']
+            variant = serializer.validated_data['variant']
+            _, created = cart_store.add_item(
+                request.user.id,
+                product.id,
+                variant.id if variant else None,
+                serializer.validated_data.get('quantity', 1)
             )
 
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
-
             return Response(
                 {"message": "Item added to cart successfully"},
                 status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
@@ -85,16 +76,28 @@ class AddToCartView(generics.CreateAPIView):
             )
 
 
-class UpdateCartItemView(generics.UpdateAPIView):
-    """Update cart item with enhanced validation"""
-    serializer_class = UpdateCartItemSerializer
-    permission_classes = [IsUserOrSupplier]
+class CartStoreItemMixin:
+    """
+    Resolves ``pk`` to a cart line (product and variant in the same query);
+    the change itself is made in the cart store
+    """
     lookup_url_kwarg = 'pk'
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return CartItem.objects.none()
-        return CartItem.objects.filter(cart__user=self.request.user)
+        return CartItem.objects.filter(cart__user=self.request.user).select_related('product', 'variant')
+
+    def get_object(self):
+        # Item ids are assigned when the cart is persisted
+        cart_store.persist_cart(self.request.user.id)
+        return super().get_object()
+
+
+class UpdateCartItemView(CartStoreItemMixin, generics.UpdateAPIView):
+    """Update cart item with enhanced validation"""
+    serializer_class = UpdateCartItemSerializer
+    permission_classes = [IsUserOrSupplier]
 
     def update(self, request, *args, **kwargs):
         try:
@@ -106,7 +109,7 @@ class UpdateCartItemView(generics.UpdateAPIView):
 
             # Update quantity
             instance.quantity = serializer.validated_data['quantity']
-            instance.save()
+            cart_store.set_quantity(request.user.id, instance.product_id, instance.variant_id, instance.quantity)
 
             return Response({
                 "message": "Cart item updated successfully",
@@ -126,20 +129,14 @@ class UpdateCartItemView(generics.UpdateAPIView):
             )
 
 
-class RemoveFromCartView(generics.DestroyAPIView):
+class RemoveFromCartView(CartStoreItemMixin, generics.DestroyAPIView):
     """Remove item from cart"""
     permission_classes = [IsUserOrSupplier]
-    lookup_url_kwarg = 'pk'
-
-    def get_queryset(self):
-        if getattr(self, 'swagger_fake_view', False):
-            return CartItem.objects.none()
-        return CartItem.objects.filter(cart__user=self.request.user)
 
     def destroy(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
-            self.perform_destroy(instance)
+            cart_store.remove_item(request.user.id, instance.product_id, instance.variant_id)
             return Response(
                 {"message": "Item removed from cart successfully"},
                 status=status.HTTP_200_OK
@@ -156,17 +153,36 @@ class ClearCartView(APIView):
     permission_classes = [IsUserOrSupplier]
 
     def delete(self, request):
-        cart = Cart.objects.filter(user=request.user).first()
-        if not cart:
+        items_count = cart_store.clear_cart(request.user.id)
+        if not items_count:
             return Response(
                 {"message": "Cart is already empty"},
                 status=status.HTTP_200_OK
             )
-        
-        items_count = cart.items.count()
-        cart.items.all().delete()
-        
+
         return Response(
             {"message": f"Cart cleared successfully. {items_count} items removed."},
             status=status.HTTP_200_OK
         )
+
+
+class BulkCartView(APIView):
+    """
+    Apply a list of add/set/remove operations to the cart in one request.
+    Either every operation is applied or none is; the response is the
+    updated cart, or the errors per operation.
+    """
+    permission_classes = [IsUserOrSupplier]
+
+    def post(self, request):
+        serializer = BulkCartSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        operations = [CartOperation(**operation) for operation in serializer.validated_data['operations']]
+        result = apply_cart_operations(request.user.id, operations)
+        if not result.is_valid:
+            return Response({'operations': result.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        cart, _ = Cart.objects.for_display().get_or_create(user=request.user)
+        return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
@@ -137,22 +137,39 @@ class CheckoutSession(models.Model):
         from django.utils import timezone
         return timezone.now() > self.expires_at
 
+    @classmethod
+    def release_superseded_stock(cls, user):
+        """
+        Give back the stock held for the user's earlier open sessions; a new
+        session for the cart replaces them
+        """
+        from orders.models import StockReservation
+        from orders.reservations import release_reservations
+
+        open_sessions = cls.objects.filter(user=user, order__isnull=True).exclude(
+            status__in=('order_created', 'completed', 'expired', 'cancelled')
+        ).values('session_id')
+        release_reservations(StockReservation.objects.filter(reference__in=open_sessions))
+
     def calculate_totals(self):
-        """Calculate all pricing components"""
-        # Calculate tax (18% GST)
-        self.tax_amount = self.subtotal * Decimal('0.18')
-        
-        # Calculate shipping (free for orders > 500)
-        self.shipping_charge = Decimal('50.00') if self.subtotal < Decimal('500.00') else Decimal('0.00')
-        
-        # Calculate total
-        self.total_amount = (
-            self.subtotal + 
-            self.shipping_charge + 
-            self.tax_amount - 
-            self.discount_amount - 
-            self.coupon_discount
+        """Price the cart snapshot with the checkout pricing rules (see orders.pricing)"""
+        from orders.pricing import QuoteLine, get_coupon, price_lines
+
+        lines = [
+            QuoteLine(item['product_id'], item['variant_id'], item['quantity'], Decimal(str(item['unit_price'])))
+            for item in self.cart_items_snapshot.get('items', [])
+        ]
+        quote = price_lines(
+            lines,
+            coupon=get_coupon(self.coupon_code),
+            user=self.user,
+            discount=self.discount_amount
         )
+        self.subtotal = quote.subtotal
+        self.tax_amount = quote.tax
+        self.shipping_charge = quote.shipping_charge
+        self.coupon_discount = quote.coupon_discount
+        self.total_amount = quote.total
 
     def save(self, *args, **kwargs):
         if not self.expires_at:
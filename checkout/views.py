@@ -19,6 +19,9 @@ from .serializers import (
     CreateOrderSerializer,
     CheckoutSummarySerializer
 )
+from cart import store as cart_store
+from orders.pricing import quote_cart
+from orders.reservations import InsufficientStock, StockLine, commit_stock, reserve_stock
 from cart.models import Cart, CartItem
 from orders.models import Order, OrderItem
 from coupon.models import Coupon
@@ -75,22 +78,26 @@ class InitiateCheckoutView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
+            cart_store.persist_cart(request.user.id)
             with transaction.atomic():
                 # Get user's cart
                 cart = Cart.objects.get(user=request.user)
-                
+                quote = quote_cart(cart, user=request.user)
+                priced = {(line.product_id, line.variant_id): line for line in quote.lines}
+
                 # Create cart snapshot
                 cart_items_data = []
-                for item in cart.items.all():
+                for item in cart.items.select_related('product', 'variant'):
+                    line = priced[(item.product_id, item.variant_id)]
                     cart_items_data.append({
                         'id': item.id,
                         'product_id': item.product.id,
                         'product_name': item.product.name,
                         'variant_id': item.variant.id if item.variant else None,
-                        'variant_display': f"{item.variant.size} - {item.variant.color}" if item.variant else "Default",
+                        'variant_display': str(item.variant) if item.variant else "Default",
                         'quantity': item.quantity,
-                        'unit_price': float(item.total_price / item.quantity),
-                        'total_price': float(item.total_price),
+                        'unit_price': float(line.unit_price),
+                        'total_price': float(line.total),
                         'available_stock': item.variant.stock if item.variant else item.product.stock
                     })
 
@@ -100,7 +107,17 @@ class InitiateCheckoutView(APIView):
                     user=request.user,
                     session_id=session_id,
                     cart_items_snapshot={'items': cart_items_data},
-                    subtotal=cart.total_price
+                    subtotal=quote.subtotal
+                )
+
+                # Hold the stock for as long as the session lives, in place
+                # of what the user's earlier sessions still hold
+                CheckoutSession.release_superseded_stock(request.user)
+                reserve_stock(
+                    [StockLine(line.product_id, line.variant_id, line.quantity) for line in quote.lines],
+                    session_id,
+                    expires_at=checkout_session.expires_at,
+                    user=request.user
                 )
 
                 return Response({
@@ -114,6 +131,11 @@ class InitiateCheckoutView(APIView):
                 'success': False,
                 'message': 'Cart not found or empty'
             }, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as e:
+            return Response({
+                'success': False,
+                'message': e.message
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 'success': False,
@@ -292,24 +314,17 @@ class ApplyCouponView(APIView):
                     is_active=True
                 )
                 
-                # Calculate discount
-                if coupon.discount_type == 'percentage':
-                    discount = checkout_session.subtotal * (coupon.discount_value / 100)
-                    if coupon.max_discount_amount:
-                        discount = min(discount, coupon.max_discount_amount)
-                else:
-                    discount = coupon.discount_value
-
-                # Apply minimum order amount check
-                if coupon.min_order_amount and checkout_session.subtotal < coupon.min_order_amount:
+                is_valid, message = coupon.is_valid(request.user, checkout_session.subtotal)
+                if not is_valid:
                     return Response({
                         'success': False,
-                        'message': f'Minimum order amount of ₹{coupon.min_order_amount} required for this coupon'
+                        'message': message
                     }, status=status.HTTP_400_BAD_REQUEST)
 
+                # The discount is computed by calculate_totals on save
                 checkout_session.coupon_code = coupon.code
-                checkout_session.coupon_discount = discount
                 checkout_session.save()
+                discount = checkout_session.coupon_discount
 
                 return Response({
                     'success': True,
@@ -349,7 +364,6 @@ class RemoveCouponView(APIView):
                 }, status=status.HTTP_410_GONE)
 
             checkout_session.coupon_code = None
-            checkout_session.coupon_discount = Decimal('0.00')
             checkout_session.save()
 
             return Response({
@@ -428,8 +442,16 @@ class CreateOrderView(APIView):
                         except Coupon.DoesNotExist:
                             pass
 
-                    # Create order items from cart snapshot
+                    # Commit the stock held since the session started
                     cart_items = checkout_session.cart_items_snapshot.get('items', [])
+                    commit_stock(
+                        [StockLine(item['product_id'], item['variant_id'], item['quantity']) for item in cart_items],
+                        reference=checkout_session.session_id,
+                        order=order,
+                        user=request.user
+                    )
+
+                    # Create order items from cart snapshot
                     for item_data in cart_items:
                         OrderItem.objects.create(
                             order=order,
@@ -461,6 +483,11 @@ class CreateOrderView(APIView):
                         }
                     }, status=status.HTTP_201_CREATED)
 
+            except InsufficientStock as e:
+                return Response({
+                    'success': False,
+                    'message': e.message
+                }, status=status.HTTP_400_BAD_REQUEST)
             except Exception as e:
                 return Response({
                     'success': False,
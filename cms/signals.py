@@ -0,0 +1,39 @@
+"""
+CMS Signals
+
+Every public CMS model has its own generation counter ('cms', model name);
+saves and deletes bump it so the ETags of the endpoints serving that model
+change (see ConditionalGetMixin).
+"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from products.enterprise_cache import EnterpriseCacheManager
+from .models import Page, Banner, BlogPost, BlogCategory, BlogTag, FAQ, Testimonial, CarouselBanner
+
+CMS_MODELS = (Page, Banner, BlogPost, BlogCategory, BlogTag, FAQ, Testimonial, CarouselBanner)
+
+
+def cms_etag_scope(model):
+    return ('cms', model._meta.model_name)
+
+
+def bump_cms_generation(model):
+    EnterpriseCacheManager.bump_generation(*cms_etag_scope(model))
+
+
+def cms_content_changed(sender, **kwargs):
+    bump_cms_generation(sender)
+
+
+for model in CMS_MODELS:
+    post_save.connect(cms_content_changed, sender=model, dispatch_uid=f'cms_etag_save_{model._meta.model_name}')
+    post_delete.connect(cms_content_changed, sender=model, dispatch_uid=f'cms_etag_delete_{model._meta.model_name}')
+
+
+@receiver(m2m_changed, sender=BlogPost.categories.through)
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def blog_post_relations_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_cms_generation(BlogPost)
@@ -4,7 +4,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import F, Q
 from django.utils import timezone
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -20,11 +20,17 @@ from .serializers import (
 )
 from .models import CarouselBanner
 from .serializers import CarouselBannerSerializer
+from .signals import cms_etag_scope
+from products.mixins import ConditionalGetMixin
 
+# Banners enter and leave their date window without a save
+BANNER_ETAG_WINDOW = 60  # seconds
 
-class PageListView(generics.ListAPIView):
+
+class PageListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = PageSerializer
     permission_classes = [permissions.AllowAny]
+    etag_scopes = (cms_etag_scope(Page),)
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     search_fields = ['title', 'content']
     filterset_fields = ['status', 'is_featured', 'show_in_nav']
@@ -55,10 +61,11 @@ class PageListView(generics.ListAPIView):
         return queryset.order_by('order', 'title')
 
 
-class PageDetailView(generics.RetrieveAPIView):
+class PageDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = PageSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'slug'
+    etag_scopes = (cms_etag_scope(Page),)
 
     @swagger_auto_schema(
         operation_description="Get detailed view of a page",
@@ -81,12 +88,16 @@ class PageDetailView(generics.RetrieveAPIView):
 
         return queryset
 
+    def get_last_modified(self):
+        return Page.objects.filter(slug=self.kwargs['slug']).values_list('updated_at', flat=True).first()
+
 
-class BannerListView(generics.ListAPIView):
+class BannerListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = BannerSerializer
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['position', 'is_active']
+    etag_scopes = (cms_etag_scope(Banner),)
 
     @swagger_auto_schema(
         operation_description="Get list of active banners",
@@ -103,6 +114,9 @@ class BannerListView(generics.ListAPIView):
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+    def get_etag_extra(self):
+        return int(timezone.now().timestamp() // BANNER_ETAG_WINDOW)
+
     def get_queryset(self):
         now = timezone.now()
         queryset = Banner.objects.filter(
@@ -120,9 +134,10 @@ class BannerListView(generics.ListAPIView):
         return queryset.order_by('order')
 
 
-class BlogPostListView(generics.ListAPIView):
+class BlogPostListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = BlogPostSerializer
     permission_classes = [permissions.AllowAny]
+    etag_scopes = (cms_etag_scope(BlogPost), cms_etag_scope(BlogCategory), cms_etag_scope(BlogTag))
     filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
     search_fields = ['title', 'content', 'excerpt']
     filterset_fields = ['status', 'is_featured', 'categories', 'tags']
@@ -186,19 +201,21 @@ class BlogPostDetailView(generics.RetrieveAPIView):
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
 
-        # Increment view count
+        # Increment view count; a queryset update, so the post_save ETag bump
+        # does not invalidate the blog list on every read
         if instance.status == 'published':
+            BlogPost.objects.filter(pk=instance.pk).update(view_count=F('view_count') + 1)
             instance.view_count += 1
-            instance.save()
 
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
 
-class BlogCategoryListView(generics.ListAPIView):
+class BlogCategoryListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = BlogCategorySerializer
     permission_classes = [permissions.AllowAny]
     queryset = BlogCategory.objects.all().order_by('name')
+    etag_scopes = (cms_etag_scope(BlogCategory),)
 
     @swagger_auto_schema(
         operation_description="Get list of blog categories",
@@ -212,10 +229,11 @@ class BlogCategoryListView(generics.ListAPIView):
         return super().get(request, *args, **kwargs)
 
 
-class BlogTagListView(generics.ListAPIView):
+class BlogTagListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = BlogTagSerializer
     permission_classes = [permissions.AllowAny]
     queryset = BlogTag.objects.all().order_by('name')
+    etag_scopes = (cms_etag_scope(BlogTag),)
 
     @swagger_auto_schema(
         operation_description="Get list of blog tags",
@@ -229,11 +247,12 @@ class BlogTagListView(generics.ListAPIView):
         return super().get(request, *args, **kwargs)
 
 
-class FAQListView(generics.ListAPIView):
+class FAQListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = FAQSerializer
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['category', 'is_active']
+    etag_scopes = (cms_etag_scope(FAQ),)
 
     @swagger_auto_schema(
         operation_description="Get list of frequently asked questions",
@@ -254,11 +273,12 @@ class FAQListView(generics.ListAPIView):
         return FAQ.objects.filter(is_active=True).order_by('category', 'order')
 
 
-class TestimonialListView(generics.ListAPIView):
+class TestimonialListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = TestimonialSerializer
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['is_featured', 'is_active']
+    etag_scopes = (cms_etag_scope(Testimonial),)
 
     @swagger_auto_schema(
         operation_description="Get list of testimonials",
@@ -280,9 +300,10 @@ class TestimonialListView(generics.ListAPIView):
 
 
 # Public Carousel endpoints
-class CarouselBannerListView(generics.ListAPIView):
+class CarouselBannerListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CarouselBannerSerializer
     permission_classes = [permissions.AllowAny]
+    etag_scopes = (cms_etag_scope(CarouselBanner),)
 
     def get_queryset(self):
         # Only active and not-deleted (no end date logic for carousel) items
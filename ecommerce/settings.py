@@ -94,6 +94,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'products.middleware.AuditLogMiddleware',
 ]
 
 ROOT_URLCONF = 'ecommerce.urls'
@@ -270,3 +271,44 @@ TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
 
 SECURE_SSL_REDIRECT = False
+
+# Product search backend (see products/search.py)
+PRODUCT_SEARCH_BACKEND = 'products.search.DatabaseSearchBackend'
+
+# Autocomplete prefix index (see products/autocomplete.py)
+PRODUCT_AUTOCOMPLETE_SNAPSHOT = os.environ.get('PRODUCT_AUTOCOMPLETE_SNAPSHOT')
+PRODUCT_AUTOCOMPLETE_MAX_AGE = 600
+
+# Catalog snapshot for public list endpoints (see products/catalog_snapshot.py),
+# a file every worker process maps; defaults to one per database in the temp
+# directory. Products created without save signals are noticed within
+# PRODUCT_CATALOG_SNAPSHOT_CHECK_INTERVAL seconds.
+PRODUCT_CATALOG_SNAPSHOT_ENABLED = os.environ.get('PRODUCT_CATALOG_SNAPSHOT_ENABLED', 'True').lower() == 'true'
+PRODUCT_CATALOG_SNAPSHOT = os.environ.get('PRODUCT_CATALOG_SNAPSHOT')
+PRODUCT_CATALOG_SNAPSHOT_MAX_AGE = 300
+PRODUCT_CATALOG_SNAPSHOT_CHECK_INTERVAL = 5
+
+# Per-process LRU of resolved supplier prices (see products/pricing.py)
+PRODUCT_PRICE_CACHE_SIZE = 10000
+PRODUCT_PRICE_CACHE_TTL = 60
+
+# Write product audit entries from a background thread (see products/audit.py)
+PRODUCT_AUDIT_ASYNC = os.environ.get('PRODUCT_AUDIT_ASYNC', 'False').lower() == 'true'
+
+# Cart store (see cart/store.py). The default reads and writes the cart
+# tables; 'cart.store.CacheCartBackend' keeps carts in the cache and writes
+# them back inline, or from a background thread when async. It needs a
+# shared default cache (Redis), not the per-process LocMemCache.
+CART_STORE_BACKEND = os.environ.get('CART_STORE_BACKEND', 'cart.store.DatabaseCartBackend')
+CART_WRITE_BEHIND_ASYNC = os.environ.get('CART_WRITE_BEHIND_ASYNC', 'False').lower() == 'true'
+CART_WRITE_BEHIND_DELAY = 2
+
+# Checkout pricing shared by checkout, payments and orders (see orders/pricing.py)
+CHECKOUT_TAX_RATE = '0.18'
+CHECKOUT_SHIPPING_CHARGE = '50.00'
+CHECKOUT_FREE_SHIPPING_THRESHOLD = '500.00'
+CHECKOUT_QUOTE_TTL = 60
+
+# Stock held by a payment-from-cart checkout, in seconds (see orders/reservations.py);
+# run `manage.py release_stock_reservations` periodically to free expired holds
+CHECKOUT_RESERVATION_TTL = 30 * 60
@@ -8,6 +8,7 @@ from django.core.exceptions import ValidationError
 from accounts.models import User
 from products.models import Product, ProductVariant
 from coupon.models import Coupon
+from .pricing import QuoteLine, lines_for, price_lines
 
 
 class Order(models.Model):
@@ -139,87 +140,73 @@ class Order(models.Model):
         return f"{timestamp}{seq:04d}"
 
     def calculate_totals(self):
-        """Calculate all financial fields with proper rounding"""
-        with transaction.atomic():
-            items = self.items.select_related('product', 'variant').all()
-
-            # Calculate subtotal
-            self.subtotal = sum(
-                item.total_price for item in items
-            ).quantize(Decimal('0.00'))
-
-            # Calculate tax (10% for example)
-            self.tax = (self.subtotal * Decimal('0.10')).quantize(Decimal('0.00'))
-
-            # Apply coupon if valid
-            self.coupon_discount = Decimal('0.00')
-            if self.coupon:
-                is_valid, _ = self.coupon.is_valid(self.user, self.subtotal)
-                if is_valid:
-                    self.coupon_discount = self.coupon.apply_discount(
-                        self.subtotal
-                    ).quantize(Decimal('0.00'))
-
-            # Convert float fields to Decimal
-            shipping_charge = Decimal(self.shipping_charge).quantize(Decimal('0.00'))
-            discount = Decimal(self.discount).quantize(Decimal('0.00'))
-
-            # Calculate final total
-            self.total = (
-                    self.subtotal +
-                    self.tax +
-                    shipping_charge -
-                    discount -
-                    self.coupon_discount
-            ).quantize(Decimal('0.00'))
+        """Price the order items with the checkout pricing rules (see orders.pricing)"""
+        lines = [
+            QuoteLine(product_id, variant_id, quantity, price)
+            for product_id, variant_id, quantity, price in self.items.values_list(
+                'product_id', 'variant_id', 'quantity', 'price'
+            )
+        ]
+        quote = price_lines(
+            lines,
+            coupon=self.coupon,
+            user=self.user,
+            shipping_charge=Decimal(str(self.shipping_charge)),
+            discount=Decimal(str(self.discount)),
+        )
+        self.subtotal = quote.subtotal
+        self.tax = quote.tax
+        self.shipping_charge = quote.shipping_charge
+        self.coupon_discount = quote.coupon_discount
+        self.total = quote.total
 
     @staticmethod
-    def create_from_cart(cart, shipping_address, billing_address, payment_method=None):
+    def create_from_cart(cart, shipping_address, billing_address, payment_method=None, reservation=None):
         """
-        Create an order from a cart with stock validation
+        Create an order from a cart, taking its stock (see orders.reservations):
+        the holds under ``reservation`` are committed when they still match
+        the cart, otherwise the stock is taken now
         Returns: Order object
         Raises: ValidationError if stock is insufficient
         """
+        from .reservations import StockLine, commit_stock
+
         with transaction.atomic():
-            # Lock cart items for processing
-            cart_items = cart.items.select_related(
-                'product', 'variant'
-            ).select_for_update()
-
-            # Validate stock before creating order
-            for item in cart_items:
-                available_stock = item.variant.stock if item.variant else item.product.stock
-                if item.quantity > available_stock:
-                    raise ValidationError(
-                        f"Not enough stock for {item.product.name}. "
-                        f"Available: {available_stock}, Requested: {item.quantity}"
-                    )
+            cart_items = list(cart.items.select_related('product', 'variant'))
+
+            # Price the items for the delivery address
+            quote = price_lines(lines_for(
+                [(item.product_id, item.variant_id, item.quantity, item.product.price) for item in cart_items],
+                shipping_address
+            ))
 
             # Create order
             order = Order.objects.create(
                 user=cart.user,
                 shipping_address=shipping_address,
                 billing_address=billing_address,
-                payment_method=payment_method
+                payment_method=payment_method,
+                shipping_charge=quote.shipping_charge
+            )
+
+            # Take the stock (conditional updates, no save signals)
+            commit_stock(
+                [StockLine(item.product_id, item.variant_id, item.quantity) for item in cart_items],
+                reference=reservation,
+                order=order,
+                user=cart.user
             )
 
-            # Create order items and update stock
-            for cart_item in cart_items:
-                OrderItem.objects.create(
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
                     product=cart_item.product,
                     variant=cart_item.variant,
                     quantity=cart_item.quantity,
-                    price=cart_item.variant.total_price if cart_item.variant else cart_item.product.price
+                    price=line.unit_price
                 )
-
-                # Update stock
-                if cart_item.variant:
-                    cart_item.variant.stock -= cart_item.quantity
-                    cart_item.variant.save()
-                else:
-                    cart_item.product.stock -= cart_item.quantity
-                    cart_item.product.save()
+                for cart_item, line in zip(cart_items, quote.lines)
+            ])
 
             # Clear cart
             cart.clear()
@@ -397,3 +384,60 @@ class OrderStatusChange(models.Model):
 
     def __str__(self):
         return f"Order #{self.order.order_number} changed to {self.status}"
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a checkout (see orders.reservations). Product/variant
+    stock is decremented when the hold is taken; a held reservation is
+    either committed to an order or released, which puts the stock back.
+    """
+    HELD, COMMITTED, RELEASED = 'held', 'committed', 'released'
+    STATUSES = (
+        (HELD, 'Held'),
+        (COMMITTED, 'Committed'),
+        (RELEASED, 'Released'),
+    )
+
+    reference = models.CharField(max_length=100)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='stock_reservations'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations'
+    )
+    variant = models.ForeignKey(
+        ProductVariant,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='stock_reservations'
+    )
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=20, choices=STATUSES, default=HELD)
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stock_reservations'
+    )
+    expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Stock Reservation"
+        verbose_name_plural = "Stock Reservations"
+        indexes = [
+            models.Index(fields=['reference', 'status']),
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x product {self.product_id} ({self.status}, {self.reference})"
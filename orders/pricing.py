@@ -0,0 +1,162 @@
+"""
+Checkout pricing shared by checkout sessions, payment-from-cart and orders.
+
+One set of rules, all in Decimal rounded to paise:
+
+- unit price: variant lines are resolved for the delivery location
+  (products.pricing.resolve_prices), lines without a variant cost the
+  product price;
+- tax: ``CHECKOUT_TAX_RATE`` of the subtotal;
+- shipping: ``CHECKOUT_SHIPPING_CHARGE`` below
+  ``CHECKOUT_FREE_SHIPPING_THRESHOLD``, free from there (orders keep the
+  shipping charge they were created with);
+- coupon: ``Coupon.apply_discount`` of the subtotal when ``Coupon.is_valid``;
+- total = subtotal + tax + shipping - discount - coupon discount.
+
+``price_lines`` prices a list of lines in one pass. ``quote_cart``
+snapshots a cart (one query, plus the price resolution) and memoizes the
+quote in the cache per (cart version, coupon, delivery location) for
+``CHECKOUT_QUOTE_TTL`` seconds; the cart version is ``Cart.updated_at``,
+which every change to the cart's items moves.
+"""
+
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from cart.models import Cart, CartItem
+from coupon.models import Coupon
+from products.pricing import normalize_location, resolve_prices
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+DEFAULT_TAX_RATE = Decimal('0.18')  # GST
+DEFAULT_SHIPPING_CHARGE = Decimal('50.00')
+DEFAULT_FREE_SHIPPING_THRESHOLD = Decimal('500.00')
+DEFAULT_QUOTE_TTL = 60  # seconds
+
+
+class PricingPolicy(NamedTuple):
+    tax_rate: Decimal
+    shipping_charge: Decimal
+    free_shipping_threshold: Decimal
+
+
+class QuoteLine(NamedTuple):
+    product_id: int
+    variant_id: Optional[int]
+    quantity: int
+    unit_price: Decimal
+    total: Optional[Decimal] = None  # set by price_lines
+
+
+class PriceQuote(NamedTuple):
+    lines: Tuple[QuoteLine, ...]
+    subtotal: Decimal
+    tax: Decimal
+    shipping_charge: Decimal
+    discount: Decimal
+    coupon_discount: Decimal
+    total: Decimal
+    coupon_code: Optional[str] = None
+
+    def summary(self) -> Dict[str, str]:
+        """Amounts as strings, for JSON snapshots"""
+        return {
+            'subtotal': str(self.subtotal),
+            'tax': str(self.tax),
+            'shipping_charge': str(self.shipping_charge),
+            'coupon_discount': str(self.coupon_discount),
+            'total': str(self.total),
+        }
+
+
+def get_pricing_policy() -> PricingPolicy:
+    return PricingPolicy(
+        Decimal(str(getattr(settings, 'CHECKOUT_TAX_RATE', DEFAULT_TAX_RATE))),
+        Decimal(str(getattr(settings, 'CHECKOUT_SHIPPING_CHARGE', DEFAULT_SHIPPING_CHARGE))),
+        Decimal(str(getattr(settings, 'CHECKOUT_FREE_SHIPPING_THRESHOLD', DEFAULT_FREE_SHIPPING_THRESHOLD))),
+    )
+
+
+def price_lines(lines: Iterable[QuoteLine], coupon: Optional[Coupon] = None, user=None,
+                shipping_charge: Optional[Decimal] = None, discount: Decimal = ZERO,
+                policy: Optional[PricingPolicy] = None) -> PriceQuote:
+    """
+    Quote for ``lines``; ``shipping_charge`` overrides the policy (orders),
+    an invalid ``coupon`` gives no discount
+    """
+    policy = policy or get_pricing_policy()
+    priced = []
+    subtotal = ZERO
+    for line in lines:
+        total = (Decimal(line.unit_price) * line.quantity).quantize(CENT)
+        priced.append(line._replace(unit_price=Decimal(line.unit_price), total=total))
+        subtotal += total
+
+    tax = (subtotal * policy.tax_rate).quantize(CENT)
+    if shipping_charge is None:
+        shipping_charge = policy.shipping_charge if priced and subtotal < policy.free_shipping_threshold else ZERO
+    shipping_charge = Decimal(shipping_charge).quantize(CENT)
+    discount = Decimal(discount).quantize(CENT)
+
+    coupon_discount = ZERO
+    if coupon is not None and coupon.is_valid(user, subtotal)[0]:
+        coupon_discount = Decimal(coupon.apply_discount(subtotal)).quantize(CENT)
+
+    return PriceQuote(
+        lines=tuple(priced),
+        subtotal=subtotal,
+        tax=tax,
+        shipping_charge=shipping_charge,
+        discount=discount,
+        coupon_discount=coupon_discount,
+        total=subtotal + tax + shipping_charge - discount - coupon_discount,
+        coupon_code=coupon.code if coupon is not None else None,
+    )
+
+
+def address_location(address) -> Tuple[str, str]:
+    """(pincode, district) of an address dict (payments, orders) or Address instance (checkout)"""
+    if not address:
+        return normalize_location()
+    if isinstance(address, dict):
+        pincode = address.get('postal_code') or address.get('pincode') or address.get('zip_code')
+        district = address.get('district') or address.get('city')
+    else:
+        pincode, district = getattr(address, 'postal_code', None), getattr(address, 'city', None)
+    return normalize_location(str(pincode or ''), district)
+
+
+def lines_for(rows: Iterable[Tuple[int, Optional[int], int, Decimal]], address=None) -> List[QuoteLine]:
+    """Unpriced lines from ``(product_id, variant_id, quantity, product_price)`` rows"""
+    rows = list(rows)
+    pincode, district = address_location(address)
+    prices = resolve_prices([row[1] for row in rows if row[1]], pincode, district)
+    lines = []
+    for product_id, variant_id, quantity, product_price in rows:
+        resolved = prices.get(variant_id) if variant_id else None
+        unit_price = resolved.price if resolved is not None else (product_price or ZERO)
+        lines.append(QuoteLine(product_id, variant_id, quantity, unit_price))
+    return lines
+
+
+def get_coupon(code: Optional[str]) -> Optional[Coupon]:
+    return Coupon.objects.filter(code=code).first() if code else None
+
+
+def quote_cart(cart: Cart, coupon_code: Optional[str] = None, address=None, user=None) -> PriceQuote:
+    """Memoized quote for the current contents of ``cart``"""
+    pincode, district = address_location(address)
+    key = f'checkout_quote:{cart.pk}:{cart.updated_at.timestamp()}:{coupon_code or ""}:{pincode}:{district}'
+    quote = cache.get(key)
+    if quote is None:
+        rows = CartItem.objects.filter(cart=cart).order_by('id').values_list(
+            'product_id', 'variant_id', 'quantity', 'product__price'
+        )
+        quote = price_lines(lines_for(rows, address), coupon=get_coupon(coupon_code), user=user or cart.user)
+        cache.set(key, quote, getattr(settings, 'CHECKOUT_QUOTE_TTL', DEFAULT_QUOTE_TTL))
+    return quote
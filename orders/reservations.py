@@ -0,0 +1,217 @@
+"""
+Stock reservations for checkout.
+
+Taking stock is one conditional statement per line,
+
+    UPDATE ... SET stock = stock - n WHERE id = ... AND stock >= n
+
+so two checkouts can never both take the last unit, and nothing is read
+or locked beforehand. A batch (one checkout or order) runs in a single
+transaction: when a line comes back with no row updated, the transaction
+rolls back and releases the lines already taken. Lines are taken in
+(product, variant) order so that concurrent batches lock rows in the same
+order. The writes are queryset updates, so Product/ProductVariant save
+signals do not run; once the transaction commits, ``_refresh_catalog``
+brings what those signals maintain up to date for the touched rows in one
+pass (category counts, change feed, cache generations, variant matrices,
+catalog snapshot).
+
+Every batch is recorded as StockReservation rows under a reference (a
+checkout session id, a payment's reservation id, ...). Holds expire at
+``expires_at``; ``release_expired_reservations`` (the
+``release_stock_reservations`` command) gives expired holds back. Commit
+and release change the status with a conditional update, so a hold is
+either committed or released exactly once, even when the sweeper runs
+at the same moment.
+"""
+
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from products.models import Product, ProductVariant
+from .models import StockReservation
+
+DEFAULT_RESERVATION_TTL = 30 * 60  # seconds
+
+
+class StockLine(NamedTuple):
+    product_id: int
+    variant_id: Optional[int]
+    quantity: int
+
+
+class InsufficientStock(ValidationError):
+    def __init__(self, product_name: str, available: int, requested: int):
+        super().__init__(
+            f"Not enough stock for {product_name}. Available: {available}, Requested: {requested}"
+        )
+        self.product_name = product_name
+        self.available = available
+        self.requested = requested
+
+
+def new_reference(prefix: str) -> str:
+    return f'{prefix}-{uuid.uuid4().hex[:16]}'
+
+
+def reservation_expiry(ttl: Optional[int] = None):
+    return timezone.now() + timedelta(
+        seconds=ttl if ttl is not None else getattr(settings, 'CHECKOUT_RESERVATION_TTL', DEFAULT_RESERVATION_TTL)
+    )
+
+
+def merge_lines(lines: Iterable[StockLine]) -> List[StockLine]:
+    """One line per (product, variant), in locking order"""
+    quantities: Dict[Tuple[int, Optional[int]], int] = defaultdict(int)
+    for line in lines:
+        quantities[(line.product_id, line.variant_id)] += line.quantity
+    return [
+        StockLine(product_id, variant_id, quantity)
+        for (product_id, variant_id), quantity in sorted(quantities.items(), key=lambda item: (item[0][0], item[0][1] or 0))
+        if quantity > 0
+    ]
+
+
+def _stock_row(line: StockLine):
+    if line.variant_id:
+        return ProductVariant.objects.filter(pk=line.variant_id)
+    return Product.objects.filter(pk=line.product_id)
+
+
+def _take(line: StockLine) -> bool:
+    return bool(_stock_row(line).filter(stock__gte=line.quantity).update(stock=F('stock') - line.quantity))
+
+
+def _give_back(line: StockLine) -> None:
+    _stock_row(line).update(stock=F('stock') + line.quantity)
+
+
+def _refresh_catalog(product_ids, variant_ids) -> None:
+    """What the skipped save signals would have refreshed, for one batch of stock writes"""
+    from products.catalog_snapshot import sync_catalog_product
+    from products.categories import rebuild_category_counts
+    from products.change_feed import record_stock
+    from products.enterprise_cache import EnterpriseCacheManager
+    from products.variant_matrix import schedule_matrix_rebuild
+
+    variants = list(ProductVariant.objects.filter(pk__in=variant_ids).select_related('product'))
+    products = list(Product.objects.filter(pk__in=product_ids))
+    touched = products + [variant.product for variant in variants]
+
+    EnterpriseCacheManager.invalidate_bulk_product_caches(
+        [product.pk for product in touched],
+        {product.category_id for product in touched},
+        {product.brand_id for product in touched},
+    )
+    rebuild_category_counts({product.category_id for product in products if product.category_id})
+    record_stock(products, variants)
+    schedule_matrix_rebuild({variant.product_id for variant in variants})
+    for product in products:
+        sync_catalog_product(product)
+
+
+def _stock_changed(lines: Iterable[StockLine]) -> None:
+    """Schedule ``_refresh_catalog`` for ``lines`` after the surrounding transaction commits"""
+    product_ids = {line.product_id for line in lines if not line.variant_id}
+    variant_ids = {line.variant_id for line in lines if line.variant_id}
+    if product_ids or variant_ids:
+        transaction.on_commit(lambda: _refresh_catalog(product_ids, variant_ids))
+
+
+def _insufficient(line: StockLine) -> InsufficientStock:
+    name, stock = Product.objects.filter(pk=line.product_id).values_list('name', 'stock').first() or ('', 0)
+    if line.variant_id:
+        stock = ProductVariant.objects.filter(pk=line.variant_id).values_list('stock', flat=True).first() or 0
+    return InsufficientStock(name or f'product {line.product_id}', stock, line.quantity)
+
+
+def reserve_stock(lines: Iterable[StockLine], reference: str, expires_at=None, user=None) -> List[StockReservation]:
+    """
+    Take the stock of ``lines`` and record the holds under ``reference``;
+    all or nothing, raises InsufficientStock
+    """
+    lines = merge_lines(lines)
+    with transaction.atomic():
+        for line in lines:
+            if not _take(line):
+                raise _insufficient(line)
+        _stock_changed(lines)
+        return StockReservation.objects.bulk_create([
+            StockReservation(
+                reference=reference,
+                user=user,
+                product_id=line.product_id,
+                variant_id=line.variant_id,
+                quantity=line.quantity,
+                expires_at=expires_at,
+            )
+            for line in lines
+        ])
+
+
+def held_lines(reference: str) -> List[StockLine]:
+    return merge_lines(
+        StockLine(*row) for row in StockReservation.objects.filter(
+            reference=reference, status=StockReservation.HELD
+        ).values_list('product_id', 'variant_id', 'quantity')
+    )
+
+
+def release_reservations(queryset) -> int:
+    """Release the held reservations in ``queryset``; returns how many were released"""
+    released = []
+    for pk, product_id, variant_id, quantity in queryset.filter(status=StockReservation.HELD).values_list(
+        'pk', 'product_id', 'variant_id', 'quantity'
+    ):
+        with transaction.atomic():
+            if StockReservation.objects.filter(pk=pk, status=StockReservation.HELD).update(
+                status=StockReservation.RELEASED
+            ):
+                line = StockLine(product_id, variant_id, quantity)
+                _give_back(line)
+                released.append(line)
+    _stock_changed(released)
+    return len(released)
+
+
+def release_reference(reference: str) -> int:
+    return release_reservations(StockReservation.objects.filter(reference=reference))
+
+
+def release_expired_reservations(now=None) -> int:
+    return release_reservations(StockReservation.objects.filter(expires_at__lt=now or timezone.now()))
+
+
+def commit_stock(lines: Iterable[StockLine], reference: Optional[str] = None, order=None, user=None) -> str:
+    """
+    Turn the stock for ``lines`` into a sale: the holds under ``reference``
+    are committed when they still match ``lines``; otherwise they are
+    released and the stock is taken now (raises InsufficientStock).
+    Returns the reference of the committed reservations.
+    """
+    lines = merge_lines(lines)
+    if reference and held_lines(reference) == lines:
+        with transaction.atomic():
+            committed = StockReservation.objects.filter(
+                reference=reference, status=StockReservation.HELD
+            ).update(status=StockReservation.COMMITTED, order=order)
+            if committed == len(lines):
+                return reference
+            # The sweeper released some of them after they were read
+            transaction.set_rollback(True)
+    if reference:
+        release_reference(reference)
+
+    reference = new_reference('order')
+    with transaction.atomic():
+        reserve_stock(lines, reference, user=user)
+        StockReservation.objects.filter(reference=reference).update(status=StockReservation.COMMITTED, order=order)
+    return reference
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from cart import store as cart_store
 from cart.models import Cart
 from coupon.models import Coupon
 from .models import Order, OrderItem, OrderStatusChange
@@ -90,6 +91,7 @@ class CreateOrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Request context missing")
 
         if 'cart_id' in data:
+            cart_store.persist_cart(request.user.id)
             try:
                 cart = request.user.carts.get(id=data['cart_id'])
                 if not cart.items.exists():
@@ -9,7 +9,7 @@ from rest_framework.test import APIClient
 
 from accounts.models import User
 from coupon.models import Coupon
-from orders.models import Order, OrderItem, OrderStatusChange
+from orders.models import Order, OrderItem, OrderStatusChange, StockReservation
 from products.models import Product, ProductCategory, Brand, ProductVariant
 
 
@@ -99,8 +99,8 @@ class ModelTests(OrderAppTestCase):
         self.assertEqual(order.status, 'pending')
         self.assertEqual(order.payment_status, 'pending')
         self.assertEqual(order.subtotal, Decimal('400.00'))
-        self.assertEqual(order.tax, Decimal('40.00'))
-        self.assertEqual(order.total, Decimal('440.00'))
+        self.assertEqual(order.tax, Decimal('72.00'))  # 18% GST
+        self.assertEqual(order.total, Decimal('472.00'))
 
     def test_order_item_creation(self):
         order = self.create_test_order()
@@ -231,7 +231,7 @@ class APITests(OrderAppTestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['total_orders'], 1)
-        self.assertEqual(response.data['total_revenue'], '440.00')
+        self.assertEqual(response.data['total_revenue'], '472.00')
 
 
 class PermissionTests(OrderAppTestCase):
@@ -245,3 +245,175 @@ class PermissionTests(OrderAppTestCase):
         self.client.force_authenticate(user=other_user)
         response = self.client.get(reverse('order-detail', kwargs={'pk': order.pk}))
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CheckoutPricingTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='pricing@example.com', password='pricing123', full_name='Pricing User'
+        )
+        category = ProductCategory.objects.create(name='Pricing Category', created_by=self.user)
+        self.product = Product.objects.create(
+            name='Pricing Product', price=Decimal('100.10'), stock=50, category=category, created_by=self.user
+        )
+        self.variant = ProductVariant.objects.create(
+            product=self.product, additional_price=Decimal('20.00'), stock=10
+        )
+        self.coupon = Coupon.objects.create(
+            code='PRICE10', coupon_type='percentage', discount_value=10,
+            max_discount=Decimal('500.00'), min_order_amount=Decimal('100.00'),
+            valid_from=timezone.now(), valid_to=timezone.now() + timezone.timedelta(days=1),
+            max_uses=10, created_by=self.user
+        )
+
+    def test_price_lines_uses_one_set_of_rules(self):
+        from orders.pricing import QuoteLine, price_lines
+
+        quote = price_lines([QuoteLine(self.product.id, None, 3, Decimal('100.10'))])
+        self.assertEqual(quote.lines[0].total, Decimal('300.30'))
+        self.assertEqual(quote.tax, Decimal('54.05'))
+        self.assertEqual(quote.shipping_charge, Decimal('50.00'))
+        self.assertEqual(quote.total, Decimal('404.35'))
+
+        quote = price_lines([QuoteLine(self.product.id, None, 5, Decimal('100.10'))], coupon=self.coupon, user=self.user)
+        self.assertEqual(quote.shipping_charge, Decimal('0.00'))
+        self.assertEqual(quote.coupon_discount, Decimal('50.05'))
+        self.assertEqual(quote.total, Decimal('500.50') + Decimal('90.09') - Decimal('50.05'))
+
+    def test_quote_cart_is_memoized_per_cart_version(self):
+        from cart.models import Cart, CartItem
+        from orders.pricing import quote_cart
+
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, variant=self.variant, quantity=2)
+        cart.refresh_from_db()
+        quote = quote_cart(cart, coupon_code='PRICE10', user=self.user)
+        # Catalog price of the variant: product price + additional price
+        self.assertEqual(quote.subtotal, Decimal('240.20'))
+        self.assertEqual(quote.coupon_discount, Decimal('24.02'))
+        with self.assertNumQueries(0):
+            self.assertEqual(quote_cart(cart, coupon_code='PRICE10', user=self.user), quote)
+
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        cart.refresh_from_db()
+        self.assertEqual(quote_cart(cart, coupon_code='PRICE10', user=self.user).subtotal, Decimal('340.30'))
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='stock@example.com', password='stock123', full_name='Stock User'
+        )
+        category = ProductCategory.objects.create(name='Stock Category', created_by=self.user)
+        self.product = Product.objects.create(
+            name='Stock Product', price=Decimal('10.00'), stock=5, category=category, created_by=self.user
+        )
+        self.other = Product.objects.create(
+            name='Other Stock Product', price=Decimal('20.00'), stock=2, category=category, created_by=self.user
+        )
+        self.variant = ProductVariant.objects.create(product=self.product, stock=3)
+
+    def _stock(self):
+        self.product.refresh_from_db()
+        self.other.refresh_from_db()
+        self.variant.refresh_from_db()
+        return self.product.stock, self.other.stock, self.variant.stock
+
+    def test_reservation_is_all_or_nothing(self):
+        from orders.reservations import InsufficientStock, StockLine, reserve_stock
+
+        reserve_stock([
+            StockLine(self.product.id, None, 2),
+            StockLine(self.product.id, self.variant.id, 3),
+        ], 'checkout-a')
+        self.assertEqual(self._stock(), (3, 2, 0))
+
+        with self.assertRaises(InsufficientStock) as context:
+            reserve_stock([
+                StockLine(self.other.id, None, 1),
+                StockLine(self.product.id, self.variant.id, 1),
+            ], 'checkout-b')
+        self.assertIn('Available: 0, Requested: 1', str(context.exception))
+        self.assertEqual(self._stock(), (3, 2, 0))
+        self.assertFalse(StockReservation.objects.filter(reference='checkout-b').exists())
+
+    def test_stock_writes_skip_save_signals(self):
+        from django.db.models.signals import post_save
+        from orders.reservations import StockLine, release_reference, reserve_stock
+
+        saved = []
+
+        def record(sender, **kwargs):
+            saved.append(sender)
+
+        post_save.connect(record, sender=Product)
+        post_save.connect(record, sender=ProductVariant)
+        self.addCleanup(post_save.disconnect, record, sender=Product)
+        self.addCleanup(post_save.disconnect, record, sender=ProductVariant)
+        reserve_stock([StockLine(self.product.id, None, 1), StockLine(self.other.id, None, 1)], 'checkout-c')
+        self.assertEqual(self._stock(), (4, 1, 3))
+        release_reference('checkout-c')
+        self.assertEqual(saved, [])
+        self.assertEqual(self._stock(), (5, 2, 3))
+
+    def test_catalog_follows_stock_writes_after_commit(self):
+        from products.models import CatalogChange
+        from orders.reservations import StockLine, release_reference, reserve_stock
+
+        self.product.status, self.product.is_publish = 'published', True
+        self.product.save()
+        category = self.product.category
+        category.refresh_from_db()
+        self.assertEqual(category.product_count, 1)
+        before = CatalogChange.objects.count()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock([StockLine(self.product.id, None, 5), StockLine(self.product.id, self.variant.id, 1)], 'sale')
+        category.refresh_from_db()
+        self.assertEqual(category.product_count, 0)
+        self.assertEqual(
+            sorted(CatalogChange.objects.filter(pk__gt=before).values_list('object_type', 'fields')),
+            [('product', {'stock': 0}), ('variant', {'stock': 2})],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_reference('sale')
+        category.refresh_from_db()
+        self.assertEqual(category.product_count, 1)
+
+    def test_expired_holds_are_released_once(self):
+        from orders.reservations import StockLine, release_expired_reservations, reserve_stock
+
+        past = timezone.now() - timezone.timedelta(minutes=1)
+        reserve_stock([StockLine(self.other.id, None, 2)], 'checkout-d', expires_at=past)
+        reserve_stock([StockLine(self.product.id, None, 1)], 'checkout-e',
+                      expires_at=timezone.now() + timezone.timedelta(minutes=5))
+        self.assertEqual(self._stock(), (4, 0, 3))
+
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(release_expired_reservations(), 0)
+        self.assertEqual(self._stock(), (4, 2, 3))
+
+    def test_order_commits_matching_holds(self):
+        from cart.models import Cart, CartItem
+        from orders.reservations import StockLine, reserve_stock
+
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        reserve_stock([StockLine(self.product.id, None, 2)], 'payment-x', user=self.user)
+        self.assertEqual(self._stock(), (3, 2, 3))
+
+        order = Order.create_from_cart(cart, {'postal_code': '110001'}, {}, reservation='payment-x')
+        self.assertEqual(self._stock(), (3, 2, 3))
+        reservation = StockReservation.objects.get(reference='payment-x')
+        self.assertEqual((reservation.status, reservation.order), (StockReservation.COMMITTED, order))
+
+        # Holds that no longer match the cart are released and the stock taken afresh
+        CartItem.objects.create(cart=cart, product=self.other, quantity=1)
+        reserve_stock([StockLine(self.other.id, None, 2)], 'payment-y', user=self.user)
+        Order.create_from_cart(cart, {}, {}, reservation='payment-y')
+        self.assertEqual(self._stock(), (3, 1, 3))
+        self.assertEqual(StockReservation.objects.get(reference='payment-y').status, StockReservation.RELEASED)
@@ -205,6 +205,28 @@ class Payment(models.Model):
         
         return True, "Pathlog Wallet payment processed successfully"
 
+    def release_stock(self):
+        """Give back the stock held for this payment's cart (see orders.reservations)"""
+        from orders.reservations import release_reference
+
+        if self.cart_data and self.cart_data.get('reservation') and not self.order:
+            release_reference(self.cart_data['reservation'])
+
+    @classmethod
+    def release_superseded_stock(cls, user, cart_id):
+        """
+        Give back the stock held for the user's earlier unpaid payments of
+        ``cart_id``; a new payment for the cart replaces them
+        """
+        from orders.reservations import release_reference
+
+        superseded = cls.objects.filter(
+            user=user, status='pending', order__isnull=True, cart_data__cart_id=cart_id
+        ).values_list('cart_data', flat=True)
+        for cart_data in superseded:
+            if cart_data.get('reservation'):
+                release_reference(cart_data['reservation'])
+
     def create_order_from_cart_data(self):
         """Create order from stored cart data after successful payment"""
         if not self.cart_data or self.order:
@@ -223,19 +245,14 @@ class Payment(models.Model):
                 cart=cart,
                 shipping_address=self.shipping_address,
                 billing_address=self.billing_address,
-                payment_method=self.payment_method or 'razorpay'
+                payment_method=self.payment_method or 'razorpay',
+                reservation=self.cart_data.get('reservation')
             )
             
-            # Apply coupon if provided
+            # Apply coupon if provided; calculate_totals drops it when no longer valid
             if self.coupon_code:
-                try:
-                    order.coupon = Coupon.objects.get(code=self.coupon_code)
-                    is_valid, _ = order.coupon.is_valid(self.user, order.subtotal)
-                    if is_valid:
-                        order.coupon_discount = order.coupon.apply_discount(order.subtotal)
-                        order.calculate_totals()
-                except Coupon.DoesNotExist:
-                    pass
+                order.coupon = Coupon.objects.filter(code=self.coupon_code).first()
+                order.calculate_totals()
             
             # Set payment status to paid
             order.payment_status = 'paid'
@@ -289,3 +306,4 @@ class Payment(models.Model):
             self.status = 'failed'
             self.webhook_verified = True
             self.save()
+            self.release_stock()
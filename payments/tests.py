@@ -233,4 +233,32 @@ class PaymentTestCase(TestCase):
             amount=self.order.total
         )
 
-        self.assertEqual(str(payment), f"Payment test_payment_id for Order TEST123")
\ No newline at end of file
+        self.assertEqual(str(payment), f"Payment test_payment_id for Order TEST123")
+
+class PaymentStockReservationTests(TestCase):
+    def test_new_payment_releases_earlier_holds_of_the_cart(self):
+        from cart.models import Cart
+        from orders.models import StockReservation
+        from orders.reservations import StockLine, reserve_stock
+        from products.models import Product, ProductCategory
+
+        user = User.objects.create_user(email='holds@example.com', password='testpass123', full_name='Holds')
+        category = ProductCategory.objects.create(name='Holds Category', created_by=user)
+        product = Product.objects.create(
+            name='Held Product', price=Decimal('10.00'), stock=5, category=category, created_by=user
+        )
+        cart = Cart.objects.create(user=user)
+        for reference in ('payment-a', 'payment-b'):
+            reserve_stock([StockLine(product.id, None, 2)], reference, user=user)
+            Payment.objects.create(
+                user=user, amount=Decimal('20.00'), cart_data={'cart_id': cart.id, 'reservation': reference}
+            )
+        Payment.objects.filter(cart_data__reservation='payment-b').update(status='failed')
+
+        Payment.release_superseded_stock(user, cart.id)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 3)
+        self.assertEqual(
+            dict(StockReservation.objects.values_list('reference', 'status')),
+            {'payment-a': StockReservation.RELEASED, 'payment-b': StockReservation.HELD},
+        )
@@ -3,17 +3,22 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from django.conf import settings
+from django.db import transaction
 import razorpay
 import json
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from .models import Payment
 from orders.models import Order
+from cart import store as cart_store
+from orders.pricing import quote_cart
+from orders.reservations import (
+    InsufficientStock, StockLine, new_reference, release_reference, reservation_expiry, reserve_stock
+)
 from cart.models import Cart
 from .serializers import PaymentSerializer, CreatePaymentSerializer, CreatePaymentFromCartSerializer, VerifyPaymentSerializer, ConfirmCODSerializer
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponse
-from decimal import Decimal
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
@@ -74,6 +79,7 @@ class CreatePaymentFromCartView(APIView):
     )
 
     def post(self, request):
+        cart_store.persist_cart(request.user.id)
         serializer = CreatePaymentFromCartSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
 
@@ -100,25 +106,47 @@ class CreatePaymentFromCartView(APIView):
                 'cart_id': cart.id
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Calculate order totals (same logic as Order.create_from_cart)
-        subtotal = Decimal(str(sum(item.total_price for item in cart.items.all())))
-        tax_rate = Decimal('0.18')  # 18% GST
-        tax = subtotal * tax_rate
-        shipping_charge = Decimal('50.00')  # Flat shipping
-        total = subtotal + tax + shipping_charge
-        
-        # Apply coupon if provided
-        coupon_discount = Decimal('0.00')
-        if serializer.validated_data.get('coupon_code'):
-            from coupon.models import Coupon
-            try:
-                coupon = Coupon.objects.get(code=serializer.validated_data['coupon_code'])
-                is_valid, _ = coupon.is_valid(request.user, subtotal)
-                if is_valid:
-                    coupon_discount = Decimal(str(coupon.apply_discount(subtotal)))
-                    total -= coupon_discount
-            except Coupon.DoesNotExist:
-                pass
+        # Calculate order totals (same rules as Order.create_from_cart, see orders.pricing)
+        quote = quote_cart(
+            cart,
+            coupon_code=serializer.validated_data.get('coupon_code'),
+            address=serializer.validated_data['shipping_address'],
+            user=request.user
+        )
+        subtotal, tax, shipping_charge = quote.subtotal, quote.tax, quote.shipping_charge
+        coupon_discount, total = quote.coupon_discount, quote.total
+
+        # Stored for order creation once the payment is confirmed
+        cart_data = {
+            'cart_id': cart.id,
+            'items': [
+                {
+                    'product_id': line.product_id,
+                    'variant_id': line.variant_id,
+                    'quantity': line.quantity,
+                    'price': str(line.total)
+                }
+                for line in quote.lines
+            ],
+            **quote.summary()
+        }
+
+        # Hold the stock until the payment completes (released on failure or expiry).
+        # The holds of earlier unpaid payments for this cart are given back first,
+        # unless the new reservation fails.
+        reservation = new_reference('payment')
+        try:
+            with transaction.atomic():
+                Payment.release_superseded_stock(request.user, cart.id)
+                reserve_stock(
+                    [StockLine(line.product_id, line.variant_id, line.quantity) for line in quote.lines],
+                    reservation,
+                    expires_at=reservation_expiry(),
+                    user=request.user
+                )
+        except InsufficientStock as e:
+            return Response({'error': e.message, 'cart_id': cart.id}, status=status.HTTP_400_BAD_REQUEST)
+        cart_data['reservation'] = reservation
 
         # Save address to user profile if requested
         if serializer.validated_data.get('save_address', True):
@@ -128,25 +156,6 @@ class CreatePaymentFromCartView(APIView):
         
         # Handle COD payments differently
         if payment_method == 'cod':
-            # Store cart data for later order creation
-            cart_data = {
-                'cart_id': cart.id,
-                'items': [
-                    {
-                        'product_id': item.product.id,
-                        'variant_id': item.variant.id if item.variant else None,
-                        'quantity': item.quantity,
-                        'price': str(item.total_price)
-                    }
-                    for item in cart.items.all()
-                ],
-                'subtotal': str(subtotal),
-                'tax': str(tax),
-                'shipping_charge': str(shipping_charge),
-                'coupon_discount': str(coupon_discount),
-                'total': str(total)
-            }
-
             # Create COD payment record (no Razorpay order needed)
             payment = Payment.objects.create(
                 user=request.user,
@@ -179,25 +188,6 @@ class CreatePaymentFromCartView(APIView):
 
         # Handle Pathlog Wallet payments
         if payment_method == 'pathlog_wallet':
-            # Store cart data for later order creation
-            cart_data = {
-                'cart_id': cart.id,
-                'items': [
-                    {
-                        'product_id': item.product.id,
-                        'variant_id': item.variant.id if item.variant else None,
-                        'quantity': item.quantity,
-                        'price': str(item.total_price)
-                    }
-                    for item in cart.items.all()
-                ],
-                'subtotal': str(subtotal),
-                'tax': str(tax),
-                'shipping_charge': str(shipping_charge),
-                'coupon_discount': str(coupon_discount),
-                'total': str(total)
-            }
-
             # Create Pathlog Wallet payment record
             payment = Payment.objects.create(
                 user=request.user,
@@ -237,25 +227,6 @@ class CreatePaymentFromCartView(APIView):
                 'payment_capture': 1  # Auto-capture payment
             })
 
-            # Store cart data for later order creation
-            cart_data = {
-                'cart_id': cart.id,
-                'items': [
-                    {
-                        'product_id': item.product.id,
-                        'variant_id': item.variant.id if item.variant else None,
-                        'quantity': item.quantity,
-                        'price': str(item.total_price)
-                    }
-                    for item in cart.items.all()
-                ],
-                'subtotal': str(subtotal),
-                'tax': str(tax),
-                'shipping_charge': str(shipping_charge),
-                'coupon_discount': str(coupon_discount),
-                'total': str(total)
-            }
-
             # Create payment record without order
             payment = Payment.objects.create(
                 user=request.user,
@@ -297,6 +268,7 @@ class CreatePaymentFromCartView(APIView):
                 }
             })
         except Exception as e:
+            release_reference(reservation)
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
@@ -396,6 +368,7 @@ class VerifyPaymentView(APIView):
             else:
                 payment.status = 'failed'
                 payment.save()
+                payment.release_stock()
                 return Response({'error': 'Payment verification failed'}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -527,6 +500,7 @@ class RazorpayWebhookView(APIView):
                     payment.status = 'failed'
                     payment.webhook_verified = True
                     payment.save()
+                    payment.release_stock()
                 except Payment.DoesNotExist:
                     pass
 
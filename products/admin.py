@@ -103,7 +103,7 @@ class ProductReviewAdmin(admin.ModelAdmin):
 
 @admin.register(ProductAuditLog)
 class ProductAuditLogAdmin(admin.ModelAdmin):
-    list_display = ['product', 'changed_by', 'changed_at']
-    list_filter = ['changed_at']
+    list_display = ['product', 'object_type', 'object_id', 'changed_by', 'changed_at']
+    list_filter = ['object_type', 'changed_at']
     search_fields = ['product__name', 'changed_by__username']
-    readonly_fields = ['product', 'changed_by', 'changes', 'changed_at']
+    readonly_fields = ['product', 'object_type', 'object_id', 'changed_by', 'changes', 'changed_at']
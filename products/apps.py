@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # Import signal handlers so they are registered at startup
+        import products.enterprise_cache
+        import products.search
+        import products.ratings
+        import products.categories
+        import products.audit
+        import products.pricing
+        import products.variant_matrix
+        import products.change_feed
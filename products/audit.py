@@ -0,0 +1,218 @@
+"""
+ProductAuditLog writer.
+
+Field values are captured when an instance is loaded (a post_init field
+tracker), so a save is diffed against what the caller read without
+re-fetching the row. Entries enter the buffer only once the saving
+transaction commits and are written with one ``bulk_create`` per flush:
+
+- inside ``audit_batch()`` (AuditLogMiddleware opens one per request) the
+  buffer is flushed when the outermost batch exits;
+- outside a batch every committed entry is flushed straight away.
+
+With ``settings.PRODUCT_AUDIT_ASYNC`` the flush hands the batch to a
+background thread instead of writing it inside the request. Either way a
+failed write is logged, not raised: the changes it records have committed.
+"""
+
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Product, ProductAuditLog, ProductVariant, SupplierProductPrice
+
+logger = logging.getLogger(__name__)
+
+TRACKED_FIELDS = {
+    Product: ('price', 'stock', 'status', 'is_publish', 'name', 'category', 'brand', 'product_type'),
+    ProductVariant: ('price', 'mrp', 'additional_price', 'stock', 'is_active', 'status'),
+    SupplierProductPrice: ('price', 'mrp', 'pincode', 'district'),
+}
+
+OBJECT_TYPES = {
+    Product: 'product',
+    ProductVariant: 'variant',
+    SupplierProductPrice: 'supplier_price',
+}
+
+
+def _attnames(model) -> Dict[str, str]:
+    return {name: model._meta.get_field(name).attname for name in TRACKED_FIELDS[model]}
+
+
+_ATTNAMES = {model: _attnames(model) for model in TRACKED_FIELDS}
+
+
+def snapshot(instance) -> Optional[Dict[str, object]]:
+    """Tracked values as loaded; deferred fields are left out"""
+    if not instance.pk:
+        return None
+    deferred = instance.get_deferred_fields()
+    return {
+        name: getattr(instance, attname)
+        for name, attname in _ATTNAMES[type(instance)].items()
+        if attname not in deferred
+    }
+
+
+def diff(instance) -> Dict[str, list]:
+    """``{field: [old, new]}`` between the tracked state and ``instance``"""
+    previous = getattr(instance, '_audit_state', None)
+    if not previous:
+        return {}
+    attnames = _ATTNAMES[type(instance)]
+    changes = {}
+    for name, old in previous.items():
+        new = getattr(instance, attnames[name])
+        if old != new:
+            changes[name] = [str(old), str(new)]
+    return changes
+
+
+# ----- buffering -----
+
+class _Buffer(threading.local):
+    def __init__(self):
+        self.entries: List[ProductAuditLog] = []
+        self.depth = 0
+
+
+_buffer = _Buffer()
+
+
+def record(instance, changes: Dict[str, list]) -> None:
+    """Queue an audit entry for ``instance``; dropped if its transaction rolls back"""
+    entry = ProductAuditLog(
+        product_id=_product_id(instance),
+        changed_by=getattr(instance, '_changed_by', None),
+        changes=changes,
+        changed_at=timezone.now(),
+        object_type=OBJECT_TYPES[type(instance)],
+        object_id=instance.pk,
+    )
+    if isinstance(instance, SupplierProductPrice):
+        entry._variant_id = instance.product_variant_id
+    transaction.on_commit(lambda: _committed(entry))
+
+
+def _product_id(instance) -> Optional[int]:
+    if isinstance(instance, Product):
+        return instance.pk
+    if isinstance(instance, ProductVariant):
+        return instance.product_id
+    variant = instance._state.fields_cache.get('product_variant')
+    return variant.product_id if variant is not None else None
+
+
+def _committed(entry: ProductAuditLog) -> None:
+    _buffer.entries.append(entry)
+    if not _buffer.depth:
+        flush()
+
+
+@contextmanager
+def audit_batch():
+    """Collect committed audit entries and write them together on exit"""
+    _buffer.depth += 1
+    try:
+        yield
+    finally:
+        _buffer.depth -= 1
+        if not _buffer.depth:
+            flush()
+
+
+def flush() -> None:
+    entries, _buffer.entries = _buffer.entries, []
+    if not entries:
+        return
+    if getattr(settings, 'PRODUCT_AUDIT_ASYNC', False):
+        _worker().put(entries)
+        return
+    # The audited writes have committed; a failed log write must not fail them
+    try:
+        write_entries(entries)
+    except Exception:
+        logger.exception('Could not write %d product audit entries', len(entries))
+
+
+def write_entries(entries: List[ProductAuditLog]) -> None:
+    """Resolve missing product ids (one query) and insert ``entries``"""
+    variant_ids = {entry._variant_id for entry in entries if entry.product_id is None}
+    if variant_ids:
+        products = dict(ProductVariant.objects.filter(pk__in=variant_ids).values_list('pk', 'product_id'))
+        for entry in entries:
+            if entry.product_id is None:
+                entry.product_id = products.get(entry._variant_id)
+        entries = [entry for entry in entries if entry.product_id is not None]
+    ProductAuditLog.objects.bulk_create(entries)
+
+
+# ----- background writer -----
+
+class AuditWorker:
+    """Daemon thread that writes queued batches in order"""
+
+    def __init__(self):
+        self._queue: 'queue.Queue[List[ProductAuditLog]]' = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='product-audit-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, entries: List[ProductAuditLog]) -> None:
+        self._queue.put(entries)
+
+    def join(self) -> None:
+        """Block until every queued batch has been written"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            entries = self._queue.get()
+            try:
+                close_old_connections()
+                write_entries(entries)
+            except Exception:
+                logger.exception('Could not write %d product audit entries', len(entries))
+            finally:
+                self._queue.task_done()
+
+
+_worker_instance: Optional[AuditWorker] = None
+_worker_lock = threading.Lock()
+
+
+def _worker() -> AuditWorker:
+    global _worker_instance
+    if _worker_instance is None:
+        with _worker_lock:
+            if _worker_instance is None:
+                _worker_instance = AuditWorker()
+    return _worker_instance
+
+
+# Signal handlers
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=ProductVariant)
+@receiver(post_init, sender=SupplierProductPrice)
+def remember_audit_state(sender, instance, **kwargs):
+    instance._audit_state = snapshot(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_save, sender=SupplierProductPrice)
+def audit_changes_on_save(sender, instance, created, **kwargs):
+    if not created:
+        changes = diff(instance)
+        if changes:
+            record(instance, changes)
+    instance._audit_state = snapshot(instance)
@@ -0,0 +1,236 @@
+"""
+In-process autocomplete index for product, brand and category names.
+
+Names are stored in a sorted array of ``(prefix_key, kind, id)`` rows, one row
+per word start, so a lookup is a ``bisect`` plus a short scan and never touches
+the database. Suggestions are ordered by popularity weight:
+
+- products: number of reviews (from the rating summary)
+- brands / categories: number of published products
+
+The index is built lazily on first use (from a JSON snapshot when
+``settings.PRODUCT_AUTOCOMPLETE_SNAPSHOT`` points at one, otherwise from the
+database), updated incrementally by the post_save/post_delete handlers in
+``enterprise_cache.py``, and rebuilt once it is older than
+``settings.PRODUCT_AUTOCOMPLETE_MAX_AGE`` seconds so that other worker
+processes converge too.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+PUBLISHED_STATUSES = ('approved', 'published')
+
+# Share of the suggestion limit given to each kind (mirrors the original
+# product 1/2, category 1/4, brand 1/4 split)
+KIND_QUOTAS = (('product', 2), ('category', 4), ('brand', 4))
+
+# Upper bound on rows scanned per lookup, keeps very short prefixes cheap
+MAX_SCAN = 2000
+
+DEFAULT_MAX_AGE = 600
+
+
+def normalize(text: Optional[str]) -> str:
+    return ' '.join((text or '').lower().split())
+
+
+def _word_starts(text: str) -> List[str]:
+    """All suffixes of ``text`` that begin at a word boundary"""
+    keys = []
+    for index, char in enumerate(text):
+        if index == 0 or (text[index - 1] == ' ' and char != ' '):
+            keys.append(text[index:])
+    return keys
+
+
+class AutocompleteIndex:
+    """
+    Sorted-array prefix index with popularity weights
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys: List[Tuple[str, str, int]] = []
+        self._entries: Dict[Tuple[str, int], Tuple[str, int]] = {}
+        self.built_at: Optional[float] = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ----- mutation -----
+
+    def _remove_keys(self, kind: str, pk: int, name: str) -> None:
+        for key in _word_starts(normalize(name)):
+            row = (key, kind, pk)
+            position = bisect_left(self._keys, row)
+            if position < len(self._keys) and self._keys[position] == row:
+                del self._keys[position]
+
+    def upsert(self, kind: str, pk: int, name: str, weight: Optional[int] = None) -> None:
+        with self._lock:
+            existing = self._entries.get((kind, pk))
+            if existing is not None:
+                self._remove_keys(kind, pk, existing[0])
+                if weight is None:
+                    weight = existing[1]
+            self._entries[(kind, pk)] = (name, weight or 0)
+            for key in _word_starts(normalize(name)):
+                insort(self._keys, (key, kind, pk))
+
+    def remove(self, kind: str, pk: int) -> None:
+        with self._lock:
+            existing = self._entries.pop((kind, pk), None)
+            if existing is not None:
+                self._remove_keys(kind, pk, existing[0])
+
+    def load(self, entries) -> None:
+        """Replace the whole index with ``(kind, pk, name, weight)`` rows"""
+        keys = []
+        mapping = {}
+        for kind, pk, name, weight in entries:
+            mapping[(kind, pk)] = (name, weight or 0)
+            keys.extend((key, kind, pk) for key in _word_starts(normalize(name)))
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._entries = mapping
+            self.built_at = time.time()
+
+    # ----- lookup -----
+
+    def lookup(self, prefix: str, kind: Optional[str] = None, limit: int = 10) -> List[dict]:
+        """
+        Return up to ``limit`` suggestions whose name has a word starting
+        with ``prefix``, heaviest first
+        """
+        prefix = normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+        keys = self._keys
+        position = bisect_left(keys, (prefix,))
+        seen = set()
+        candidates = []
+        scanned = 0
+        while position < len(keys) and scanned < MAX_SCAN:
+            key, row_kind, pk = keys[position]
+            if not key.startswith(prefix):
+                break
+            position += 1
+            scanned += 1
+            if kind and row_kind != kind:
+                continue
+            if (row_kind, pk) in seen:
+                continue
+            seen.add((row_kind, pk))
+            entry = self._entries.get((row_kind, pk))
+            if entry is not None:
+                candidates.append((-entry[1], entry[0], row_kind, pk))
+        candidates.sort()
+        return [
+            {'text': name, 'type': row_kind, 'id': pk}
+            for _, name, row_kind, pk in candidates[:limit]
+        ]
+
+    def suggest(self, query: str, limit: int = 10) -> List[dict]:
+        """
+        Mixed suggestions split across products, categories and brands
+        """
+        suggestions = []
+        for kind, divisor in KIND_QUOTAS:
+            suggestions.extend(self.lookup(query, kind=kind, limit=limit // divisor))
+        return suggestions
+
+    # ----- persistence -----
+
+    def rows(self):
+        return [(kind, pk, name, weight) for (kind, pk), (name, weight) in self._entries.items()]
+
+    def save_snapshot(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump({'built_at': self.built_at, 'entries': self.rows()}, f)
+
+    def load_snapshot(self, path: str) -> None:
+        with open(path) as f:
+            data = json.load(f)
+        self.load(tuple(row) for row in data['entries'])
+        self.built_at = data.get('built_at') or time.time()
+
+
+def load_entries_from_db():
+    """
+    Published names with popularity weights, three queries in total
+    """
+    from .models import Brand, Product, ProductCategory
+    from .ratings import review_count_expression
+
+    published = Q(status__in=PUBLISHED_STATUSES, is_publish=True)
+    published_products = Q(products__status__in=PUBLISHED_STATUSES, products__is_publish=True)
+
+    products = Product.objects.filter(published).annotate(
+        weight=review_count_expression()
+    ).values_list('id', 'name', 'weight')
+    categories = ProductCategory.objects.filter(published).annotate(
+        weight=Count('products', filter=published_products)
+    ).values_list('id', 'name', 'weight')
+    brands = Brand.objects.filter(published).annotate(
+        weight=Count('products', filter=published_products)
+    ).values_list('id', 'name', 'weight')
+
+    for kind, rows in (('product', products), ('category', categories), ('brand', brands)):
+        for pk, name, weight in rows:
+            yield kind, pk, name, weight
+
+
+autocomplete_index = AutocompleteIndex()
+_build_lock = threading.Lock()
+
+
+def rebuild_autocomplete_index(index: AutocompleteIndex = autocomplete_index) -> AutocompleteIndex:
+    index.load(load_entries_from_db())
+    return index
+
+
+def get_autocomplete_index() -> AutocompleteIndex:
+    """
+    Return the process-wide index, building or refreshing it when needed
+    """
+    max_age = getattr(settings, 'PRODUCT_AUTOCOMPLETE_MAX_AGE', DEFAULT_MAX_AGE)
+    built_at = autocomplete_index.built_at
+    if built_at is not None and time.time() - built_at < max_age:
+        return autocomplete_index
+
+    with _build_lock:
+        if autocomplete_index.built_at != built_at:
+            return autocomplete_index
+        snapshot = getattr(settings, 'PRODUCT_AUTOCOMPLETE_SNAPSHOT', None)
+        if built_at is None and snapshot and os.path.exists(snapshot):
+            autocomplete_index.load_snapshot(snapshot)
+            if time.time() - autocomplete_index.built_at < max_age:
+                return autocomplete_index
+        rebuild_autocomplete_index(autocomplete_index)
+    return autocomplete_index
+
+
+def sync_autocomplete_entry(kind: str, instance) -> None:
+    """
+    Reflect a saved product/brand/category in the index, if it is built
+    """
+    if autocomplete_index.built_at is None:
+        return
+    if instance.status in PUBLISHED_STATUSES and instance.is_publish:
+        autocomplete_index.upsert(kind, instance.pk, instance.name)
+    else:
+        autocomplete_index.remove(kind, instance.pk)
+
+
+def remove_autocomplete_entry(kind: str, pk: int) -> None:
+    if autocomplete_index.built_at is not None:
+        autocomplete_index.remove(kind, pk)
@@ -0,0 +1,647 @@
+"""
+Bulk catalog import.
+
+Products (with their type-specific details and optional nested ``variants``)
+and variants are read as a stream of records, from a JSON array, NDJSON or
+CSV, and written a chunk at a time:
+
+- brands, categories, attributes and attribute values are resolved through
+  in-memory maps loaded once per import (new attributes/values are created in
+  bulk per chunk)
+- slugs and SKUs are allocated for the whole chunk with one collision query
+  each (see ``products.identifiers``)
+- rows are written with ``bulk_create``/``bulk_update`` inside one
+  transaction per chunk, so the per-row pre_save/post_save signals
+  (slug/SKU loops, audit re-fetch, cache invalidation, search indexing) do not
+  run; the checks they performed are applied here instead
+- cache generations, category counts, the catalog snapshot, the search index
+  and the autocomplete index are refreshed once by ``flush()`` at the end
+
+``ImportReport`` counts created/updated/skipped rows and the throughput.
+"""
+
+import codecs
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .identifiers import allocate_skus, allocate_slugs, product_sku_base, variant_sku_base
+from .models import (
+    PRODUCT_STATUSES, PRODUCT_TYPES, Brand, EquipmentDetails, MedicineDetails, PathologyDetails,
+    Product, ProductAttribute, ProductAttributeValue, ProductCategory, ProductVariant,
+)
+
+DEFAULT_CHUNK_SIZE = 500
+# Attempts per chunk when a concurrent writer takes a slug/SKU first
+MAX_CHUNK_ATTEMPTS = 3
+
+PRODUCT_FIELDS = (
+    'name', 'description', 'image', 'price', 'mrp', 'stock', 'product_type',
+    'status', 'is_publish', 'specifications', 'category_id', 'brand_id',
+)
+VARIANT_FIELDS = ('price', 'mrp', 'additional_price', 'stock', 'image', 'is_active', 'status')
+DETAIL_MODELS = {
+    'medicine': ('medicine_details', MedicineDetails),
+    'equipment': ('equipment_details', EquipmentDetails),
+    'pathology': ('pathology_details', PathologyDetails),
+}
+VALID_TYPES = {value for value, _ in PRODUCT_TYPES}
+VALID_STATUSES = {value for value, _ in PRODUCT_STATUSES}
+TRUE_STRINGS = {'1', 'true', 'yes', 'y', 't'}
+
+
+class ImportRowError(ValueError):
+    """A record that cannot be imported; the message ends up in the report"""
+
+
+# ----- readers -----
+
+def _text_chunks(stream, chunk_size: int) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+
+def iter_json_records(stream, chunk_size: int = 65536) -> Iterator[Dict]:
+    """
+    Yield the objects of a JSON array, or of NDJSON / concatenated JSON,
+    reading ``stream`` incrementally
+    """
+    decoder = json.JSONDecoder()
+    chunks = _text_chunks(stream, chunk_size)
+    buffer, in_array = '', None
+
+    def more() -> bool:
+        nonlocal buffer
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buffer += chunk
+        return True
+
+    while True:
+        buffer = buffer.lstrip()
+        if in_array is None and buffer:
+            in_array = buffer.startswith('[')
+            if in_array:
+                buffer = buffer[1:]
+            continue
+        if in_array and buffer[:1] == ',':
+            buffer = buffer[1:]
+            continue
+        if in_array and buffer[:1] == ']':
+            return
+        if not buffer:
+            if more():
+                continue
+            if in_array:
+                raise ImportRowError('Unterminated JSON array')
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if more():
+                continue
+            raise ImportRowError('Invalid JSON')
+        buffer = buffer[end:]
+        # Django serializer dumps wrap the values in "fields"
+        if isinstance(record, dict) and isinstance(record.get('fields'), dict):
+            record = {**record['fields'], **({'id': record['pk']} if 'pk' in record else {})}
+        yield record
+
+
+def _unflatten(row: Dict) -> Dict:
+    """``medicine_details.form`` style CSV columns become nested dicts"""
+    record = {}
+    for key, value in row.items():
+        if key is None or value in (None, ''):
+            continue
+        target = record
+        *parents, leaf = key.strip().split('.')
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+    return record
+
+
+def iter_csv_records(stream) -> Iterator[Dict]:
+    """
+    Yield CSV rows as records; ``attributes`` may be ``Color=Red;Size=M`` and
+    ``specifications`` a JSON object
+    """
+    lines = (line for chunk in _text_chunks(stream, 65536) for line in chunk.splitlines(keepends=True))
+    for row in csv.DictReader(lines):
+        record = _unflatten(row)
+        if isinstance(record.get('attributes'), str):
+            record['attributes'] = [
+                {'name': name.strip(), 'value': value.strip()}
+                for name, _, value in (pair.partition('=') for pair in record['attributes'].split(';'))
+                if name.strip() and value.strip()
+            ]
+        if isinstance(record.get('specifications'), str):
+            try:
+                record['specifications'] = json.loads(record['specifications'])
+            except ValueError:
+                record['specifications'] = {'value': record['specifications']}
+        yield record
+
+
+def iter_records(stream, import_format: str) -> Iterator[Dict]:
+    if import_format == 'csv':
+        return iter_csv_records(stream)
+    return iter_json_records(stream)
+
+
+def _chunked(records: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ----- value parsing -----
+
+def _decimal(value, default='0.00') -> Decimal:
+    if value in (None, ''):
+        return Decimal(default)
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ImportRowError(f'Invalid amount: {value!r}')
+
+
+def _int(value, default=0) -> int:
+    if value in (None, ''):
+        return default
+    try:
+        number = int(float(value))
+    except (TypeError, ValueError):
+        raise ImportRowError(f'Invalid number: {value!r}')
+    if number < 0:
+        raise ImportRowError(f'Negative value: {value!r}')
+    return number
+
+
+def _bool(value, default=False) -> bool:
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_STRINGS
+
+
+def _check_mrp(price: Decimal, mrp: Decimal) -> None:
+    # Same rule as the validate_mrp_vs_price pre_save handler
+    if mrp > Decimal('0.00') and mrp < price:
+        raise ImportRowError('MRP must be greater than or equal to the price.')
+
+
+class ImportReport:
+    """Row counts and throughput of one import run"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.rows = 0
+        self.errors: List[str] = []
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    def error(self, row: int, message) -> None:
+        self.skipped += 1
+        self.errors.append(f'row {row}: {message}')
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else float(self.rows)
+
+    def as_dict(self) -> Dict:
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'rows': self.rows,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+class CatalogImporter:
+    """
+    Chunked product/variant importer; use as a context manager (or call
+    ``flush()``) so caches and indexes are refreshed once at the end
+
+        with CatalogImporter(user) as importer:
+            importer.import_products(iter_json_records(stream))
+        importer.report.as_dict()
+    """
+
+    def __init__(self, created_by, chunk_size: int = DEFAULT_CHUNK_SIZE, update_existing: bool = False):
+        self.created_by = created_by
+        self.chunk_size = chunk_size
+        self.update_existing = update_existing
+        self.report = ImportReport()
+
+        self._categories: Optional[Dict] = None
+        self._brands: Optional[Dict] = None
+        self._attributes: Dict[str, ProductAttribute] = {}
+        self._attribute_values: Dict = {}
+        self._products_by_name: Dict[str, Product] = {}
+        self._products_by_sku: Dict[str, Product] = {}
+
+        self._touched_products: Dict[int, Product] = {}
+        self._updated_product_ids = set()
+        self._touched_categories = set()
+        self._touched_brands = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+    # ----- lookup maps -----
+
+    def _load_maps(self) -> None:
+        if self._categories is not None:
+            return
+        self._categories, self._brands = {}, {}
+        for pk, name in ProductCategory.objects.order_by().values_list('id', 'name'):
+            self._categories[pk] = self._categories[name.lower()] = pk
+        for pk, name in Brand.objects.order_by().values_list('id', 'name'):
+            self._brands[pk] = self._brands[name.lower()] = pk
+        for attribute in ProductAttribute.objects.all():
+            self._attributes[attribute.name.lower()] = attribute
+        for value in ProductAttributeValue.objects.all():
+            self._attribute_values[(value.attribute_id, value.value.lower())] = value
+
+    def _resolve(self, mapping: Dict, record: Dict, name: str, required: bool) -> Optional[int]:
+        value = record.get(f'{name}_id', record.get(name))
+        if value in (None, ''):
+            if required:
+                raise ImportRowError(f'{name} is required')
+            return None
+        key = int(value) if str(value).isdigit() else str(value).strip().lower()
+        if key not in mapping:
+            raise ImportRowError(f'Unknown {name}: {value!r}')
+        return mapping[key]
+
+    # ----- products -----
+
+    def import_products(self, records: Iterable[Dict]) -> ImportReport:
+        self._load_maps()
+        for chunk in _chunked(enumerate(records, 1), self.chunk_size):
+            self._import_product_chunk(chunk)
+        return self.report
+
+    def _build_product(self, record: Dict):
+        name = (record.get('name') or '').strip()
+        if not name:
+            raise ImportRowError('name is required')
+        price = _decimal(record.get('price'))
+        mrp = _decimal(record.get('mrp'))
+        _check_mrp(price, mrp)
+        product_type = record.get('product_type') or 'medicine'
+        if product_type not in VALID_TYPES:
+            raise ImportRowError(f'Unknown product_type: {product_type!r}')
+        product_status = record.get('status') or 'published'
+        if product_status not in VALID_STATUSES:
+            raise ImportRowError(f'Unknown status: {product_status!r}')
+        values = {
+            'name': name[:255],
+            'description': record.get('description') or '',
+            'image': record.get('image') or '',
+            'price': price,
+            'mrp': mrp,
+            'stock': _int(record.get('stock')),
+            'product_type': product_type,
+            'status': product_status,
+            'is_publish': _bool(record.get('is_publish'), default=True),
+            'specifications': record.get('specifications') or {},
+            'category_id': self._resolve(self._categories, record, 'category', required=True),
+            'brand_id': self._resolve(self._brands, record, 'brand', required=False),
+        }
+        detail_key = DETAIL_MODELS[product_type][0]
+        details = record.get(detail_key) if isinstance(record.get(detail_key), dict) else None
+        return values, (record.get('sku') or None), details
+
+    def _import_product_chunk(self, chunk) -> None:
+        built = []
+        for row, record in chunk:
+            self.report.rows += 1
+            try:
+                built.append((row, record) + self._build_product(record))
+            except ImportRowError as e:
+                self.report.error(row, e)
+
+        # Existing rows (matched on SKU) are updated or rejected, one query
+        given_skus = [sku for _, _, _, sku, _ in built if sku]
+        existing = Product.objects.in_bulk(given_skus, field_name='sku') if given_skus else {}
+
+        new, updated, seen_skus = [], [], set()
+        # Category/brand of updated products before the update: their counts and lists change too
+        left_scopes = []
+        for row, record, values, sku, details in built:
+            if sku and (sku in seen_skus):
+                self.report.error(row, f'Duplicate SKU in file: {sku}')
+                continue
+            if sku:
+                seen_skus.add(sku)
+            if sku in existing:
+                if not self.update_existing:
+                    self.report.error(row, f'SKU already exists: {sku}')
+                    continue
+                product = existing[sku]
+                left_scopes.append((product.category_id, product.brand_id))
+                for field, value in values.items():
+                    setattr(product, field, value)
+                updated.append((row, record, product, details))
+            else:
+                new.append((row, record, Product(sku=sku, created_by=self.created_by, **values), details))
+
+        now = timezone.now()
+        for _, _, product, _ in updated:
+            product.updated_at = now
+        products = [product for _, _, product, _ in new]
+        given_skus = [product.sku for product in products]
+        for attempt in range(1, MAX_CHUNK_ATTEMPTS + 1):
+            self._allocate_product_identifiers(products)
+            try:
+                with transaction.atomic():
+                    Product.objects.bulk_create(products)
+                    if updated:
+                        Product.objects.bulk_update(
+                            [product for _, _, product, _ in updated], list(PRODUCT_FIELDS) + ['updated_at']
+                        )
+                    self._write_details(new + updated)
+                break
+            except IntegrityError:
+                # Someone took one of the allocated slugs/SKUs meanwhile: allocate again
+                for product, sku in zip(products, given_skus):
+                    product.pk, product.slug, product.sku = None, '', sku
+                if attempt == MAX_CHUNK_ATTEMPTS:
+                    for row, _, _, _ in new + updated:
+                        self.report.error(row, 'Could not allocate a unique slug/SKU')
+                    return
+
+        self.report.created += len(new)
+        self.report.updated += len(updated)
+        for _, _, product, _ in new + updated:
+            self._remember_product(product)
+        self._updated_product_ids.update(product.pk for _, _, product, _ in updated)
+        for category_id, brand_id in left_scopes:
+            self._touched_categories.add(category_id)
+            if brand_id:
+                self._touched_brands.add(brand_id)
+
+        nested = [
+            (row, {**variant, 'product_sku': product.sku})
+            for row, record, product, _ in new + updated
+            for variant in (record.get('variants') or [])
+        ]
+        if nested:
+            self._import_variant_chunk(nested)
+
+    def _allocate_product_identifiers(self, products: List[Product]) -> None:
+        unslugged = [product for product in products if not product.slug]
+        for product, slug in zip(unslugged, allocate_slugs(Product.objects.all(), [p.name for p in unslugged])):
+            product.slug = slug
+        unskued = [product for product in products if not product.sku]
+        for product, sku in zip(unskued, allocate_skus(Product.objects.all(), [product_sku_base(p.name) for p in unskued])):
+            product.sku = sku
+
+    def _write_details(self, rows) -> None:
+        by_model = {}
+        for _, _, product, details in rows:
+            if details is None:
+                continue
+            _, model = DETAIL_MODELS[product.product_type]
+            fields = {f.name for f in model._meta.concrete_fields} - {'id', 'product'}
+            values = {key: value for key, value in details.items() if key in fields}
+            if model is MedicineDetails:
+                values['prescription_required'] = _bool(values.get('prescription_required'))
+                values.setdefault('batch_number', f'BATCH{product.pk:06d}')
+            by_model.setdefault(model, []).append(model(product=product, **values))
+        for model, objects in by_model.items():
+            update_fields = sorted({f.name for f in model._meta.concrete_fields} - {'id', 'product'})
+            model.objects.bulk_create(
+                objects, update_conflicts=True, unique_fields=['product'], update_fields=update_fields,
+            )
+
+    def _remember_product(self, product: Product) -> None:
+        self._products_by_name[product.name] = product
+        self._products_by_sku[product.sku] = product
+        self._touched_products[product.pk] = product
+        self._touched_categories.add(product.category_id)
+        if product.brand_id:
+            self._touched_brands.add(product.brand_id)
+
+    # ----- variants -----
+
+    def import_variants(self, records: Iterable[Dict]) -> ImportReport:
+        self._load_maps()
+        for chunk in _chunked(enumerate(records, 1), self.chunk_size):
+            self._import_variant_chunk(chunk)
+        return self.report
+
+    def _products_for(self, chunk) -> None:
+        """Load the products the chunk refers to that are not known yet (one query)"""
+        names, skus = set(), set()
+        for _, record in chunk:
+            if record.get('product_sku') and record['product_sku'] not in self._products_by_sku:
+                skus.add(record['product_sku'])
+            elif record.get('product_name') and record['product_name'] not in self._products_by_name:
+                names.add(record['product_name'])
+        if names or skus:
+            for product in Product.objects.filter(sku__in=skus) | Product.objects.filter(name__in=names):
+                self._products_by_sku[product.sku] = product
+                self._products_by_name.setdefault(product.name, product)
+
+    def _attribute_values_for(self, chunk) -> None:
+        """Create the attributes/values the chunk needs that do not exist yet"""
+        pairs = {
+            (attr['name'].strip(), str(attr['value']).strip())
+            for _, record in chunk for attr in (record.get('attributes') or [])
+            if attr.get('name') and attr.get('value') not in (None, '')
+        }
+        missing = {name for name, _ in pairs if name.lower() not in self._attributes}
+        if missing:
+            ProductAttribute.objects.bulk_create(
+                [ProductAttribute(name=name) for name in missing], ignore_conflicts=True
+            )
+            for attribute in ProductAttribute.objects.filter(name__in=missing):
+                self._attributes[attribute.name.lower()] = attribute
+        missing_values = {
+            (self._attributes[name.lower()].pk, value) for name, value in pairs
+            if (self._attributes[name.lower()].pk, value.lower()) not in self._attribute_values
+        }
+        if missing_values:
+            ProductAttributeValue.objects.bulk_create(
+                [ProductAttributeValue(attribute_id=attr_id, value=value) for attr_id, value in missing_values],
+                ignore_conflicts=True,
+            )
+            attribute_ids = {attr_id for attr_id, _ in missing_values}
+            values = {value for _, value in missing_values}
+            for value in ProductAttributeValue.objects.filter(attribute_id__in=attribute_ids, value__in=values):
+                self._attribute_values[(value.attribute_id, value.value.lower())] = value
+
+    def _build_variant(self, record: Dict):
+        product = None
+        if record.get('product_sku'):
+            product = self._products_by_sku.get(record['product_sku'])
+        if product is None and record.get('product_name'):
+            product = self._products_by_name.get(record['product_name'])
+        if product is None:
+            raise ImportRowError(f"Unknown product: {record.get('product_sku') or record.get('product_name')!r}")
+        price = _decimal(record.get('price'))
+        mrp = _decimal(record.get('mrp'))
+        _check_mrp(price, mrp)
+        variant_status = record.get('status')
+        values = {
+            'price': price,
+            'mrp': mrp,
+            'additional_price': _decimal(record.get('additional_price')),
+            'stock': _int(record.get('stock')),
+            'image': record.get('image') or '',
+            'is_active': _bool(record.get('is_active'), default=True),
+            'status': variant_status if variant_status in VALID_STATUSES else 'pending',
+        }
+        attribute_values = [
+            self._attribute_values[(self._attributes[attr['name'].strip().lower()].pk, str(attr['value']).strip().lower())]
+            for attr in (record.get('attributes') or [])
+            if attr.get('name') and attr.get('value') not in (None, '')
+        ]
+        return product, values, (record.get('sku') or None), attribute_values
+
+    def _import_variant_chunk(self, chunk) -> None:
+        self._products_for(chunk)
+        self._attribute_values_for(chunk)
+
+        built = []
+        for row, record in chunk:
+            self.report.rows += 1
+            try:
+                built.append((row,) + self._build_variant(record))
+            except ImportRowError as e:
+                self.report.error(row, e)
+
+        given_skus = [sku for _, _, _, sku, _ in built if sku]
+        existing = ProductVariant.objects.in_bulk(given_skus, field_name='sku') if given_skus else {}
+
+        new, updated, seen_skus = [], [], set()
+        for row, product, values, sku, attribute_values in built:
+            if sku and sku in seen_skus:
+                self.report.error(row, f'Duplicate SKU in file: {sku}')
+                continue
+            if sku:
+                seen_skus.add(sku)
+            if sku in existing:
+                if not self.update_existing:
+                    self.report.error(row, f'SKU already exists: {sku}')
+                    continue
+                variant = existing[sku]
+                for field, value in values.items():
+                    setattr(variant, field, value)
+                updated.append((row, variant, attribute_values))
+            else:
+                new.append((row, ProductVariant(product=product, sku=sku, **values), attribute_values))
+
+        now = timezone.now()
+        for _, variant, _ in updated:
+            variant.updated_at = now
+        variants = [variant for _, variant, _ in new]
+        given_skus = [variant.sku for variant in variants]
+        for attempt in range(1, MAX_CHUNK_ATTEMPTS + 1):
+            unskued = [variant for variant in variants if not variant.sku]
+            for variant, generated in zip(unskued, allocate_skus(
+                ProductVariant.objects.all(), [variant_sku_base(variant.product) for variant in unskued]
+            )):
+                variant.sku = generated
+            try:
+                with transaction.atomic():
+                    ProductVariant.objects.bulk_create(variants)
+                    if updated:
+                        ProductVariant.objects.bulk_update(
+                            [variant for _, variant, _ in updated], list(VARIANT_FIELDS) + ['updated_at']
+                        )
+                    ProductVariant.attributes.through.objects.bulk_create([
+                        ProductVariant.attributes.through(productvariant_id=variant.pk, productattributevalue_id=value.pk)
+                        for _, variant, attribute_values in new + updated
+                        for value in attribute_values
+                    ], ignore_conflicts=True)
+                break
+            except IntegrityError:
+                for variant, sku in zip(variants, given_skus):
+                    variant.pk, variant.sku = None, sku
+                if attempt == MAX_CHUNK_ATTEMPTS:
+                    for row, _, _ in new + updated:
+                        self.report.error(row, 'Could not allocate a unique SKU')
+                    return
+
+        self.report.created += len(new)
+        self.report.updated += len(updated)
+        for _, variant, _ in new + updated:
+            self._touched_products.setdefault(variant.product_id, variant.product)
+            self._updated_product_ids.add(variant.product_id)
+
+    # ----- deferred side effects -----
+
+    def flush(self) -> None:
+        """
+        Refresh everything the skipped per-row signals would have: cache
+        generations, category counts, catalog snapshot, resolved prices,
+        variant matrices, change feed, search and autocomplete indexes
+        """
+        from .autocomplete import sync_autocomplete_entry
+        from .catalog_snapshot import invalidate_catalog_snapshot
+        from .categories import rebuild_category_counts
+        from .change_feed import record_products
+        from .enterprise_cache import EnterpriseCacheManager
+        from .pricing import get_price_cache
+        from .search import index_products_by_id
+        from .variant_matrix import rebuild_variant_matrices
+
+        if self.report.finished is None:
+            self.report.finished = time.monotonic()
+        if not self._touched_products:
+            return
+
+        EnterpriseCacheManager.invalidate_bulk_product_caches(
+            self._updated_product_ids, self._touched_categories, self._touched_brands
+        )
+        rebuild_category_counts(self._touched_categories)
+        invalidate_catalog_snapshot()
+        get_price_cache().invalidate_products(self._updated_product_ids)
+        rebuild_variant_matrices(self._touched_products)
+        record_products(self._touched_products.values())
+        index_products_by_id(self._touched_products)
+        for product in self._touched_products.values():
+            sync_autocomplete_entry('product', product)
+
+        self._touched_products = {}
+        self._updated_product_ids = set()
+        self._touched_categories = set()
+        self._touched_brands = set()
+
@@ -0,0 +1,621 @@
+"""
+Shared catalog snapshot for the hot public read paths.
+
+The published products are kept as fixed-width columns (id, price, stock,
+created_at, category, brand, type, flags) in one memory-mapped file, with
+the published categories and brands as compact records next to them. Every
+worker process maps the same file (``settings.PRODUCT_CATALOG_SNAPSHOT``, by
+default one per database in the temp directory), so it is built once and
+shared.
+
+Updates are incremental: the product post_save/post_delete handlers in
+``enterprise_cache.py`` overwrite the product's slot in place (or append into
+the spare capacity reserved at build time) once the write commits, and bump
+the version in the header, which every mapping sees immediately.
+Category/brand changes, a full buffer, or an age above
+``settings.PRODUCT_CATALOG_SNAPSHOT_MAX_AGE`` mark the snapshot stale and the
+next reader rebuilds it from the database. Products created by writers that
+bypass the save signals are caught by comparing the highest product id with
+the one the snapshot has seen, at most every
+``settings.PRODUCT_CATALOG_SNAPSHOT_CHECK_INTERVAL`` seconds.
+
+Public list endpoints select the ids of a keyset page from the snapshot when
+every filter in the request is one it can answer (see ``snapshot_criteria``)
+and load just those rows through the ORM; anything else uses the ORM as
+before. Rows the ORM no longer returns, or returns with another price or
+creation time than the snapshot holds, mark the snapshot stale and the
+request falls back to the ORM.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms only lock per process
+    fcntl = None
+
+PUBLISHED_STATUSES = ('approved', 'published')
+
+MAGIC = b'CATSNAP2'
+# magic, version, layout version, row count, capacity, blob length, stale flag,
+# built at, highest product id seen
+HEADER = struct.Struct('<8sQQQQQQdQ')
+COLUMNS = (
+    ('id', 'q'),
+    ('price', 'd'),
+    ('stock', 'q'),
+    ('created_at', 'd'),
+    ('category_id', 'q'),
+    ('brand_id', 'q'),
+    ('product_type', 'B'),
+    ('flags', 'B'),
+)
+SORTABLE_FIELDS = ('created_at', 'price')
+PRODUCT_TYPE_CODES = {'medicine': 1, 'equipment': 2, 'pathology': 3}
+FLAG_PUBLISHED = 1
+
+# Free slots reserved at build time for products published afterwards
+SPARE_CAPACITY = 0.125
+MIN_SPARE_CAPACITY = 256
+
+DEFAULT_MAX_AGE = 300
+DEFAULT_CHECK_INTERVAL = 5
+# A shared file built before this process started may have missed writes
+PROCESS_STARTED = time.time()
+
+
+class ProductRecord(NamedTuple):
+    id: int
+    price: float
+    stock: int
+    created_at: float
+    category_id: int
+    brand_id: int
+    product_type: int
+    flags: int
+
+
+class CategoryRecord(NamedTuple):
+    id: int
+    parent_id: Optional[int]
+    name: str
+    slug: str
+
+
+class BrandRecord(NamedTuple):
+    id: int
+    name: str
+
+
+def product_record(product) -> ProductRecord:
+    published = product.status in PUBLISHED_STATUSES and product.is_publish
+    return ProductRecord(
+        product.pk,
+        float(product.price or 0),
+        product.stock or 0,
+        product.created_at.timestamp() if product.created_at else 0.0,
+        product.category_id or 0,
+        product.brand_id or 0,
+        PRODUCT_TYPE_CODES.get(product.product_type, 0),
+        FLAG_PUBLISHED if published else 0,
+    )
+
+
+class CatalogSnapshot:
+    """
+    Column store over a mapped buffer; see the module docstring
+    """
+    __slots__ = (
+        'path', 'capacity', 'built_at', 'categories', 'brands',
+        '_mm', '_fd', '_columns', '_positions', '_indexed', '_orders', '_lock',
+    )
+
+    def __init__(self, mm, path=None, fd=None):
+        self._fd = fd
+        magic, _, _, _, capacity, blob_length, _, built_at, _ = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a catalog snapshot')
+        self._mm, self.path = mm, path
+        self.capacity, self.built_at = capacity, built_at
+
+        view = memoryview(mm)
+        offset = HEADER.size
+        self._columns = {}
+        for name, code in COLUMNS:
+            size = struct.calcsize(code) * capacity
+            self._columns[name] = view[offset:offset + size].cast(code)
+            offset += size
+        blob = json.loads(bytes(mm[offset:offset + blob_length]) or b'{}')
+        self.categories = {row[0]: CategoryRecord(*row) for row in blob.get('categories', ())}
+        self.brands = {row[0]: BrandRecord(*row) for row in blob.get('brands', ())}
+
+        self._positions: Dict[int, int] = {}
+        self._indexed = 0
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def __del__(self):
+        if self._fd is not None:
+            os.close(self._fd)
+
+    # ----- building / opening -----
+
+    @classmethod
+    def build(cls, rows, categories, brands, path: Optional[str] = None,
+              max_id: Optional[int] = None) -> 'CatalogSnapshot':
+        rows = list(rows)
+        if max_id is None:
+            max_id = max((row[0] for row in rows), default=0)
+        capacity = len(rows) + max(MIN_SPARE_CAPACITY, int(len(rows) * SPARE_CAPACITY))
+        padding = capacity - len(rows)
+        blob = json.dumps({
+            'categories': [list(record) for record in categories],
+            'brands': [list(record) for record in brands],
+        }, separators=(',', ':')).encode()
+
+        chunks = [HEADER.pack(MAGIC, 1, 1, len(rows), capacity, len(blob), 0, time.time(), max_id)]
+        for position, (name, code) in enumerate(COLUMNS):
+            column = array(code, (row[position] for row in rows))
+            column.extend([0] * padding)
+            chunks.append(column.tobytes())
+        chunks.append(blob)
+        data = b''.join(chunks)
+
+        if path is None:
+            mm = mmap.mmap(-1, len(data))
+            mm.write(data)
+            return cls(mm)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        cls.mark_file_stale(path)
+        os.replace(tmp_path, path)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str) -> 'CatalogSnapshot':
+        fd = os.open(path, os.O_RDWR)
+        try:
+            mm = mmap.mmap(fd, 0)
+        except Exception:
+            os.close(fd)
+            raise
+        # From here on the instance owns (and closes) the descriptor
+        return cls(mm, path=path, fd=fd)
+
+    @classmethod
+    def mark_file_stale(cls, path: str) -> None:
+        """Tell every process mapping ``path`` to reopen it"""
+        try:
+            snapshot = cls.open(path)
+        except (OSError, ValueError, struct.error):
+            return
+        snapshot.mark_stale()
+
+    # ----- header -----
+
+    def _header(self):
+        return list(HEADER.unpack_from(self._mm, 0))
+
+    @property
+    def version(self) -> int:
+        return self._header()[1]
+
+    def __len__(self):
+        return self._header()[3]
+
+    @property
+    def max_id(self) -> int:
+        return self._header()[8]
+
+    def is_fresh(self, max_age: float) -> bool:
+        header = self._header()
+        return not header[6] and time.time() - header[7] < max_age
+
+    @contextmanager
+    def _exclusive(self):
+        with self._lock:
+            if self._fd is not None and fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield self._header()
+            finally:
+                if self._fd is not None and fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def mark_stale(self) -> None:
+        with self._exclusive() as header:
+            header[6] = 1
+            HEADER.pack_into(self._mm, 0, *header)
+
+    # ----- product rows -----
+
+    def _sync_positions(self, count: int) -> None:
+        # Rows appended by any process since we last looked
+        ids = self._columns['id']
+        for index in range(self._indexed, count):
+            self._positions[ids[index]] = index
+        self._indexed = count
+
+    def get(self, product_id: int) -> Optional[ProductRecord]:
+        self._sync_positions(len(self))
+        index = self._positions.get(product_id)
+        if index is None:
+            return None
+        return ProductRecord(*(self._columns[name][index] for name, _ in COLUMNS))
+
+    def upsert(self, record: ProductRecord) -> bool:
+        """
+        Write ``record`` in place; False when it needs a slot and none is left
+        """
+        with self._exclusive() as header:
+            self._sync_positions(header[3])
+            index = self._positions.get(record.id)
+            columns = self._columns
+            if record.id > header[8]:
+                header[8] = record.id
+                HEADER.pack_into(self._mm, 0, *header)
+            if index is None:
+                if not record.flags & FLAG_PUBLISHED:
+                    return True
+                if header[3] >= self.capacity:
+                    return False
+                index = header[3]
+                header[3] += 1
+                relayout = True
+            else:
+                relayout = (
+                    columns['price'][index] != record.price
+                    or columns['created_at'][index] != record.created_at
+                )
+            for (name, _), value in zip(COLUMNS, record):
+                columns[name][index] = value
+            header[1] += 1
+            if relayout:
+                header[2] += 1
+            HEADER.pack_into(self._mm, 0, *header)
+            self._sync_positions(header[3])
+        return True
+
+    def remove(self, product_id: int) -> None:
+        with self._exclusive() as header:
+            self._sync_positions(header[3])
+            index = self._positions.get(product_id)
+            if index is None:
+                return
+            self._columns['flags'][index] = 0
+            header[1] += 1
+            HEADER.pack_into(self._mm, 0, *header)
+
+    # ----- queries -----
+
+    def _order(self, field: str, layout: int, count: int):
+        cached = self._orders.get(field)
+        if cached is not None and cached[0] == (layout, count):
+            return cached[1], cached[2]
+        ids, values = self._columns['id'], self._columns[field]
+        order = sorted(range(count), key=lambda index: (values[index], ids[index]))
+        keys = [(values[index], ids[index]) for index in order]
+        self._orders[field] = ((layout, count), keys, order)
+        return keys, order
+
+    def select(self, criteria: Dict, field: str, descending: bool, after=None, limit: int = 20) -> List[int]:
+        """
+        Ids of up to ``limit`` visible products matching ``criteria`` in
+        ``(field, id)`` order, starting after the ``(value, id)`` cursor
+        """
+        header = self._header()
+        keys, order = self._order(field, header[2], header[3])
+        if after is None:
+            start = len(keys) - 1 if descending else 0
+        elif descending:
+            start = bisect_left(keys, after) - 1
+        else:
+            start = bisect_right(keys, after)
+        positions = range(start, -1, -1) if descending else range(start, len(keys))
+
+        columns = self._columns
+        ids, prices, stocks = columns['id'], columns['price'], columns['stock']
+        categories, brands = columns['category_id'], columns['brand_id']
+        types, flags = columns['product_type'], columns['flags']
+        category_ids = criteria.get('category_ids')
+        brand_ids = criteria.get('brand_ids')
+        type_codes = criteria.get('types')
+        price_min = criteria.get('price_min')
+        price_max = criteria.get('price_max')
+
+        selected = []
+        for position in positions:
+            index = order[position]
+            if not flags[index] & FLAG_PUBLISHED or stocks[index] <= 0:
+                continue
+            if category_ids is not None and categories[index] not in category_ids:
+                continue
+            if brand_ids is not None and brands[index] not in brand_ids:
+                continue
+            if type_codes is not None and types[index] not in type_codes:
+                continue
+            if price_min is not None and prices[index] < price_min:
+                continue
+            if price_max is not None and prices[index] > price_max:
+                continue
+            selected.append(ids[index])
+            if len(selected) >= limit:
+                break
+        return selected
+
+
+# ----- process-wide snapshot -----
+
+_current: Optional[CatalogSnapshot] = None
+_build_lock = threading.Lock()
+_checked_at = 0.0
+
+
+def _max_age() -> float:
+    return getattr(settings, 'PRODUCT_CATALOG_SNAPSHOT_MAX_AGE', DEFAULT_MAX_AGE)
+
+
+def snapshot_path() -> str:
+    """``settings.PRODUCT_CATALOG_SNAPSHOT``, else a file per database in the temp directory"""
+    path = getattr(settings, 'PRODUCT_CATALOG_SNAPSHOT', None)
+    if path:
+        return path
+    from django.db import connection
+
+    database = hashlib.md5(str(connection.settings_dict['NAME']).encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'catalog-snapshot-{database}.bin')
+
+
+def _has_unseen_products(snapshot: CatalogSnapshot) -> bool:
+    """
+    Whether products were created that the snapshot never saw (writers that
+    bypass the save signals); asks the database at most once per interval
+    """
+    global _checked_at
+    now = time.monotonic()
+    if now - _checked_at < getattr(settings, 'PRODUCT_CATALOG_SNAPSHOT_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL):
+        return False
+    _checked_at = now
+    from django.db.models import Max
+
+    from .models import Product
+
+    return (Product.objects.aggregate(top=Max('id'))['top'] or 0) > snapshot.max_id
+
+
+def build_catalog_snapshot(path: Optional[str] = None) -> CatalogSnapshot:
+    """Build a snapshot from the database (four queries)"""
+    from django.db.models import Max
+
+    from .models import Brand, Product, ProductCategory
+
+    global _checked_at
+    _checked_at = time.monotonic()
+    max_id = Product.objects.aggregate(top=Max('id'))['top'] or 0
+
+    products = Product.objects.filter(
+        status__in=PUBLISHED_STATUSES, is_publish=True
+    ).order_by().only(
+        'id', 'price', 'stock', 'created_at', 'category_id', 'brand_id',
+        'product_type', 'status', 'is_publish',
+    )
+    categories = ProductCategory.objects.filter(
+        status__in=PUBLISHED_STATUSES, is_publish=True
+    ).order_by().values_list('id', 'parent_id', 'name', 'slug')
+    brands = Brand.objects.filter(
+        status__in=PUBLISHED_STATUSES, is_publish=True
+    ).order_by().values_list('id', 'name')
+    return CatalogSnapshot.build(
+        (product_record(product) for product in products.iterator(chunk_size=2000)),
+        categories, brands, path=path, max_id=max_id,
+    )
+
+
+@contextmanager
+def _file_lock(path: Optional[str]):
+    if path is None or fcntl is None:
+        yield
+        return
+    with open(f'{path}.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _open_shared(path: str) -> Optional[CatalogSnapshot]:
+    try:
+        snapshot = CatalogSnapshot.open(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if snapshot.built_at < PROCESS_STARTED or not snapshot.is_fresh(_max_age()):
+        return None
+    return snapshot
+
+
+def get_catalog_snapshot() -> Optional[CatalogSnapshot]:
+    """
+    The current snapshot, opening or (re)building it when needed; None when
+    disabled by ``settings.PRODUCT_CATALOG_SNAPSHOT_ENABLED``
+    """
+    global _current
+    if not getattr(settings, 'PRODUCT_CATALOG_SNAPSHOT_ENABLED', True):
+        return None
+    path = snapshot_path()
+    snapshot = _current
+    if snapshot is not None and snapshot.path == path and snapshot.is_fresh(_max_age()):
+        if not _has_unseen_products(snapshot):
+            return snapshot
+        snapshot.mark_stale()
+
+    with _build_lock:
+        if (_current is not None and _current is not snapshot
+                and _current.path == path and _current.is_fresh(_max_age())):
+            return _current
+        with _file_lock(path):
+            _current = _open_shared(path) or build_catalog_snapshot(path)
+    return _current
+
+
+def _writable_snapshot() -> Optional[CatalogSnapshot]:
+    global _current
+    path = snapshot_path()
+    if _current is not None and _current.path == path:
+        return _current
+    if os.path.exists(path):
+        # Keep a shared file current even from processes that never read it
+        _current = _open_shared(path)
+        return _current
+    return None
+
+
+def reset_catalog_snapshot() -> None:
+    """
+    Forget the snapshot and mark the shared file stale, so the next reader
+    rebuilds it (tests: rolled back rows leave their ids to be reused)
+    """
+    global _current
+    _current = None
+    CatalogSnapshot.mark_file_stale(snapshot_path())
+
+
+def sync_catalog_product(product) -> None:
+    """Reflect a saved product in the snapshot, if one is loaded"""
+    snapshot = _writable_snapshot()
+    if snapshot is not None and not snapshot.upsert(product_record(product)):
+        snapshot.mark_stale()
+
+
+def remove_catalog_product(product_id: int) -> None:
+    snapshot = _writable_snapshot()
+    if snapshot is not None:
+        snapshot.remove(product_id)
+
+
+def invalidate_catalog_snapshot() -> None:
+    """Categories/brands changed: rebuild on next use"""
+    snapshot = _writable_snapshot()
+    if snapshot is not None:
+        snapshot.mark_stale()
+
+
+# ----- list endpoints -----
+
+# Query parameters ``snapshot_criteria`` understands; any other one means the ORM
+SNAPSHOT_QUERY_PARAMS = {
+    'cursor', 'ordering', 'page_size', 'no_cache',
+    'category', 'category_id', 'categories',
+    'brand', 'brand_id', 'brands',
+    'product_type', 'type', 'types',
+    'price_min', 'price_max', 'in_stock',
+}
+
+
+def _id_set(value) -> set:
+    return {int(part) for part in str(value).split(',') if part.strip()}
+
+
+def _name_matches(records, value: str) -> set:
+    needle = value.lower()
+    return {record.id for record in records.values() if needle in record.name.lower()}
+
+
+def _intersect(criteria: Dict, key: str, values: set) -> None:
+    current = criteria.get(key)
+    criteria[key] = values if current is None else current & values
+
+
+def snapshot_criteria(snapshot: CatalogSnapshot, params, medixmall_mode: bool = False) -> Optional[Dict]:
+    """
+    Translate list query parameters into ``CatalogSnapshot.select`` criteria,
+    or None when the request needs the ORM
+    """
+    if not set(params) <= SNAPSHOT_QUERY_PARAMS:
+        return None
+    criteria = {}
+    try:
+        for name in ('category', 'brand'):
+            value = params.get(name)
+            if not value:
+                continue
+            key = f'{name}_ids'
+            if value.strip().lstrip('-').isdigit():
+                _intersect(criteria, key, {int(value)})
+            else:
+                records = snapshot.categories if name == 'category' else snapshot.brands
+                _intersect(criteria, key, _name_matches(records, value))
+        for name, key in (('category_id', 'category_ids'), ('categories', 'category_ids'),
+                          ('brand_id', 'brand_ids'), ('brands', 'brand_ids')):
+            if params.get(name):
+                _intersect(criteria, key, _id_set(params[name]))
+        for name in ('product_type', 'type', 'types'):
+            if params.get(name):
+                _intersect(criteria, 'types', {PRODUCT_TYPE_CODES[value] for value in params[name].split(',')})
+        for name in ('price_min', 'price_max'):
+            if params.get(name):
+                criteria[name] = float(params[name])
+    except (KeyError, ValueError):
+        # Let the filterset report the invalid value
+        return None
+    if params.get('in_stock') not in (None, '', 'true', 'True', '1'):
+        return None
+    if medixmall_mode:
+        _intersect(criteria, 'types', {PRODUCT_TYPE_CODES['medicine']})
+    return criteria
+
+
+def _moved(snapshot: CatalogSnapshot, row) -> bool:
+    """Whether ``row`` sorts elsewhere than the snapshot has it (a price or created_at write it missed)"""
+    record = snapshot.get(row.pk)
+    return record is None or (
+        record.price != float(row.price or 0)
+        or record.created_at != (row.created_at.timestamp() if row.created_at else 0.0)
+    )
+
+
+def snapshot_keyset_fetch(queryset, params, medixmall_mode: bool = False):
+    """
+    A ``fetch`` callable for ``KeysetPagination.paginate_queryset`` that picks
+    the page from the snapshot and loads it from ``queryset``, or None
+    """
+    snapshot = get_catalog_snapshot()
+    if snapshot is None:
+        return None
+    criteria = snapshot_criteria(snapshot, params, medixmall_mode)
+    if criteria is None:
+        return None
+
+    def fetch(field_name, descending, cursor, limit):
+        if field_name not in SORTABLE_FIELDS:
+            return None
+        after = None
+        if cursor is not None:
+            value, pk = cursor
+            value = value.timestamp() if field_name == 'created_at' else float(value)
+            after = (value, pk)
+        ids = snapshot.select(criteria, field_name, descending, after, limit)
+        rows = {row.pk: row for row in queryset.filter(pk__in=ids)} if ids else {}
+        if len(rows) != len(ids) or any(_moved(snapshot, row) for row in rows.values()):
+            # The snapshot is behind the database; rebuild it and use the ORM
+            snapshot.mark_stale()
+            return None
+        return [rows[pk] for pk in ids]
+
+    return fetch
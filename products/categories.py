@@ -0,0 +1,164 @@
+"""
+Category tree reads and the denormalized per-category product counts.
+
+Every category stores its materialized path (``/1/7/42/``, maintained by
+ProductCategory.save), so a whole subtree at any depth is one indexed
+``path LIKE '/1/7/%'`` query. ``ProductCategory.product_count`` holds the
+number of published, in-stock products filed directly under the category;
+Product saves and deletes adjust it with a single ``UPDATE ... SET
+product_count = product_count +/- 1`` when a product enters or leaves that
+set, and subtree totals are summed in Python from the fetched subtree.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Product, ProductCategory
+
+PUBLISHED_STATUSES = ('approved', 'published')
+
+
+def is_counted(product) -> bool:
+    """Whether ``product`` shows up in public listings (and so in the counts)"""
+    return (
+        product.status in PUBLISHED_STATUSES
+        and product.is_publish
+        and (product.stock or 0) > 0
+    )
+
+
+def counted_products():
+    return Product.objects.filter(status__in=PUBLISHED_STATUSES, is_publish=True, stock__gt=0)
+
+
+def published_subtree(category) -> List:
+    """
+    Published descendants of ``category`` (any depth) ordered by depth then
+    name, in one query; a subtree under an unpublished category is dropped
+    """
+    rows = category.get_descendants().order_by('depth', 'name')
+    visible = {category.pk}
+    subtree = []
+    for row in rows:
+        if row.is_publish and row.parent_id in visible:
+            visible.add(row.pk)
+            subtree.append(row)
+    return subtree
+
+
+def subtree_totals(category, subtree, counts: Optional[Dict[int, int]] = None) -> Dict[int, int]:
+    """
+    Product count of every node's subtree (itself included), rolled up
+    from ``counts`` (direct counts per category id) or the stored
+    ``product_count`` columns
+    """
+    if counts is None:
+        counts = {node.pk: node.product_count for node in [category, *subtree]}
+    totals = defaultdict(int)
+    for node in [category, *subtree]:
+        direct = counts.get(node.pk, 0)
+        for pk in node.ancestor_ids + [node.pk]:
+            totals[pk] += direct
+    return totals
+
+
+def _apply_count_delta(category_id: int, sign: int) -> None:
+    categories = ProductCategory.objects.filter(pk=category_id)
+    if sign < 0:
+        # Never drive the counter below zero; a drifted count is recomputed
+        if not categories.filter(product_count__gt=0).update(product_count=F('product_count') - 1):
+            rebuild_category_counts([category_id])
+        return
+    categories.update(product_count=F('product_count') + 1)
+
+
+def rebuild_category_counts(category_ids: Optional[Iterable[int]] = None) -> None:
+    """Recompute ``product_count`` from the products table with one GROUP BY"""
+    categories = ProductCategory.objects.all()
+    products = counted_products()
+    if category_ids is not None:
+        category_ids = list(category_ids)
+        categories = categories.filter(pk__in=category_ids)
+        products = products.filter(category_id__in=category_ids)
+    counts = dict(
+        products.order_by().values('category_id').annotate(total=Count('id')).values_list('category_id', 'total')
+    )
+    ProductCategory.objects.bulk_update(
+        [ProductCategory(pk=pk, product_count=counts.get(pk, 0)) for pk in categories.values_list('id', flat=True)],
+        ['product_count'],
+        batch_size=1000,
+    )
+
+def rebuild_category_paths(batch_size: int = 1000) -> int:
+    """
+    Recompute every ``path``/``depth`` from the parent links (one read plus
+    batched UPDATEs); returns the number of categories
+    """
+    parents = dict(ProductCategory.objects.order_by().values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_of(pk):
+        # Iterative walk up to the first node with a known path (or a root)
+        chain = []
+        while pk is not None and pk not in paths and pk not in chain:
+            chain.append(pk)
+            pk = parents.get(pk)
+        prefix = paths.get(pk, '/')
+        for node in reversed(chain):
+            prefix = paths[node] = f'{prefix}{node}/'
+        return prefix
+
+    categories = [
+        ProductCategory(pk=pk, path=path_of(pk), depth=path_of(pk).count('/') - 2)
+        for pk in parents
+    ]
+    ProductCategory.objects.bulk_update(categories, ['path', 'depth'], batch_size=batch_size)
+    return len(categories)
+
+
+# Signal handlers
+
+@receiver(post_init, sender=Product)
+def remember_category_count_state(sender, instance, **kwargs):
+    # Field tracker: what the row held when loaded, so saves know what to undo.
+    # Deferred loads (only()/defer()) leave the state unknown.
+    deferred = instance.get_deferred_fields() & {'category_id', 'status', 'is_publish', 'stock'}
+    if instance.pk and not deferred:
+        instance._category_count_state = (instance.category_id, is_counted(instance))
+    else:
+        instance._category_count_state = None
+
+
+@receiver(post_save, sender=Product)
+def update_category_count_on_product_save(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_category_count_state', None)
+    current = (instance.category_id, is_counted(instance))
+    if previous != current:
+        if previous is None and not created:
+            # Saved through an instance we never saw loaded: recompute
+            rebuild_category_counts([instance.category_id] if instance.category_id else [])
+        else:
+            if previous is not None and previous[0] and previous[1]:
+                _apply_count_delta(previous[0], -1)
+            if current[0] and current[1]:
+                _apply_count_delta(current[0], 1)
+    instance._category_count_state = current
+
+
+@receiver(pre_delete, sender=Product)
+def resolve_category_count_state(sender, instance, **kwargs):
+    # Deferred loads: read the stored state while the row still exists
+    if getattr(instance, '_category_count_state', None) is None:
+        category_id = counted_products().filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        instance._category_count_state = (category_id, category_id is not None)
+
+
+@receiver(post_delete, sender=Product)
+def update_category_count_on_product_delete(sender, instance, **kwargs):
+    state = getattr(instance, '_category_count_state', None) or (None, False)
+    if state[0] and state[1]:
+        _apply_count_delta(state[0], -1)
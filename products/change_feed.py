@@ -0,0 +1,258 @@
+"""
+Catalog change feed.
+
+Every product and variant create/update/delete appends a CatalogChange row
+in the transaction of the change (Product.save and ProductVariant.save are
+atomic). A row carries the object, its product, the action and the new
+values of the fields that changed, diffed against the values loaded with the
+instance (a post_init field tracker); saves that change no tracked field
+append nothing.
+
+Clients poll ``/api/public/products/changes/?since=<seq>`` and apply the
+deltas. Rows are written without a sequence number; the feed numbers them
+when it reads (``assign_sequence``), after every number handed out so far.
+Only committed rows are visible to it, so a transaction that committed late
+is numbered after what clients have already read, and no change is missed.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import DatabaseError, models, transaction
+from django.db.models import Case, Max, Value, When
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import CatalogChange, Product, ProductVariant
+
+PUBLISHED_STATUSES = ('approved', 'published')
+
+TRACKED_FIELDS = {
+    Product: ('name', 'price', 'mrp', 'stock', 'status', 'is_publish', 'category', 'brand', 'product_type', 'image'),
+    ProductVariant: ('price', 'mrp', 'additional_price', 'stock', 'is_active', 'status', 'image'),
+}
+
+OBJECT_TYPES = {Product: 'product', ProductVariant: 'variant'}
+
+# The fields is_visible reads, per model
+VISIBILITY_FIELDS = {Product: ('status', 'is_publish'), ProductVariant: ('status', 'is_active')}
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+SEQUENCE_BATCH = 1000
+
+_FIELDS = {
+    model: {name: model._meta.get_field(name) for name in fields}
+    for model, fields in TRACKED_FIELDS.items()
+}
+
+
+def tracked_values(instance) -> Dict[str, object]:
+    """Tracked fields of ``instance`` as assigned (deferred ones left out)"""
+    deferred = instance.get_deferred_fields()
+    return {
+        name: getattr(instance, field.attname)
+        for name, field in _FIELDS[type(instance)].items()
+        if field.attname not in deferred
+    }
+
+
+def to_json(instance, values: Dict[str, object]) -> Dict[str, object]:
+    """``values`` with decimals rendered like the API does (``"12.50"``)"""
+    fields = _FIELDS[type(instance)]
+    rendered = {}
+    for name, value in values.items():
+        field = fields[name]
+        if isinstance(field, models.DecimalField) and value is not None:
+            value = str(Decimal(str(value)).quantize(Decimal(1).scaleb(-field.decimal_places)))
+        rendered[name] = value
+    return rendered
+
+
+def _visible(status, flag) -> bool:
+    return status in PUBLISHED_STATUSES and bool(flag)
+
+
+def is_visible(instance) -> bool:
+    """Public visibility of the product or variant itself"""
+    if isinstance(instance, Product):
+        return _visible(instance.status, instance.is_publish)
+    return _visible(instance.status, instance.is_active)
+
+
+def _stored_visibility(instance) -> bool:
+    """Visibility of the row as stored, for instances loaded without the visibility fields"""
+    row = type(instance).objects.filter(pk=instance.pk).values_list(*VISIBILITY_FIELDS[type(instance)]).first()
+    return row is not None and _visible(*row)
+
+
+def _product_visible(variant) -> bool:
+    product = variant._state.fields_cache.get('product')
+    if product is not None:
+        return is_visible(product)
+    return Product.objects.filter(
+        pk=variant.product_id, status__in=PUBLISHED_STATUSES, is_publish=True
+    ).exists()
+
+
+def _product_id(instance) -> int:
+    return instance.pk if isinstance(instance, Product) else instance.product_id
+
+
+def record_change(instance, action: str, fields: Dict[str, object], was_visible: bool) -> CatalogChange:
+    visible = action != 'deleted' and is_visible(instance)
+    is_public = visible or was_visible
+    if is_public and isinstance(instance, ProductVariant) and action != 'deleted':
+        is_public = _product_visible(instance)
+    return CatalogChange.objects.create(
+        object_type=OBJECT_TYPES[type(instance)],
+        object_id=instance.pk,
+        product_id=_product_id(instance),
+        action=action,
+        fields=to_json(instance, fields),
+        is_public=is_public,
+    )
+
+
+def record_products(products: Iterable[Product], action: str = 'updated') -> int:
+    """
+    Append full-snapshot entries for ``products`` in one INSERT, for writers
+    that bypass save signals (bulk imports)
+    """
+    changes = [
+        CatalogChange(
+            object_type='product', object_id=product.pk, product_id=product.pk,
+            action=action, fields=to_json(product, tracked_values(product)), is_public=is_visible(product),
+        )
+        for product in products
+    ]
+    CatalogChange.objects.bulk_create(changes)
+    return len(changes)
+
+
+def record_stock(products: Iterable[Product], variants: Iterable[ProductVariant]) -> int:
+    """
+    Append stock-only entries in one INSERT, for writers that move stock with
+    queryset updates (orders.reservations); variants need their product loaded
+    """
+    changes = [
+        CatalogChange(
+            object_type='product', object_id=product.pk, product_id=product.pk,
+            action='updated', fields={'stock': product.stock}, is_public=is_visible(product),
+        )
+        for product in products
+    ] + [
+        CatalogChange(
+            object_type='variant', object_id=variant.pk, product_id=variant.product_id,
+            action='updated', fields={'stock': variant.stock},
+            is_public=is_visible(variant) and is_visible(variant.product),
+        )
+        for variant in variants
+    ]
+    CatalogChange.objects.bulk_create(changes)
+    return len(changes)
+
+
+def assign_sequence(batch: int = SEQUENCE_BATCH) -> int:
+    """
+    Number up to ``batch`` committed, unnumbered rows (oldest first) after
+    every number handed out so far; returns how many were numbered
+    """
+    if not CatalogChange.objects.filter(seq__isnull=True).exists():
+        return 0
+    try:
+        with transaction.atomic():
+            # Numbering is serialized on the row holding the top number; the
+            # unique seq index refuses duplicates from a run that raced past it
+            list(CatalogChange.objects.select_for_update().filter(seq__isnull=False)
+                 .order_by('-seq').values_list('pk', flat=True)[:1])
+            top = CatalogChange.objects.aggregate(top=Max('seq'))['top'] or 0
+            pending = list(
+                CatalogChange.objects.filter(seq__isnull=True).order_by('id').values_list('pk', flat=True)[:batch]
+            )
+            if pending:
+                CatalogChange.objects.filter(pk__in=pending).update(seq=Case(
+                    *(When(pk=pk, then=Value(top + rank)) for rank, pk in enumerate(pending, 1)),
+                    output_field=models.PositiveBigIntegerField(),
+                ))
+    except DatabaseError:
+        # Another reader numbered them first
+        return 0
+    return len(pending)
+
+
+def changes_since(since: int, limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[CatalogChange], bool]:
+    """Public changes after sequence ``since`` (oldest first) and whether more follow"""
+    backlog = assign_sequence() == SEQUENCE_BATCH
+    rows = list(CatalogChange.objects.filter(seq__gt=since, is_public=True).order_by('seq')[:limit + 1])
+    return rows[:limit], len(rows) > limit or backlog
+
+
+def change_payload(change: CatalogChange) -> Dict:
+    return {
+        'seq': change.seq,
+        'type': change.object_type,
+        'id': change.object_id,
+        'product_id': change.product_id,
+        'action': change.action,
+        'fields': change.fields,
+    }
+
+
+def prune_changes(older_than: timedelta) -> int:
+    """Delete feed rows older than ``older_than``; returns how many were removed"""
+    deleted, _ = CatalogChange.objects.filter(created_at__lt=timezone.now() - older_than).delete()
+    return deleted
+
+
+def _remember(instance) -> None:
+    # Deferred loads (only()/defer()) leave the visibility unknown: reading a
+    # deferred field here would load the row again, and so run post_init again.
+    # It is looked up before the instance is saved or deleted instead.
+    if instance.pk:
+        deferred = instance.get_deferred_fields() & set(VISIBILITY_FIELDS[type(instance)])
+        instance._change_feed_state = (tracked_values(instance), None if deferred else is_visible(instance))
+    else:
+        instance._change_feed_state = None
+
+
+# Signal handlers
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=ProductVariant)
+def remember_change_feed_state(sender, instance, **kwargs):
+    _remember(instance)
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ProductVariant)
+@receiver(pre_delete, sender=Product)
+@receiver(pre_delete, sender=ProductVariant)
+def resolve_change_feed_visibility(sender, instance, **kwargs):
+    state = getattr(instance, '_change_feed_state', None)
+    if state is not None and state[1] is None:
+        instance._change_feed_state = (state[0], _stored_visibility(instance))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+def record_change_on_save(sender, instance, created, **kwargs):
+    state = getattr(instance, '_change_feed_state', None)
+    current = tracked_values(instance)
+    if created or state is None:
+        record_change(instance, 'created' if created else 'updated', current, was_visible=False)
+    else:
+        previous, was_visible = state
+        changed = {name: value for name, value in current.items() if previous.get(name, value) != value}
+        if changed:
+            record_change(instance, 'updated', changed, was_visible)
+    _remember(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductVariant)
+def record_change_on_delete(sender, instance, **kwargs):
+    state = getattr(instance, '_change_feed_state', None)
+    record_change(instance, 'deleted', {}, was_visible=state[1] if state else is_visible(instance))
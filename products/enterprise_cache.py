@@ -1,16 +1,38 @@
 """
 Enterprise-level caching system for products
 Implements Redis caching with intelligent cache invalidation
+
+Invalidation uses generation counters instead of key sweeps: every cache key
+embeds the current generation of its namespace (and optionally of narrower
+scopes such as a single product or category). Invalidating is a single INCR
+of the relevant counter; entries under the old generation are never read
+again and simply expire.
+
+List and detail entries are read through ``get_or_compute``, which adds
+stampede protection on top: entries carry a soft expiry and stay readable for
+a grace period after it, one worker (holding a short cache lock) recomputes
+while the others keep serving the stale copy, and the refresh may start
+slightly early with a probability that grows as the expiry approaches
+(probabilistic early expiration), so hot keys rarely expire all at once.
 """
 
 from django.core.cache import cache
 from django.conf import settings
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 import json
 import hashlib
-from typing import Any, Optional, Dict, List
-from .models import Product, ProductCategory, Brand, ProductReview, ProductVariant
+import math
+import random
+import time
+import uuid
+from collections import defaultdict
+from functools import partial
+from typing import Any, Optional, Dict, List, Sequence, Tuple
+from .models import Product, ProductCategory, Brand, ProductReview, ProductVariant, ProductImage, SupplierProductPrice
+from .autocomplete import remove_autocomplete_entry, sync_autocomplete_entry
+from .catalog_snapshot import invalidate_catalog_snapshot, remove_catalog_product, sync_catalog_product
 
 
 class EnterpriseCacheManager:
@@ -39,10 +61,77 @@ class EnterpriseCacheManager:
         'agg': 'aggregated',
     }
     
+    # Generation counters never expire on their own
+    GENERATION_KEY_PREFIX = 'generation'
+    
+    # Stale-while-revalidate: entries stay in the cache for
+    # STALE_TTL_MULTIPLIER x their timeout but are only fresh for the timeout
+    STALE_TTL_MULTIPLIER = 3
+    LOCK_KEY_PREFIX = 'lock'
+    LOCK_TIMEOUT = 30  # seconds, upper bound on a single recompute
+    LOCK_WAIT = 2.0  # seconds a cold miss waits for another worker's recompute
+    LOCK_POLL_INTERVAL = 0.05
+    # Higher beta starts refreshes earlier (1.0 is the usual XFetch default)
+    EARLY_EXPIRATION_BETA = 1.0
+    
+    # Read-through counters live in the shared cache, so every process (and
+    # the performance_monitor command) sees the totals of all workers
+    STATS_KEY_PREFIX = 'cache_stats'
+    STAT_OUTCOMES = ('hit', 'miss', 'stale', 'coalesced')
+    
+    @classmethod
+    def _generation_key(cls, namespace: str, scope: Any = None) -> str:
+        if scope is None:
+            return f"{cls.GENERATION_KEY_PREFIX}:{namespace}"
+        return f"{cls.GENERATION_KEY_PREFIX}:{namespace}:{scope}"
+    
+    @staticmethod
+    def _initial_generation() -> int:
+        # Time-based seed so a counter that was evicted never restarts at a
+        # value readers have already used
+        return int(time.time() * 1000)
+    
+    @classmethod
+    def get_generations(cls, scopes: Sequence[Tuple[str, Any]]) -> List[int]:
+        """
+        Return the current generation for each ``(namespace, scope)`` pair in
+        one cache round-trip, seeding missing counters
+        """
+        keys = [cls._generation_key(namespace, scope) for namespace, scope in scopes]
+        try:
+            found = cache.get_many(keys)
+            for key in keys:
+                if key not in found:
+                    cache.add(key, cls._initial_generation(), None)
+                    found[key] = cache.get(key, 0)
+            return [found[key] for key in keys]
+        except Exception as e:
+            print(f"Cache generation lookup error: {e}")
+            return [0 for _ in keys]
+    
     @classmethod
-    def generate_cache_key(cls, prefix: str, *args, **kwargs) -> str:
+    def bump_generation(cls, namespace: str, scope: Any = None) -> None:
+        """
+        Invalidate every key built with this namespace/scope (one INCR)
+        """
+        key = cls._generation_key(namespace, scope)
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Counter missing: start a fresh, higher generation
+                cache.set(key, cls._initial_generation(), None)
+        except Exception as e:
+            print(f"Cache generation bump error: {e}")
+    
+    @classmethod
+    def generate_cache_key(cls, prefix: str, *args, scopes: Optional[Sequence[Tuple[str, Any]]] = None, **kwargs) -> str:
         """
         Generate a unique cache key based on prefix and parameters
+        
+        The key embeds the generation of the prefix namespace plus those of
+        any extra ``scopes`` (e.g. ``[('category', 3)]``), so bumping any of
+        them makes the key unreachable.
         """
         # Create a string representation of all parameters
         params_str = '_'.join([str(arg) for arg in args])
@@ -54,7 +143,10 @@ class EnterpriseCacheManager:
         if len(params_str) > 100:
             params_str = hashlib.md5(params_str.encode()).hexdigest()
         
-        return f"{cls.CACHE_PREFIXES[prefix]}:{params_str}"
+        all_scopes = [(prefix, None)] + list(scopes or [])
+        generations = '.'.join(str(gen) for gen in cls.get_generations(all_scopes))
+        
+        return f"{cls.CACHE_PREFIXES[prefix]}:v{generations}:{params_str}"
     
     @classmethod
     def get_cached_data(cls, cache_type: str, key: str) -> Optional[Any]:
@@ -82,90 +174,209 @@ class EnterpriseCacheManager:
             print(f"Cache setting error: {e}")
             return False
     
+    # ----- stampede-protected reads -----
+    
+    @classmethod
+    def _stat_keys(cls) -> Dict[str, Tuple[str, str]]:
+        return {
+            f"{cls.STATS_KEY_PREFIX}:{cache_type}:{outcome}": (cache_type, outcome)
+            for cache_type in cls.CACHE_TIMEOUTS
+            for outcome in cls.STAT_OUTCOMES
+        }
+    
     @classmethod
-    def invalidate_cache_pattern(cls, pattern: str) -> bool:
+    def record_stat(cls, cache_type: str, outcome: str) -> None:
+        key = f"{cls.STATS_KEY_PREFIX}:{cache_type}:{outcome}"
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # First event: a concurrent add wins, then count on top of it
+                if not cache.add(key, 1, None):
+                    cache.incr(key)
+        except Exception as e:
+            print(f"Cache stats error: {e}")
+    
+    @classmethod
+    def get_cache_stats(cls) -> Dict[str, Dict[str, int]]:
         """
-        Invalidate cache keys matching a pattern
+        Per cache type counters (hit, miss, stale, coalesced) of all
+        processes sharing the cache, in one round-trip
         """
+        keys = cls._stat_keys()
         try:
-            # Prefer backend-native delete_pattern when available
-            if hasattr(cache, 'delete_pattern'):
-                cache.delete_pattern(pattern)
-                return True
-
-            # Fallback for LocMemCache or other backends without delete_pattern
-            # Try to inspect internal cache storage (best-effort)
-            try:
-                internal = getattr(cache, '_cache', None)
-                if internal is None:
-                    # Nothing we can do
-                    return False
-
-                import re
-                # Convert simple glob-style pattern to regex
-                regex = re.escape(pattern).replace(r"\*", ".*")
-                prog = re.compile(r"^" + regex + r"$")
-
-                keys = list(internal.keys())
-                for key in keys:
-                    try:
-                        if prog.match(str(key)):
-                            cache.delete(key)
-                    except Exception:
-                        # ignore per-key errors
-                        continue
-
-                return True
-            except Exception as e:
-                print(f"Cache invalidation fallback error: {e}")
-                return False
-
+            found = cache.get_many(list(keys))
         except Exception as e:
-            print(f"Cache invalidation error: {e}")
-            return False
+            print(f"Cache stats error: {e}")
+            return {}
+        stats = defaultdict(dict)
+        for key, count in found.items():
+            cache_type, outcome = keys[key]
+            stats[cache_type][outcome] = count
+        return dict(stats)
+    
+    @classmethod
+    def reset_cache_stats(cls) -> None:
+        try:
+            cache.delete_many(list(cls._stat_keys()))
+        except Exception as e:
+            print(f"Cache stats error: {e}")
+    
+    @classmethod
+    def _acquire_lock(cls, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            if cache.add(f"{cls.LOCK_KEY_PREFIX}:{key}", token, cls.LOCK_TIMEOUT):
+                return token
+        except Exception as e:
+            print(f"Cache lock error: {e}")
+        return None
+    
+    @classmethod
+    def _release_lock(cls, key: str, token: str) -> None:
+        lock_key = f"{cls.LOCK_KEY_PREFIX}:{key}"
+        try:
+            # Only drop the lock if it is still ours (it may have timed out)
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+        except Exception as e:
+            print(f"Cache lock release error: {e}")
+    
+    @classmethod
+    def _needs_refresh(cls, envelope: Dict) -> bool:
+        """
+        Probabilistic early expiration: refresh when
+        ``now - delta * beta * ln(rand) >= expires_at``, where delta is how
+        long the value took to compute
+        """
+        jitter = envelope['delta'] * cls.EARLY_EXPIRATION_BETA * -math.log(1.0 - random.random())
+        return time.time() + jitter >= envelope['expires_at']
+    
+    @classmethod
+    def _store(cls, cache_type: str, key: str, compute, timeout: int):
+        started = time.time()
+        value = compute()
+        finished = time.time()
+        envelope = {
+            'value': value,
+            'expires_at': finished + timeout,
+            'delta': finished - started,
+        }
+        cls.set_cached_data(cache_type, key, envelope, timeout * cls.STALE_TTL_MULTIPLIER)
+        return value
+    
+    @classmethod
+    def _wait_for_envelope(cls, key: str) -> Optional[Dict]:
+        deadline = time.time() + cls.LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(cls.LOCK_POLL_INTERVAL)
+            envelope = cls.get_cached_data(None, key)
+            if envelope is not None:
+                return envelope
+        return None
     
     @classmethod
-    def invalidate_product_caches(cls, product_id: int):
+    def get_or_compute(cls, cache_type: str, key: str, compute, timeout: Optional[int] = None,
+                       force_refresh: bool = False) -> Any:
         """
-        Invalidate all caches related to a specific product
+        Return the cached value for ``key`` or compute and cache it, letting
+        only one worker recompute a missing or stale entry at a time
+        
+        - fresh entry: returned as is (``hit``)
+        - stale (or picked for early refresh): the lock holder recomputes,
+          everyone else gets the stale value (``stale``)
+        - missing: the lock holder computes (``miss``), the others wait up to
+          ``LOCK_WAIT`` seconds for its result (``coalesced``) before giving up
+          and computing themselves
         """
-        patterns = [
-            f"{cls.CACHE_PREFIXES['product']}:*:{product_id}:*",
-            f"{cls.CACHE_PREFIXES['product']}:*:product_{product_id}",
-            f"{cls.CACHE_PREFIXES['search']}:*",  # Invalidate all search results
-            f"{cls.CACHE_PREFIXES['filter']}:*",  # Invalidate all filter results
-        ]
+        timeout = timeout or cls.CACHE_TIMEOUTS.get(cache_type, 300)
+        
+        if force_refresh:
+            cls.record_stat(cache_type, 'miss')
+            return cls._store(cache_type, key, compute, timeout)
+        
+        envelope = cls.get_cached_data(cache_type, key)
+        if envelope is not None:
+            if not cls._needs_refresh(envelope):
+                cls.record_stat(cache_type, 'hit')
+                return envelope['value']
+            token = cls._acquire_lock(key)
+            if token is None:
+                cls.record_stat(cache_type, 'stale')
+                return envelope['value']
+            try:
+                cls.record_stat(cache_type, 'miss')
+                return cls._store(cache_type, key, compute, timeout)
+            finally:
+                cls._release_lock(key, token)
         
-        for pattern in patterns:
-            cls.invalidate_cache_pattern(pattern)
+        token = cls._acquire_lock(key)
+        if token is None:
+            envelope = cls._wait_for_envelope(key)
+            if envelope is not None:
+                cls.record_stat(cache_type, 'coalesced')
+                return envelope['value']
+        try:
+            cls.record_stat(cache_type, 'miss')
+            return cls._store(cache_type, key, compute, timeout)
+        finally:
+            if token is not None:
+                cls._release_lock(key, token)
+    
+    @classmethod
+    def invalidate_product_caches(cls, product_id: int, category_id: Optional[int] = None,
+                                  brand_id: Optional[int] = None):
+        """
+        Invalidate caches related to a specific product
+        
+        Only the product's own detail entries, unscoped product lists, the
+        lists scoped to its category/brand, and search/filter results are
+        affected; listings of unrelated categories stay cached.
+        """
+        cls.bump_generation('product', product_id)
+        cls.bump_generation('product', 'list')
+        if category_id:
+            cls.bump_generation('category', category_id)
+        if brand_id:
+            cls.bump_generation('brand', brand_id)
+        cls.bump_generation('search')
+        cls.bump_generation('filter')
     
+    @classmethod
+    def invalidate_bulk_product_caches(cls, product_ids, category_ids=(), brand_ids=()):
+        """
+        One invalidation for a batch of written products (bulk imports): each
+        generation is bumped once however many products share it
+        """
+        for product_id in set(product_ids):
+            cls.bump_generation('product', product_id)
+        cls.bump_generation('product', 'list')
+        for category_id in set(category_ids):
+            if category_id:
+                cls.bump_generation('category', category_id)
+        for brand_id in set(brand_ids):
+            if brand_id:
+                cls.bump_generation('brand', brand_id)
+        cls.bump_generation('search')
+        cls.bump_generation('filter')
+
     @classmethod
     def invalidate_category_caches(cls, category_id: int):
         """
         Invalidate all caches related to a specific category
         """
-        patterns = [
-            f"{cls.CACHE_PREFIXES['category']}:*",
-            f"{cls.CACHE_PREFIXES['filter']}:*category*{category_id}*",
-            f"{cls.CACHE_PREFIXES['search']}:*",
-        ]
-        
-        for pattern in patterns:
-            cls.invalidate_cache_pattern(pattern)
+        cls.bump_generation('category')
+        cls.bump_generation('category', category_id)
+        cls.bump_generation('search')
     
     @classmethod
     def invalidate_brand_caches(cls, brand_id: int):
         """
         Invalidate all caches related to a specific brand
         """
-        patterns = [
-            f"{cls.CACHE_PREFIXES['brand']}:*",
-            f"{cls.CACHE_PREFIXES['filter']}:*brand*{brand_id}*",
-            f"{cls.CACHE_PREFIXES['search']}:*",
-        ]
-        
-        for pattern in patterns:
-            cls.invalidate_cache_pattern(pattern)
+        cls.bump_generation('brand')
+        cls.bump_generation('brand', brand_id)
+        cls.bump_generation('search')
 
 
 class EnterpriseProductCache:
@@ -180,15 +391,45 @@ class EnterpriseProductCache:
         """
         filter_hash = hashlib.md5(json.dumps(filters, sort_keys=True).encode()).hexdigest()[:16]
         return EnterpriseCacheManager.generate_cache_key(
-            'product', 'list', filter_hash, ordering, page, page_size
+            'product', 'list', filter_hash, ordering, page, page_size,
+            scopes=EnterpriseProductCache.get_list_scopes(filters)
         )
     
+    @staticmethod
+    def get_list_scopes(filters: Dict) -> List[Tuple[str, Any]]:
+        """
+        Pick the generation scopes a product list depends on: lists narrowed
+        to one category/brand follow that category/brand, anything else
+        follows the global product list generation
+        """
+        def _single_id(*names):
+            for name in names:
+                value = filters.get(name)
+                if isinstance(value, (list, tuple)):
+                    value = value[0] if len(value) == 1 else None
+                try:
+                    return int(value)
+                except (TypeError, ValueError):
+                    continue
+            return None
+        
+        scopes = []
+        category_id = _single_id('category', 'category_id')
+        brand_id = _single_id('brand', 'brand_id')
+        if category_id is not None:
+            scopes.append(('category', category_id))
+        if brand_id is not None:
+            scopes.append(('brand', brand_id))
+        return scopes or [('product', 'list')]
+    
     @staticmethod
     def get_product_detail_cache_key(product_id: int) -> str:
         """
         Generate cache key for product detail
         """
-        return EnterpriseCacheManager.generate_cache_key('product', 'detail', product_id)
+        return EnterpriseCacheManager.generate_cache_key(
+            'product', 'detail', product_id, scopes=[('product', product_id)]
+        )
     
     @staticmethod
     def get_search_cache_key(query: str, filters: Dict, ordering: str = '', page: int = 1) -> str:
@@ -204,18 +445,50 @@ class EnterpriseProductCache:
 
 # Cache invalidation signal handlers
 
+LIST_SCOPE_FIELDS = ('category_id', 'brand_id')
+
+
+def _loaded_scopes(product) -> Tuple[Optional[int], Optional[int]]:
+    """(category_id, brand_id) of a product instance; None for deferred fields, which are never reloaded"""
+    deferred = product.get_deferred_fields()
+    return tuple(None if name in deferred else getattr(product, name) for name in LIST_SCOPE_FIELDS)
+
+
+def _product_scopes(product_id: int, product=None) -> Tuple[Optional[int], Optional[int]]:
+    """
+    (category_id, brand_id) of a product, for writes to the models hanging
+    off it: read off ``product`` when the caller holds it, else one query
+    """
+    if product is not None:
+        return _loaded_scopes(product)
+    return Product.objects.filter(pk=product_id).values_list(*LIST_SCOPE_FIELDS).first() or (None, None)
+
+
+def _child_scopes(instance) -> Tuple[Optional[int], Optional[int]]:
+    return _product_scopes(instance.product_id, instance._state.fields_cache.get('product'))
+
+
+@receiver(post_init, sender=Product)
+def remember_list_scopes(sender, instance, **kwargs):
+    # Field tracker: the category/brand lists the product was in when loaded,
+    # so moving it also invalidates the lists it left
+    instance._list_scopes = _loaded_scopes(instance) if instance.pk else None
+
+
 @receiver(post_save, sender=Product)
 def invalidate_product_cache_on_save(sender, instance, **kwargs):
     """
     Invalidate product-related caches when a product is saved
     """
-    EnterpriseCacheManager.invalidate_product_caches(instance.id)
-    
-    # Also invalidate category and brand caches if they changed
-    if instance.category_id:
-        EnterpriseCacheManager.invalidate_category_caches(instance.category_id)
-    if instance.brand_id:
-        EnterpriseCacheManager.invalidate_brand_caches(instance.brand_id)
+    previous_category, previous_brand = getattr(instance, '_list_scopes', None) or (None, None)
+    category_id, brand_id = _loaded_scopes(instance)
+    EnterpriseCacheManager.invalidate_bulk_product_caches(
+        [instance.id], {previous_category, category_id}, {previous_brand, brand_id}
+    )
+    instance._list_scopes = (category_id, brand_id)
+    # In-process index and snapshot: only once the write is committed
+    transaction.on_commit(partial(sync_autocomplete_entry, 'product', instance))
+    transaction.on_commit(partial(sync_catalog_product, instance))
 
 
 @receiver(post_delete, sender=Product)
@@ -223,7 +496,14 @@ def invalidate_product_cache_on_delete(sender, instance, **kwargs):
     """
     Invalidate product-related caches when a product is deleted
     """
-    EnterpriseCacheManager.invalidate_product_caches(instance.id)
+    # The row is gone: only values already on the instance can be read
+    previous_category, previous_brand = getattr(instance, '_list_scopes', None) or (None, None)
+    category_id, brand_id = _loaded_scopes(instance)
+    EnterpriseCacheManager.invalidate_bulk_product_caches(
+        [instance.id], {previous_category, category_id}, {previous_brand, brand_id}
+    )
+    transaction.on_commit(partial(remove_autocomplete_entry, 'product', instance.id))
+    transaction.on_commit(partial(remove_catalog_product, instance.id))
 
 
 @receiver(post_save, sender=ProductCategory)
@@ -232,6 +512,8 @@ def invalidate_category_cache_on_save(sender, instance, **kwargs):
     Invalidate category-related caches when a category is saved
     """
     EnterpriseCacheManager.invalidate_category_caches(instance.id)
+    transaction.on_commit(partial(sync_autocomplete_entry, 'category', instance))
+    transaction.on_commit(invalidate_catalog_snapshot)
 
 
 @receiver(post_delete, sender=ProductCategory)
@@ -240,6 +522,8 @@ def invalidate_category_cache_on_delete(sender, instance, **kwargs):
     Invalidate category-related caches when a category is deleted
     """
     EnterpriseCacheManager.invalidate_category_caches(instance.id)
+    transaction.on_commit(partial(remove_autocomplete_entry, 'category', instance.id))
+    transaction.on_commit(invalidate_catalog_snapshot)
 
 
 @receiver(post_save, sender=Brand)
@@ -248,6 +532,8 @@ def invalidate_brand_cache_on_save(sender, instance, **kwargs):
     Invalidate brand-related caches when a brand is saved
     """
     EnterpriseCacheManager.invalidate_brand_caches(instance.id)
+    transaction.on_commit(partial(sync_autocomplete_entry, 'brand', instance))
+    transaction.on_commit(invalidate_catalog_snapshot)
 
 
 @receiver(post_delete, sender=Brand)
@@ -256,6 +542,8 @@ def invalidate_brand_cache_on_delete(sender, instance, **kwargs):
     Invalidate brand-related caches when a brand is deleted
     """
     EnterpriseCacheManager.invalidate_brand_caches(instance.id)
+    transaction.on_commit(partial(remove_autocomplete_entry, 'brand', instance.id))
+    transaction.on_commit(invalidate_catalog_snapshot)
 
 
 @receiver(post_save, sender=ProductReview)
@@ -263,15 +551,51 @@ def invalidate_product_cache_on_review_save(sender, instance, **kwargs):
     """
     Invalidate product cache when a review is added/updated
     """
-    EnterpriseCacheManager.invalidate_product_caches(instance.product_id)
+    EnterpriseCacheManager.invalidate_product_caches(instance.product_id, *_child_scopes(instance))
+
+
+@receiver(post_delete, sender=ProductReview)
+def invalidate_product_cache_on_review_delete(sender, instance, **kwargs):
+    """
+    Invalidate product cache when a review is removed (its rating summary changed)
+    """
+    EnterpriseCacheManager.invalidate_product_caches(instance.product_id, *_child_scopes(instance))
 
 
 @receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
 def invalidate_product_cache_on_variant_save(sender, instance, **kwargs):
     """
-    Invalidate product cache when a variant is added/updated
+    Invalidate product cache when a variant is added/updated/removed
+    """
+    EnterpriseCacheManager.invalidate_product_caches(instance.product_id, *_child_scopes(instance))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_product_cache_on_image_change(sender, instance, **kwargs):
+    """
+    Invalidate product cache when one of its images changes
+    """
+    EnterpriseCacheManager.invalidate_product_caches(instance.product_id, *_child_scopes(instance))
+
+
+@receiver(post_save, sender=SupplierProductPrice)
+@receiver(post_delete, sender=SupplierProductPrice)
+def invalidate_product_cache_on_supplier_price_change(sender, instance, **kwargs):
+    """
+    Invalidate product cache when a supplier price of one of its variants changes
     """
-    EnterpriseCacheManager.invalidate_product_caches(instance.product_id)
+    variant = instance._state.fields_cache.get('product_variant')
+    if variant is not None:
+        product = variant._state.fields_cache.get('product')
+        row = (variant.product_id, *(_loaded_scopes(product) if product is not None else (None, None)))
+    else:
+        row = ProductVariant.objects.filter(pk=instance.product_variant_id).values_list(
+            'product_id', 'product__category_id', 'product__brand_id'
+        ).first()
+    if row:
+        EnterpriseCacheManager.invalidate_product_caches(*row)
 
 
 # Cache warming functions
@@ -290,7 +614,9 @@ def warm_popular_products_cache():
     ).order_by('-created_at')[:100]
     
     # Cache the serialized data
-    cache_key = EnterpriseCacheManager.generate_cache_key('product', 'popular_list')
+    cache_key = EnterpriseCacheManager.generate_cache_key(
+        'product', 'popular_list', scopes=[('product', 'list')]
+    )
     serializer = PublicProductListSerializer(popular_products, many=True)
     EnterpriseCacheManager.set_cached_data('product_list', cache_key, serializer.data, timeout=900)
 
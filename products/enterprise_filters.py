@@ -7,6 +7,7 @@ import django_filters
 from django.db.models import Q, F, Case, When, IntegerField, DecimalField
 from django.db.models.functions import Lower
 from .models import Product, ProductCategory, Brand, ProductReview, ProductVariant, PRODUCT_TYPES, PRODUCT_STATUSES
+from .search import get_search_backend
 
 
 class EnterpriseProductFilter(django_filters.FilterSet):
@@ -95,53 +96,15 @@ class EnterpriseProductFilter(django_filters.FilterSet):
     def filter_search(self, queryset, name, value):
         """
         Enterprise-level search with weighted relevance scoring
-        Searches across multiple fields with different priorities
+        Matches are resolved through the product search index (see
+        products.search) and annotated with ``search_score``. Field weights:
+        name 100, SKU 90, brand 80, category 70, description 60,
+        type-specific details 50, tags 30.
         """
-        if not value:
-            return queryset
-        
-        # Clean and split search terms
-        terms = value.lower().strip().split()
-        if not terms:
+        if not value or not value.strip():
             return queryset
         
-        search_query = Q()
-        
-        for term in terms:
-            # High priority: exact name match (weight: 100)
-            search_query |= Q(name__icontains=term)
-            
-            # High priority: SKU match (weight: 90)
-            search_query |= Q(sku__icontains=term)
-            
-            # Medium-high priority: brand match (weight: 80)
-            search_query |= Q(brand__name__icontains=term)
-            
-            # Medium priority: category match (weight: 70)
-            search_query |= Q(category__name__icontains=term)
-            
-            # Medium priority: description match (weight: 60)
-            search_query |= Q(description__icontains=term)
-            
-            # Medicine-specific searches (weight: 50)
-            search_query |= Q(medicine_details__composition__icontains=term)
-            search_query |= Q(medicine_details__manufacturer__icontains=term)
-            search_query |= Q(medicine_details__form__icontains=term)
-            
-            # Equipment-specific searches (weight: 50)
-            search_query |= Q(equipment_details__model_number__icontains=term)
-            search_query |= Q(equipment_details__equipment_type__icontains=term)
-            search_query |= Q(equipment_details__usage_type__icontains=term)
-            search_query |= Q(equipment_details__technical_specifications__icontains=term)
-            
-            # Pathology-specific searches (weight: 50)
-            search_query |= Q(pathology_details__compatible_tests__icontains=term)
-            search_query |= Q(pathology_details__chemical_composition__icontains=term)
-            
-            # Low priority: tags match (weight: 30)
-            search_query |= Q(tags__name__icontains=term)
-        
-        return queryset.filter(search_query).distinct()
+        return get_search_backend().filter_queryset(queryset, value)
     
     def filter_category(self, queryset, name, value):
         """
@@ -2,8 +2,7 @@
 Enterprise-level optimized views with advanced caching, filtering, and performance optimizations
 """
 
-from django.db.models import Q, Prefetch, Count, Avg, F, Case, When
-from django.core.cache import cache
+from django.db.models import Prefetch, F, Case, When
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_headers
@@ -16,7 +15,7 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import json
 
-from .models import Product, ProductCategory, Brand, ProductReview, ProductVariant
+from .models import Product, ProductVariant
 from .serializers import (
     ProductCategorySerializer, PublicProductListSerializer, PublicProductSerializer,
     BrandSerializer, ProductReviewSerializer, ProductVariantSerializer
@@ -26,10 +25,15 @@ from .enterprise_filters import (
     EnterpriseReviewFilter, EnterpriseVariantFilter
 )
 from .enterprise_cache import EnterpriseCacheManager, EnterpriseProductCache
-from .mixins import MedixMallFilterMixin, MedixMallDetailMixin, MedixMallContextMixin
+from .search import apply_relevance_boosts, get_search_backend
+from .autocomplete import get_autocomplete_index
+from .facets import compute_facets, parse_price_boundaries
+from .ratings import average_rating_expression, review_count_expression, review_stats
+from .related import get_related_products
+from .mixins import MedixMallFilterMixin, MedixMallDetailMixin, MedixMallContextMixin, SparseFieldsetMixin
 
 
-class EnterpriseProductListView(MedixMallFilterMixin, MedixMallContextMixin, generics.ListAPIView):
+class EnterpriseProductListView(SparseFieldsetMixin, MedixMallFilterMixin, MedixMallContextMixin, generics.ListAPIView):
     """
     Enterprise-optimized product list view with:
     - Advanced filtering and search
@@ -39,9 +43,9 @@ class EnterpriseProductListView(MedixMallFilterMixin, MedixMallContextMixin, gen
     """
     serializer_class = PublicProductListSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # ``search``/``q`` are handled by EnterpriseProductFilter through the search index
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = EnterpriseProductFilter
-    search_fields = ['name', 'description', 'sku']
     ordering_fields = ['price', 'created_at', 'name', 'stock']
     ordering = ['-created_at']
     
@@ -51,15 +55,11 @@ class EnterpriseProductListView(MedixMallFilterMixin, MedixMallContextMixin, gen
         """
         queryset = super().get_queryset()
         
-        # Optimize for list view - minimal prefetching
-        return queryset.select_related(
-            'category', 'brand', 'created_by'
-        ).prefetch_related(
-            'tags'
-        ).annotate(
-            # Add computed fields for better performance
-            review_count=Count('reviews'),
-            avg_rating=Avg('reviews__rating')
+        # Optimize for list view - everything the list serializer reads is joined
+        return PublicProductListSerializer.setup_eager_loading(queryset).annotate(
+            # Read from the denormalized rating summary (no GROUP BY over reviews)
+            review_count=review_count_expression(),
+            avg_rating=average_rating_expression()
         )
     
     def list(self, request, *args, **kwargs):
@@ -76,21 +76,15 @@ class EnterpriseProductListView(MedixMallFilterMixin, MedixMallContextMixin, gen
             filters, ordering, page, page_size
         )
         
-        # Try to get from cache first
-        cached_data = EnterpriseCacheManager.get_cached_data('product_list', cache_key)
-        if cached_data and not request.query_params.get('no_cache'):
-            return Response(cached_data)
-        
-        # If not in cache, get fresh data
-        response = super().list(request, *args, **kwargs)
-        
-        # Cache the response data
-        if response.status_code == 200:
-            EnterpriseCacheManager.set_cached_data(
-                'product_list', cache_key, response.data
-            )
+        def fetch():
+            return super(EnterpriseProductListView, self).list(request, *args, **kwargs).data
         
-        return response
+        # Single-flight, stale-while-revalidate cache read
+        data = EnterpriseCacheManager.get_or_compute(
+            'product_list', cache_key, fetch,
+            force_refresh=bool(request.query_params.get('no_cache'))
+        )
+        return Response(data)
     
     @swagger_auto_schema(
         operation_description="Get optimized list of products with enterprise-level filtering and caching",
@@ -128,13 +122,12 @@ class EnterpriseProductDetailView(MedixMallDetailMixin, MedixMallContextMixin, g
         """
         Heavily optimized queryset for detail view
         """
-        return super().get_queryset().prefetch_related(
-            Prefetch('variants', queryset=ProductVariant.objects.select_related().prefetch_related('attributes')),
-            Prefetch('images'),
-            Prefetch('reviews', queryset=ProductReview.objects.select_related('user')),
-            'medicine_details',
-            'equipment_details', 
-            'pathology_details'
+        # Variants, images and type details come from MedixMallDetailMixin
+        # (PublicProductSerializer.setup_eager_loading)
+        return super().get_queryset().select_related('rating_summary', 'related_products').prefetch_related(
+            Prefetch(
+                'variants', queryset=ProductVariant.objects.filter(is_active=True), to_attr='active_variants'
+            )
         )
     
     def retrieve(self, request, *args, **kwargs):
@@ -144,22 +137,18 @@ class EnterpriseProductDetailView(MedixMallDetailMixin, MedixMallContextMixin, g
         product_id = kwargs.get('pk')
         cache_key = EnterpriseProductCache.get_product_detail_cache_key(product_id)
         
-        # Try cache first
-        cached_data = EnterpriseCacheManager.get_cached_data('product_detail', cache_key)
-        if cached_data and not request.query_params.get('no_cache'):
-            return Response(cached_data)
-        
-        # Get fresh data
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        
-        # Add enhanced data
-        self._add_enhanced_product_data(data, instance)
-        
-        # Cache the response
-        EnterpriseCacheManager.set_cached_data('product_detail', cache_key, data)
+        def fetch():
+            instance = self.get_object()
+            data = self.get_serializer(instance).data
+            
+            # Add enhanced data
+            self._add_enhanced_product_data(data, instance)
+            return data
         
+        data = EnterpriseCacheManager.get_or_compute(
+            'product_detail', cache_key, fetch,
+            force_refresh=bool(request.query_params.get('no_cache'))
+        )
         return Response(data)
     
     def _add_enhanced_product_data(self, data, instance):
@@ -167,26 +156,15 @@ class EnterpriseProductDetailView(MedixMallDetailMixin, MedixMallContextMixin, g
         Add enhanced data to product detail response
         """
         # Review statistics
-        reviews = instance.reviews.all()
-        data['review_stats'] = {
-            'total_reviews': reviews.count(),
-            'average_rating': reviews.aggregate(avg=Avg('rating'))['avg'] or 0,
-            'rating_distribution': {
-                str(i): reviews.filter(rating=i).count() for i in range(1, 6)
-            }
-        }
+        data['review_stats'] = review_stats(instance)
         
-        # Related products
-        related_products = Product.objects.filter(
-            category=instance.category,
-            status__in=['approved', 'published'],
-            is_publish=True
-        ).exclude(id=instance.id).select_related('category', 'brand')[:4]
-        
-        data['related_products'] = PublicProductListSerializer(related_products, many=True).data
+        # Related products (precomputed neighbors)
+        data['related_products'] = PublicProductListSerializer(
+            get_related_products(instance), many=True
+        ).data
         
         # Price range for variants
-        variants = instance.variants.filter(is_active=True)
+        variants = instance.active_variants
         if variants:
             prices = [v.total_price for v in variants]
             data['price_range'] = {
@@ -223,6 +201,7 @@ class EnterpriseProductSearchView(MedixMallFilterMixin, MedixMallContextMixin, A
                             enum=['relevance', 'price_low', 'price_high', 'name_asc', 'name_desc', 'newest']),
             openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
             openapi.Parameter('page_size', openapi.IN_QUERY, description="Page size", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('price_buckets', openapi.IN_QUERY, description="Comma-separated price facet boundaries, e.g. 0,200,1000", type=openapi.TYPE_STRING),
         ]
     )
     def get(self, request):
@@ -255,8 +234,11 @@ class EnterpriseProductSearchView(MedixMallFilterMixin, MedixMallContextMixin, A
         page = int(request.query_params.get('page', 1))
         page_size = min(int(request.query_params.get('page_size', 20)), 100)  # Limit page size
         
+        price_buckets_param = request.query_params.get('price_buckets')
+        
         # Check cache
-        cache_key = EnterpriseProductCache.get_search_cache_key(query, filters, ordering, page)
+        cache_filters = dict(filters, price_buckets=price_buckets_param) if price_buckets_param else filters
+        cache_key = EnterpriseProductCache.get_search_cache_key(query, cache_filters, ordering, page)
         cached_data = EnterpriseCacheManager.get_cached_data('search_results', cache_key)
         
         if cached_data and not request.query_params.get('no_cache'):
@@ -288,7 +270,9 @@ class EnterpriseProductSearchView(MedixMallFilterMixin, MedixMallContextMixin, A
             'page_size': page_size,
             'results': serializer.data,
             'search_suggestions': self._get_search_suggestions(query),
-            'facets': self._get_search_facets(filtered_queryset)
+            'facets': self._get_search_facets(
+                filtered_queryset, parse_price_boundaries(price_buckets_param)
+            )
         }
         
         # Cache the results
@@ -298,10 +282,10 @@ class EnterpriseProductSearchView(MedixMallFilterMixin, MedixMallContextMixin, A
     
     def get_queryset(self):
         """Get base queryset with optimizations"""
-        queryset = Product.objects.filter(
+        queryset = PublicProductListSerializer.setup_eager_loading(Product.objects.filter(
             status__in=['approved', 'published'],
             is_publish=True
-        ).select_related('category', 'brand').prefetch_related('tags')
+        ))
         
         # Apply MedixMall filtering
         if hasattr(self, 'get_medixmall_mode') and self.get_medixmall_mode(self.request):
@@ -322,8 +306,12 @@ class EnterpriseProductSearchView(MedixMallFilterMixin, MedixMallContextMixin, A
     
     def _apply_sorting(self, queryset, sort_by, query=None):
         """Apply intelligent sorting"""
+        if sort_by == 'relevance' and query and 'search_score' in queryset.query.annotations:
+            # BM25 score plus exact-match, stock and rating boosts, ordered in SQL
+            return apply_relevance_boosts(queryset, query).order_by('-relevance', '-created_at')
+        
         sort_options = {
-            'relevance': ['-created_at'],  # Could be enhanced with search ranking
+            'relevance': ['-created_at'],
             'price_low': ['price', 'name'],
             'price_high': ['-price', 'name'],
             'name_asc': ['name'],
@@ -339,82 +327,32 @@ class EnterpriseProductSearchView(MedixMallFilterMixin, MedixMallContextMixin, A
     
     def _get_search_suggestions(self, query):
         """Get search suggestions based on query"""
-        # This could be enhanced with a proper search engine
         suggestions = []
         
         if len(query) >= 3:
-            # Find similar product names
-            similar_products = Product.objects.filter(
-                name__icontains=query,
-                status__in=['approved', 'published'],
-                is_publish=True
-            ).values_list('name', flat=True)[:5]
-            
-            suggestions.extend(list(similar_products))
+            # Top-ranked product names from the search index
+            suggestions.extend(_ranked_product_names(query, 5))
         
         return suggestions
     
-    def _get_search_facets(self, queryset):
-        """Get search facets for filtering"""
-        facets = {}
-        
-        # Category facets
-        category_facets = queryset.values('category__name', 'category__id').annotate(
-            count=Count('id')
-        ).order_by('-count')[:10]
-        
-        facets['categories'] = [
-            {'name': item['category__name'], 'id': item['category__id'], 'count': item['count']}
-            for item in category_facets if item['category__name']
-        ]
-        
-        # Brand facets
-        brand_facets = queryset.values('brand__name', 'brand__id').annotate(
-            count=Count('id')
-        ).order_by('-count')[:10]
-        
-        facets['brands'] = [
-            {'name': item['brand__name'], 'id': item['brand__id'], 'count': item['count']}
-            for item in brand_facets if item['brand__name']
-        ]
-        
-        # Product type facets
-        type_facets = queryset.values('product_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
-        facets['product_types'] = [
-            {'name': item['product_type'], 'count': item['count']}
-            for item in type_facets
-        ]
-        
-        # Price range facets
-        price_ranges = [
-            {'min': 0, 'max': 100, 'label': 'Under ₹100'},
-            {'min': 100, 'max': 500, 'label': '₹100 - ₹500'},
-            {'min': 500, 'max': 1000, 'label': '₹500 - ₹1000'},
-            {'min': 1000, 'max': 5000, 'label': '₹1000 - ₹5000'},
-            {'min': 5000, 'max': None, 'label': 'Above ₹5000'},
-        ]
-        
-        price_facets = []
-        for price_range in price_ranges:
-            filter_q = Q(price__gte=price_range['min'])
-            if price_range['max']:
-                filter_q &= Q(price__lte=price_range['max'])
-            
-            count = queryset.filter(filter_q).count()
-            if count > 0:
-                price_facets.append({
-                    'label': price_range['label'],
-                    'min': price_range['min'],
-                    'max': price_range['max'],
-                    'count': count
-                })
-        
-        facets['price_ranges'] = price_facets
-        
-        return facets
+    def _get_search_facets(self, queryset, price_boundaries=None):
+        """Get search facets for filtering (single aggregate query)"""
+        return compute_facets(queryset, price_boundaries)
+
+
+def _ranked_product_names(query, limit):
+    """Return up to ``limit`` published product names in search-rank order"""
+    if limit <= 0:
+        return []
+    ranked_ids = get_search_backend().search_ids(query, limit=limit * 4)
+    if not ranked_ids:
+        return []
+    names = dict(Product.objects.filter(
+        id__in=ranked_ids,
+        status__in=['approved', 'published'],
+        is_publish=True
+    ).values_list('id', 'name'))
+    return [names[pk] for pk in ranked_ids if pk in names][:limit]
 
 
 @api_view(['GET'])
@@ -438,43 +376,7 @@ def search_autocomplete(request):
     if len(query) < 2:
         return Response({'suggestions': []})
     
-    # Cache key for autocomplete
-    cache_key = f"autocomplete:{query}:{limit}"
-    cached_suggestions = cache.get(cache_key)
-    
-    if cached_suggestions:
-        return Response({'suggestions': cached_suggestions})
-    
-    suggestions = []
-    
-    # Product name suggestions
-    product_suggestions = Product.objects.filter(
-        name__icontains=query,
-        status__in=['approved', 'published'],
-        is_publish=True
-    ).values_list('name', flat=True)[:limit//2]
-    
-    suggestions.extend([{'text': name, 'type': 'product'} for name in product_suggestions])
-    
-    # Category suggestions
-    category_suggestions = ProductCategory.objects.filter(
-        name__icontains=query,
-        status__in=['approved', 'published'],
-        is_publish=True
-    ).values_list('name', flat=True)[:limit//4]
-    
-    suggestions.extend([{'text': name, 'type': 'category'} for name in category_suggestions])
-    
-    # Brand suggestions
-    brand_suggestions = Brand.objects.filter(
-        name__icontains=query,
-        status__in=['approved', 'published'],
-        is_publish=True
-    ).values_list('name', flat=True)[:limit//4]
-    
-    suggestions.extend([{'text': name, 'type': 'brand'} for name in brand_suggestions])
-    
-    # Cache suggestions for 5 minutes
-    cache.set(cache_key, suggestions, 300)
+    # Served from the in-process prefix index; no database access per keystroke
+    suggestions = get_autocomplete_index().suggest(query, limit)
     
     return Response({'suggestions': suggestions})
\ No newline at end of file
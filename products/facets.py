@@ -0,0 +1,135 @@
+"""
+Single-pass facet computation for product result sets.
+
+All facets (category, brand, product type, price range, medicine form and
+prescription requirement) come from one GROUP BY over the filtered queryset:
+each row of the result is a distinct combination of facet values with its
+product count, and the per-facet counts are summed up in Python. The number
+of combinations is bounded by the catalog taxonomy, not by the result size.
+"""
+
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Sequence
+
+from django.db.models import Case, Count, IntegerField, Value, When
+
+# Default price bucket boundaries (₹): <100, 100-500, 500-1000, 1000-5000, 5000+
+DEFAULT_PRICE_BOUNDARIES = (0, 100, 500, 1000, 5000)
+
+MAX_PRICE_BOUNDARIES = 20
+TOP_FACET_VALUES = 10
+
+
+def parse_price_boundaries(value: Optional[str]) -> Sequence[Decimal]:
+    """
+    Parse a ``price_buckets`` query value such as ``"0,200,1000"`` into
+    sorted, de-duplicated boundaries. Falls back to the defaults when the
+    value is missing or malformed.
+    """
+    if not value:
+        return DEFAULT_PRICE_BOUNDARIES
+    try:
+        boundaries = sorted({Decimal(part.strip()) for part in value.split(',') if part.strip()})
+    except InvalidOperation:
+        return DEFAULT_PRICE_BOUNDARIES
+    boundaries = [b for b in boundaries if b >= 0][:MAX_PRICE_BOUNDARIES]
+    return boundaries or DEFAULT_PRICE_BOUNDARIES
+
+
+def _format_amount(amount) -> str:
+    amount = Decimal(amount)
+    return f"{amount:.0f}" if amount == amount.to_integral_value() else f"{amount:.2f}"
+
+
+def price_buckets(boundaries: Sequence) -> List[dict]:
+    """
+    Turn boundaries into ``[min, max)`` buckets with display labels;
+    the last bucket is open-ended
+    """
+    buckets = []
+    for index, lower in enumerate(boundaries):
+        upper = boundaries[index + 1] if index + 1 < len(boundaries) else None
+        if upper is None:
+            label = f"Above ₹{_format_amount(lower)}"
+        elif lower == 0:
+            label = f"Under ₹{_format_amount(upper)}"
+        else:
+            label = f"₹{_format_amount(lower)} - ₹{_format_amount(upper)}"
+        buckets.append({'min': lower, 'max': upper, 'label': label})
+    return buckets
+
+
+def _bucket_expression(buckets: List[dict]):
+    whens = [
+        When(price__lt=bucket['max'], then=Value(index))
+        for index, bucket in enumerate(buckets) if bucket['max'] is not None
+    ]
+    return Case(*whens, default=Value(len(buckets) - 1), output_field=IntegerField())
+
+
+def compute_facets(queryset, price_boundaries: Optional[Sequence] = None) -> Dict[str, list]:
+    """
+    Compute all search facets for ``queryset`` with a single aggregate query
+    """
+    buckets = price_buckets(price_boundaries or DEFAULT_PRICE_BOUNDARIES)
+
+    rows = (
+        queryset.order_by()
+        .prefetch_related(None)
+        .filter(price__gte=buckets[0]['min'])
+        .annotate(price_bucket=_bucket_expression(buckets))
+        .values(
+            'category_id', 'category__name', 'brand_id', 'brand__name', 'product_type',
+            'price_bucket', 'medicine_details__form', 'medicine_details__prescription_required',
+        )
+        .annotate(count=Count('id'))
+    )
+
+    categories = defaultdict(int)
+    brands = defaultdict(int)
+    types = defaultdict(int)
+    bucket_counts = defaultdict(int)
+    forms = defaultdict(int)
+    prescription = defaultdict(int)
+    names = {}
+
+    for row in rows:
+        count = row['count']
+        if row['category__name']:
+            categories[row['category_id']] += count
+            names[('category', row['category_id'])] = row['category__name']
+        if row['brand__name']:
+            brands[row['brand_id']] += count
+            names[('brand', row['brand_id'])] = row['brand__name']
+        types[row['product_type']] += count
+        bucket_counts[row['price_bucket']] += count
+        if row['medicine_details__form']:
+            forms[row['medicine_details__form']] += count
+        if row['medicine_details__prescription_required'] is not None:
+            prescription[row['medicine_details__prescription_required']] += count
+
+    def _top(counts, kind):
+        ordered = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:TOP_FACET_VALUES]
+        return [{'name': names[(kind, pk)], 'id': pk, 'count': count} for pk, count in ordered]
+
+    return {
+        'categories': _top(categories, 'category'),
+        'brands': _top(brands, 'brand'),
+        'product_types': [
+            {'name': name, 'count': count}
+            for name, count in sorted(types.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'price_ranges': [
+            {**bucket, 'count': bucket_counts[index]}
+            for index, bucket in enumerate(buckets) if bucket_counts[index]
+        ],
+        'medicine_forms': [
+            {'name': name, 'count': count}
+            for name, count in sorted(forms.items(), key=lambda item: (-item[1], item[0]))[:TOP_FACET_VALUES]
+        ],
+        'prescription_required': [
+            {'value': value, 'count': count}
+            for value, count in sorted(prescription.items(), reverse=True)
+        ],
+    }
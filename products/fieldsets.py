@@ -0,0 +1,130 @@
+"""
+Sparse fieldsets for product list endpoints.
+
+``?fields=name,price`` keeps only the listed fields of
+PublicProductListSerializer, ``?exclude=description,specifications`` drops
+fields, and ``?profile=compact`` selects a predefined set (grid tiles:
+name, price, image, MRP). The queryset follows the selection: only the
+selected columns are loaded and only the selected relations joined.
+
+When every selected field is a plain column (as in ``compact``) rows are
+read with ``values_list(named=True)`` and turned into dicts directly,
+without the serializer; values are rendered exactly as the serializer
+fields would.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .serializers import PublicProductListSerializer
+
+PRODUCT_LIST_PROFILES = {
+    'compact': ('id', 'name', 'slug', 'price', 'image', 'mrp'),  # serializer order
+}
+
+FIELDS_PARAM, EXCLUDE_PARAM, PROFILE_PARAM = 'fields', 'exclude', 'profile'
+
+# Always loaded: keyset cursors and the catalog snapshot read these off the rows
+ROW_COLUMNS = ('pk', 'id', 'created_at', 'price', 'name')
+
+_SERIALIZER_FIELDS = PublicProductListSerializer().fields
+AVAILABLE_FIELDS: Tuple[str, ...] = tuple(_SERIALIZER_FIELDS)
+# Nested serializers: joined with select_related, their own fields loaded
+RELATION_FIELDS = {
+    name: tuple(field.Meta.fields)
+    for name, field in _SERIALIZER_FIELDS.items()
+    if isinstance(field, serializers.BaseSerializer)
+}
+# Fields rendered through to_representation; the rest are passed through
+_CONVERTED_TYPES = (serializers.DecimalField, serializers.DateTimeField, serializers.DateField)
+
+
+def _split(value: str) -> Tuple[str, ...]:
+    return tuple(name.strip() for name in value.split(',') if name.strip())
+
+
+def parse_product_fields(params) -> Optional[Tuple[str, ...]]:
+    """
+    Field names selected by the query parameters, in serializer order, or
+    None for the full representation; raises ValidationError for unknown
+    names or profiles
+    """
+    profile = params.get(PROFILE_PARAM)
+    if profile:
+        if profile not in PRODUCT_LIST_PROFILES:
+            raise ValidationError({
+                PROFILE_PARAM: f"Unknown profile '{profile}'. Choose from: {', '.join(sorted(PRODUCT_LIST_PROFILES))}"
+            })
+        selected = PRODUCT_LIST_PROFILES[profile]
+    elif params.get(FIELDS_PARAM):
+        selected = _split(params[FIELDS_PARAM])
+    elif params.get(EXCLUDE_PARAM):
+        selected = AVAILABLE_FIELDS
+    else:
+        return None
+
+    excluded = _split(params.get(EXCLUDE_PARAM, ''))
+    unknown = (set(selected) | set(excluded)) - set(AVAILABLE_FIELDS)
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: f"Unknown fields: {', '.join(sorted(unknown))}"})
+    return tuple(name for name in AVAILABLE_FIELDS if name in selected and name not in excluded)
+
+
+def is_flat(fields: Iterable[str]) -> bool:
+    """True when no selected field needs a join"""
+    return not set(fields) & set(RELATION_FIELDS)
+
+
+def sparse_product_queryset(queryset, fields: Optional[Tuple[str, ...]]):
+    """
+    ``queryset`` loading only what ``fields`` needs: named rows for flat
+    selections, otherwise instances with ``only()`` and the selected joins
+    """
+    if fields is None:
+        return queryset
+    columns = [name for name in fields if name not in RELATION_FIELDS]
+    if is_flat(fields):
+        return queryset.select_related(None).values_list(
+            *dict.fromkeys([*ROW_COLUMNS, *columns]), named=True
+        )
+    relations = [name for name in fields if name in RELATION_FIELDS]
+    related_columns = [f'{name}__{column}' for name in relations for column in RELATION_FIELDS[name]]
+    return queryset.select_related(None).select_related(*relations).only(
+        *dict.fromkeys([*ROW_COLUMNS[1:], *columns, *related_columns])
+    )
+
+
+def _converters(fields: Tuple[str, ...]) -> Dict[str, object]:
+    return {
+        name: _SERIALIZER_FIELDS[name].to_representation
+        for name in fields
+        if isinstance(_SERIALIZER_FIELDS[name], _CONVERTED_TYPES)
+    }
+
+
+def rows_to_dicts(rows, fields: Tuple[str, ...]):
+    """Serializer-equivalent dicts of named rows, one ``getattr`` per field"""
+    converters = _converters(fields)
+    data = []
+    for row in rows:
+        item = {}
+        for name in fields:
+            value = getattr(row, name)
+            converter = converters.get(name)
+            item[name] = converter(value) if converter is not None and value is not None else value
+        data.append(item)
+    return data
+
+
+class FlatRowSerializer:
+    """Stand-in for ``PublicProductListSerializer(rows, many=True)`` on named rows"""
+
+    def __init__(self, rows, fields: Tuple[str, ...]):
+        self.rows = rows
+        self.fields = fields
+
+    @property
+    def data(self):
+        return rows_to_dicts(self.rows, self.fields)
@@ -0,0 +1,139 @@
+"""
+Unique slug and SKU allocation.
+
+Slugs are ``<base>``, then ``<base>-1``, ``<base>-2``...; product SKUs are
+``<NAME>-<8 hex>`` and variant SKUs ``<PRODUCT SKU>-<8 hex>``. Allocating for
+a whole chunk of rows costs one collision query: every base in the chunk is
+checked at once and free values are handed out in memory.
+
+Single saves use the same allocators from the pre_save handlers in
+``products.models``; nothing is locked, so ``save_with_identifiers`` retries
+the save with fresh values when the unique index rejects one.
+"""
+
+import uuid
+from collections import defaultdict
+from typing import Iterable, List, Sequence
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+SLUG_BASE_LENGTH = 50
+SKU_BASE_LENGTH = 20
+VARIANT_SKU_BASE_LENGTH = 10
+
+
+def slug_base(value: str) -> str:
+    return slugify(value or '')[:SLUG_BASE_LENGTH] or uuid.uuid4().hex[:8]
+
+
+def product_sku_base(name: str) -> str:
+    return slugify(name or '')[:SKU_BASE_LENGTH].upper() or 'PRD'
+
+
+def variant_sku_base(product) -> str:
+    return (product.sku or slugify(product.name)[:VARIANT_SKU_BASE_LENGTH].upper() or 'PRD').upper()
+
+
+def random_sku(base: str) -> str:
+    return f'{base}-{uuid.uuid4().hex[:8].upper()}'
+
+
+def _suffix(value: str, base: str):
+    """``n`` for ``<base>-<n>``, 0 for ``base`` itself, None otherwise"""
+    if value == base:
+        return 0
+    tail = value[len(base) + 1:]
+    return int(tail) if value.startswith(f'{base}-') and tail.isdigit() else None
+
+
+def allocate_slugs(queryset, values: Sequence[str], slug_field: str = 'slug') -> List[str]:
+    """
+    Unique slugs for ``values`` (in order), with one query for all of them
+    """
+    bases = [slug_base(value) for value in values]
+    if not bases:
+        return []
+    lookup = Q()
+    for base in set(bases):
+        lookup |= Q(**{slug_field: base}) | Q(**{f'{slug_field}__startswith': f'{base}-'})
+    base_set = set(bases)
+    taken = defaultdict(set)
+    for slug in queryset.filter(lookup).values_list(slug_field, flat=True):
+        # ``slug`` is either a base itself or ``<base>-<n>``
+        for base in (slug, slug.rsplit('-', 1)[0]):
+            suffix = _suffix(slug, base) if base in base_set else None
+            if suffix is not None:
+                taken[base].add(suffix)
+
+    slugs = []
+    next_suffix = {}
+    for base in bases:
+        suffix = next_suffix.get(base, 0)
+        while suffix in taken[base]:
+            suffix += 1
+        taken[base].add(suffix)
+        next_suffix[base] = suffix + 1
+        slugs.append(base if suffix == 0 else f'{base}-{suffix}')
+    return slugs
+
+
+def allocate_skus(queryset, bases: Iterable[str], sku_field: str = 'sku') -> List[str]:
+    """
+    Random SKUs for ``bases`` (in order); one query unless a candidate clashes
+    """
+    bases = list(bases)
+    candidates = [random_sku(base) for base in bases]
+    pending = list(range(len(candidates)))
+    while pending:
+        checked = [candidates[index] for index in pending]
+        clashes = set(queryset.filter(**{f'{sku_field}__in': checked}).values_list(sku_field, flat=True))
+        pending_set = set(pending)
+        seen = {candidate for index, candidate in enumerate(candidates) if index not in pending_set}
+        retry = []
+        for index in pending:
+            candidate = candidates[index]
+            if candidate in clashes or candidate in seen:
+                candidates[index] = random_sku(bases[index])
+                retry.append(index)
+            else:
+                seen.add(candidate)
+        pending = retry
+    return candidates
+
+
+# ----- single saves -----
+
+MAX_SAVE_ATTEMPTS = 3
+
+
+def mark_generated(instance, field: str, value) -> None:
+    """Assign a generated identifier, remembering it may be re-allocated"""
+    generated = instance.__dict__.setdefault('_generated_identifiers', {})
+    generated.setdefault(field, getattr(instance, field))
+    setattr(instance, field, value)
+
+
+def save_with_identifiers(instance, fields: Sequence[str], save, *args, **kwargs):
+    """
+    Run ``save`` and retry with fresh identifiers on an IntegrityError.
+
+    Generated slugs/SKUs are not reserved up front, so a concurrent writer can
+    take the same value between allocation and INSERT; the unique index is the
+    arbiter and the loser simply allocates again. Instances whose ``fields``
+    are all set already are saved as-is, without the extra savepoint.
+    """
+    if all(getattr(instance, field) for field in fields):
+        return save(*args, **kwargs)
+    for attempt in range(1, MAX_SAVE_ATTEMPTS + 1):
+        instance._generated_identifiers = {}
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            generated = instance._generated_identifiers
+            if not generated or attempt == MAX_SAVE_ATTEMPTS:
+                raise
+            for field, original in generated.items():
+                setattr(instance, field, original)
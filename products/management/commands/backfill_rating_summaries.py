@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from products.models import ProductRatingSummary, ProductReview
+from products.ratings import RATINGS, summary_rows
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized product rating summaries from the reviews table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of summary rows written per INSERT',
+        )
+
+    def handle(self, *args, **options):
+        fields = ['review_count', 'rating_sum'] + [f'rating_{rating}' for rating in RATINGS]
+        summaries = [ProductRatingSummary(**row) for row in summary_rows()]
+
+        with transaction.atomic():
+            ProductRatingSummary.objects.bulk_create(
+                summaries,
+                batch_size=options['batch_size'],
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=fields,
+            )
+            stale, _ = ProductRatingSummary.objects.filter(
+                ~Exists(ProductReview.objects.filter(product_id=OuterRef('product_id')))
+            ).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {len(summaries)} rating summaries, removed {stale} stale"
+        ))
@@ -0,0 +1,124 @@
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from products.models import Product, ProductCategory, ProductVariant, SupplierProductPrice
+from products.pricing import get_price_cache, query_prices, resolve_prices
+
+DISTRICTS = ['Central Delhi', 'South Delhi', 'Mumbai City', 'Pune', 'Bengaluru Urban']
+
+
+class _Rollback(Exception):
+    pass
+
+
+def naive_prices(variant_ids, pincode, district):
+    """Per-variant lookups (pincode, then district, then any region), for comparison"""
+    prices = {}
+    for variant in ProductVariant.objects.filter(pk__in=variant_ids).select_related('product'):
+        rows = SupplierProductPrice.objects.filter(product_variant=variant).order_by('price')
+        row = (
+            rows.filter(pincode=pincode).first()
+            or rows.filter(district__iexact=district, pincode__isnull=True).first()
+            or rows.filter(pincode__isnull=True, district__isnull=True).first()
+        )
+        prices[variant.pk] = row.price if row else variant.total_price
+    return prices
+
+
+class Command(BaseCommand):
+    help = 'Benchmark supplier price resolution on a generated dataset (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Supplier price rows to generate')
+        parser.add_argument('--variants', type=int, default=2000, help='Variants the rows are spread over')
+        parser.add_argument('--batch-size', type=int, default=50, help='Variants resolved per call')
+        parser.add_argument('--rounds', type=int, default=20, help='Batches timed per strategy')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                variant_ids, pincodes = self._seed(options['rows'], options['variants'])
+                self._run(variant_ids, pincodes, options['batch_size'], options['rounds'])
+                raise _Rollback
+        except _Rollback:
+            pass
+        get_price_cache().clear()
+
+    def _seed(self, rows, variant_count):
+        started = time.monotonic()
+        token = uuid.uuid4().hex[:8]
+        User = get_user_model()
+        per_variant = max(1, rows // variant_count)
+        suppliers = User.objects.bulk_create([
+            User(email=f'bench-{token}-{index}@example.com', full_name=f'Bench Supplier {index}', role='supplier')
+            for index in range(per_variant)
+        ])
+        owner = suppliers[0]
+        category = ProductCategory.objects.create(name=f'Price benchmark {token}', created_by=owner)
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'Bench product {index}', slug=f'bench-{token}-{index}', sku=f'BENCH-{token}-{index}',
+                category=category, created_by=owner, price=Decimal(100 + index % 400),
+            )
+            for index in range(variant_count)
+        ])
+        variants = ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, sku=f'{product.sku}-V') for product in products
+        ])
+
+        pincodes = [(str(110001 + index), DISTRICTS[index % len(DISTRICTS)]) for index in range(50)]
+        prices = []
+        for variant_index, variant in enumerate(variants):
+            for supplier_index, supplier in enumerate(suppliers):
+                kind = supplier_index % 5
+                pincode, district = pincodes[(variant_index + supplier_index) % len(pincodes)]
+                prices.append(SupplierProductPrice(
+                    supplier=supplier, product_variant=variant,
+                    price=Decimal(random.randint(50, 500)),
+                    pincode=pincode if kind < 3 else None,
+                    district=district if kind < 4 else None,
+                ))
+        SupplierProductPrice.objects.bulk_create(prices, batch_size=5000)
+        self.stdout.write(
+            f"Seeded {len(prices)} supplier prices over {len(variants)} variants "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+        return [variant.pk for variant in variants], pincodes
+
+    def _run(self, variant_ids, pincodes, batch_size, rounds):
+        batches = [
+            (random.sample(variant_ids, min(batch_size, len(variant_ids))), *random.choice(pincodes))
+            for _ in range(rounds)
+        ]
+
+        def measure(label, resolve):
+            started = time.monotonic()
+            with CaptureQueriesContext(connection) as queries:
+                results = [resolve(ids, pincode, district) for ids, pincode, district in batches]
+            elapsed = (time.monotonic() - started) / len(batches)
+            self.stdout.write(
+                f"{label:<24} {elapsed * 1000:8.2f} ms/batch {len(queries) / len(batches):8.1f} queries/batch"
+            )
+            return results
+
+        expected = measure('naive per-variant', naive_prices)
+        get_price_cache().clear()
+        fresh = measure('resolver (one query)', query_prices)
+        measure('resolver (LRU, cold)', resolve_prices)
+        measure('resolver (LRU, warm)', resolve_prices)
+
+        mismatches = sum(
+            1
+            for naive, resolved in zip(expected, fresh)
+            for variant_id, price in naive.items()
+            if resolved[variant_id].price != price
+        )
+        style = self.style.SUCCESS if not mismatches else self.style.ERROR
+        self.stdout.write(style(f"{mismatches} price mismatches between naive and resolver results"))
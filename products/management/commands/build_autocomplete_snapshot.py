@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from products.autocomplete import AutocompleteIndex, rebuild_autocomplete_index
+
+
+class Command(BaseCommand):
+    help = 'Write a snapshot of the autocomplete index so workers can start without rebuilding it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=getattr(settings, 'PRODUCT_AUTOCOMPLETE_SNAPSHOT', None),
+            help='Snapshot path (defaults to settings.PRODUCT_AUTOCOMPLETE_SNAPSHOT)',
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if not output:
+            raise CommandError('No output path given and PRODUCT_AUTOCOMPLETE_SNAPSHOT is not set')
+
+        index = rebuild_autocomplete_index(AutocompleteIndex())
+        index.save_snapshot(output)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(index)} autocomplete entries to {output}"))
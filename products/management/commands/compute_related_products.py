@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from products.related import refresh_related_products, stale_product_ids
+
+
+class Command(BaseCommand):
+    help = 'Precompute related products from category, brand, co-purchase and co-view signals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only recompute products without a neighbor list or touched since the last run',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of products scored per batch',
+        )
+
+    def handle(self, *args, **options):
+        product_ids = stale_product_ids() if options['incremental'] else None
+        count = refresh_related_products(product_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Computed related products for {count} products"))
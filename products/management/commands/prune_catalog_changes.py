@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from products.change_feed import prune_changes
+
+
+class Command(BaseCommand):
+    help = 'Delete catalog change feed entries older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Keep entries from the last N days',
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} catalog change entries"))
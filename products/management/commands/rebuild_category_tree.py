@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.categories import rebuild_category_counts, rebuild_category_paths
+
+
+class Command(BaseCommand):
+    help = 'Recompute category materialized paths and the denormalized product counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of categories written per UPDATE batch',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_category_paths(batch_size=options['batch_size'])
+            rebuild_category_counts()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt paths and product counts of {total} categories"))
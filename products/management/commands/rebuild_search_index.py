@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of products loaded per database round-trip',
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        products = Product.objects.select_related(
+            'brand', 'category', 'medicine_details', 'equipment_details', 'pathology_details'
+        ).prefetch_related('tags').order_by('pk')
+
+        self.stdout.write(f"Rebuilding search index with {backend.__class__.__name__}...")
+        count = backend.rebuild(products.iterator(chunk_size=options['chunk_size']))
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products"))
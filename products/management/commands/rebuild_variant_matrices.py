@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.variant_matrix import rebuild_variant_matrices
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed variant selection matrix of every product'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of products computed and written per batch',
+        )
+
+    def handle(self, *args, **options):
+        product_ids = Product.objects.values_list('pk', flat=True)
+        count = rebuild_variant_matrices(product_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt variant matrices of {count} products"))
@@ -1,12 +1,8 @@
-import json
 import os
-from decimal import Decimal
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from products.models import (
-    Product, ProductCategory, Brand, ProductVariant, ProductAttribute, 
-    ProductAttributeValue, MedicineDetails, EquipmentDetails, PathologyDetails
-)
+from products.models import Product, ProductAttribute
+from products.bulk_import import DEFAULT_CHUNK_SIZE, CatalogImporter, iter_json_records
 from accounts.models import upload_to_imagekit
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
@@ -26,6 +22,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Delete existing products before seeding',
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Rows written per bulk INSERT',
+        )
 
     def handle(self, *args, **options):
         if options['reset']:
@@ -60,132 +62,36 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'Variants file not found: {variants_file}'))
             return
 
-        with open(products_file, 'r') as f:
-            products_data = json.load(f)
-
-        with open(variants_file, 'r') as f:
-            variants_data = json.load(f)
-
-        self.stdout.write(f'Loaded {len(products_data)} products and {len(variants_data)} variants')
-
-        # Create products
-        created_products = {}
-        for product_data in products_data:
-            try:
-                # Get category and brand
-                category = ProductCategory.objects.get(id=product_data['category_id'])
-                brand = None
-                if product_data.get('brand_id'):
-                    brand = Brand.objects.get(id=product_data['brand_id'])
-
-                # Get optimized image URL
-                image_url = self.get_product_image_url(product_data)
-
-                # Create product
-                product = Product.objects.create(
-                    name=product_data['name'],
-                    category=category,
-                    brand=brand,
-                    description=product_data.get('description', ''),
-                    image=image_url,
-                    price=Decimal(str(product_data.get('price', '0.00'))),
-                    stock=product_data.get('stock', 0),
-                    product_type=product_data.get('product_type', 'medicine'),
-                    status=product_data.get('status', 'published'),
-                    is_publish=product_data.get('is_publish', True),
-                    created_by=admin_user,
-                    specifications=product_data.get('specifications', {})
-                )
-
-                # Create type-specific details
-                if product.product_type == 'medicine' and 'medicine_details' in product_data:
-                    med_data = product_data['medicine_details']
-                    MedicineDetails.objects.create(
-                        product=product,
-                        composition=med_data.get('composition', ''),
-                        quantity=med_data.get('quantity', ''),
-                        manufacturer=med_data.get('manufacturer', ''),
-                        prescription_required=med_data.get('prescription_required', False),
-                        form=med_data.get('form', ''),
-                        pack_size=med_data.get('pack_size', ''),
-                        batch_number=med_data.get('batch_number', f'BATCH{product.id:06d}')
-                    )
-                elif product.product_type == 'equipment' and 'equipment_details' in product_data:
-                    eq_data = product_data['equipment_details']
-                    EquipmentDetails.objects.create(
-                        product=product,
-                        model_number=eq_data.get('model_number', ''),
-                        warranty_period=eq_data.get('warranty_period', ''),
-                        usage_type=eq_data.get('usage_type', ''),
-                        technical_specifications=eq_data.get('technical_specifications', ''),
-                        power_requirement=eq_data.get('power_requirement', ''),
-                        equipment_type=eq_data.get('equipment_type', '')
-                    )
-                elif product.product_type == 'pathology' and 'pathology_details' in product_data:
-                    path_data = product_data['pathology_details']
-                    PathologyDetails.objects.create(
-                        product=product,
-                        compatible_tests=path_data.get('test_type', ''),
-                        chemical_composition=path_data.get('test_method', ''),
-                        storage_condition=path_data.get('storage_condition', 'Store as per manufacturer guidelines')
-                    )
-
-                created_products[product_data['name']] = product
-                self.stdout.write(f'✅ Created product: {product.name} with image: {product.image}')
-
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'❌ Error creating product {product_data.get("name", "Unknown")}: {str(e)}'))
-                continue
-
-        self.stdout.write(f'✅ Created {len(created_products)} products')
+        # Both files are streamed and written in chunks; caches are flushed once at the end
+        with CatalogImporter(admin_user, chunk_size=options['chunk_size']) as importer:
+            with open(products_file, 'rb') as f:
+                importer.import_products(self.product_record(data) for data in iter_json_records(f))
+            products_report = importer.report.as_dict()
+            with open(variants_file, 'rb') as f:
+                importer.import_variants(iter_json_records(f))
 
-        # Create variants
-        created_variants = 0
-        for variant_data in variants_data:
-            try:
-                product_name = variant_data.get('product_name', '')
-                if product_name not in created_products:
-                    self.stdout.write(self.style.WARNING(f'⚠️ Product "{product_name}" not found for variant, skipping...'))
-                    continue
+        report = importer.report.as_dict()
+        for error in report['errors']:
+            self.stdout.write(self.style.ERROR(f'❌ {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 Successfully created {products_report['created']} products and "
+            f"{report['created'] - products_report['created']} variants "
+            f"({report['rows']} rows in {report['elapsed']}s, {report['rows_per_second']} rows/sec)"
+        ))
 
-                product = created_products[product_name]
-
-                # Create variant
-                variant = ProductVariant.objects.create(
-                    product=product,
-                    sku=variant_data.get('sku', f'VAR{product.id}001'),
-                    price=Decimal(str(variant_data.get('price', '0.00'))),
-                    additional_price=Decimal(str(variant_data.get('additional_price', '0.00'))),
-                    stock=variant_data.get('stock', 0),
-                    is_active=True
-                )
-
-                # Create and assign attributes
-                for attr_data in variant_data.get('attributes', []):
-                    attr_name = attr_data.get('name', '')
-                    attr_value = attr_data.get('value', '')
-                    
-                    if attr_name and attr_value:
-                        # Get or create attribute
-                        attribute, _ = ProductAttribute.objects.get_or_create(name=attr_name)
-                        
-                        # Get or create attribute value
-                        attr_value_obj, _ = ProductAttributeValue.objects.get_or_create(
-                            attribute=attribute,
-                            value=attr_value
-                        )
-                        
-                        # Assign to variant
-                        variant.attributes.add(attr_value_obj)
-
-                created_variants += 1
-                self.stdout.write(f'✅ Created variant: {variant.sku} for {product.name}')
-
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'❌ Error creating variant: {str(e)}'))
-                continue
-
-        self.stdout.write(self.style.SUCCESS(f'🎉 Successfully created {len(created_products)} products and {created_variants} variants!'))
+    def product_record(self, product_data):
+        """Seed file record -> import record (image upload, pathology field names)"""
+        record = dict(product_data)
+        record['image'] = self.get_product_image_url(product_data)
+        record.setdefault('product_type', 'medicine')
+        if 'pathology_details' in record:
+            path_data = record['pathology_details']
+            record['pathology_details'] = {
+                'compatible_tests': path_data.get('test_type', ''),
+                'chemical_composition': path_data.get('test_method', ''),
+                'storage_condition': path_data.get('storage_condition', 'Store as per manufacturer guidelines'),
+            }
+        return record
 
     def create_optimized_product_image(self, product_name, product_type='medicine', size=800, quality=85):
         """Create a highly optimized product image based on product type with higher resolution for detail views"""
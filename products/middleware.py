@@ -110,3 +110,18 @@ class QueryOptimizationMiddleware:
             response['X-Query-Count'] = str(query_count)
             
         return response
+
+
+class AuditLogMiddleware:
+    """
+    Buffer the request's product audit entries and write them in one batch
+    (see products/audit.py)
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from .audit import audit_batch
+
+        with audit_batch():
+            return self.get_response(request)
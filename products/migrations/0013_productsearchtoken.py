@@ -0,0 +1,101 @@
+# Generated by Django 5.2 on 2026-10-16 20:37
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import migrations, models
+
+# Frozen copy of the products.search indexing rules
+SEARCH_FIELD_WEIGHTS = {
+    'name': 100, 'sku': 90, 'brand': 80, 'category': 70, 'description': 60, 'details': 50, 'tags': 30,
+}
+MAX_TOKEN_LENGTH = 64
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [token[:MAX_TOKEN_LENGTH] for token in TOKEN_RE.findall(str(text).lower())]
+
+
+def related_or_none(product, attr):
+    try:
+        return getattr(product, attr)
+    except ObjectDoesNotExist:
+        return None
+
+
+def build_document(product):
+    details = []
+    medicine = related_or_none(product, 'medicine_details')
+    if medicine:
+        details.extend([medicine.composition, medicine.manufacturer, medicine.form])
+    equipment = related_or_none(product, 'equipment_details')
+    if equipment:
+        details.extend([
+            equipment.model_number, equipment.equipment_type,
+            equipment.usage_type, equipment.technical_specifications,
+        ])
+    pathology = related_or_none(product, 'pathology_details')
+    if pathology:
+        details.extend([pathology.compatible_tests, pathology.chemical_composition])
+    return {
+        'name': product.name,
+        'sku': product.sku,
+        'brand': product.brand.name if product.brand_id else '',
+        'category': product.category.name if product.category_id else '',
+        'description': product.description,
+        'details': ' '.join(filter(None, details)),
+        'tags': ' '.join(tag.name for tag in product.tags.all()),
+    }
+
+
+def backfill_search_tokens(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductSearchToken = apps.get_model('products', 'ProductSearchToken')
+    products = Product.objects.select_related(
+        'brand', 'category', 'medicine_details', 'equipment_details', 'pathology_details'
+    ).prefetch_related('tags').order_by('pk')
+    rows = []
+    for product in products.iterator(chunk_size=500):
+        for field, text in build_document(product).items():
+            tokens = tokenize(text)
+            for token, frequency in Counter(tokens).items():
+                rows.append(ProductSearchToken(
+                    product_id=product.pk, field=field, token=token, weight=SEARCH_FIELD_WEIGHTS[field],
+                    frequency=frequency, field_length=len(tokens),
+                ))
+        if len(rows) >= 5000:
+            ProductSearchToken.objects.bulk_create(rows, batch_size=1000)
+            rows = []
+    ProductSearchToken.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_product_mrp_productvariant_mrp_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=20)),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('frequency', models.PositiveSmallIntegerField(default=1)),
+                ('field_length', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'product'], name='products_pr_token_28f114_idx')],
+                'unique_together': {('product', 'field', 'token')},
+            },
+        ),
+        migrations.RunPython(backfill_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-16 21:03
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_category_tree(apps, schema_editor):
+    ProductCategory = apps.get_model('products', 'ProductCategory')
+    Product = apps.get_model('products', 'Product')
+    parents = dict(ProductCategory.objects.order_by().values_list('id', 'parent_id'))
+    counts = dict(
+        Product.objects.filter(status__in=['approved', 'published'], is_publish=True, stock__gt=0)
+        .order_by().values('category_id').annotate(total=Count('id'))
+        .values_list('category_id', 'total')
+    )
+    paths = {}
+
+    def path_of(pk):
+        chain = []
+        while pk is not None and pk not in paths and pk not in chain:
+            chain.append(pk)
+            pk = parents.get(pk)
+        prefix = paths.get(pk, '/')
+        for node in reversed(chain):
+            prefix = paths[node] = f'{prefix}{node}/'
+        return prefix
+
+    categories = []
+    for pk in parents:
+        path = path_of(pk)
+        categories.append(ProductCategory(
+            pk=pk, path=path, depth=path.count('/') - 2, product_count=counts.get(pk, 0)
+        ))
+    ProductCategory.objects.bulk_update(categories, ['path', 'depth', 'product_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_relatedproducts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productcategory',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='productcategory',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_category_tree, migrations.RunPython.noop),
+    ]
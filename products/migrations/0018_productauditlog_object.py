@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-16 21:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_category_tree'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productauditlog',
+            name='changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='productauditlog',
+            name='object_type',
+            field=models.CharField(choices=[('product', 'Product'), ('variant', 'Product Variant'), ('supplier_price', 'Supplier Price')], default='product', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='productauditlog',
+            name='object_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='productauditlog',
+            index=models.Index(fields=['object_type', 'object_id'], name='products_pr_object__13a6f1_idx'),
+        ),
+    ]
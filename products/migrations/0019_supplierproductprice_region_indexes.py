@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-16 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_productauditlog_object'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplierproductprice',
+            index=models.Index(fields=['product_variant', 'pincode', 'price'], name='products_su_product_10d7fe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplierproductprice',
+            index=models.Index(fields=['product_variant', 'district', 'price'], name='products_su_product_2a91fc_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-16 22:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0019_supplierproductprice_region_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVariantMatrix',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='variant_matrix', serialize=False, to='products.product')),
+                ('attributes', models.JSONField(default=list)),
+                ('combinations', models.JSONField(default=dict)),
+                ('built_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
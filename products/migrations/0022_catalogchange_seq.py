@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_sequence(apps, schema_editor):
+    # Existing rows keep their id as sequence, so clients' cursors stay valid
+    CatalogChange = apps.get_model('products', 'CatalogChange')
+    CatalogChange.objects.update(seq=F('id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0021_catalogchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogchange',
+            name='seq',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_sequence, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,14 @@
 # products/mixins.py
+import hashlib
+import json
+
 from django.db.models import Q
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.http import http_date
+
+from .pagination import (
+    KeysetPagination, STREAM_CHUNK_SIZE, STREAM_CONTENT_TYPES, STREAM_QUERY_PARAM, stream_queryset
+)
 
 
 class MedixMallFilterMixin:
@@ -18,11 +27,12 @@ class MedixMallFilterMixin:
     def get_queryset(self):
         # Define base queryset for Product model (lightweight for list views)
         from .models import Product
+        from .serializers import PRODUCT_DETAIL_RELATIONS
         queryset = Product.objects.filter(
             status__in=['approved', 'published'],
             is_publish=True,
             stock__gt=0
-        ).select_related('category', 'brand', 'created_by')
+        ).select_related('category', 'brand', 'created_by', *PRODUCT_DETAIL_RELATIONS)
         
         # Apply MedixMall filtering for both authenticated and anonymous users
         if self.get_medixmall_mode(self.request):
@@ -55,15 +65,14 @@ class MedixMallDetailMixin:
     def get_queryset(self):
         # Define base queryset for Product model (with heavy prefetching for detail views)
         from .models import Product
-        queryset = Product.objects.filter(
-            status__in=['approved', 'published'],
-            is_publish=True,
-            stock__gt=0
-        ).prefetch_related(
-            'variants__attributes__attribute',
-            'images', 
-            'reviews'
-        ).select_related('category', 'brand', 'created_by')
+        from .serializers import PublicProductSerializer
+        queryset = PublicProductSerializer.setup_eager_loading(
+            Product.objects.filter(
+                status__in=['approved', 'published'],
+                is_publish=True,
+                stock__gt=0
+            ).select_related('created_by')
+        )
         
         # Apply MedixMall filtering for both authenticated and anonymous users
         if self.get_medixmall_mode(self.request):
@@ -100,6 +109,143 @@ class MedixMallContextMixin:
         return response
 
 
+class KeysetListMixin:
+    """
+    Mixin for public list endpoints: without a ``page`` parameter results are
+    keyset paginated (``?cursor=``), or streamed in full with
+    ``?stream=ndjson`` / ``?stream=json``. ``?page=N`` keeps the regular
+    page-number pagination.
+    """
+    keyset_pagination_class = KeysetPagination
+    keyset_orderings = ('-created_at',)
+    stream_chunk_size = STREAM_CHUNK_SIZE
+    
+    def list(self, request, *args, **kwargs):
+        if 'page' in request.query_params:
+            return super().list(request, *args, **kwargs)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        paginator = self.keyset_pagination_class()
+        
+        stream_format = request.query_params.get(STREAM_QUERY_PARAM)
+        if stream_format in STREAM_CONTENT_TYPES:
+            ordering = paginator.get_ordering(request, self)
+            tiebreak = '-id' if ordering.startswith('-') else 'id'
+            return stream_queryset(
+                queryset.order_by(ordering, tiebreak),
+                lambda batch: self.get_serializer(batch, many=True).data,
+                stream_format,
+                self.stream_chunk_size,
+            )
+        
+        page = paginator.paginate_queryset(
+            queryset, request, view=self, fetch=self.get_keyset_fetch(request)
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
+    def get_keyset_fetch(self, request):
+        """Alternative row source for keyset pages (see KeysetPagination)"""
+        return None
+
+
+class SparseFieldsetMixin:
+    """
+    Mixin for product list endpoints serialized with
+    PublicProductListSerializer: ``?fields=``, ``?exclude=`` and
+    ``?profile=compact`` narrow the representation, the query loads only
+    what it needs, and flat selections skip the serializer (see
+    products/fieldsets.py)
+    """
+    product_fields = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        from .fieldsets import parse_product_fields
+        self.product_fields = parse_product_fields(request.query_params)
+
+    def sparse_queryset(self, queryset):
+        from .fieldsets import sparse_product_queryset
+        return sparse_product_queryset(queryset, self.product_fields)
+
+    def filter_queryset(self, queryset):
+        # After filters and ordering, which may need the full model
+        return self.sparse_queryset(super().filter_queryset(queryset))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['product_fields'] = self.product_fields
+        return context
+
+    def get_serializer(self, *args, **kwargs):
+        from .fieldsets import FlatRowSerializer, is_flat
+        if args and kwargs.get('many') and self.product_fields is not None and is_flat(self.product_fields):
+            return FlatRowSerializer(args[0], self.product_fields)
+        return super().get_serializer(*args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """
+    Mixin for public read endpoints: responses carry a strong ETag hashed from
+    the generation counters the body depends on (``etag_scopes``, read in one
+    cache round-trip), the URL and the caller state that changes the body
+    (staff flag, MedixMall mode). Any invalidation that bumps one of those
+    counters moves the ETag, so a request whose If-None-Match still matches
+    gets a 304 before the queryset or the serializer run.
+
+    Views that know when their object changed also send Last-Modified
+    (``get_last_modified``). It is informational only: reviews, prices and
+    images change the body without touching ``updated_at``, so 304s are
+    decided on the ETag alone.
+    """
+    etag_scopes = ()
+
+    def get_etag_scopes(self):
+        return list(self.etag_scopes)
+
+    def get_etag_extra(self):
+        """Further values the body depends on (e.g. a time window)"""
+        return None
+
+    def get_last_modified(self):
+        """Last change of the object as a datetime, if the view knows it"""
+        return None
+
+    def get_etag(self, request):
+        from .enterprise_cache import EnterpriseCacheManager
+
+        scopes = self.get_etag_scopes()
+        generations = EnterpriseCacheManager.get_generations(scopes)
+        # Counters read as 0 when the cache is down: no validator then
+        if not all(generations):
+            return None
+        medixmall_mode = self.get_medixmall_mode(request) if hasattr(self, 'get_medixmall_mode') else None
+        state = json.dumps([
+            request.path,
+            sorted(request.query_params.lists()),
+            list(zip(scopes, generations)),
+            bool(request.user.is_staff),
+            bool(medixmall_mode),
+            self.get_etag_extra(),
+        ], default=str)
+        return quote_etag(hashlib.sha1(state.encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag is None:
+            return super().get(request, *args, **kwargs)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            last_modified = self.get_last_modified()
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+
 class EnterpriseSearchMixin:
     """
     Enterprise-level search functionality with advanced features
@@ -1,15 +1,18 @@
-import uuid
 from decimal import Decimal
-from typing import Dict
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
-from django.utils.text import slugify
 from django.utils import timezone
 from taggit.managers import TaggableManager
 
+from .identifiers import (
+    allocate_slugs, mark_generated, product_sku_base, random_sku, save_with_identifiers, variant_sku_base,
+)
+
 # ---------- Constants ----------
 PRODUCT_STATUSES = (
     ('pending', 'Pending'),
@@ -87,6 +90,12 @@ class ProductCategory(models.Model):
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Materialized path ("/<root id>/.../<own id>/") and depth, maintained by save()
+    path = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Published, in-stock products filed directly under this category (see products/categories.py)
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    
     # Admin approval workflow fields
     is_publish = models.BooleanField(default=False)
     status = models.CharField(max_length=20, choices=PRODUCT_STATUSES, default='pending')
@@ -107,6 +116,52 @@ class ProductCategory(models.Model):
 
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        """Save and keep ``path``/``depth`` of this category and its subtree in sync"""
+        return save_with_identifiers(self, ('slug',), self._save, *args, **kwargs)
+    
+    def _save(self, *args, **kwargs):
+        parent_path = '/'
+        if self.parent_id:
+            parent_path = ProductCategory.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or '/'
+        old_path = ''
+        if self.pk:
+            old_path = ProductCategory.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ''
+            if old_path and parent_path.startswith(old_path):
+                raise ValueError("A category cannot be moved under itself or one of its subcategories")
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            new_path = f'{parent_path}{self.pk}/'
+            if new_path != old_path:
+                self._move_subtree(old_path, new_path)
+    
+    def _move_subtree(self, old_path, new_path):
+        new_depth = new_path.count('/') - 2
+        if not old_path:
+            ProductCategory.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        else:
+            # One UPDATE rewrites the path prefix of every descendant
+            ProductCategory.objects.filter(path__startswith=old_path).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - (old_path.count('/') - 2)),
+            )
+        self.path, self.depth = new_path, new_depth
+    
+    @property
+    def ancestor_ids(self):
+        """Ids from the root down to the parent, read from ``path``"""
+        return [int(pk) for pk in self.path.strip('/').split('/')[:-1] if pk]
+    
+    def get_ancestors(self):
+        return ProductCategory.objects.filter(pk__in=self.ancestor_ids).order_by('depth')
+    
+    def get_descendants(self, include_self=False):
+        if not self.path:
+            return ProductCategory.objects.none()
+        descendants = ProductCategory.objects.filter(path__startswith=self.path)
+        return descendants if include_self else descendants.exclude(pk=self.pk)
         
     @property
     def needs_approval(self):
@@ -179,10 +234,18 @@ class Product(models.Model):
             models.Index(fields=['brand', 'is_publish']),
             models.Index(fields=['product_type', 'status', 'is_publish']),
             models.Index(fields=['price', 'stock', 'is_publish']),
+            # Keyset pagination: (created_at, id) and (price, id)
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['price', 'id']),
         ]
 
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        # The catalog change feed is written from post_save; keep both in one transaction
+        with transaction.atomic():
+            return save_with_identifiers(self, ('slug', 'sku'), super().save, *args, **kwargs)
         
     @property
     def needs_approval(self):
@@ -295,9 +358,18 @@ class ProductVariant(models.Model):
         ]
 
     def __str__(self):
-        attr_vals = ", ".join([str(v) for v in self.attributes.all()])
+        if 'attributes' in getattr(self, '_prefetched_objects_cache', {}):
+            attributes = self.attributes.all()
+        else:
+            attributes = self.attributes.select_related('attribute')
+        attr_vals = ", ".join([str(v) for v in attributes])
         return f"{self.product.name} - {attr_vals}" if attr_vals else f"{self.product.name} - default"
 
+    def save(self, *args, **kwargs):
+        # The catalog change feed is written from post_save; keep both in one transaction
+        with transaction.atomic():
+            return save_with_identifiers(self, ('sku',), super().save, *args, **kwargs)
+
     @property
     def total_price(self):
         if self.price and self.price != Decimal('0.00'):
@@ -368,6 +440,11 @@ class SupplierProductPrice(models.Model):
 
     class Meta:
         unique_together = ('supplier', 'product_variant', 'pincode', 'district')
+        indexes = [
+            # Cheapest row per variant and region (products/pricing.py)
+            models.Index(fields=['product_variant', 'pincode', 'price']),
+            models.Index(fields=['product_variant', 'district', 'price']),
+        ]
 
 
 # ---------- Reviews ----------
@@ -389,103 +466,203 @@ class ProductReview(models.Model):
 
     def save(self, *args, **kwargs):
         self.is_published = self.rating >= 3
-        super().save(*args, **kwargs)
+        # The rating summary is updated from post_save; keep both in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class ProductRatingSummary(models.Model):
+    """
+    Denormalized review statistics, one row per reviewed product.
+    Maintained by products.ratings from ProductReview saves/deletes.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary'
+    )
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.review_count} reviews"
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.review_count if self.review_count else 0
+
+    @property
+    def histogram(self):
+        return [self.rating_1, self.rating_2, self.rating_3, self.rating_4, self.rating_5]
+
+    def as_review_stats(self):
+        """Same shape as the ``review_stats`` block of the product detail views"""
+        return {
+            'total_reviews': self.review_count,
+            'average_rating': self.average_rating,
+            'rating_distribution': {
+                str(rating): getattr(self, f'rating_{rating}') for rating in range(5, 0, -1)
+            },
+        }
 
 
 # ---------- Audit Log ----------
 
+AUDIT_OBJECT_TYPES = (
+    ('product', 'Product'),
+    ('variant', 'Product Variant'),
+    ('supplier_price', 'Supplier Price'),
+)
+
+
 class ProductAuditLog(models.Model):
+    """Field changes of a product, variant or supplier price (written by products.audit)"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='audit_logs')
     changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     changes = models.JSONField(default=dict)
-    changed_at = models.DateTimeField(auto_now_add=True)
+    # Set when the change is captured; entries may be written later in a batch
+    changed_at = models.DateTimeField(default=timezone.now)
+    object_type = models.CharField(max_length=20, choices=AUDIT_OBJECT_TYPES, default='product')
+    object_id = models.PositiveBigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['object_type', 'object_id']),
+        ]
 
     def __str__(self):
         return f"{self.product.name} changes at {self.changed_at}"
 
 
-# ---------- Signals ----------
+# ---------- Variant Matrix ----------
 
-def _unique_slugify(instance, value, queryset, slug_field='slug'):
-    base_slug = slugify(value)[:50] or str(uuid.uuid4())[:8]
-    slug = base_slug
-    counter = 1
-    lookup = {slug_field: slug}
-    while queryset.filter(**lookup).exclude(pk=getattr(instance, 'pk', None)).exists():
-        slug = f"{base_slug}-{counter}"
-        lookup[slug_field] = slug
-        counter += 1
-    return slug
+class ProductVariantMatrix(models.Model):
+    """
+    Precomputed variant selection matrix of a product: the attribute axes and,
+    per sorted attribute-value-id combination, the public variant it selects.
+    Written by products.variant_matrix; never edited by hand.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='variant_matrix'
+    )
+    attributes = models.JSONField(default=list)
+    combinations = models.JSONField(default=dict)
+    built_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.product_id}: {len(self.combinations)} variants"
 
 
+# ---------- Catalog Change Feed ----------
+
+CATALOG_CHANGE_OBJECT_TYPES = (
+    ('product', 'Product'),
+    ('variant', 'Product Variant'),
+)
+
+CATALOG_CHANGE_ACTIONS = (
+    ('created', 'Created'),
+    ('updated', 'Updated'),
+    ('deleted', 'Deleted'),
+)
+
+
+class CatalogChange(models.Model):
+    """
+    Append-only log of product/variant changes. Written by
+    products.change_feed in the transaction of the change; ``seq`` (the feed
+    sequence) is assigned once the row is committed.
+    """
+    object_type = models.CharField(max_length=10, choices=CATALOG_CHANGE_OBJECT_TYPES)
+    object_id = models.PositiveBigIntegerField()
+    # Plain ids, not foreign keys: entries outlive the rows they describe
+    product_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=10, choices=CATALOG_CHANGE_ACTIONS)
+    # New values of the changed fields only
+    fields = models.JSONField(default=dict)
+    # Whether the object was publicly visible before or after the change
+    is_public = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Feed sequence, assigned after commit by products.change_feed.assign_sequence
+    seq = models.PositiveBigIntegerField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.pk} {self.object_type} {self.object_id} {self.action}"
+
+
+# ---------- Related Products ----------
+
+class RelatedProducts(models.Model):
+    """
+    Precomputed, ranked neighbor list of a product (ids only).
+    Written by products.related; never edited by hand.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='related_products'
+    )
+    neighbor_ids = models.JSONField(default=list)
+    computed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.product_id}: {len(self.neighbor_ids)} related"
+
+
+# ---------- Search Index ----------
+
+class ProductSearchToken(models.Model):
+    """
+    Inverted index posting: one row per (product, field, token).
+    Maintained by products.search; never edited by hand.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_tokens')
+    field = models.CharField(max_length=20)
+    token = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField()
+    frequency = models.PositiveSmallIntegerField(default=1)
+    field_length = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'field', 'token')
+        indexes = [
+            models.Index(fields=['token', 'product']),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> {self.product_id} ({self.field})"
+
+
+# ---------- Signals ----------
+
 @receiver(pre_save, sender=ProductCategory)
 @receiver(pre_save, sender=Product)
 def generate_slug(sender, instance, **kwargs):
     if not instance.slug:
-        instance.slug = _unique_slugify(instance, getattr(instance, 'name', ''), sender.objects)
+        queryset = sender.objects.all()
+        if instance.pk:
+            queryset = queryset.exclude(pk=instance.pk)
+        mark_generated(instance, 'slug', allocate_slugs(queryset, [getattr(instance, 'name', '')])[0])
+
 
+# SKUs carry a random suffix, so they are not pre-checked: a clash surfaces as
+# an IntegrityError and save_with_identifiers() retries with a new one.
 
 @receiver(pre_save, sender=Product)
 def generate_product_sku(sender, instance, **kwargs):
     if not instance.sku:
-        base_sku = slugify(instance.name)[:20].upper() or "PRD"
-        unique_suffix = str(uuid.uuid4())[:8].upper()
-        sku_candidate = f"{base_sku}-{unique_suffix}"
-        counter = 1
-        while sender.objects.filter(sku=sku_candidate).exclude(pk=instance.pk).exists():
-            sku_candidate = f"{base_sku}-{unique_suffix}-{counter}"
-            counter += 1
-        instance.sku = sku_candidate
+        mark_generated(instance, 'sku', random_sku(product_sku_base(instance.name)))
 
 
 @receiver(pre_save, sender=ProductVariant)
 def generate_variant_sku(sender, instance, **kwargs):
     if not instance.sku:
-        base = (instance.product.sku or slugify(instance.product.name)[:10].upper() or "PRD").upper()
-        suffix = str(uuid.uuid4())[:8].upper()
-        sku_candidate = f"{base}-{suffix}"
-        counter = 1
-        while sender.objects.filter(sku=sku_candidate).exclude(pk=instance.pk).exists():
-            sku_candidate = f"{base}-{suffix}-{counter}"
-            counter += 1
-        instance.sku = sku_candidate
-
-
-@receiver(pre_save, sender=Product)
-def track_product_changes(sender, instance, **kwargs):
-    if not instance.pk:
-        return
-    try:
-        old = sender.objects.get(pk=instance.pk)
-    except sender.DoesNotExist:
-        return
-
-    tracked_fields = [
-        'price', 'stock', 'status', 'is_publish', 'name', 'category', 'brand', 'product_type'
-    ]
-
-    diffs: Dict[str, list] = {}
-    for field in tracked_fields:
-        old_val = getattr(old, field)
-        new_val = getattr(instance, field)
-        if isinstance(old_val, models.Model):
-            old_val_repr = getattr(old_val, 'pk', str(old_val))
-        else:
-            old_val_repr = old_val
-        if isinstance(new_val, models.Model):
-            new_val_repr = getattr(new_val, 'pk', str(new_val))
-        else:
-            new_val_repr = new_val
-
-        if old_val_repr != new_val_repr:
-            diffs[field] = [str(old_val_repr), str(new_val_repr)]
-
-    if diffs:
-        ProductAuditLog.objects.create(
-            product=instance,
-            changed_by=getattr(instance, '_changed_by', None),
-            changes=diffs
-        )
+        mark_generated(instance, 'sku', random_sku(variant_sku_base(instance.product)))
 
 
 @receiver(pre_save, sender=Product)
@@ -1,5 +1,6 @@
 from django.core.cache import cache
-from django.db.models import Prefetch, Q, Count, Avg
+from django.db.models import Prefetch, Q, Value
+from django.db.models.functions import Coalesce
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
@@ -7,6 +8,7 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_headers
 from .views import ProductViewSet, ProductCategoryViewSet, BrandViewSet, ProductReviewViewSet
+from .ratings import average_rating_expression, review_count_expression
 
 class OptimizedProductViewSet(ProductViewSet):
     """Enterprise-optimized Product ViewSet with advanced caching and query optimization"""
@@ -65,8 +67,8 @@ class OptimizedProductViewSet(ProductViewSet):
             featured = self.get_queryset().filter(
                 status='approved'
             ).annotate(
-                avg_rating=Avg('reviews__rating'),
-                review_count=Count('reviews')
+                avg_rating=Coalesce(average_rating_expression(), Value(0.0)),
+                review_count=review_count_expression()
             ).order_by('-avg_rating', '-review_count')[:10]
             
             cache.set(cache_key, featured, 60 * 60)  # Cache for 1 hour
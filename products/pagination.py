@@ -0,0 +1,209 @@
+"""
+Keyset (cursor) pagination and streaming dumps for public list endpoints.
+
+Pages are addressed by the ``(ordering field, id)`` pair of the last row seen
+instead of an offset, so every page is an index range scan of ``page_size + 1``
+rows and no ``COUNT(*)`` is needed. Cursors are opaque base64 tokens carrying
+that pair; ``next``/``previous`` links are built from the first and last row of
+the page.
+
+Clients that need the whole table use ``?stream=ndjson`` (one JSON object per
+line) or ``?stream=json`` (a single JSON array). Both are produced from
+``QuerySet.iterator(chunk_size=...)`` and serialized chunk by chunk, so the
+full result is never held in memory.
+"""
+
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+STREAM_QUERY_PARAM = 'stream'
+STREAM_CHUNK_SIZE = 500
+STREAM_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on ``(field, id)``
+
+    The view lists the orderings it supports in ``keyset_orderings`` (the
+    first one is the default); the client picks one with ``?ordering=``.
+    """
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    page_size_query_param = 'page_size'
+    page_size = 20
+    max_page_size = 100
+    default_orderings = ('-created_at',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_orderings(self, view):
+        return getattr(view, 'keyset_orderings', None) or self.default_orderings
+
+    def get_ordering(self, request, view):
+        orderings = self.get_orderings(view)
+        ordering = request.query_params.get(self.ordering_query_param)
+        return ordering if ordering in orderings else orderings[0]
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    # ----- cursors -----
+
+    def encode_cursor(self, ordering, value, pk, reverse=False):
+        # isoformat keeps full microsecond precision (DjangoJSONEncoder truncates)
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        payload = {'o': ordering, 'v': value, 'id': pk}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, ordering, field):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            payload = json.loads(raw)
+            if payload['o'] != ordering:
+                raise ValueError('ordering mismatch')
+            value = field.to_python(payload['v'])
+            pk = int(payload['id'])
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk, bool(payload.get('r'))
+
+    # ----- paging -----
+
+    def paginate_queryset(self, queryset, request, view=None, fetch=None):
+        """
+        ``fetch(field_name, descending, cursor, limit)`` may supply the rows
+        from elsewhere (e.g. the catalog snapshot); returning None falls back
+        to ``queryset``
+        """
+        self.request = request
+        self.ordering = self.get_ordering(request, view)
+        self.field_name = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+        page_size = self.get_page_size(request)
+
+        field = queryset.model._meta.get_field(self.field_name)
+        cursor = self.decode_cursor(request, self.ordering, field)
+        reverse = bool(cursor and cursor[2])
+
+        # Walking backwards flips the scan direction; the page is re-reversed below
+        scan_descending = descending != reverse
+        lookup = 'lt' if scan_descending else 'gt'
+        prefix = '-' if scan_descending else ''
+        rows = None
+        if fetch is not None:
+            rows = fetch(self.field_name, scan_descending, cursor[:2] if cursor else None, page_size + 1)
+        if rows is None:
+            if cursor:
+                value, pk, _ = cursor
+                queryset = queryset.filter(
+                    Q(**{f'{self.field_name}__{lookup}': value})
+                    | Q(**{self.field_name: value, f'id__{lookup}': pk})
+                )
+            rows = list(queryset.order_by(f'{prefix}{self.field_name}', f'{prefix}id')[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = rows
+        return rows
+
+    def _row_cursor(self, row, reverse=False):
+        return self.encode_cursor(self.ordering, getattr(row, self.field_name), row.pk, reverse)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self._row_cursor(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self._row_cursor(self.page[0], reverse=True)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def _chunks(queryset, chunk_size):
+    batch = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        batch.append(obj)
+        if len(batch) >= chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_queryset(queryset, serialize, stream_format='ndjson', chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream ``queryset`` as NDJSON or a JSON array
+
+    ``serialize`` turns a list of instances into a list of dicts (normally
+    ``lambda batch: view.get_serializer(batch, many=True).data``).
+    """
+    def ndjson():
+        for batch in _chunks(queryset, chunk_size):
+            yield ''.join(json.dumps(item, cls=DjangoJSONEncoder) + '\n' for item in serialize(batch))
+
+    def json_array():
+        yield '['
+        separator = ''
+        for batch in _chunks(queryset, chunk_size):
+            for item in serialize(batch):
+                yield separator + json.dumps(item, cls=DjangoJSONEncoder)
+                separator = ','
+        yield ']'
+
+    content = ndjson() if stream_format == 'ndjson' else json_array()
+    return StreamingHttpResponse(content, content_type=STREAM_CONTENT_TYPES[stream_format])
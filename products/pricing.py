@@ -0,0 +1,264 @@
+"""
+Supplier price resolution by delivery location.
+
+The price of a variant at a delivery location is the cheapest
+SupplierProductPrice of an active, on-duty supplier listed for the pincode,
+else for the district, else one listed without a region; variants with none
+of those fall back to the catalog price (``ProductVariant.total_price`` /
+``effective_mrp``).
+
+A batch of variants is resolved with one query: the winning supplier row is
+picked by correlated subqueries ordered by (level, price), next to the
+variant and product columns the fallback needs. Results are kept in a
+per-process LRU cache with a short TTL; supplier price, variant and product
+saves drop the affected entries of this process.
+"""
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Case, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Product, ProductVariant, SupplierProductPrice
+
+ZERO = Decimal('0.00')
+
+# Resolution levels, best first
+PINCODE, DISTRICT, ANY_REGION, CATALOG = 'pincode', 'district', 'any', 'catalog'
+SUPPLIER_LEVELS = (PINCODE, DISTRICT, ANY_REGION)
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 60  # seconds; bounds staleness of writes made by other processes
+
+
+class ResolvedPrice(NamedTuple):
+    variant_id: int
+    product_id: int
+    price: Decimal
+    mrp: Decimal
+    source: str  # one of PINCODE, DISTRICT, ANY_REGION, CATALOG
+    supplier_id: Optional[int] = None
+    supplier_price_id: Optional[int] = None
+
+
+def normalize_location(pincode: Optional[str] = None, district: Optional[str] = None) -> Tuple[str, str]:
+    return (pincode or '').strip(), (district or '').strip().lower()
+
+
+def _catalog_price(price, additional_price, product_price) -> Decimal:
+    # Same rule as ProductVariant.total_price
+    if price and price != ZERO:
+        return price
+    return (product_price or ZERO) + (additional_price or ZERO)
+
+
+def _no_region(field: str) -> Q:
+    return Q(**{f'{field}__isnull': True}) | Q(**{field: ''})
+
+
+def _candidates(pincode: str, district: str, variant: str = 'pk'):
+    """Supplier rows usable at the location, best first, for ``OuterRef(variant)``"""
+    rank = []
+    levels = Q()
+    if pincode:
+        levels |= Q(pincode=pincode)
+        rank.append(When(pincode=pincode, then=Value(0)))
+    if district:
+        district_q = Q(district__iexact=district) & _no_region('pincode')
+        levels |= district_q
+        rank.append(When(district_q, then=Value(1)))
+    levels |= _no_region('pincode') & _no_region('district')
+    return SupplierProductPrice.objects.filter(
+        levels, product_variant=OuterRef(variant), supplier__is_active=True, supplier__is_on_duty=True,
+    ).annotate(
+        level=Case(*rank, default=Value(2), output_field=IntegerField())
+    ).order_by('level', 'price', 'pk')
+
+
+def unit_price_expression(variant: str = 'variant', product: str = 'product',
+                          pincode: str = '', district: str = ''):
+    """
+    The price ``resolve_prices`` gives at a (normalized) location as an SQL
+    expression, for rows with a nullable ``variant`` and a ``product``
+    relation; rows without a variant cost the product price
+    """
+    amount = DecimalField(max_digits=14, decimal_places=2)
+    product_price = Coalesce(F(f'{product}__price'), Value(ZERO), output_field=amount)
+    catalog = Case(
+        When(**{f'{variant}__isnull': True}, then=product_price),
+        When(Q(**{f'{variant}__price__isnull': False}) & ~Q(**{f'{variant}__price': ZERO}), then=F(f'{variant}__price')),
+        default=product_price + Coalesce(F(f'{variant}__additional_price'), Value(ZERO), output_field=amount),
+        output_field=amount,
+    )
+    supplier = Subquery(_candidates(pincode, district, variant).values('price')[:1], output_field=amount)
+    return Coalesce(supplier, catalog, output_field=amount)
+
+
+def query_prices(variant_ids: Iterable[int], pincode: str = '', district: str = '') -> Dict[int, ResolvedPrice]:
+    """Resolve ``variant_ids`` at a (normalized) location with one query, bypassing the cache"""
+    variant_ids = set(variant_ids)
+    if not variant_ids:
+        return {}
+    candidates = _candidates(pincode, district)
+    rows = ProductVariant.objects.filter(pk__in=variant_ids).order_by().annotate(
+        supplier_price_id=Subquery(candidates.values('pk')[:1]),
+        supplier_price=Subquery(candidates.values('price')[:1]),
+        supplier_mrp=Subquery(candidates.values('mrp')[:1]),
+        supplier_id=Subquery(candidates.values('supplier_id')[:1]),
+        supplier_level=Subquery(candidates.values('level')[:1]),
+    ).values_list(
+        'pk', 'product_id', 'price', 'mrp', 'additional_price', 'product__price', 'product__mrp',
+        'supplier_price_id', 'supplier_price', 'supplier_mrp', 'supplier_id', 'supplier_level',
+    )
+
+    resolved = {}
+    for (pk, product_id, price, mrp, additional_price, product_price, product_mrp,
+         supplier_price_id, supplier_price, supplier_mrp, supplier_id, level) in rows:
+        catalog_mrp = mrp if mrp and mrp != ZERO else (product_mrp or ZERO)
+        if supplier_price_id is None:
+            resolved[pk] = ResolvedPrice(
+                pk, product_id, _catalog_price(price, additional_price, product_price), catalog_mrp, CATALOG,
+            )
+        else:
+            resolved[pk] = ResolvedPrice(
+                pk, product_id, supplier_price,
+                supplier_mrp if supplier_mrp and supplier_mrp != ZERO else catalog_mrp,
+                SUPPLIER_LEVELS[level], supplier_id, supplier_price_id,
+            )
+    return resolved
+
+
+class PriceCache:
+    """LRU of resolved prices keyed by (variant id, pincode, district)"""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[tuple, Tuple[float, ResolvedPrice]]' = OrderedDict()
+        self._keys_by_variant = defaultdict(set)
+        self._keys_by_product = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[tuple]) -> Dict[tuple, ResolvedPrice]:
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] < now:
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+        return found
+
+    def set_many(self, items: Dict[tuple, ResolvedPrice]) -> None:
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key, resolved in items.items():
+                self._entries[key] = (expires, resolved)
+                self._entries.move_to_end(key)
+                self._keys_by_variant[resolved.variant_id].add(key)
+                self._keys_by_product[resolved.product_id].add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_variants(self, variant_ids: Iterable[int]) -> None:
+        with self._lock:
+            for variant_id in variant_ids:
+                for key in list(self._keys_by_variant.get(variant_id, ())):
+                    self._remove(key)
+
+    def invalidate_products(self, product_ids: Iterable[int]) -> None:
+        with self._lock:
+            for product_id in product_ids:
+                for key in list(self._keys_by_product.get(product_id, ())):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_variant.clear()
+            self._keys_by_product.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        resolved = entry[1]
+        for index, owner in ((self._keys_by_variant, resolved.variant_id), (self._keys_by_product, resolved.product_id)):
+            keys = index.get(owner)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[owner]
+
+
+_cache: Optional[PriceCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_price_cache() -> PriceCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PriceCache(
+                    getattr(settings, 'PRODUCT_PRICE_CACHE_SIZE', DEFAULT_CACHE_SIZE),
+                    getattr(settings, 'PRODUCT_PRICE_CACHE_TTL', DEFAULT_CACHE_TTL),
+                )
+    return _cache
+
+
+def resolve_prices(variant_ids: Iterable[int], pincode: Optional[str] = None,
+                   district: Optional[str] = None) -> Dict[int, ResolvedPrice]:
+    """
+    ``{variant_id: ResolvedPrice}`` for delivery to ``pincode``/``district``;
+    cached variants cost nothing, the rest one query. Unknown ids are left out.
+    """
+    pincode, district = normalize_location(pincode, district)
+    keys = {(variant_id, pincode, district): variant_id for variant_id in set(variant_ids)}
+    cache = get_price_cache()
+    found = cache.get_many(keys)
+    missing = [variant_id for key, variant_id in keys.items() if key not in found]
+    if missing:
+        fresh = query_prices(missing, pincode, district)
+        cache.set_many({(variant_id, pincode, district): resolved for variant_id, resolved in fresh.items()})
+        found.update({(variant_id, pincode, district): resolved for variant_id, resolved in fresh.items()})
+    return {key[0]: resolved for key, resolved in found.items()}
+
+
+def resolve_price(variant_id: int, pincode: Optional[str] = None, district: Optional[str] = None) -> Optional[ResolvedPrice]:
+    return resolve_prices([variant_id], pincode, district).get(variant_id)
+
+
+# Signal handlers
+
+@receiver(post_save, sender=SupplierProductPrice)
+@receiver(post_delete, sender=SupplierProductPrice)
+def invalidate_prices_on_supplier_price_change(sender, instance, **kwargs):
+    get_price_cache().invalidate_variants([instance.product_variant_id])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def invalidate_prices_on_variant_change(sender, instance, **kwargs):
+    get_price_cache().invalidate_variants([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_prices_on_product_change(sender, instance, **kwargs):
+    get_price_cache().invalidate_products([instance.pk])
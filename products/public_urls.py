@@ -11,6 +11,9 @@ from .public_views import (
     PublicProductsByCategory,
     PublicProductsByBrand,
     PublicProductsByType,
+    PublicVariantPriceView,
+    PublicProductVariantMatrixView,
+    PublicCatalogChangesView,
 )
 from .enterprise_views import search_autocomplete
 
@@ -23,6 +26,9 @@ urlpatterns = [
     path('products/', PublicProductListView.as_view(), name='public-product-list'),
     path('products/<int:pk>/', PublicProductDetailView.as_view(), name='public-product-detail'),
     path('products/<int:product_id>/reviews/', PublicProductReviewListView.as_view(), name='public-product-reviews'),
+    path('products/<int:pk>/variants/matrix/', PublicProductVariantMatrixView.as_view(), name='public-product-variant-matrix'),
+    path('changes/', PublicCatalogChangesView.as_view(), name='public-catalog-changes'),
+    path('prices/', PublicVariantPriceView.as_view(), name='public-variant-prices'),
     
     # Advanced search and filtering
     path('search/', PublicProductSearchView.as_view(), name='public-product-search'),
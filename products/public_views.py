@@ -3,7 +3,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, filters, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Q, Avg, Count, Min, Max
+from django.db.models import Q, Count, Min, Max
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404
 from drf_yasg.utils import swagger_auto_schema
@@ -16,18 +16,36 @@ from .serializers import (
     ProductCategorySerializer, BaseProductSerializer, PublicProductSerializer, PublicProductListSerializer, 
     ProductReviewSerializer, BrandSerializer, ProductVariantSerializer
 )
-from .mixins import MedixMallFilterMixin, MedixMallDetailMixin, MedixMallContextMixin, EnterpriseSearchMixin
+from .mixins import (
+    MedixMallFilterMixin, MedixMallDetailMixin, MedixMallContextMixin, EnterpriseSearchMixin, KeysetListMixin,
+    ConditionalGetMixin, SparseFieldsetMixin,
+)
 from .enterprise_filters import EnterpriseProductFilter
+from .ratings import review_count_expression, review_stats
+from .related import get_related_products
+from .catalog_snapshot import snapshot_keyset_fetch
+from . import change_feed
+from .pricing import resolve_prices
+from .variant_matrix import get_variant_matrix, matrix_payload, select_variant
 from .enterprise_views import EnterpriseProductListView, EnterpriseProductSearchView
 
+# Product listings change with any product save and embed category/brand names
+PRODUCT_LIST_ETAG_SCOPES = (('product', 'list'), ('category', None), ('brand', None))
+
+SPARSE_FIELDSET_PARAMETERS = [
+    openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated fields to return (e.g. `name,image,price,mrp`)", type=openapi.TYPE_STRING),
+    openapi.Parameter('exclude', openapi.IN_QUERY, description="Comma separated fields to leave out", type=openapi.TYPE_STRING),
+    openapi.Parameter('profile', openapi.IN_QUERY, description="Predefined field set: `compact` = id, name, slug, image, price, mrp", type=openapi.TYPE_STRING, enum=['compact']),
+]
+
 
-class PublicProductCategoryListView(generics.ListAPIView):
+class PublicProductCategoryListView(ConditionalGetMixin, KeysetListMixin, generics.ListAPIView):
     """
     Public endpoint to list all published product categories.
 
-    Behaviour change: when the client does NOT provide a `page` query parameter,
-    return all matching categories (no pagination). If `page` is provided,
-    regular DRF pagination is used.
+    Without a `page` query parameter results are keyset paginated (newest
+    first, follow `next`) or streamed in full with `?stream=ndjson|json`. If
+    `page` is provided, regular DRF pagination is used.
     """
     queryset = ProductCategory.objects.filter(status__in=['approved', 'published'], is_publish=True)
     serializer_class = ProductCategorySerializer
@@ -35,28 +53,8 @@ class PublicProductCategoryListView(generics.ListAPIView):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     search_fields = ['name']
     ordering = ['name']
-
-    def list(self, request, *args, **kwargs):
-        """Return all results when 'page' query param is absent.
-
-        This preserves existing pagination behaviour when clients request a
-        specific page (for example, `?page=2`). If `page` is not present we
-        return the full result set in a single response.
-        """
-        # If client explicitly asked for a page, use normal pagination
-        if 'page' in request.query_params:
-            return super().list(request, *args, **kwargs)
-
-        # No page param: return all results
-        queryset = self.filter_queryset(self.get_queryset())
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({
-            'count': queryset.count(),
-            'next': None,
-            'previous': None,
-            'results': serializer.data,
-        })
+    keyset_orderings = ('-created_at', 'created_at')
+    etag_scopes = (('category', None),)
 
     @swagger_auto_schema(
         operation_description="Get list of all published product categories",
@@ -64,6 +62,9 @@ class PublicProductCategoryListView(generics.ListAPIView):
         tags=['Public - Products'],
         manual_parameters=[
             openapi.Parameter('search', openapi.IN_QUERY, description="Search categories by name", type=openapi.TYPE_STRING),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor from the `next`/`previous` link (used when `page` is absent)", type=openapi.TYPE_STRING),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Results per cursor page (max 100)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('stream', openapi.IN_QUERY, description="Stream every result instead of a page", type=openapi.TYPE_STRING, enum=['ndjson', 'json']),
         ],
         responses={
             200: openapi.Response('Success', ProductCategorySerializer(many=True)),
@@ -73,9 +74,10 @@ class PublicProductCategoryListView(generics.ListAPIView):
         return super().get(request, *args, **kwargs)
 
 
-class PublicBrandListView(generics.ListAPIView):
+class PublicBrandListView(ConditionalGetMixin, KeysetListMixin, generics.ListAPIView):
     """
-    Public endpoint to list all published brands
+    Public endpoint to list all published brands (keyset paginated by name
+    unless `page` is given)
     """
     queryset = Brand.objects.filter(status__in=['approved', 'published'], is_publish=True)
     serializer_class = BrandSerializer
@@ -83,6 +85,8 @@ class PublicBrandListView(generics.ListAPIView):
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
     ordering = ['name']
+    keyset_orderings = ('name', '-name')
+    etag_scopes = (('brand', None),)
 
     @swagger_auto_schema(
         operation_description="Get list of all brands",
@@ -90,6 +94,9 @@ class PublicBrandListView(generics.ListAPIView):
         tags=['Public - Products'],
         manual_parameters=[
             openapi.Parameter('search', openapi.IN_QUERY, description="Search brands by name", type=openapi.TYPE_STRING),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor from the `next`/`previous` link (used when `page` is absent)", type=openapi.TYPE_STRING),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Results per cursor page (max 100)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('stream', openapi.IN_QUERY, description="Stream every result instead of a page", type=openapi.TYPE_STRING, enum=['ndjson', 'json']),
         ],
         responses={
             200: openapi.Response('Success', BrandSerializer(many=True)),
@@ -98,31 +105,15 @@ class PublicBrandListView(generics.ListAPIView):
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
-    def list(self, request, *args, **kwargs):
-        """Return all brands when 'page' query param is absent.
 
-        Preserve normal DRF pagination when the client explicitly requests a page
-        using the `page` query parameter.
-        """
-        if 'page' in request.query_params:
-            return super().list(request, *args, **kwargs)
-
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({
-            'count': queryset.count(),
-            'next': None,
-            'previous': None,
-            'results': serializer.data,
-        })
-
-
-class PublicProductListView(EnterpriseProductListView):
+class PublicProductListView(ConditionalGetMixin, KeysetListMixin, EnterpriseProductListView):
     """
     Public endpoint to list all published products with filtering and search
-    Inherits from Enterprise view for optimized performance
+    Inherits from Enterprise view for optimized performance; without `page`
+    results are keyset paginated on (created_at, id) or (price, id)
     """
-    pass  # All functionality inherited from EnterpriseProductListView
+    keyset_orderings = ('-created_at', 'created_at', 'price', '-price', 'name', '-name')
+    etag_scopes = PRODUCT_LIST_ETAG_SCOPES
 
     @swagger_auto_schema(
         operation_description="Get list of all published products in stock. Respects user's MedixMall mode preference - if enabled, only shows medicine products.",
@@ -134,7 +125,11 @@ class PublicProductListView(EnterpriseProductListView):
             openapi.Parameter('brand', openapi.IN_QUERY, description="Filter by brand ID", type=openapi.TYPE_INTEGER),
             openapi.Parameter('product_type', openapi.IN_QUERY, description="Filter by product type", type=openapi.TYPE_STRING, enum=['medicine', 'equipment', 'pathology']),
             openapi.Parameter('ordering', openapi.IN_QUERY, description="Order by field", type=openapi.TYPE_STRING, enum=['price', '-price', 'created_at', '-created_at', 'name', '-name']),
-            openapi.Parameter('page', openapi.IN_QUERY, description="Page number for pagination (if not provided, returns all products)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('page', openapi.IN_QUERY, description="Page number for pagination (if not provided, results are cursor paginated)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor from the `next`/`previous` link (used when `page` is absent)", type=openapi.TYPE_STRING),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Results per cursor page (max 100)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('stream', openapi.IN_QUERY, description="Stream every result instead of a page", type=openapi.TYPE_STRING, enum=['ndjson', 'json']),
+            *SPARSE_FIELDSET_PARAMETERS,
             openapi.Parameter('Authorization', openapi.IN_HEADER, description="Bearer <access_token> (optional for MedixMall mode)", type=openapi.TYPE_STRING, required=False),
         ],
         responses={
@@ -150,30 +145,18 @@ class PublicProductListView(EnterpriseProductListView):
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
-    def list(self, request, *args, **kwargs):
-        """Return all products when 'page' query param is absent.
-
-        Preserve normal DRF pagination when the client explicitly requests a page
-        using the `page` query parameter.
-        """
-        if 'page' in request.query_params:
-            return super().list(request, *args, **kwargs)
-
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({
-            'count': queryset.count(),
-            'next': None,
-            'previous': None,
-            'results': serializer.data,
-        })
-
     def get_queryset(self):
         # Use the mixin's get_queryset which handles MedixMall filtering
         return super().get_queryset()
 
+    def get_keyset_fetch(self, request):
+        # Simple filter shapes pick their page from the in-memory catalog snapshot
+        return snapshot_keyset_fetch(
+            self.sparse_queryset(self.get_queryset()), request.query_params, self.get_medixmall_mode(request)
+        )
+
 
-class PublicProductDetailView(MedixMallDetailMixin, MedixMallContextMixin, generics.RetrieveAPIView):
+class PublicProductDetailView(ConditionalGetMixin, MedixMallDetailMixin, MedixMallContextMixin, generics.RetrieveAPIView):
     """
     Public endpoint to view individual product details
     Respects user's MedixMall mode preference
@@ -204,6 +187,16 @@ class PublicProductDetailView(MedixMallDetailMixin, MedixMallContextMixin, gener
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('rating_summary', 'related_products', 'variant_matrix')
+
+    def get_etag_scopes(self):
+        # The body embeds related products: any product write can change it
+        return [('product', self.kwargs['pk']), ('product', 'list'), ('category', None), ('brand', None)]
+
+    def get_last_modified(self):
+        return Product.objects.filter(pk=self.kwargs['pk']).values_list('updated_at', flat=True).first()
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
@@ -212,33 +205,20 @@ class PublicProductDetailView(MedixMallDetailMixin, MedixMallContextMixin, gener
         data = serializer.data
         
         # Add review statistics
-        reviews = instance.reviews.all()
-        data['review_stats'] = {
-            'total_reviews': reviews.count(),
-            'average_rating': reviews.aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0,
-            'rating_distribution': {
-                '5': reviews.filter(rating=5).count(),
-                '4': reviews.filter(rating=4).count(),
-                '3': reviews.filter(rating=3).count(),
-                '2': reviews.filter(rating=2).count(),
-                '1': reviews.filter(rating=1).count(),
-            }
-        }
+        data['review_stats'] = review_stats(instance)
         
-        # Add related products (same category, different product)
-        related_products = Product.objects.filter(
-            category=instance.category,
-            status='published',
-            is_publish=True
-        ).exclude(id=instance.id)[:4]
+        # Add related products (precomputed neighbors, lightweight serializer)
+        data['related_products'] = PublicProductListSerializer(
+            get_related_products(instance), many=True
+        ).data
         
-        from .serializers import PublicProductSerializer
-        data['related_products'] = PublicProductSerializer(related_products, many=True).data
+        # Variant selection matrix (precomputed, read with the product row)
+        data['variant_matrix'] = matrix_payload(get_variant_matrix(instance))
         
         return Response(data)
 
 
-class PublicProductReviewListView(generics.ListAPIView):
+class PublicProductReviewListView(ConditionalGetMixin, generics.ListAPIView):
     """
     Public endpoint to list reviews for a specific product
     """
@@ -264,6 +244,9 @@ class PublicProductReviewListView(generics.ListAPIView):
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+    def get_etag_scopes(self):
+        return [('product', self.kwargs.get('product_id'))]
+
     def get_queryset(self):
         product_id = self.kwargs.get('product_id')
         return ProductReview.objects.filter(
@@ -279,7 +262,7 @@ class PublicProductSearchView(EnterpriseProductSearchView):
     pass  # All functionality inherited from EnterpriseProductSearchView
 
 
-class PublicFeaturedProductsView(MedixMallFilterMixin, MedixMallContextMixin, generics.ListAPIView):
+class PublicFeaturedProductsView(ConditionalGetMixin, SparseFieldsetMixin, MedixMallFilterMixin, MedixMallContextMixin, generics.ListAPIView):
     """
     Public endpoint for featured/trending products
     Respects user's MedixMall mode preference
@@ -287,12 +270,14 @@ class PublicFeaturedProductsView(MedixMallFilterMixin, MedixMallContextMixin, ge
     """
     serializer_class = PublicProductListSerializer
     permission_classes = [permissions.AllowAny]
+    etag_scopes = PRODUCT_LIST_ETAG_SCOPES
 
     @swagger_auto_schema(
         operation_description="Get featured/trending products (most reviewed products). Respects user's MedixMall mode preference.",
         operation_summary="Featured Products (Public)",
         tags=['Public - Products'],
         manual_parameters=[
+            *SPARSE_FIELDSET_PARAMETERS,
             openapi.Parameter('Authorization', openapi.IN_HEADER, description="Bearer <access_token> (optional for MedixMall mode)", type=openapi.TYPE_STRING, required=False),
         ],
         responses={
@@ -312,15 +297,16 @@ class PublicFeaturedProductsView(MedixMallFilterMixin, MedixMallContextMixin, ge
         # Get base queryset with MedixMall filtering and add review count annotation
         queryset = super().get_queryset()
         return queryset.annotate(
-            review_count=Count('reviews')
+            review_count=review_count_expression()
         ).order_by('-review_count', '-created_at')[:10]
 
 
-class PublicProductsByCategory(MedixMallFilterMixin, MedixMallContextMixin, generics.ListAPIView):
+class PublicProductsByCategory(ConditionalGetMixin, SparseFieldsetMixin, MedixMallFilterMixin, MedixMallContextMixin, generics.ListAPIView):
     """
     Public endpoint to get products by category
     Respects user's MedixMall mode preference
     Enhanced to show parent category info, subcategories, and products from all subcategories
+    (at any depth, via the category materialized path)
     Uses lightweight serializer for better performance
     """
     serializer_class = PublicProductListSerializer
@@ -328,6 +314,7 @@ class PublicProductsByCategory(MedixMallFilterMixin, MedixMallContextMixin, gene
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['price', 'created_at', 'name']
     ordering = ['-created_at']
+    etag_scopes = PRODUCT_LIST_ETAG_SCOPES
 
     @swagger_auto_schema(
         operation_description="Get all products in a specific category. If the category has subcategories, includes products from all subcategories too. Respects user's MedixMall mode preference.",
@@ -335,6 +322,7 @@ class PublicProductsByCategory(MedixMallFilterMixin, MedixMallContextMixin, gene
         tags=['Public - Products'],
         manual_parameters=[
             openapi.Parameter('ordering', openapi.IN_QUERY, description="Order by field", type=openapi.TYPE_STRING, enum=['price', '-price', 'created_at', '-created_at', 'name', '-name']),
+            *SPARSE_FIELDSET_PARAMETERS,
             openapi.Parameter('Authorization', openapi.IN_HEADER, description="Bearer <access_token> (optional for MedixMall mode)", type=openapi.TYPE_STRING, required=False),
         ],
         responses={
@@ -360,55 +348,51 @@ class PublicProductsByCategory(MedixMallFilterMixin, MedixMallContextMixin, gene
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+    def get_category_tree(self):
+        """
+        The requested category and its published subtree at any depth (two
+        queries, memoized for the request)
+        """
+        if not hasattr(self, '_category_tree'):
+            from .models import ProductCategory
+            from .categories import published_subtree
+            
+            try:
+                category = ProductCategory.objects.get(id=self.kwargs.get('category_id'), is_publish=True)
+            except ProductCategory.DoesNotExist:
+                from django.http import Http404
+                raise Http404("Category not found")
+            self._category_tree = (category, published_subtree(category))
+        return self._category_tree
+
     def get_queryset(self):
-        from .models import ProductCategory
-        
-        category_id = self.kwargs.get('category_id')
-        
-        # Get the parent category
-        try:
-            parent_category = ProductCategory.objects.get(id=category_id, is_publish=True)
-        except ProductCategory.DoesNotExist:
-            from django.http import Http404
-            raise Http404("Category not found")
-        
-        # Get all subcategories (children of this category)
-        subcategory_ids = list(ProductCategory.objects.filter(
-            parent_id=category_id,
-            is_publish=True
-        ).values_list('id', flat=True))
-        
-        # Create a list of all category IDs to search in (parent + subcategories)
-        all_category_ids = [category_id] + subcategory_ids
+        category, subtree = self.get_category_tree()
         
         # Get base queryset with MedixMall filtering
         queryset = super().get_queryset()
         
-        # Filter products from parent category and all subcategories
-        return queryset.filter(category_id__in=all_category_ids)
+        # Filter products from the category and all its descendants
+        return queryset.filter(category_id__in=[category.id] + [node.id for node in subtree])
     
     def list(self, request, *args, **kwargs):
         """Enhanced list method to include category and subcategory information"""
-        from .models import ProductCategory
+        from .categories import subtree_totals
         
-        category_id = self.kwargs.get('category_id')
-        
-        # Get the parent category
-        try:
-            parent_category = ProductCategory.objects.get(id=category_id, is_publish=True)
-        except ProductCategory.DoesNotExist:
-            from django.http import Http404
-            raise Http404("Category not found")
-        
-        # Get all subcategories
-        subcategories = ProductCategory.objects.filter(
-            parent_id=category_id,
-            is_publish=True
-        ).order_by('name')
+        parent_category, subtree = self.get_category_tree()
+        subcategories = sorted(
+            (node for node in subtree if node.parent_id == parent_category.id),
+            key=lambda node: node.name,
+        )
         
         # Get the standard product list response
         response = super().list(request, *args, **kwargs)
         
+        # Stored counts cover every published product; MedixMall mode needs its own
+        counts = None
+        if self.get_medixmall_mode(request):
+            counts = self.get_products_counts_for_categories([parent_category.id] + [node.id for node in subtree])
+        product_counts = subtree_totals(parent_category, subtree, counts)
+        
         # Enhance the response with category and subcategory information
         response.data = {
             'category': {
@@ -416,8 +400,8 @@ class PublicProductsByCategory(MedixMallFilterMixin, MedixMallContextMixin, gene
                 'name': parent_category.name,
                 'slug': parent_category.slug,
                 'icon': parent_category.icon,
-                'is_parent': subcategories.exists(),
-                'total_subcategories': subcategories.count()
+                'is_parent': bool(subcategories),
+                'total_subcategories': len(subcategories)
             },
             'subcategories': [
                 {
@@ -425,7 +409,7 @@ class PublicProductsByCategory(MedixMallFilterMixin, MedixMallContextMixin, gene
                     'name': subcat.name,
                     'slug': subcat.slug,
                     'icon': subcat.icon,
-                    'product_count': self.get_products_count_for_category(subcat.id)
+                    'product_count': product_counts.get(subcat.id, 0)
                 }
                 for subcat in subcategories
             ],
@@ -439,12 +423,24 @@ class PublicProductsByCategory(MedixMallFilterMixin, MedixMallContextMixin, gene
     
     def get_products_count_for_category(self, category_id):
         """Get product count for a specific category"""
+        return self.get_products_counts_for_categories([category_id]).get(category_id, 0)
+    
+    def get_products_counts_for_categories(self, category_ids):
+        """Product counts for several categories in one grouped query"""
+        if not category_ids:
+            return {}
         # Use the same base queryset logic to respect MedixMall mode
         base_queryset = super().get_queryset()
-        return base_queryset.filter(category_id=category_id).count()
+        return dict(
+            base_queryset.filter(category_id__in=category_ids)
+            .order_by()
+            .values('category_id')
+            .annotate(product_count=Count('id'))
+            .values_list('category_id', 'product_count')
+        )
 
 
-class PublicProductsByBrand(MedixMallFilterMixin, MedixMallContextMixin, generics.ListAPIView):
+class PublicProductsByBrand(ConditionalGetMixin, SparseFieldsetMixin, MedixMallFilterMixin, MedixMallContextMixin, generics.ListAPIView):
     """
     Public endpoint to get products by brand
     Respects user's MedixMall mode preference
@@ -455,6 +451,7 @@ class PublicProductsByBrand(MedixMallFilterMixin, MedixMallContextMixin, generic
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['price', 'created_at', 'name']
     ordering = ['-created_at']
+    etag_scopes = PRODUCT_LIST_ETAG_SCOPES
 
     @swagger_auto_schema(
         operation_description="Get all products by a specific brand. Respects user's MedixMall mode preference.",
@@ -462,6 +459,7 @@ class PublicProductsByBrand(MedixMallFilterMixin, MedixMallContextMixin, generic
         tags=['Public - Products'],
         manual_parameters=[
             openapi.Parameter('ordering', openapi.IN_QUERY, description="Order by field", type=openapi.TYPE_STRING, enum=['price', '-price', 'created_at', '-created_at', 'name', '-name']),
+            *SPARSE_FIELDSET_PARAMETERS,
             openapi.Parameter('Authorization', openapi.IN_HEADER, description="Bearer <access_token> (optional for MedixMall mode)", type=openapi.TYPE_STRING, required=False),
         ],
         responses={
@@ -483,7 +481,7 @@ class PublicProductsByBrand(MedixMallFilterMixin, MedixMallContextMixin, generic
         return queryset.filter(brand_id=brand_id)
 
 
-class PublicProductsByType(MedixMallFilterMixin, MedixMallContextMixin, generics.ListAPIView):
+class PublicProductsByType(ConditionalGetMixin, SparseFieldsetMixin, MedixMallFilterMixin, MedixMallContextMixin, generics.ListAPIView):
     """
     Public endpoint to get products by product type (medicine, equipment, pathology)
     Respects user's MedixMall mode preference
@@ -494,6 +492,7 @@ class PublicProductsByType(MedixMallFilterMixin, MedixMallContextMixin, generics
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['price', 'created_at', 'name']
     ordering = ['-created_at']
+    etag_scopes = PRODUCT_LIST_ETAG_SCOPES
 
     @swagger_auto_schema(
         operation_description="Get all products by a specific product type (medicine, equipment, pathology). Respects user's MedixMall mode preference.",
@@ -501,6 +500,7 @@ class PublicProductsByType(MedixMallFilterMixin, MedixMallContextMixin, generics
         tags=['Public - Products'],
         manual_parameters=[
             openapi.Parameter('ordering', openapi.IN_QUERY, description="Order by field", type=openapi.TYPE_STRING, enum=['price', '-price', 'created_at', '-created_at', 'name', '-name']),
+            *SPARSE_FIELDSET_PARAMETERS,
             openapi.Parameter('Authorization', openapi.IN_HEADER, description="Bearer <access_token> (optional for MedixMall mode)", type=openapi.TYPE_STRING, required=False),
         ],
         responses={
@@ -527,4 +527,121 @@ class PublicProductsByType(MedixMallFilterMixin, MedixMallContextMixin, generics
             raise Http404(f"Invalid product type. Must be one of: {', '.join(valid_types)}")
         
         queryset = super().get_queryset()
-        return queryset.filter(product_type=product_type)
\ No newline at end of file
+        return queryset.filter(product_type=product_type)
+
+class PublicVariantPriceView(APIView):
+    """
+    Public endpoint resolving the price of variants at a delivery location
+    (supplier price for the pincode, then the district, then the catalog
+    price; see products/pricing.py)
+    """
+    permission_classes = [permissions.AllowAny]
+    MAX_VARIANTS = 200
+
+    @swagger_auto_schema(
+        operation_description="Resolve the best supplier price and MRP of variants for a delivery pincode/district, falling back to the catalog price.",
+        operation_summary="Variant Prices by Location (Public)",
+        tags=['Public - Products'],
+        manual_parameters=[
+            openapi.Parameter('variant_ids', openapi.IN_QUERY, description="Comma separated variant ids (max 200)", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('pincode', openapi.IN_QUERY, description="Delivery pincode", type=openapi.TYPE_STRING),
+            openapi.Parameter('district', openapi.IN_QUERY, description="Delivery district", type=openapi.TYPE_STRING),
+        ],
+        responses={200: 'Success', 400: 'Invalid variant_ids'}
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            variant_ids = {int(value) for value in request.query_params.get('variant_ids', '').split(',') if value.strip()}
+        except ValueError:
+            return Response({'error': 'variant_ids must be a comma separated list of integers'}, status=400)
+        if not variant_ids or len(variant_ids) > self.MAX_VARIANTS:
+            return Response({'error': f'Provide between 1 and {self.MAX_VARIANTS} variant_ids'}, status=400)
+
+        visible = ProductVariant.objects.filter(
+            pk__in=variant_ids, is_active=True,
+            product__status__in=['approved', 'published'], product__is_publish=True,
+        ).values_list('pk', flat=True)
+        resolved = resolve_prices(visible, request.query_params.get('pincode'), request.query_params.get('district'))
+        return Response({
+            'prices': [
+                {
+                    'variant_id': price.variant_id,
+                    'product_id': price.product_id,
+                    'price': str(price.price),
+                    'mrp': str(price.mrp),
+                    'source': price.source,
+                    'supplier_id': price.supplier_id,
+                }
+                for price in sorted(resolved.values(), key=lambda price: price.variant_id)
+            ]
+        })
+
+
+class PublicProductVariantMatrixView(APIView):
+    """
+    Public endpoint returning a product's whole variant selection matrix
+    (attribute axes plus one entry per attribute value combination; see
+    products/variant_matrix.py)
+    """
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Get the variant matrix of a product: attribute axes and, keyed by sorted comma-joined attribute value ids, the variant id, SKU, price, MRP, stock and image. Pass `values` to also get the entry for one combination.",
+        operation_summary="Product Variant Matrix (Public)",
+        tags=['Public - Products'],
+        manual_parameters=[
+            openapi.Parameter('values', openapi.IN_QUERY, description="Comma separated attribute value ids to select", type=openapi.TYPE_STRING),
+        ],
+        responses={200: 'Success', 400: 'Invalid values', 404: 'Product not found'}
+    )
+    def get(self, request, pk, *args, **kwargs):
+        product = get_object_or_404(
+            Product.objects.select_related('variant_matrix'),
+            pk=pk, status__in=['approved', 'published'], is_publish=True,
+        )
+        matrix = get_variant_matrix(product)
+        data = matrix_payload(matrix)
+        if 'values' in request.query_params:
+            try:
+                value_ids = [int(value) for value in request.query_params['values'].split(',') if value.strip()]
+            except ValueError:
+                return Response({'error': 'values must be a comma separated list of integers'}, status=400)
+            data['selected'] = select_variant(matrix, value_ids)
+        return Response(data)
+
+
+class PublicCatalogChangesView(APIView):
+    """
+    Public catalog change feed: compact product/variant deltas after a
+    sequence number, oldest first (see products/change_feed.py)
+
+    Start with `since=0` (or after a full catalog fetch, with the latest
+    `next_since`), apply each delta, then poll again with `next_since`.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Get product/variant changes after a sequence number, oldest first. Each entry carries the new values of the changed fields only; `deleted` entries carry none. Poll again with `next_since`; `has_more` means another page is ready.",
+        operation_summary="Catalog Change Feed (Public)",
+        tags=['Public - Products'],
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, description="Last sequence number already applied (default 0)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('limit', openapi.IN_QUERY, description=f"Maximum changes to return (default {change_feed.DEFAULT_PAGE_SIZE}, max {change_feed.MAX_PAGE_SIZE})", type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: 'Success', 400: 'Invalid since/limit'}
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', change_feed.DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'since and limit must be integers'}, status=400)
+        if since < 0 or limit < 1:
+            return Response({'error': 'since must be >= 0 and limit >= 1'}, status=400)
+
+        changes, has_more = change_feed.changes_since(since, min(limit, change_feed.MAX_PAGE_SIZE))
+        return Response({
+            'changes': [change_feed.change_payload(change) for change in changes],
+            'next_since': changes[-1].seq if changes else since,
+            'has_more': has_more,
+        })
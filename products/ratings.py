@@ -0,0 +1,146 @@
+"""
+Maintenance of the denormalized ProductRatingSummary rows.
+
+Every ProductReview save/delete applies a delta to its product's summary with
+a single ``UPDATE ... SET col = col + n`` inside the review's transaction, so
+readers never aggregate the reviews table. The first review of a product, or
+a summary that drifted, falls back to recomputing the row from the reviews.
+"""
+
+from typing import Dict, Iterable, Optional
+
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import ProductRatingSummary, ProductReview
+
+RATINGS = range(1, 6)
+
+EMPTY_REVIEW_STATS = {
+    'total_reviews': 0,
+    'average_rating': 0,
+    'rating_distribution': {str(rating): 0 for rating in reversed(RATINGS)},
+}
+
+
+def review_stats(product) -> Dict:
+    """
+    ``review_stats`` for a product, read from its summary (select_related
+    ``rating_summary`` to avoid the extra query)
+    """
+    try:
+        return product.rating_summary.as_review_stats()
+    except ProductRatingSummary.DoesNotExist:
+        return {**EMPTY_REVIEW_STATS, 'rating_distribution': dict(EMPTY_REVIEW_STATS['rating_distribution'])}
+
+
+# Query expressions for Product querysets (LEFT JOIN on the summary, no GROUP BY)
+
+def review_count_expression():
+    return Coalesce(F('rating_summary__review_count'), Value(0))
+
+
+def average_rating_expression():
+    """Average of all ratings, NULL for unreviewed products"""
+    return Cast(F('rating_summary__rating_sum'), FloatField()) / NullIf(
+        F('rating_summary__review_count'), Value(0)
+    )
+
+
+def published_average_rating_expression():
+    """
+    Average rating of published reviews only; reviews are published exactly
+    when rating >= 3 (see ProductReview.save), so it follows from the histogram
+    """
+    published_sum = (
+        F('rating_summary__rating_3') * 3 + F('rating_summary__rating_4') * 4
+        + F('rating_summary__rating_5') * 5
+    )
+    published_count = (
+        F('rating_summary__rating_3') + F('rating_summary__rating_4') + F('rating_summary__rating_5')
+    )
+    return Cast(published_sum, FloatField()) / NullIf(published_count, Value(0))
+
+
+def summary_rows(product_ids: Optional[Iterable[int]] = None):
+    """
+    Recompute summaries from the reviews table with one GROUP BY
+    """
+    reviews = ProductReview.objects.all()
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=list(product_ids))
+    return reviews.order_by().values('product_id').annotate(
+        review_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in RATINGS},
+    )
+
+
+def rebuild_rating_summary(product_id: int) -> None:
+    rows = list(summary_rows([product_id]))
+    if rows:
+        values = rows[0]
+        values.pop('product_id')
+        ProductRatingSummary.objects.update_or_create(product_id=product_id, defaults=values)
+    else:
+        ProductRatingSummary.objects.filter(product_id=product_id).delete()
+
+
+def apply_review_delta(product_id: int, rating: int, sign: int) -> None:
+    """
+    Add (sign=1) or remove (sign=-1) one review of ``rating`` from a summary
+    """
+    if rating not in RATINGS:
+        rebuild_rating_summary(product_id)
+        return
+    summaries = ProductRatingSummary.objects.filter(product_id=product_id)
+    if sign < 0:
+        # Never drive a counter below zero; a drifted row is recomputed instead
+        updated = summaries.filter(**{f'rating_{rating}__gt': 0}).update(
+            review_count=F('review_count') - 1,
+            rating_sum=F('rating_sum') - rating,
+            **{f'rating_{rating}': F(f'rating_{rating}') - 1},
+        )
+        # No row at all (never built, or removed with its product): nothing to do
+        if not updated and summaries.exists():
+            rebuild_rating_summary(product_id)
+        return
+    updated = summaries.update(
+        review_count=F('review_count') + 1,
+        rating_sum=F('rating_sum') + rating,
+        **{f'rating_{rating}': F(f'rating_{rating}') + 1},
+    )
+    if not updated:
+        rebuild_rating_summary(product_id)
+
+
+# Signal handlers
+
+@receiver(post_init, sender=ProductReview)
+def remember_review_rating(sender, instance, **kwargs):
+    # Field tracker: what the row held when loaded, so updates know the old rating
+    instance._summary_state = (instance.product_id, instance.rating) if instance.pk else None
+
+
+@receiver(post_save, sender=ProductReview)
+def update_summary_on_review_save(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_summary_state', None)
+    current = (instance.product_id, instance.rating)
+    if previous != current:
+        if previous is not None:
+            apply_review_delta(previous[0], previous[1], -1)
+        elif not created:
+            # Saved through an instance we never saw loaded: recompute
+            rebuild_rating_summary(instance.product_id)
+            instance._summary_state = current
+            return
+        apply_review_delta(instance.product_id, instance.rating, 1)
+    instance._summary_state = current
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_summary_on_review_delete(sender, instance, **kwargs):
+    state = getattr(instance, '_summary_state', None) or (instance.product_id, instance.rating)
+    apply_review_delta(state[0], state[1], -1)
@@ -0,0 +1,242 @@
+"""
+Related-products engine.
+
+For every published product a ranked list of neighbor ids is precomputed by
+a batch job (``manage.py compute_related_products``) and stored in one
+RelatedProducts row. Candidates come from four signals:
+
+- co-purchase: other products in the same orders (orders.OrderItem)
+- co-view: other products viewed by the same user/session (analytics.ProductView)
+- same brand and same category (most reviewed first)
+
+Co-occurrence counts are damped with ``log1p`` and combined with the weights
+in RELATED_SIGNAL_WEIGHTS. Each batch of target products costs a fixed number
+of queries regardless of its size.
+
+Incremental runs only recompute products without a row and products touched
+since the previous run (edited, ordered or viewed). Detail views read the
+list with the product row and load the neighbors in a single query.
+"""
+
+import math
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.apps import apps
+from django.db.models import F, Max, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import Product, RelatedProducts
+from .ratings import review_count_expression
+
+PUBLISHED_STATUSES = ('approved', 'published')
+
+RELATED_SIGNAL_WEIGHTS = {
+    'co_purchase': 4.0,
+    'co_view': 3.0,
+    'category': 1.5,
+    'brand': 1.0,
+}
+
+# Neighbors stored per product; detail views show the first DEFAULT_RELATED_LIMIT
+MAX_RELATED = 12
+DEFAULT_RELATED_LIMIT = 4
+# Same-category / same-brand candidates considered per group
+GROUP_CANDIDATES = 50
+# Orders and views older than this do not count
+SIGNAL_WINDOW_DAYS = 180
+
+
+def _published(queryset):
+    return queryset.filter(status__in=PUBLISHED_STATUSES, is_publish=True)
+
+
+def _group_candidates(field: str, group_ids: Set[int]) -> Dict[int, List[int]]:
+    """Top GROUP_CANDIDATES published products per category/brand, one query"""
+    if not group_ids:
+        return {}
+    rows = _published(Product.objects.filter(**{f'{field}__in': group_ids})).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=F(field),
+            order_by=[review_count_expression().desc(), F('created_at').desc()],
+        )
+    ).filter(position__lte=GROUP_CANDIDATES).values_list('id', field)
+    groups = defaultdict(list)
+    for pk, group_id in rows:
+        groups[group_id].append(pk)
+    return groups
+
+
+def _co_occurrences(pairs, targets: Set[int]) -> Dict[int, Dict[int, int]]:
+    """
+    ``pairs`` are ``(basket, product_id)`` rows; count how many baskets each
+    target shares with every other product
+    """
+    baskets = defaultdict(set)
+    for basket, product_id in pairs:
+        baskets[basket].add(product_id)
+    counts = defaultdict(lambda: defaultdict(int))
+    for products in baskets.values():
+        for target in products & targets:
+            for other in products:
+                if other != target:
+                    counts[target][other] += 1
+    return counts
+
+
+def _co_purchases(targets: Set[int], since) -> Dict[int, Dict[int, int]]:
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    orders = OrderItem.objects.filter(product_id__in=targets, created_at__gte=since).values('order_id')
+    pairs = OrderItem.objects.filter(order_id__in=orders).order_by().values_list(
+        'order_id', 'product_id'
+    ).distinct()
+    return _co_occurrences(pairs, targets)
+
+
+def _co_views(targets: Set[int], since) -> Dict[int, Dict[int, int]]:
+    ProductView = apps.get_model('analytics', 'ProductView')
+    views = ProductView.objects.filter(created_at__gte=since)
+    visitors = views.filter(product_id__in=targets)
+    rows = views.filter(
+        Q(user_id__in=visitors.exclude(user_id=None).values('user_id'))
+        | Q(user_id=None, session_key__in=visitors.filter(user_id=None).exclude(session_key='').values('session_key'))
+    ).order_by().values_list('product_id', 'user_id', 'session_key').distinct()
+    pairs = (
+        (('user', user_id) if user_id else ('session', session_key), product_id)
+        for product_id, user_id, session_key in rows
+        if user_id or session_key
+    )
+    return _co_occurrences(pairs, targets)
+
+
+def compute_related(product_ids: Iterable[int]) -> Dict[int, List[int]]:
+    """
+    Ranked neighbor ids for each of ``product_ids``
+    """
+    targets = {
+        pk: (category_id, brand_id)
+        for pk, category_id, brand_id in Product.objects.filter(
+            id__in=list(product_ids)
+        ).order_by().values_list('id', 'category_id', 'brand_id')
+    }
+    if not targets:
+        return {}
+    target_ids = set(targets)
+    since = timezone.now() - timedelta(days=SIGNAL_WINDOW_DAYS)
+
+    by_category = _group_candidates('category_id', {c for c, _ in targets.values() if c})
+    by_brand = _group_candidates('brand_id', {b for _, b in targets.values() if b})
+    co_purchase = _co_purchases(target_ids, since)
+    co_view = _co_views(target_ids, since)
+
+    # Co-occurring products must themselves be published
+    co_candidates = set()
+    for counts in (co_purchase, co_view):
+        for neighbors in counts.values():
+            co_candidates.update(neighbors)
+    published = set(
+        _published(Product.objects.filter(id__in=co_candidates)).values_list('id', flat=True)
+    ) if co_candidates else set()
+
+    weights = RELATED_SIGNAL_WEIGHTS
+    related = {}
+    for pk, (category_id, brand_id) in targets.items():
+        scores = defaultdict(float)
+        for other in by_category.get(category_id, ()):
+            scores[other] += weights['category']
+        for other in by_brand.get(brand_id, ()):
+            scores[other] += weights['brand']
+        for other, count in co_purchase.get(pk, {}).items():
+            if other in published:
+                scores[other] += weights['co_purchase'] * math.log1p(count)
+        for other, count in co_view.get(pk, {}).items():
+            if other in published:
+                scores[other] += weights['co_view'] * math.log1p(count)
+        scores.pop(pk, None)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        related[pk] = [other for other, _ in ranked[:MAX_RELATED]]
+    return related
+
+
+def _chunked(ids: List[int], size: int):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def refresh_related_products(product_ids: Optional[Iterable[int]] = None, batch_size: int = 500) -> int:
+    """
+    Recompute and store neighbor lists; all published products by default.
+    Products whose list changed get their detail generation bumped (the
+    detail payload embeds the neighbors)
+    """
+    from .enterprise_cache import EnterpriseCacheManager
+
+    if product_ids is None:
+        product_ids = _published(Product.objects.all()).values_list('id', flat=True)
+    ids = sorted(set(product_ids))
+    for chunk in _chunked(ids, batch_size):
+        now = timezone.now()
+        related = compute_related(chunk)
+        previous = dict(
+            RelatedProducts.objects.filter(product_id__in=related).values_list('product_id', 'neighbor_ids')
+        )
+        rows = [
+            RelatedProducts(product_id=pk, neighbor_ids=neighbors, computed_at=now)
+            for pk, neighbors in related.items()
+        ]
+        RelatedProducts.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['neighbor_ids', 'computed_at'],
+        )
+        for pk, neighbors in related.items():
+            if previous.get(pk) != neighbors:
+                EnterpriseCacheManager.bump_generation('product', pk)
+    return len(ids)
+
+
+def stale_product_ids() -> Set[int]:
+    """
+    Products whose neighbor list is missing or may have changed since the
+    last run: edited products, products in new orders, newly viewed products
+    """
+    stale = set(
+        _published(Product.objects.filter(related_products__isnull=True)).values_list('id', flat=True)
+    )
+    watermark = RelatedProducts.objects.aggregate(latest=Max('computed_at'))['latest']
+    if watermark is None:
+        return stale
+
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    ProductView = apps.get_model('analytics', 'ProductView')
+    stale.update(Product.objects.filter(updated_at__gt=watermark).values_list('id', flat=True))
+    stale.update(OrderItem.objects.filter(created_at__gt=watermark).values_list('product_id', flat=True))
+    stale.update(ProductView.objects.filter(created_at__gt=watermark).values_list('product_id', flat=True))
+    return stale
+
+
+def get_related_products(product, limit: int = DEFAULT_RELATED_LIMIT):
+    """
+    Related products of ``product`` in rank order, loaded in one query with
+    what PublicProductListSerializer needs. Falls back to same-category
+    products until the batch job has covered ``product``.
+    """
+    queryset = _published(Product.objects.all()).select_related(
+        'category', 'brand', 'medicine_details', 'equipment_details', 'pathology_details'
+    )
+    try:
+        neighbor_ids = product.related_products.neighbor_ids
+    except RelatedProducts.DoesNotExist:
+        return list(
+            queryset.filter(category_id=product.category_id).exclude(id=product.id)[:limit]
+        )
+    if not neighbor_ids:
+        return []
+    # Fetch a few spares in case some neighbors were unpublished since
+    candidates = neighbor_ids[:limit * 2]
+    products = {p.id: p for p in queryset.filter(id__in=candidates)}
+    return [products[pk] for pk in candidates if pk in products][:limit]
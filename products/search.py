@@ -0,0 +1,539 @@
+"""
+Pluggable product search backends.
+
+Products are tokenized into an inverted index (one row per product/field/token)
+that is kept up to date from Product, detail-model and tag saves. Searches look
+up matching tokens instead of scanning the product table with ``icontains``
+joins, and return ranked product IDs.
+
+The active backend is selected with ``settings.PRODUCT_SEARCH_BACKEND``
+(dotted path). ``DatabaseSearchBackend`` stores the index in
+``ProductSearchToken`` and works on both SQLite and PostgreSQL;
+``InMemorySearchBackend`` is a pure-Python fallback used by tests.
+
+Matches are ranked with BM25, using the per-field weights below as field
+boosts. ``apply_relevance_boosts`` layers exact-match, stock and rating
+boosts on top for the "relevance" sort.
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import (
+    Avg, Case, Count, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery,
+    Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import (
+    Brand, EquipmentDetails, MedicineDetails, PathologyDetails, Product,
+    ProductCategory, ProductSearchToken,
+)
+from .ratings import published_average_rating_expression
+
+# Per-field relevance weights (mirrors the priorities documented in
+# EnterpriseProductFilter.filter_search)
+SEARCH_FIELD_WEIGHTS = {
+    'name': 100,
+    'sku': 90,
+    'brand': 80,
+    'category': 70,
+    'description': 60,
+    'details': 50,
+    'tags': 30,
+}
+
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TERMS = 10
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Additive boosts applied on top of the BM25 score for the "relevance" sort
+RELEVANCE_BOOSTS = {
+    'exact_name': 5.0,
+    'exact_sku': 4.0,
+    'in_stock': 1.0,
+    'rating': 0.5,  # per star of average published rating
+}
+
+CORPUS_STATS_CACHE_KEY = 'search_index:corpus_stats'
+CORPUS_STATS_TIMEOUT = 300
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into lowercase alphanumeric tokens"""
+    if not text:
+        return []
+    return [token[:MAX_TOKEN_LENGTH] for token in _TOKEN_RE.findall(str(text).lower())]
+
+
+def query_terms(query: Optional[str]) -> List[str]:
+    """Tokenize a search query, de-duplicated and capped in length"""
+    terms = []
+    for token in tokenize(query):
+        if token not in terms:
+            terms.append(token)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def _related_or_none(product, attr):
+    try:
+        return getattr(product, attr)
+    except ObjectDoesNotExist:
+        return None
+
+
+def build_document(product: Product) -> Dict[str, str]:
+    """
+    Collect the searchable text of a product, keyed by index field
+    """
+    details = []
+    medicine = _related_or_none(product, 'medicine_details')
+    if medicine:
+        details.extend([medicine.composition, medicine.manufacturer, medicine.form])
+    equipment = _related_or_none(product, 'equipment_details')
+    if equipment:
+        details.extend([
+            equipment.model_number, equipment.equipment_type,
+            equipment.usage_type, equipment.technical_specifications,
+        ])
+    pathology = _related_or_none(product, 'pathology_details')
+    if pathology:
+        details.extend([pathology.compatible_tests, pathology.chemical_composition])
+
+    return {
+        'name': product.name,
+        'sku': product.sku,
+        'brand': product.brand.name if product.brand_id else '',
+        'category': product.category.name if product.category_id else '',
+        'description': product.description,
+        'details': ' '.join(filter(None, details)),
+        'tags': ' '.join(product.tags.names()) if product.pk else '',
+    }
+
+
+def build_postings(product: Product) -> List[Tuple[str, str, int, int]]:
+    """
+    Turn a product into ``(field, token, frequency, field_length)`` postings
+    """
+    postings = []
+    for field, text in build_document(product).items():
+        tokens = tokenize(text)
+        for token, frequency in Counter(tokens).items():
+            postings.append((field, token, frequency, len(tokens)))
+    return postings
+
+
+def bm25_idf(total_documents: int, document_frequency: int) -> float:
+    return math.log(1 + (total_documents - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def bm25_posting_score(weight: float, idf: float, frequency: int, field_length: int,
+                       average_length: float) -> float:
+    """
+    BM25 contribution of a single posting, scaled by its field weight
+    """
+    length_ratio = field_length / average_length if average_length else 0.0
+    norm = 1 - BM25_B + BM25_B * length_ratio
+    return (weight / 100.0) * idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * norm)
+
+
+def apply_relevance_boosts(queryset, query: str):
+    """
+    Annotate ``relevance`` = ``search_score`` plus exact name/SKU match,
+    in-stock and average review rating boosts.
+
+    Everything is computed in SQL so the caller can order and slice by
+    relevance without loading the candidate set into Python.
+    """
+    query = (query or '').strip()
+    average_rating = published_average_rating_expression()
+    return queryset.annotate(
+        relevance=ExpressionWrapper(
+            Coalesce(F('search_score'), Value(0.0))
+            + Case(When(name__iexact=query, then=Value(RELEVANCE_BOOSTS['exact_name'])),
+                   default=Value(0.0), output_field=FloatField())
+            + Case(When(sku__iexact=query, then=Value(RELEVANCE_BOOSTS['exact_sku'])),
+                   default=Value(0.0), output_field=FloatField())
+            + Case(When(stock__gt=0, then=Value(RELEVANCE_BOOSTS['in_stock'])),
+                   default=Value(0.0), output_field=FloatField())
+            + Coalesce(average_rating, Value(0.0)) * Value(RELEVANCE_BOOSTS['rating']),
+            output_field=FloatField(),
+        )
+    )
+
+
+class BaseSearchBackend:
+    """
+    Interface shared by all search backends
+    """
+
+    def index_product(self, product: Product) -> None:
+        raise NotImplementedError
+
+    def remove_product(self, product_id: int) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Return ``(product_id, score)`` pairs ordered by descending score
+        """
+        raise NotImplementedError
+
+    def search_ids(self, query: str, limit: Optional[int] = None) -> List[int]:
+        return [product_id for product_id, _ in self.search(query, limit)]
+
+    def filter_queryset(self, queryset, query: str):
+        """
+        Restrict a Product queryset to search matches and annotate
+        ``search_score`` so callers can order by relevance
+        """
+        ranked = self.search(query)
+        if not ranked:
+            return queryset.none()
+        return queryset.filter(pk__in=[pk for pk, _ in ranked]).annotate(
+            search_score=Case(
+                *[When(pk=pk, then=Value(float(score))) for pk, score in ranked],
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+
+    def rebuild(self, products: Iterable[Product]) -> int:
+        self.clear()
+        count = 0
+        for product in products:
+            self.index_product(product)
+            count += 1
+        return count
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Inverted index stored in the ``ProductSearchToken`` table.
+
+    Query terms match index tokens by prefix, so ``para`` finds
+    ``paracetamol`` through the ``(token, product)`` index rather than a
+    table scan.
+    """
+
+    def index_product(self, product: Product) -> None:
+        rows = [
+            ProductSearchToken(
+                product_id=product.pk,
+                field=field,
+                token=token,
+                weight=SEARCH_FIELD_WEIGHTS[field],
+                frequency=frequency,
+                field_length=field_length,
+            )
+            for field, token, frequency, field_length in build_postings(product)
+        ]
+        with transaction.atomic():
+            ProductSearchToken.objects.filter(product_id=product.pk).delete()
+            ProductSearchToken.objects.bulk_create(rows, batch_size=500)
+        cache.delete(CORPUS_STATS_CACHE_KEY)
+
+    def remove_product(self, product_id: int) -> None:
+        ProductSearchToken.objects.filter(product_id=product_id).delete()
+        cache.delete(CORPUS_STATS_CACHE_KEY)
+
+    def clear(self) -> None:
+        ProductSearchToken.objects.all().delete()
+        cache.delete(CORPUS_STATS_CACHE_KEY)
+
+    def _matching_tokens(self, terms: List[str]):
+        condition = Q()
+        for term in terms:
+            condition |= Q(token__startswith=term)
+        return ProductSearchToken.objects.filter(condition)
+
+    def corpus_stats(self) -> Tuple[int, Dict[str, float]]:
+        """
+        Return ``(indexed_products, {field: mean field length})``.
+
+        Lengths are averaged over postings rather than documents, which is
+        close enough for length normalisation and needs a single GROUP BY.
+        Cached briefly since it changes slowly.
+        """
+        stats = cache.get(CORPUS_STATS_CACHE_KEY)
+        if stats is None:
+            rows = ProductSearchToken.objects.order_by().values('field').annotate(
+                avg_length=Avg('field_length'),
+                documents=Count('product', distinct=True),
+            )
+            total = 0
+            average_lengths = {}
+            for row in rows:
+                total = max(total, row['documents'])
+                average_lengths[row['field']] = float(row['avg_length'] or 0.0)
+            stats = (total, average_lengths)
+            cache.set(CORPUS_STATS_CACHE_KEY, stats, CORPUS_STATS_TIMEOUT)
+        return stats
+
+    def document_frequencies(self, terms: List[str]) -> Dict[str, int]:
+        """
+        Number of products matching each term, in one aggregate query
+        """
+        aggregates = {
+            f"t{index}": Count('product', distinct=True, filter=Q(token__startswith=term))
+            for index, term in enumerate(terms)
+        }
+        counts = ProductSearchToken.objects.aggregate(**aggregates)
+        return {term: counts[f"t{index}"] or 0 for index, term in enumerate(terms)}
+
+    def score_expression(self, terms: List[str]):
+        """
+        Per-posting BM25 expression; summing it per product gives the score
+        """
+        total, average_lengths = self.corpus_stats()
+        frequencies = self.document_frequencies(terms)
+        idf = Case(
+            *[When(token__startswith=term, then=Value(bm25_idf(total, frequencies[term])))
+              for term in terms],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        average_length = Case(
+            *[When(field=field, then=Value(length or 1.0)) for field, length in average_lengths.items()],
+            default=Value(1.0),
+            output_field=FloatField(),
+        )
+        frequency = Cast('frequency', FloatField())
+        field_length = Cast('field_length', FloatField())
+        weight = Cast('weight', FloatField()) / Value(100.0)
+        norm = Value(1 - BM25_B) + Value(BM25_B) * field_length / average_length
+        return ExpressionWrapper(
+            weight * idf * frequency * Value(BM25_K1 + 1) / (frequency + Value(BM25_K1) * norm),
+            output_field=FloatField(),
+        )
+
+    def score_subquery(self, terms: List[str]):
+        """
+        Correlated subquery yielding the BM25 score of the outer product
+        """
+        return Subquery(
+            self._matching_tokens(terms)
+            .filter(product_id=OuterRef('pk'))
+            .order_by()
+            .values('product_id')
+            .annotate(score=Sum(self.score_expression(terms)))
+            .values('score')[:1],
+            output_field=FloatField(),
+        )
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        terms = query_terms(query)
+        if not terms:
+            return []
+        ranked = (
+            self._matching_tokens(terms)
+            .order_by()
+            .values('product_id')
+            .annotate(score=Sum(self.score_expression(terms)))
+            .order_by('-score', 'product_id')
+            .values_list('product_id', 'score')
+        )
+        if limit:
+            ranked = ranked[:limit]
+        return [(product_id, float(score)) for product_id, score in ranked]
+
+    def filter_queryset(self, queryset, query: str):
+        terms = query_terms(query)
+        if not terms:
+            return queryset.none()
+        matching_ids = self._matching_tokens(terms).values('product_id')
+        return queryset.filter(pk__in=matching_ids).annotate(
+            search_score=Coalesce(self.score_subquery(terms), Value(0.0))
+        )
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    Pure-Python inverted index for tests and environments without the index
+    table. State is process-local; scoring matches DatabaseSearchBackend.
+    """
+
+    def __init__(self):
+        # token -> product_id -> [(field, frequency, field_length)]
+        self._postings: Dict[str, Dict[int, List[Tuple[str, int, int]]]] = defaultdict(dict)
+        self._documents: Dict[int, List[str]] = {}
+
+    def index_product(self, product: Product) -> None:
+        self.remove_product(product.pk)
+        tokens = []
+        for field, token, frequency, field_length in build_postings(product):
+            self._postings[token].setdefault(product.pk, []).append((field, frequency, field_length))
+            tokens.append(token)
+        self._documents[product.pk] = tokens
+
+    def remove_product(self, product_id: int) -> None:
+        for token in self._documents.pop(product_id, []):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[token]
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._documents.clear()
+
+    def _average_lengths(self) -> Dict[str, float]:
+        totals: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+        for postings in self._postings.values():
+            for entries in postings.values():
+                for field, _, field_length in entries:
+                    totals[field][0] += field_length
+                    totals[field][1] += 1
+        return {field: length / count for field, (length, count) in totals.items()}
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        terms = query_terms(query)
+        if not terms:
+            return []
+        matches = {
+            term: [token for token in self._postings if token.startswith(term)]
+            for term in terms
+        }
+        total = len(self._documents)
+        average_lengths = self._average_lengths()
+        scores: Dict[int, float] = defaultdict(float)
+        scored_tokens = set()
+        for term in terms:
+            matched_products = {pid for token in matches[term] for pid in self._postings[token]}
+            idf = bm25_idf(total, len(matched_products))
+            for token in matches[term]:
+                # A token matching several terms is scored once, by the first
+                if token in scored_tokens:
+                    continue
+                scored_tokens.add(token)
+                for product_id, entries in self._postings[token].items():
+                    for field, frequency, field_length in entries:
+                        scores[product_id] += bm25_posting_score(
+                            SEARCH_FIELD_WEIGHTS[field], idf, frequency,
+                            field_length, average_lengths.get(field) or 1.0,
+                        )
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+
+_backend = None
+_backend_path = None
+
+
+def get_search_backend() -> BaseSearchBackend:
+    """
+    Return the configured backend instance (cached per process)
+    """
+    global _backend, _backend_path
+    path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'products.search.DatabaseSearchBackend')
+    if _backend is None or path != _backend_path:
+        _backend = import_string(path)()
+        _backend_path = path
+    return _backend
+
+
+def index_products_by_id(product_ids: Iterable[int]) -> None:
+    """
+    Re-index the given products after the surrounding transaction commits
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    def _reindex():
+        backend = get_search_backend()
+        products = Product.objects.filter(pk__in=product_ids).select_related(
+            'brand', 'category', 'medicine_details', 'equipment_details', 'pathology_details'
+        ).prefetch_related('tags')
+        for product in products:
+            backend.index_product(product)
+
+    transaction.on_commit(_reindex)
+
+
+# Columns build_document reads from each model (the rest comes from
+# details and tags, which have their own handlers)
+INDEXED_FIELDS = {
+    Product: ('name', 'sku', 'description', 'brand_id', 'category_id'),
+    Brand: ('name',),
+    ProductCategory: ('name',),
+}
+
+
+def _indexed_values(instance) -> Optional[Tuple]:
+    fields = INDEXED_FIELDS[type(instance)]
+    if not instance.pk or instance.get_deferred_fields() & set(fields):
+        return None
+    return tuple(getattr(instance, field) for field in fields)
+
+
+def _indexed_text_changed(instance, created: bool) -> bool:
+    """Whether a save changed the indexed text; unknown loaded values count as changed"""
+    previous = getattr(instance, '_search_state', None)
+    current = _indexed_values(instance)
+    instance._search_state = current
+    return created or previous is None or previous != current
+
+
+# Index maintenance signal handlers
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=Brand)
+@receiver(post_init, sender=ProductCategory)
+def remember_indexed_values(sender, instance, **kwargs):
+    # Field tracker: stock, status and price saves leave the index alone
+    instance._search_state = _indexed_values(instance)
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, created, **kwargs):
+    if _indexed_text_changed(instance, created):
+        index_products_by_id([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    get_search_backend().remove_product(instance.pk)
+
+
+@receiver(post_save, sender=MedicineDetails)
+@receiver(post_save, sender=EquipmentDetails)
+@receiver(post_save, sender=PathologyDetails)
+def index_product_on_details_save(sender, instance, **kwargs):
+    index_products_by_id([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def index_product_on_tags_change(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Product):
+        index_products_by_id([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+def index_products_on_brand_save(sender, instance, created, **kwargs):
+    if _indexed_text_changed(instance, created) and not created:
+        index_products_by_id(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=ProductCategory)
+def index_products_on_category_save(sender, instance, created, **kwargs):
+    if _indexed_text_changed(instance, created) and not created:
+        index_products_by_id(instance.products.values_list('pk', flat=True))
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
 from rest_framework import serializers
 from PIL import Image
 from io import BytesIO
@@ -435,6 +436,26 @@ class BaseProductSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at', 'updated_at', 'status', 'is_publish', 'slug', 'sku')
 
 
+# Variants shown on public endpoints
+PUBLIC_VARIANT_STATUSES = ('approved', 'published')
+
+# Reverse one-to-one details rendered by the public serializers
+PRODUCT_DETAIL_RELATIONS = ('medicine_details', 'equipment_details', 'pathology_details')
+
+
+def public_variants_queryset():
+    return ProductVariant.objects.filter(
+        status__in=PUBLIC_VARIANT_STATUSES, is_active=True
+    ).prefetch_related(
+        Prefetch('attributes', queryset=ProductAttributeValue.objects.select_related('attribute'))
+    ).order_by('id')
+
+
+def public_variants_prefetch():
+    """Approved, active variants (with attribute values) into ``product.public_variants``"""
+    return Prefetch('variants', queryset=public_variants_queryset(), to_attr='public_variants')
+
+
 # Public Product Serializer (for frontend with nested objects)
 class PublicProductSerializer(serializers.ModelSerializer):
     variants = serializers.SerializerMethodField()
@@ -457,12 +478,19 @@ class PublicProductSerializer(serializers.ModelSerializer):
             'medicine_details', 'equipment_details', 'pathology_details'
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Everything the serializer reads, in a fixed number of queries"""
+        return queryset.select_related('category', 'brand', *PRODUCT_DETAIL_RELATIONS).prefetch_related(
+            public_variants_prefetch(), 'images'
+        )
+
     def get_variants(self, obj):
         """Only return approved and active variants"""
-        approved_variants = obj.variants.filter(
-            status__in=['approved', 'published'], 
-            is_active=True
-        )
+        approved_variants = getattr(obj, 'public_variants', None)
+        if approved_variants is None:
+            # Not loaded through setup_eager_loading (single instance)
+            approved_variants = public_variants_queryset().filter(product=obj)
         return ProductVariantSerializer(approved_variants, many=True).data
 
     def create(self, validated_data):
@@ -569,6 +597,19 @@ class PublicProductListSerializer(serializers.ModelSerializer):
             'medicine_details', 'equipment_details', 'pathology_details'
         ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sparse fieldset (products/fieldsets.py), passed by the view
+        selected = self.context.get('product_fields')
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Single query: category, brand and type details are joined"""
+        return queryset.select_related('category', 'brand', *PRODUCT_DETAIL_RELATIONS)
+
 
 # Medicine Product Serializer
 class MedicineBaseProductSerializer(BaseProductSerializer):
@@ -1,14 +1,41 @@
+import json
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from .models import Brand, ProductCategory, Product, ProductVariant, ProductReview
+from .models import (
+    Brand, ProductCategory, Product, ProductVariant, ProductReview,
+    MedicineDetails, ProductRatingSummary, ProductSearchToken, RelatedProducts,
+    ProductAuditLog, SupplierProductPrice,
+)
+from .enterprise_cache import EnterpriseCacheManager, EnterpriseProductCache
+from .autocomplete import AutocompleteIndex, rebuild_autocomplete_index
+from .ratings import review_stats
+from .related import compute_related, get_related_products, refresh_related_products, stale_product_ids
+from .facets import DEFAULT_PRICE_BOUNDARIES, compute_facets, parse_price_boundaries
+from .search import InMemorySearchBackend, apply_relevance_boosts, get_search_backend
 
 User = get_user_model()
 
 
+class FreshCatalogSnapshotMixin:
+    """Each test starts without a catalog snapshot: ids of rolled back rows are reused"""
+
+    def setUp(self):
+        from .catalog_snapshot import reset_catalog_snapshot
+
+        super().setUp()
+        reset_catalog_snapshot()
+        self.addCleanup(reset_catalog_snapshot)
+
+
 class BaseSetupMixin:
     """Reusable setup for model and API tests"""
     @classmethod
@@ -163,3 +190,1609 @@ class ProductAPITests(BaseSetupMixin, TestCase):
         response = self.client.post('/api/products/supplier-prices/', payload)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(float(response.data['price']), 95.00)
+
+
+class ProductSearchIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='search@example.com',
+            password='searchpass123',
+            full_name='Search User',
+            role='admin'
+        )
+        cls.brand = Brand.objects.create(name='Cipla', created_by=cls.user)
+        cls.category = ProductCategory.objects.create(name='Pain Relief', created_by=cls.user)
+
+    def _create_product(self, **kwargs):
+        defaults = {
+            'price': 50.00,
+            'stock': 5,
+            'category': self.category,
+            'brand': self.brand,
+            'created_by': self.user,
+            'status': 'published',
+            'is_publish': True,
+        }
+        defaults.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(**defaults)
+
+    def test_product_save_updates_index(self):
+        product = self._create_product(name='Paracetamol 500mg')
+        self.assertTrue(ProductSearchToken.objects.filter(product=product, field='name', token='paracetamol').exists())
+
+        product.name = 'Ibuprofen 400mg'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertFalse(ProductSearchToken.objects.filter(product=product, field='name', token='paracetamol').exists())
+        self.assertEqual(get_search_backend().search_ids('ibupro'), [product.id])
+
+    def test_saves_that_keep_the_indexed_text_skip_reindexing(self):
+        product = self._create_product(name='Cetirizine')
+        with mock.patch('products.search.index_products_by_id') as reindex:
+            product.stock, product.status = 0, 'suspended'
+            product.save()
+            self.brand.save()
+            Product.objects.get(pk=product.pk).save()
+            reindex.assert_not_called()
+            self.category.name = 'Allergy'
+            self.category.save()
+        reindex.assert_called_once()
+
+    def test_name_match_outranks_description_match(self):
+        by_description = self._create_product(name='Cold Syrup', description='Contains dolo extract')
+        by_name = self._create_product(name='Dolo 650')
+        self.assertEqual(get_search_backend().search_ids('dolo'), [by_name.id, by_description.id])
+
+    def test_details_and_tags_are_indexed(self):
+        product = self._create_product(name='Tablet A')
+        with self.captureOnCommitCallbacks(execute=True):
+            MedicineDetails.objects.create(product=product, composition='Azithromycin')
+            product.tags.add('antibiotic')
+        backend = get_search_backend()
+        self.assertEqual(backend.search_ids('azithro'), [product.id])
+        self.assertEqual(backend.search_ids('antibiotic'), [product.id])
+
+    def test_filter_queryset_annotates_score(self):
+        product = self._create_product(name='Vitamin C')
+        results = get_search_backend().filter_queryset(Product.objects.all(), 'vitamin')
+        self.assertEqual([p.id for p in results], [product.id])
+        self.assertGreater(results[0].search_score, 0)
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='products.search.InMemorySearchBackend')
+    def test_in_memory_backend_matches_database_ranking(self):
+        backend = get_search_backend()
+        backend.clear()
+        first = self._create_product(name='Zinc Tablets')
+        second = self._create_product(name='Multivitamin', description='with zinc')
+        self.assertEqual(backend.search_ids('zinc'), [first.id, second.id])
+        results = backend.filter_queryset(Product.objects.all(), 'zinc').order_by('-search_score')
+        self.assertEqual([p.id for p in results], [first.id, second.id])
+
+    def test_search_endpoint_uses_index(self):
+        product = self._create_product(name='Cetirizine')
+        self._create_product(name='Unrelated')
+        response = APIClient().get('/api/public/products/search/', {'q': 'cetiri', 'no_cache': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [product.id])
+
+        response = APIClient().get('/api/public/products/search/autocomplete/', {'q': 'cetiri'})
+        self.assertIn({'text': 'Cetirizine', 'type': 'product', 'id': product.id}, response.data['suggestions'])
+
+    def test_database_and_in_memory_bm25_scores_agree(self):
+        self._create_product(name='Omega 3 Capsules', description='Fish oil omega')
+        self._create_product(name='Fish Oil', description='Rich in omega 3 fatty acids for heart health')
+        database_scores = get_search_backend().search('omega fish')
+        memory_backend = InMemorySearchBackend()
+        for product in Product.objects.all():
+            memory_backend.index_product(product)
+        memory_scores = memory_backend.search('omega fish')
+        self.assertEqual([pk for pk, _ in database_scores], [pk for pk, _ in memory_scores])
+        for (_, db_score), (_, memory_score) in zip(database_scores, memory_scores):
+            self.assertAlmostEqual(db_score, memory_score, places=6)
+
+    def test_relevance_sort_boosts_rating_and_stock(self):
+        rated = self._create_product(name='Azee 500')
+        unrated = self._create_product(name='Azee 500')
+        out_of_stock = self._create_product(name='Azee 500', stock=0)
+        ProductReview.objects.create(product=rated, user=self.user, rating=5)
+        response = APIClient().get('/api/public/products/search/', {'q': 'azee 500', 'sort_by': 'relevance', 'no_cache': 1})
+        self.assertEqual([item['id'] for item in response.data['results']], [rated.id, unrated.id, out_of_stock.id])
+
+    def test_relevance_sort_boosts_exact_name_match(self):
+        partial = self._create_product(name='Crocin Advance Fast')
+        exact = self._create_product(name='Crocin', description='Crocin tablets, crocin relief')
+        queryset = apply_relevance_boosts(
+            get_search_backend().filter_queryset(Product.objects.all(), 'crocin'), 'crocin'
+        ).order_by('-relevance')
+        self.assertEqual([p.id for p in queryset], [exact.id, partial.id])
+
+
+class AutocompleteIndexTests(TestCase):
+
+    def setUp(self):
+        self.index = AutocompleteIndex()
+        self.index.load([
+            ('product', 1, 'Paracetamol 500mg', 3),
+            ('product', 2, 'Pantoprazole 40', 10),
+            ('product', 3, 'Dolo Paracetamol', 1),
+            ('brand', 1, 'Pfizer', 7),
+            ('category', 1, 'Pain Relief', 4),
+        ])
+
+    def test_prefix_lookup_orders_by_weight(self):
+        self.assertEqual(
+            [s['id'] for s in self.index.lookup('pa', kind='product')],
+            [2, 1, 3]
+        )
+
+    def test_matches_word_starts_only(self):
+        self.assertEqual([s['id'] for s in self.index.lookup('paracet', kind='product')], [1, 3])
+        self.assertEqual(self.index.lookup('cetamol'), [])
+
+    def test_upsert_and_remove(self):
+        self.index.upsert('product', 1, 'Crocin')
+        self.assertEqual([s['id'] for s in self.index.lookup('paracet')], [3])
+        self.assertEqual(self.index.lookup('croc')[0], {'text': 'Crocin', 'type': 'product', 'id': 1})
+        self.index.remove('product', 1)
+        self.assertEqual(self.index.lookup('croc'), [])
+
+    def test_suggest_applies_kind_quotas(self):
+        suggestions = self.index.suggest('p', limit=4)
+        self.assertEqual([s['type'] for s in suggestions], ['product', 'product', 'category', 'brand'])
+
+    def test_snapshot_round_trip(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as snapshot:
+            self.index.save_snapshot(snapshot.name)
+            restored = AutocompleteIndex()
+            restored.load_snapshot(snapshot.name)
+        self.assertEqual(restored.suggest('pa'), self.index.suggest('pa'))
+
+    def test_endpoint_reads_index_without_queries(self):
+        user = User.objects.create_user(email='ac@example.com', password='x', full_name='AC', role='admin')
+        category = ProductCategory.objects.create(name='Allergy', created_by=user, status='published', is_publish=True)
+        rebuild_autocomplete_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name='Allegra 120', category=category, created_by=user, status='published', is_publish=True
+            )
+        client = APIClient()
+        with self.assertNumQueries(0):
+            response = client.get('/api/public/products/search/autocomplete/', {'q': 'alle'})
+        texts = [(s['type'], s['text']) for s in response.data['suggestions']]
+        self.assertIn(('product', 'Allegra 120'), texts)
+        self.assertIn(('category', 'Allergy'), texts)
+
+    def test_rolled_back_writes_stay_out_of_the_index(self):
+        from .autocomplete import autocomplete_index
+
+        user = User.objects.create_user(email='ac-rb@example.com', password='x', full_name='AC', role='admin')
+        category = ProductCategory.objects.create(name='Rollback', created_by=user, status='published', is_publish=True)
+        rebuild_autocomplete_index()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Product.objects.create(
+                name='Phantom 10', category=category, created_by=user, status='published', is_publish=True
+            )
+            raise RuntimeError
+        self.assertEqual(autocomplete_index.lookup('phantom'), [])
+
+
+class FacetEngineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='facet@example.com', password='x', full_name='Facet', role='admin')
+        cls.tablets = ProductCategory.objects.create(name='Tablets', created_by=cls.user)
+        cls.devices = ProductCategory.objects.create(name='Devices', created_by=cls.user)
+        cls.brand = Brand.objects.create(name='Sun Pharma', created_by=cls.user)
+        for name, price, category, product_type in [
+            ('A', 50, cls.tablets, 'medicine'),
+            ('B', 100, cls.tablets, 'medicine'),
+            ('C', 450, cls.tablets, 'medicine'),
+            ('D', 6000, cls.devices, 'equipment'),
+        ]:
+            product = Product.objects.create(
+                name=name, price=price, category=category, brand=cls.brand if category == cls.tablets else None,
+                product_type=product_type, created_by=cls.user
+            )
+            if product_type == 'medicine':
+                MedicineDetails.objects.create(product=product, form='Tablet', prescription_required=name == 'A')
+
+    def test_all_facets_in_one_query(self):
+        with self.assertNumQueries(1):
+            facets = compute_facets(Product.objects.all())
+        self.assertEqual(facets['categories'][0], {'name': 'Tablets', 'id': self.tablets.id, 'count': 3})
+        self.assertEqual(facets['brands'], [{'name': 'Sun Pharma', 'id': self.brand.id, 'count': 3}])
+        self.assertEqual(facets['product_types'], [{'name': 'medicine', 'count': 3}, {'name': 'equipment', 'count': 1}])
+        self.assertEqual(
+            [(r['label'], r['count']) for r in facets['price_ranges']],
+            [('Under ₹100', 1), ('₹100 - ₹500', 2), ('Above ₹5000', 1)]
+        )
+        self.assertEqual(facets['medicine_forms'], [{'name': 'Tablet', 'count': 3}])
+        self.assertEqual(
+            facets['prescription_required'],
+            [{'value': True, 'count': 1}, {'value': False, 'count': 2}]
+        )
+
+    def test_custom_price_boundaries(self):
+        facets = compute_facets(Product.objects.all(), parse_price_boundaries('1000, 75,0'))
+        self.assertEqual(
+            [(r['label'], r['count']) for r in facets['price_ranges']],
+            [('Under ₹75', 1), ('₹75 - ₹1000', 2), ('Above ₹1000', 1)]
+        )
+
+    def test_malformed_boundaries_fall_back_to_defaults(self):
+        self.assertEqual(parse_price_boundaries('abc,1'), DEFAULT_PRICE_BOUNDARIES)
+
+
+class GenerationCacheInvalidationTests(BaseSetupMixin, TestCase):
+
+    def setUp(self):
+        self.other_category = ProductCategory.objects.create(name='Other Category', created_by=self.user)
+
+    def _list_key(self, category_id):
+        return EnterpriseProductCache.get_product_list_cache_key({'category': [str(category_id)]})
+
+    def test_product_save_only_invalidates_its_own_scopes(self):
+        other_product = Product.objects.create(
+            name='Other', category=self.other_category, created_by=self.user
+        )
+        own_list = self._list_key(self.category.id)
+        other_list = self._list_key(self.other_category.id)
+        unscoped_list = EnterpriseProductCache.get_product_list_cache_key({})
+        own_detail = EnterpriseProductCache.get_product_detail_cache_key(self.product.id)
+        other_detail = EnterpriseProductCache.get_product_detail_cache_key(other_product.id)
+        search = EnterpriseProductCache.get_search_cache_key('test', {})
+
+        self.product.stock = 3
+        self.product.save()
+
+        self.assertNotEqual(self._list_key(self.category.id), own_list)
+        self.assertNotEqual(EnterpriseProductCache.get_product_list_cache_key({}), unscoped_list)
+        self.assertNotEqual(EnterpriseProductCache.get_product_detail_cache_key(self.product.id), own_detail)
+        self.assertNotEqual(EnterpriseProductCache.get_search_cache_key('test', {}), search)
+        self.assertEqual(self._list_key(self.other_category.id), other_list)
+        self.assertEqual(EnterpriseProductCache.get_product_detail_cache_key(other_product.id), other_detail)
+
+    def test_moves_and_child_writes_invalidate_category_lists(self):
+        left_list = self._list_key(self.category.id)
+        product = Product.objects.get(pk=self.product.pk)
+        product.category = self.other_category
+        product.save()
+        self.assertNotEqual(self._list_key(self.category.id), left_list)
+
+        joined_list = self._list_key(self.other_category.id)
+        ProductVariant.objects.create(product=product, additional_price=5)
+        self.assertNotEqual(self._list_key(self.other_category.id), joined_list)
+
+    def test_deferred_delete_reads_no_deleted_fields(self):
+        product = Product.objects.create(name='Doomed', category=self.category, created_by=self.user)
+        detail = EnterpriseProductCache.get_product_detail_cache_key(product.id)
+
+        Product.objects.only('id', 'name').get(pk=product.pk).delete()
+        self.assertNotEqual(EnterpriseProductCache.get_product_detail_cache_key(product.id), detail)
+        self.assertFalse(Product.objects.filter(pk=product.pk).exists())
+
+    def test_supplier_price_with_loaded_variant_makes_no_query(self):
+        from .enterprise_cache import invalidate_product_cache_on_supplier_price_change
+
+        variant = ProductVariant.objects.select_related('product').get(pk=self.variant.pk)
+        supplier_price = SupplierProductPrice(supplier=self.user, product_variant=variant, price=90)
+        category_list = self._list_key(self.category.id)
+        with self.assertNumQueries(0):
+            invalidate_product_cache_on_supplier_price_change(SupplierProductPrice, supplier_price)
+        self.assertNotEqual(self._list_key(self.category.id), category_list)
+
+    def test_bump_is_single_incr(self):
+        EnterpriseCacheManager.get_generations([('search', None)])
+        with mock.patch.object(cache, 'incr', wraps=cache.incr) as incr, \
+                mock.patch.object(cache, 'delete', wraps=cache.delete) as delete:
+            EnterpriseCacheManager.bump_generation('search')
+        incr.assert_called_once_with('generation:search')
+        delete.assert_not_called()
+
+    def test_evicted_counter_restarts_above_previous_generations(self):
+        before = EnterpriseCacheManager.get_generations([('brand', self.brand.id)])[0]
+        cache.delete(EnterpriseCacheManager._generation_key('brand', self.brand.id))
+        EnterpriseCacheManager.bump_generation('brand', self.brand.id)
+        self.assertGreaterEqual(EnterpriseCacheManager.get_generations([('brand', self.brand.id)])[0], before)
+
+
+class StampedeProtectedCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        EnterpriseCacheManager.reset_cache_stats()
+        self.calls = 0
+
+    def _compute(self):
+        self.calls += 1
+        return {'calls': self.calls}
+
+    def _expire(self, key):
+        envelope = cache.get(key)
+        envelope['expires_at'] = 0
+        cache.set(key, envelope)
+
+    def test_fresh_entry_is_computed_once(self):
+        first = EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+        second = EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(EnterpriseCacheManager.get_cache_stats()['product_list'], {'miss': 1, 'hit': 1})
+
+    def test_stale_entry_served_while_another_worker_refreshes(self):
+        EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+        self._expire('swr:test')
+        cache.add('lock:swr:test', 'other-worker')
+
+        value = EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+
+        self.assertEqual(value, {'calls': 1})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(EnterpriseCacheManager.get_cache_stats()['product_list']['stale'], 1)
+
+    def test_stale_entry_refreshed_by_lock_holder(self):
+        EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+        self._expire('swr:test')
+
+        value = EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+
+        self.assertEqual(value, {'calls': 2})
+        self.assertIsNone(cache.get('lock:swr:test'))
+
+    def test_early_expiration_probability(self):
+        EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+        envelope = cache.get('swr:test')
+        envelope['delta'] = 60
+        cache.set('swr:test', envelope)
+        # Small draws keep serving the entry, large ones refresh it early
+        with mock.patch('products.enterprise_cache.random.random', return_value=0.01):
+            EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+        self.assertEqual(self.calls, 1)
+        with mock.patch('products.enterprise_cache.random.random', return_value=0.999):
+            EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+        self.assertEqual(self.calls, 2)
+
+    def test_cold_miss_waits_for_lock_holder(self):
+        cache.add('lock:swr:test', 'other-worker')
+
+        def other_worker_finishes(seconds):
+            cache.set('swr:test', {'value': 'from-other', 'expires_at': 2 ** 40, 'delta': 0})
+
+        with mock.patch('products.enterprise_cache.time.sleep', side_effect=other_worker_finishes):
+            value = EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+
+        self.assertEqual(value, 'from-other')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(EnterpriseCacheManager.get_cache_stats()['product_list'], {'coalesced': 1})
+
+    def test_cold_miss_computes_after_wait_times_out(self):
+        cache.add('lock:swr:test', 'other-worker')
+        with mock.patch.object(EnterpriseCacheManager, 'LOCK_WAIT', 0):
+            value = EnterpriseCacheManager.get_or_compute('product_list', 'swr:test', self._compute)
+        self.assertEqual(value, {'calls': 1})
+        # The other worker's lock is left alone
+        self.assertEqual(cache.get('lock:swr:test'), 'other-worker')
+
+
+class KeysetPaginationTests(FreshCatalogSnapshotMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='keyset@example.com', password='pass12345', full_name='Keyset')
+        cls.category = ProductCategory.objects.create(
+            name='Keyset Category', created_by=cls.user, status='published', is_publish=True
+        )
+        # Duplicate prices exercise the id tie-breaker
+        cls.products = [
+            Product.objects.create(
+                name=f'Keyset {i}', price=[10, 20, 20, 20, 30, 40, 40][i], stock=5,
+                category=cls.category, created_by=cls.user, status='published', is_publish=True,
+            )
+            for i in range(7)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+
+    def _walk(self, params):
+        pages = []
+        response = self.client.get('/api/public/products/products/', params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append([item['id'] for item in response.data['results']])
+            if not response.data['next']:
+                return pages, response
+            response = self.client.get(response.data['next'])
+
+    def test_walks_every_product_once_by_created_at(self):
+        pages, _ = self._walk({'page_size': 3})
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.created_at, p.id), reverse=True)]
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_walks_price_ties_in_id_order(self):
+        pages, _ = self._walk({'page_size': 2, 'ordering': 'price'})
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.price, p.id))]
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get('/api/public/products/products/', {'page_size': 3, 'ordering': '-price'})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in back.data['results']],
+            [item['id'] for item in first.data['results']],
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/public/products/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_param_keeps_page_number_pagination(self):
+        response = self.client.get('/api/public/products/products/', {'page': 1})
+        self.assertEqual(response.data['count'], len(self.products))
+
+    def test_stream_ndjson_and_json(self):
+        response = self.client.get('/api/public/products/products/', {'stream': 'ndjson', 'ordering': 'price'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.price, p.id))]
+        self.assertEqual([json.loads(line)['id'] for line in lines], expected)
+
+        response = self.client.get('/api/public/products/products/', {'stream': 'json'})
+        items = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(items), len(self.products))
+
+    def test_categories_are_keyset_paginated(self):
+        response = self.client.get('/api/public/products/categories/')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.category.id])
+        self.assertIsNone(response.data['next'])
+
+
+class RatingSummaryTests(BaseSetupMixin, TestCase):
+
+    def _review(self, email, rating):
+        user = User.objects.create_user(email=email, password='pass12345', full_name=email)
+        return ProductReview.objects.create(product=self.product, user=user, rating=rating)
+
+    def _summary(self):
+        return ProductRatingSummary.objects.get(product=self.product)
+
+    def test_summary_follows_review_create_update_delete(self):
+        first = self._review('r1@example.com', 5)
+        self._review('r2@example.com', 2)
+        summary = self._summary()
+        self.assertEqual((summary.review_count, summary.rating_sum), (2, 7))
+        self.assertEqual(summary.histogram, [0, 1, 0, 0, 1])
+
+        first.rating = 3
+        first.save()
+        summary = self._summary()
+        self.assertEqual((summary.review_count, summary.rating_sum), (2, 5))
+        self.assertEqual(summary.histogram, [0, 1, 1, 0, 0])
+
+        ProductReview.objects.get(pk=first.pk).delete()
+        summary = self._summary()
+        self.assertEqual((summary.review_count, summary.rating_sum), (1, 2))
+        self.assertEqual(summary.average_rating, 2)
+
+    def test_drifted_summary_is_recomputed_on_delete(self):
+        review = self._review('r1@example.com', 4)
+        ProductRatingSummary.objects.filter(product=self.product).update(rating_4=0, review_count=0)
+        review.delete()
+        self.assertFalse(ProductRatingSummary.objects.filter(product=self.product).exists())
+
+    def test_deleting_reviewed_product_cascades(self):
+        self._review('r1@example.com', 4)
+        self.product.delete()
+        self.assertFalse(ProductRatingSummary.objects.exists())
+
+    def test_backfill_command_rebuilds_summaries(self):
+        from django.core.management import call_command
+
+        self._review('r1@example.com', 4)
+        self._review('r2@example.com', 1)
+        ProductRatingSummary.objects.all().delete()
+        call_command('backfill_rating_summaries', stdout=mock.MagicMock())
+        summary = self._summary()
+        self.assertEqual((summary.review_count, summary.rating_sum), (2, 5))
+        self.assertEqual(summary.histogram, [1, 0, 0, 1, 0])
+
+    def test_detail_review_stats_read_from_summary(self):
+        self._review('r1@example.com', 4)
+        self._review('r2@example.com', 2)
+        Product.objects.filter(pk=self.product.pk).update(status='published', is_publish=True)
+        product = Product.objects.select_related('rating_summary').get(pk=self.product.pk)
+        with self.assertNumQueries(0):
+            stats = review_stats(product)
+        self.assertEqual(stats['total_reviews'], 2)
+        self.assertEqual(stats['average_rating'], 3)
+        self.assertEqual(stats['rating_distribution'], {'5': 0, '4': 1, '3': 0, '2': 1, '1': 0})
+
+        response = APIClient().get(f'/api/public/products/products/{self.product.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['review_stats'], stats)
+
+
+class RelatedProductsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='related@example.com', password='pass12345', full_name='Related')
+        cls.category = ProductCategory.objects.create(name='Related Category', created_by=cls.user)
+        cls.other_category = ProductCategory.objects.create(name='Unrelated Category', created_by=cls.user)
+        cls.brand = Brand.objects.create(name='Related Brand', created_by=cls.user)
+
+        def make(name, category, brand=None):
+            return Product.objects.create(
+                name=name, price=50, stock=5, category=category, brand=brand,
+                created_by=cls.user, status='published', is_publish=True,
+            )
+
+        cls.target = make('Target', cls.category, cls.brand)
+        cls.same_category = make('Same Category', cls.category)
+        cls.same_brand = make('Same Brand', cls.other_category, cls.brand)
+        cls.bought_together = make('Bought Together', cls.other_category)
+        cls.viewed_together = make('Viewed Together', cls.other_category)
+        cls.unrelated = make('Unrelated', cls.other_category)
+
+    def _order(self, *products):
+        from orders.models import Order, OrderItem
+
+        order = Order.objects.create(user=self.user, shipping_address={}, billing_address={})
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+
+    def _view(self, session_key, *products):
+        from analytics.models import ProductView
+
+        for product in products:
+            ProductView.objects.create(product=product, session_key=session_key)
+
+    def test_signals_are_ranked(self):
+        self._order(self.target, self.bought_together)
+        self._view('session-1', self.target, self.viewed_together)
+
+        related = compute_related([self.target.id])[self.target.id]
+
+        self.assertEqual(related[:2], [self.bought_together.id, self.viewed_together.id])
+        self.assertIn(self.same_category.id, related)
+        self.assertIn(self.same_brand.id, related)
+        self.assertNotIn(self.unrelated.id, related)
+        self.assertNotIn(self.target.id, related)
+
+    def test_query_count_is_independent_of_batch_size(self):
+        self._order(self.target, self.bought_together)
+        with self.assertNumQueries(6):
+            compute_related([self.target.id])
+        all_ids = list(Product.objects.values_list('id', flat=True))
+        with self.assertNumQueries(6):
+            compute_related(all_ids)
+
+    def test_served_in_rank_order_with_one_query(self):
+        self._order(self.target, self.bought_together)
+        refresh_related_products()
+        product = Product.objects.select_related('related_products').get(pk=self.target.pk)
+
+        with self.assertNumQueries(1):
+            related = get_related_products(product)
+
+        self.assertEqual(related[0], self.bought_together)
+        self.assertEqual(len(related), 3)
+
+    def test_unpublished_neighbors_are_skipped(self):
+        refresh_related_products([self.target.id])
+        Product.objects.filter(pk=self.same_category.pk).update(is_publish=False)
+        product = Product.objects.select_related('related_products').get(pk=self.target.pk)
+        self.assertNotIn(self.same_category, get_related_products(product))
+
+    def test_incremental_refresh_picks_up_new_orders(self):
+        refresh_related_products()
+        self.assertEqual(stale_product_ids(), set())
+
+        self._order(self.target, self.bought_together)
+        self.assertEqual(stale_product_ids(), {self.target.id, self.bought_together.id})
+
+    def test_detail_view_uses_precomputed_neighbors(self):
+        self._order(self.target, self.bought_together)
+        refresh_related_products([self.target.id])
+        response = APIClient().get(f'/api/public/products/products/{self.target.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['related_products'][0]['id'], self.bought_together.id)
+        self.assertNotIn('variants', response.data['related_products'][0])
+        self.assertTrue(RelatedProducts.objects.filter(product=self.target).exists())
+
+
+class PublicEndpointQueryCountTests(FreshCatalogSnapshotMixin, TestCase):
+    """Public endpoints run a fixed number of queries whatever the page holds"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import ProductAttribute, ProductAttributeValue, ProductImage
+
+        cls.user = User.objects.create_user(email='n1@example.com', password='pass12345', full_name='N Plus One')
+        cls.category = ProductCategory.objects.create(
+            name='Query Category', created_by=cls.user, status='published', is_publish=True,
+        )
+        cls.subcategory = ProductCategory.objects.create(
+            name='Query Subcategory', parent=cls.category, created_by=cls.user,
+            status='published', is_publish=True,
+        )
+        cls.brand = Brand.objects.create(name='Query Brand', created_by=cls.user, status='published', is_publish=True)
+        size = ProductAttribute.objects.create(name='Query Size')
+        cls.sizes = [ProductAttributeValue.objects.create(attribute=size, value=v) for v in ('S', 'M')]
+        cls.image_model = ProductImage
+
+    def _make_product(self, index):
+        product = Product.objects.create(
+            name=f'Query Product {index}', price=10 + index, stock=5, category=self.category,
+            brand=self.brand, created_by=self.user, status='published', is_publish=True,
+        )
+        MedicineDetails.objects.create(product=product)
+        for size in self.sizes:
+            variant = ProductVariant.objects.create(
+                product=product, price=15, stock=3, status='approved', is_active=True,
+            )
+            variant.attributes.add(size)
+        self.image_model.objects.create(product=product, image='https://example.com/a.png')
+        return product
+
+    def _count(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+        return len(queries)
+
+    def test_list_endpoints_do_not_grow_with_results(self):
+        first = self._make_product(0)
+        # Build the catalog snapshot up front; later saves patch it in place
+        self._count('/api/public/products/products/')
+        urls = [
+            '/api/public/products/products/',
+            '/api/public/products/products/?page=1',
+            '/api/public/products/featured/',
+            f'/api/public/products/categories/{self.category.id}/products/',
+            f'/api/public/products/brands/{self.brand.id}/products/',
+            '/api/public/products/types/medicine/products/',
+        ]
+        small = {url: self._count(url) for url in urls}
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(1, 6):
+                self._make_product(index)
+        large = {url: self._count(url) for url in urls}
+        self.assertEqual(small, large)
+
+        single = self._count(f'/api/public/products/products/{first.id}/')
+        self.assertEqual(single, self._count(f'/api/public/products/products/{first.id}/'))
+
+    def test_detail_variants_use_prefetched_attributes(self):
+        product = self._make_product(0)
+        one_variant = self._count(f'/api/public/products/products/{product.id}/')
+        for _ in range(3):
+            variant = ProductVariant.objects.create(
+                product=product, price=20, stock=1, status='approved', is_active=True,
+            )
+            variant.attributes.add(*self.sizes)
+        self.assertEqual(self._count(f'/api/public/products/products/{product.id}/'), one_variant)
+
+        response = APIClient().get(f'/api/public/products/products/{product.id}/')
+        self.assertEqual(len(response.data['variants']), 5)
+
+
+class CategoryTreeTests(FreshCatalogSnapshotMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='tree@example.com', password='pass12345', full_name='Tree')
+
+    def _category(self, name, parent=None, **extra):
+        values = dict(status='published', is_publish=True)
+        values.update(extra)
+        return ProductCategory.objects.create(name=name, parent=parent, created_by=self.user, **values)
+
+    def _product(self, name, category, **extra):
+        values = dict(price=10, stock=5, status='published', is_publish=True)
+        values.update(extra)
+        return Product.objects.create(name=name, category=category, created_by=self.user, **values)
+
+    def test_paths_follow_moves(self):
+        root = self._category('Root')
+        child = self._category('Child', root)
+        leaf = self._category('Leaf', child)
+        other = self._category('Other')
+        self.assertEqual(leaf.path, f'/{root.id}/{child.id}/{leaf.id}/')
+        self.assertEqual(leaf.depth, 2)
+
+        child.parent = other
+        child.save()
+
+        leaf.refresh_from_db()
+        self.assertEqual(leaf.path, f'/{other.id}/{child.id}/{leaf.id}/')
+        self.assertEqual(leaf.ancestor_ids, [other.id, child.id])
+        self.assertEqual(set(other.get_descendants()), {child, leaf})
+        self.assertFalse(root.get_descendants().exists())
+
+    def test_cannot_move_under_own_subtree(self):
+        root = self._category('Root')
+        child = self._category('Child', root)
+        root.parent = child
+        with self.assertRaises(ValueError):
+            root.save()
+
+    def test_product_counts_are_maintained(self):
+        first = self._category('First')
+        second = self._category('Second')
+        product = self._product('Counted', first)
+        self._product('Hidden', first, is_publish=False)
+        first.refresh_from_db()
+        self.assertEqual(first.product_count, 1)
+
+        product.category = second
+        product.save()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.product_count, second.product_count), (0, 1))
+
+        product = Product.objects.get(pk=product.pk)
+        product.stock = 0
+        product.save()
+        second.refresh_from_db()
+        self.assertEqual(second.product_count, 0)
+
+        product.stock = 3
+        product.save()
+        product.delete()
+        second.refresh_from_db()
+        self.assertEqual(second.product_count, 0)
+
+    def test_deleting_a_deferred_load_uncounts_the_product(self):
+        category = self._category('Deferred')
+        product = self._product('Counted', category)
+
+        Product.objects.only('id', 'name').get(pk=product.pk).delete()
+        category.refresh_from_db()
+        self.assertEqual(category.product_count, 0)
+
+    def test_rebuild_command_repairs_drift(self):
+        from django.core.management import call_command
+
+        root = self._category('Root')
+        leaf = self._category('Leaf', self._category('Child', root))
+        self._product('Counted', leaf)
+        ProductCategory.objects.update(path='', depth=0, product_count=0)
+
+        call_command('rebuild_category_tree', stdout=mock.MagicMock())
+
+        leaf.refresh_from_db()
+        self.assertEqual(leaf.path, f'/{root.id}/{leaf.parent_id}/{leaf.id}/')
+        self.assertEqual((leaf.depth, leaf.product_count), (2, 1))
+
+    def test_by_category_covers_any_depth_with_fixed_queries(self):
+        root = self._category('Root')
+        child = self._category('Child', root)
+        self._product('Root Product', root)
+        self._product('Child Product', child)
+        url = f'/api/public/products/categories/{root.id}/products/'
+
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = APIClient().get(url)
+        self.assertEqual(response.data['count'], 2)
+
+        grandchild = self._category('Grandchild', child)
+        self._category('Great Grandchild', grandchild)
+        self._product('Deep Product', grandchild)
+        self._category('Unpublished', child, is_publish=False)
+
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = APIClient().get(url)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            [(sub['id'], sub['product_count']) for sub in response.data['subcategories']],
+            [(child.id, 2)],
+        )
+
+
+class CatalogSnapshotTests(FreshCatalogSnapshotMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='snapshot@example.com', password='pass12345', full_name='Snapshot')
+        cls.category = ProductCategory.objects.create(
+            name='Snapshot Category', created_by=cls.user, status='published', is_publish=True,
+        )
+        cls.other_category = ProductCategory.objects.create(
+            name='Other Snapshot Category', created_by=cls.user, status='published', is_publish=True,
+        )
+        cls.products = [
+            Product.objects.create(
+                name=f'Snapshot {index}', price=10 * (index + 1), stock=5, created_by=cls.user,
+                category=cls.category if index % 2 else cls.other_category,
+                status='published', is_publish=True,
+            )
+            for index in range(6)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def _ids(self, response):
+        return [item['id'] for item in response.data['results']]
+
+    def test_list_pages_come_from_snapshot(self):
+        url = f'/api/public/products/products/?category={self.category.id}&ordering=price&page_size=2'
+        self.client.get(url)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        expected = [p.id for p in sorted(self.products, key=lambda p: p.price) if p.category_id == self.category.id]
+        self.assertEqual(self._ids(response), expected[:2])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self._ids(response), expected[2:])
+        self.assertIsNone(response.data['next'])
+
+    def test_saves_patch_snapshot(self):
+        from .catalog_snapshot import get_catalog_snapshot
+
+        url = '/api/public/products/products/?ordering=-price'
+        self.client.get(url)
+        version = get_catalog_snapshot().version
+
+        cheapest = self.products[0]
+        cheapest.price = 1000
+        hidden = self.products[1]
+        hidden.stock = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            cheapest.save()
+            hidden.save()
+        # A rolled back write never reaches the snapshot
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            cheapest.price = 1
+            cheapest.save()
+            raise RuntimeError
+
+        self.assertGreater(get_catalog_snapshot().version, version)
+        ids = self._ids(self.client.get(url))
+        self.assertEqual(ids[0], cheapest.id)
+        self.assertNotIn(hidden.id, ids)
+
+    def test_unsupported_filters_use_the_orm(self):
+        url = f'/api/public/products/products/?category={self.category.id}&stock_min=1&ordering=name'
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_missing_rows_fall_back_and_mark_stale(self):
+        from .catalog_snapshot import get_catalog_snapshot
+
+        self.client.get('/api/public/products/products/')
+        snapshot = get_catalog_snapshot()
+        Product.objects.filter(pk=self.products[-1].pk).update(is_publish=False)
+
+        response = self.client.get('/api/public/products/products/')
+        self.assertNotIn(self.products[-1].id, self._ids(response))
+        self.assertFalse(snapshot.is_fresh(60))
+
+    def test_writes_without_signals_fall_back_to_the_orm(self):
+        from .catalog_snapshot import get_catalog_snapshot
+
+        url = '/api/public/products/products/?ordering=-price'
+        self.client.get(url)
+        snapshot = get_catalog_snapshot()
+        cheapest = self.products[0]
+        Product.objects.filter(pk=cheapest.pk).update(price=1000)
+
+        self.assertIn(cheapest.id, self._ids(self.client.get(url)))
+        self.assertFalse(snapshot.is_fresh(60))
+
+        get_catalog_snapshot()
+        new = Product.objects.bulk_create([Product(
+            name='Snapshot Bulk', slug='snapshot-bulk', sku='SNAPSHOT-BULK', price=5000, stock=1,
+            created_by=self.user, category=self.category, status='published', is_publish=True,
+        )])[0]
+        with override_settings(PRODUCT_CATALOG_SNAPSHOT_CHECK_INTERVAL=0):
+            self.assertEqual(self._ids(self.client.get(url))[0], new.id)
+
+    def test_file_snapshot_is_shared_between_mappings(self):
+        from .catalog_snapshot import CatalogSnapshot, get_catalog_snapshot
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PRODUCT_CATALOG_SNAPSHOT=f'{directory}/catalog.bin'):
+            snapshot = get_catalog_snapshot()
+            other_worker = CatalogSnapshot.open(snapshot.path)
+            self.assertEqual(len(other_worker), len(self.products))
+
+            product = self.products[2]
+            product.stock = 42
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+                new = Product.objects.create(
+                    name='Snapshot New', price=5, stock=1, created_by=self.user,
+                    category=self.category, status='published', is_publish=True,
+                )
+
+            self.assertEqual(other_worker.get(product.id).stock, 42)
+            self.assertEqual(other_worker.get(new.id).price, 5.0)
+            self.assertEqual(other_worker.version, snapshot.version)
+            self.assertEqual(other_worker.categories[self.category.id].name, 'Snapshot Category')
+
+
+class BulkImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='import@example.com', password='pass12345', full_name='Importer')
+        cls.category = ProductCategory.objects.create(
+            name='Import Category', created_by=cls.user, status='published', is_publish=True,
+        )
+        cls.brand = Brand.objects.create(name='Import Brand', created_by=cls.user)
+        Product.objects.create(name='Paracetamol', price=5, category=cls.category, created_by=cls.user)
+
+    def _records(self, count, prefix='Item'):
+        return [
+            {
+                'name': f'{prefix} {index}', 'category_id': self.category.id, 'brand': 'import brand',
+                'price': 10 + index, 'stock': 3, 'product_type': 'medicine',
+                'medicine_details': {'form': 'tablet', 'prescription_required': 'true'},
+                'variants': [{'price': 12, 'stock': 1, 'attributes': [{'name': 'Pack', 'value': '10'}]}],
+            }
+            for index in range(count)
+        ]
+
+    def _stream(self, records):
+        from io import BytesIO
+
+        return BytesIO(json.dumps(records).encode())
+
+    def test_streams_json_with_details_and_variants(self):
+        from .bulk_import import CatalogImporter, iter_json_records
+
+        records = self._records(3) + [{'name': 'Paracetamol', 'category': 'Import Category', 'price': 4}]
+        with CatalogImporter(self.user, chunk_size=2) as importer:
+            importer.import_products(iter_json_records(self._stream(records), chunk_size=16))
+
+        report = importer.report.as_dict()
+        self.assertEqual((report['created'], report['skipped']), (7, 0))
+        self.assertGreater(report['rows_per_second'], 0)
+        imported = Product.objects.get(name='Item 1')
+        self.assertEqual(imported.brand, self.brand)
+        self.assertTrue(imported.medicine_details.prescription_required)
+        self.assertEqual(imported.variants.get().attributes.get().value, '10')
+        self.assertTrue(imported.sku.startswith('ITEM-1-'))
+        self.assertEqual(
+            sorted(Product.objects.filter(name='Paracetamol').values_list('slug', flat=True)),
+            ['paracetamol', 'paracetamol-1'],
+        )
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.product_count, 3)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .bulk_import import CatalogImporter
+
+        def run(count, prefix):
+            with CaptureQueriesContext(connection) as queries:
+                with CatalogImporter(self.user, chunk_size=100) as importer:
+                    importer.import_products(self._records(count, prefix))
+            self.assertEqual(importer.report.created, count * 2)
+            return len(queries)
+
+        run(1, 'Warm')
+        # 30 rows stay under SQLite's bound-parameter cap, so inserts are not split
+        self.assertEqual(run(5, 'Small'), run(30, 'Large'))
+
+    def test_csv_rows_and_row_errors(self):
+        from io import BytesIO
+        from .bulk_import import CatalogImporter, iter_records
+
+        csv_data = (
+            'name,category,price,mrp,stock,medicine_details.form\n'
+            'Syrup,Import Category,20,25,4,liquid\n'
+            'Bad MRP,Import Category,20,10,4,\n'
+            'Nowhere,Missing Category,20,,4,\n'
+        )
+        with CatalogImporter(self.user) as importer:
+            importer.import_products(iter_records(BytesIO(csv_data.encode()), 'csv'))
+
+        report = importer.report.as_dict()
+        self.assertEqual((report['created'], report['skipped']), (1, 2))
+        self.assertIn('row 2: MRP', report['errors'][0])
+        self.assertEqual(Product.objects.get(name='Syrup').medicine_details.form, 'liquid')
+
+    def test_update_existing_matches_sku(self):
+        from .bulk_import import CatalogImporter
+
+        existing = Product.objects.get(name='Paracetamol')
+        records = [{'name': 'Paracetamol 500', 'sku': existing.sku, 'category_id': self.category.id, 'price': 7}]
+
+        with CatalogImporter(self.user) as importer:
+            importer.import_products(records)
+        self.assertEqual(importer.report.skipped, 1)
+
+        with CatalogImporter(self.user, update_existing=True) as importer:
+            importer.import_products(records)
+        existing.refresh_from_db()
+        self.assertEqual((importer.report.updated, existing.name, existing.price), (1, 'Paracetamol 500', 7))
+
+    def test_update_moving_category_refreshes_the_old_one(self):
+        from .bulk_import import CatalogImporter
+
+        target = ProductCategory.objects.create(name='Import Target', created_by=self.user)
+        product = Product.objects.create(
+            name='Mover', price=5, stock=2, category=self.category, created_by=self.user,
+            status='published', is_publish=True,
+        )
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.product_count, 1)
+        records = [{'name': 'Mover', 'sku': product.sku, 'category_id': target.id, 'price': 5, 'stock': 2,
+                    'status': 'published'}]
+
+        with CatalogImporter(self.user, update_existing=True) as importer:
+            importer.import_products(records)
+        self.category.refresh_from_db()
+        target.refresh_from_db()
+        self.assertEqual((self.category.product_count, target.product_count), (0, 1))
+
+    def test_admin_import_view_uses_engine(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        admin = User.objects.create_user(
+            email='import-admin@example.com', password='pass12345', full_name='Admin', is_staff=True,
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        upload = SimpleUploadedFile('products.json', json.dumps(self._records(2)).encode())
+        response = client.post(
+            '/api/adminpanel/import/', {'model_name': 'products.Product', 'file': upload, 'format': 'json'},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['created'], 4)
+        self.assertIn('rows_per_second', response.data)
+
+
+class IdentifierAllocationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='ids@example.com', password='pass12345', full_name='Identifiers')
+        cls.category = ProductCategory.objects.create(name='Identifier Category', created_by=cls.user)
+
+    def _product(self, name, **kwargs):
+        return Product.objects.create(name=name, price=5, category=self.category, created_by=self.user, **kwargs)
+
+    def test_slugs_take_next_free_suffix(self):
+        self._product('Aspirin Plus')
+        slugs = [self._product('Aspirin').slug for _ in range(3)]
+        self.assertEqual(slugs, ['aspirin', 'aspirin-1', 'aspirin-2'])
+
+        # A re-slugged product does not collide with its own current slug
+        resaved = Product.objects.get(slug='aspirin-1')
+        resaved.slug = ''
+        resaved.save()
+        self.assertEqual(resaved.slug, 'aspirin-1')
+
+    def test_generated_sku_clash_is_retried(self):
+        taken = self._product('Ibuprofen').sku
+        with mock.patch('products.models.random_sku', side_effect=[taken, 'IBUPROFEN-FRESH']):
+            product = self._product('Ibuprofen')
+        self.assertEqual(product.sku, 'IBUPROFEN-FRESH')
+
+        variant_sku = ProductVariant.objects.create(product=product).sku
+        with mock.patch('products.models.random_sku', side_effect=[variant_sku, 'IBUPROFEN-FRESH-V']):
+            variant = ProductVariant.objects.create(product=product)
+        self.assertEqual(variant.sku, 'IBUPROFEN-FRESH-V')
+
+    def test_explicit_duplicate_is_not_retried(self):
+        existing = self._product('Cetirizine')
+        with mock.patch('products.models.random_sku') as random_sku:
+            with self.assertRaises(IntegrityError):
+                self._product('Cetirizine', slug='cetirizine-x', sku=existing.sku)
+        random_sku.assert_not_called()
+
+
+class AuditLogTests(BaseSetupMixin, TestCase):
+
+    def test_change_is_diffed_against_loaded_state(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.price = Decimal('150.00')
+        product.name = 'Renamed'
+        product._changed_by = self.user
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        log = ProductAuditLog.objects.get(product=product)
+        self.assertEqual(log.changes, {'price': ['100.00', '150.00'], 'name': ['Test Product', 'Renamed']})
+        self.assertEqual((log.object_type, log.object_id, log.changed_by), ('product', product.pk, self.user))
+
+        # The tracker moves on after a save: saving again unchanged logs nothing
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(ProductAuditLog.objects.count(), 1)
+
+    def test_batch_is_written_with_one_bulk_create(self):
+        from .audit import audit_batch
+
+        product = Product.objects.get(pk=self.product.pk)
+        variant = ProductVariant.objects.get(pk=self.variant.pk)
+        supplier_price = SupplierProductPrice.objects.create(supplier=self.user, product_variant=variant, price=90)
+        supplier_price = SupplierProductPrice.objects.get(pk=supplier_price.pk)
+
+        with mock.patch.object(ProductAuditLog.objects, 'bulk_create', wraps=ProductAuditLog.objects.bulk_create) as bulk_create:
+            with audit_batch(), self.captureOnCommitCallbacks(execute=True):
+                product.stock = 4
+                product.save()
+                variant.stock = 2
+                variant.save()
+                supplier_price.price = Decimal('95.00')
+                supplier_price.save()
+        bulk_create.assert_called_once()
+
+        logs = {log.object_type: log for log in ProductAuditLog.objects.all()}
+        self.assertEqual(set(logs), {'product', 'variant', 'supplier_price'})
+        self.assertEqual(logs['variant'].changes, {'stock': ['0', '2']})
+        self.assertEqual(logs['supplier_price'].product_id, self.product.pk)
+
+    def test_failed_audit_write_does_not_fail_the_request(self):
+        from .middleware import AuditLogMiddleware
+
+        def view(request):
+            with self.captureOnCommitCallbacks(execute=True):
+                product = Product.objects.get(pk=self.product.pk)
+                product.stock = 7
+                product.save()
+            return 'response'
+
+        with mock.patch.object(ProductAuditLog.objects, 'bulk_create', side_effect=RuntimeError('audit down')):
+            with self.assertLogs('products.audit', level='ERROR'):
+                self.assertEqual(AuditLogMiddleware(view)(None), 'response')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+
+    def test_rolled_back_change_is_not_logged(self):
+        product = Product.objects.get(pk=self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                product.stock = 0
+                product.save()
+                raise RuntimeError
+        self.assertFalse(ProductAuditLog.objects.exists())
+
+    @override_settings(PRODUCT_AUDIT_ASYNC=True)
+    def test_async_flush_hands_batch_to_worker(self):
+        worker = mock.Mock()
+        product = Product.objects.get(pk=self.product.pk)
+        product.stock = 1
+        with mock.patch('products.audit._worker', return_value=worker), self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        (entries,), _ = worker.put.call_args
+        self.assertEqual([entry.changes for entry in entries], [{'stock': ['10', '1']}])
+        self.assertFalse(ProductAuditLog.objects.exists())
+
+
+class SupplierPriceResolverTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = User.objects.create_user(email='supplier-a@example.com', password='pass12345', full_name='A', role='supplier')
+        cls.other = User.objects.create_user(email='supplier-b@example.com', password='pass12345', full_name='B', role='supplier')
+        cls.off_duty = User.objects.create_user(
+            email='supplier-c@example.com', password='pass12345', full_name='C', role='supplier', is_on_duty=False,
+        )
+        category = ProductCategory.objects.create(name='Pricing', created_by=cls.supplier)
+        cls.product = Product.objects.create(name='Priced', price=100, mrp=120, category=category, created_by=cls.supplier)
+        cls.variant = ProductVariant.objects.create(product=cls.product, additional_price=10)
+        cls.plain = ProductVariant.objects.create(product=cls.product)
+        SupplierProductPrice.objects.create(supplier=cls.supplier, product_variant=cls.variant, price=90, pincode='110001', district='Central Delhi')
+        SupplierProductPrice.objects.create(supplier=cls.other, product_variant=cls.variant, price=85, pincode='110001')
+        SupplierProductPrice.objects.create(supplier=cls.supplier, product_variant=cls.variant, price=95, mrp=130, district='South Delhi')
+        SupplierProductPrice.objects.create(supplier=cls.other, product_variant=cls.variant, price=99)
+        SupplierProductPrice.objects.create(supplier=cls.off_duty, product_variant=cls.variant, price=1, pincode='110017')
+
+    def setUp(self):
+        from .pricing import get_price_cache
+
+        get_price_cache().clear()
+
+    def test_falls_back_from_pincode_to_district_to_catalog(self):
+        from .pricing import resolve_price
+
+        at_pincode = resolve_price(self.variant.pk, '110001')
+        self.assertEqual((at_pincode.price, at_pincode.source, at_pincode.supplier_id), (Decimal('85.00'), 'pincode', self.other.pk))
+
+        in_district = resolve_price(self.variant.pk, '110017', 'south delhi')
+        self.assertEqual((in_district.price, in_district.mrp, in_district.source), (Decimal('95.00'), Decimal('130.00'), 'district'))
+
+        # Off-duty suppliers are ignored; the region-less price applies
+        anywhere = resolve_price(self.variant.pk, '110017')
+        self.assertEqual((anywhere.price, anywhere.mrp, anywhere.source), (Decimal('99.00'), Decimal('120.00'), 'any'))
+
+        catalog = resolve_price(self.plain.pk, '110001')
+        self.assertEqual((catalog.price, catalog.mrp, catalog.source, catalog.supplier_id), (Decimal('100.00'), Decimal('120.00'), 'catalog', None))
+
+    def test_batch_is_one_query_then_cached(self):
+        from .pricing import resolve_prices
+
+        with self.assertNumQueries(1):
+            prices = resolve_prices([self.variant.pk, self.plain.pk, 0], '110001')
+        self.assertEqual(set(prices), {self.variant.pk, self.plain.pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_prices([self.variant.pk, self.plain.pk], '110001'), prices)
+
+    def test_writes_invalidate_cached_prices(self):
+        from .pricing import resolve_price
+
+        self.assertEqual(resolve_price(self.variant.pk, '110001').price, Decimal('85.00'))
+        SupplierProductPrice.objects.create(supplier=self.supplier, product_variant=self.variant, price=80, pincode='110001', district='')
+        self.assertEqual(resolve_price(self.variant.pk, '110001').price, Decimal('80.00'))
+
+        self.assertEqual(resolve_price(self.plain.pk).price, Decimal('100.00'))
+        product = Product.objects.get(pk=self.product.pk)
+        product.price = 110
+        product.save()
+        self.assertEqual(resolve_price(self.plain.pk).price, Decimal('110.00'))
+
+    def test_lru_evicts_least_recently_used(self):
+        from .pricing import PriceCache, ResolvedPrice
+
+        cache = PriceCache(max_size=2)
+        entries = {(pk, '', ''): ResolvedPrice(pk, 1, Decimal('1.00'), Decimal('1.00'), 'catalog') for pk in (1, 2)}
+        cache.set_many(entries)
+        cache.get_many([(1, '', '')])
+        cache.set_many({(3, '', ''): ResolvedPrice(3, 1, Decimal('1.00'), Decimal('1.00'), 'catalog')})
+        self.assertEqual(set(cache.get_many([(1, '', ''), (2, '', ''), (3, '', '')])), {(1, '', ''), (3, '', '')})
+        cache.invalidate_products([1])
+        self.assertEqual(len(cache), 0)
+
+    def test_public_endpoint(self):
+        self.product.status, self.product.is_publish = 'published', True
+        self.product.save()
+        response = APIClient().get('/api/public/products/prices/', {'variant_ids': f'{self.variant.pk},{self.plain.pk}', 'pincode': '110001'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['source'] for row in response.data['prices']], ['pincode', 'catalog'])
+        self.assertEqual(APIClient().get('/api/public/products/prices/', {'variant_ids': 'x'}).status_code, 400)
+
+
+class VariantMatrixTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import ProductAttribute, ProductAttributeValue
+
+        cls.user = User.objects.create_user(email='matrix@example.com', password='pass12345', full_name='Matrix')
+        category = ProductCategory.objects.create(name='Matrix Category', created_by=cls.user, status='published', is_publish=True)
+        cls.product = Product.objects.create(
+            name='Mouthwash', price=100, mrp=150, stock=5, category=category, created_by=cls.user,
+            status='published', is_publish=True,
+        )
+        size = ProductAttribute.objects.create(name='Size')
+        flavour = ProductAttribute.objects.create(name='Flavour')
+        cls.ml500, cls.ml250 = (ProductAttributeValue.objects.create(attribute=size, value=v) for v in ('500ml', '250ml'))
+        cls.mint = ProductAttributeValue.objects.create(attribute=flavour, value='Mint')
+        cls.large = ProductVariant.objects.create(product=cls.product, price=120, stock=4, status='approved', image='https://example.com/l.png')
+        cls.large.attributes.add(cls.ml500, cls.mint)
+        cls.small = ProductVariant.objects.create(product=cls.product, additional_price=5, stock=0, status='approved')
+        cls.small.attributes.add(cls.ml250, cls.mint)
+        hidden = ProductVariant.objects.create(product=cls.product, stock=9, status='pending')
+        hidden.attributes.add(cls.ml500)
+
+    def _matrix(self):
+        from .models import ProductVariantMatrix
+
+        return ProductVariantMatrix.objects.get(product=self.product)
+
+    def test_matrix_maps_sorted_value_ids_to_public_variants(self):
+        from .variant_matrix import matrix_key, rebuild_variant_matrices, select_variant
+
+        rebuild_variant_matrices([self.product.pk])
+        matrix = self._matrix()
+        self.assertEqual(
+            [(axis['name'], [value['value'] for value in axis['values']]) for axis in matrix.attributes],
+            [('Flavour', ['Mint']), ('Size', ['500ml', '250ml'])],
+        )
+        self.assertEqual(set(matrix.combinations), {matrix_key([self.ml500.pk, self.mint.pk]), matrix_key([self.ml250.pk, self.mint.pk])})
+
+        large = select_variant(matrix, [self.mint.pk, self.ml500.pk])
+        self.assertEqual(
+            (large['variant_id'], large['price'], large['mrp'], large['stock'], large['image']),
+            (self.large.pk, '120.00', '150.00', 4, 'https://example.com/l.png'),
+        )
+        self.assertEqual(select_variant(matrix, [self.ml250.pk, self.mint.pk])['price'], '105.00')
+        self.assertIsNone(select_variant(matrix, [self.ml500.pk]))
+
+    def test_rebuilt_after_variant_and_attribute_changes(self):
+        from .variant_matrix import rebuild_variant_matrices, select_variant
+
+        rebuild_variant_matrices([self.product.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            variant = ProductVariant.objects.get(pk=self.small.pk)
+            variant.stock = 7
+            variant.save()
+        self.assertEqual(select_variant(self._matrix(), [self.ml250.pk, self.mint.pk])['stock'], 7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mint.value = 'Cool Mint'
+            self.mint.save()
+            self.large.attributes.remove(self.ml500)
+        matrix = self._matrix()
+        self.assertEqual(matrix.attributes[0]['values'], [{'id': self.mint.pk, 'value': 'Cool Mint'}])
+        self.assertEqual(select_variant(matrix, [self.mint.pk])['variant_id'], self.large.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=self.product.pk)
+            product.price = 90
+            product.save()
+        self.assertEqual(select_variant(self._matrix(), [self.ml250.pk, self.mint.pk])['price'], '95.00')
+
+    def test_endpoint_and_detail_serve_the_stored_matrix(self):
+        from .variant_matrix import matrix_key, rebuild_variant_matrices
+
+        rebuild_variant_matrices([self.product.pk])
+        url = f'/api/public/products/products/{self.product.pk}/variants/matrix/'
+        response = APIClient().get(url, {'values': f'{self.mint.pk},{self.ml500.pk}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['combinations']), 2)
+        self.assertEqual(response.data['selected']['variant_id'], self.large.pk)
+
+        detail = APIClient().get(f'/api/public/products/products/{self.product.pk}/')
+        self.assertIn(matrix_key([self.ml250.pk, self.mint.pk]), detail.data['variant_matrix']['combinations'])
+
+
+class CatalogChangeFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='feed@example.com', password='pass12345', full_name='Feed')
+        cls.category = ProductCategory.objects.create(name='Feed Category', created_by=cls.user)
+
+    def _feed(self, since=0, **params):
+        response = APIClient().get('/api/public/products/changes/', {'since': since, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_compact_deltas_in_sequence(self):
+        product = Product.objects.create(
+            name='Feed Product', price=10, stock=5, category=self.category, created_by=self.user,
+            status='published', is_publish=True,
+        )
+        variant = ProductVariant.objects.create(product=product, price=12, stock=2, status='approved')
+        start = self._feed()['next_since']
+
+        product = Product.objects.get(pk=product.pk)
+        product.price = 9.5
+        product.stock = 4
+        product.save()
+        product.save()  # nothing changed: no entry
+        ProductVariant.objects.get(pk=variant.pk).delete()
+
+        feed = self._feed(start)
+        self.assertEqual(
+            [(change['type'], change['action'], change['fields']) for change in feed['changes']],
+            [('product', 'updated', {'price': '9.50', 'stock': 4}), ('variant', 'deleted', {})],
+        )
+        seqs = [change['seq'] for change in feed['changes']]
+        self.assertEqual(seqs, sorted(seqs))
+        self.assertEqual((feed['next_since'], feed['has_more']), (seqs[-1], False))
+        self.assertEqual(self._feed(feed['next_since'])['changes'], [])
+
+        page = self._feed(start, limit=1)
+        self.assertEqual((len(page['changes']), page['has_more']), (1, True))
+
+    def test_hidden_products_only_show_when_leaving_the_catalog(self):
+        product = Product.objects.create(name='Draft', price=10, category=self.category, created_by=self.user)
+        product.price = 11
+        product.save()
+        self.assertEqual(self._feed()['changes'], [])
+
+        product.status, product.is_publish = 'published', True
+        product.save()
+        product.is_publish = False
+        product.save()
+        self.assertEqual([change['fields'] for change in self._feed()['changes']], [
+            {'status': 'published', 'is_publish': True}, {'is_publish': False},
+        ])
+
+    def test_deferred_loads_look_up_visibility_when_saved(self):
+        product = Product.objects.create(
+            name='Deferred', price=10, stock=5, category=self.category, created_by=self.user,
+            status='published', is_publish=True,
+        )
+        start = self._feed()['next_since']
+        deferred = Product.objects.only('id', 'stock').get(pk=product.pk)
+        self.assertIsNone(deferred._change_feed_state[1])
+        deferred.stock = 0
+        deferred.save()
+        Product.objects.only('id', 'name').get(pk=product.pk).delete()
+        self.assertEqual(
+            [(change['action'], change['fields']) for change in self._feed(start)['changes']],
+            [('updated', {'stock': 0}), ('deleted', {})],
+        )
+
+    def test_late_commits_are_served_after_what_was_read(self):
+        from .models import CatalogChange
+
+        def change(object_id, **extra):
+            return CatalogChange.objects.create(
+                object_type='product', object_id=object_id, product_id=object_id, action='updated', **extra
+            )
+
+        # The first writer took its id earlier but commits after the second
+        early_id = change(1).pk
+        CatalogChange.objects.filter(pk=early_id).delete()
+        change(2)
+        since = self._feed()['next_since']
+        change(1, pk=early_id)
+
+        feed = self._feed(since)
+        self.assertEqual([entry['id'] for entry in feed['changes']], [1])
+        self.assertGreater(feed['changes'][0]['seq'], since)
+
+    def test_written_in_the_transaction_of_the_change(self):
+        from .models import CatalogChange
+
+        product = Product.objects.create(name='Rolled back', price=10, category=self.category, created_by=self.user)
+        before = CatalogChange.objects.count()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            product.stock = 3
+            product.save()
+            raise RuntimeError
+        self.assertEqual(CatalogChange.objects.count(), before)
+
+
+class ConditionalGetTests(FreshCatalogSnapshotMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='etag@example.com', password='pass12345', full_name='ETag')
+        cls.category = ProductCategory.objects.create(
+            name='ETag Category', created_by=cls.user, status='published', is_publish=True,
+        )
+        cls.product = Product.objects.create(
+            name='ETag Product', price=10, stock=5, category=cls.category, created_by=cls.user,
+            status='published', is_publish=True,
+        )
+        cls.variant = ProductVariant.objects.create(product=cls.product, price=12, stock=2, status='approved')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.url = f'/api/public/products/products/{self.product.id}/'
+
+    def test_matching_etag_returns_304_without_serializing(self):
+        from .serializers import PublicProductSerializer
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with mock.patch.object(PublicProductSerializer, 'to_representation') as serialize:
+            revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        serialize.assert_not_called()
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(revalidated['ETag'], etag)
+        self.assertEqual(revalidated.content, b'')
+
+    def test_etag_moves_with_related_changes(self):
+        etag = self.client.get(self.url)['ETag']
+        SupplierProductPrice.objects.create(supplier=self.user, product_variant=self.variant, price=9)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+
+        etag = changed['ETag']
+        ProductVariant.objects.get(pk=self.variant.pk).delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_detail_etag_follows_related_products(self):
+        other = Product.objects.create(
+            name='ETag Neighbor', price=20, stock=5, category=self.category, created_by=self.user,
+            status='published', is_publish=True,
+        )
+        etag = self.client.get(self.url)['ETag']
+        refresh_related_products([self.product.id])
+        etag_after_refresh = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(etag_after_refresh.status_code, status.HTTP_200_OK)
+
+        other.price = 18
+        other.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag_after_refresh['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_etags_follow_their_namespace(self):
+        categories = '/api/public/products/categories/'
+        products = '/api/public/products/products/'
+        category_etag = self.client.get(categories)['ETag']
+        product_etag = self.client.get(products)['ETag']
+        self.assertNotEqual(self.client.get(products, {'ordering': 'price'})['ETag'], product_etag)
+
+        self.product.stock = 4
+        self.product.save()
+        self.assertEqual(self.client.get(categories, HTTP_IF_NONE_MATCH=category_etag).status_code, 304)
+        self.assertEqual(self.client.get(products, HTTP_IF_NONE_MATCH=product_etag).status_code, 200)
+
+    def test_no_validator_when_generations_are_unavailable(self):
+        with mock.patch.object(EnterpriseCacheManager, 'get_generations', side_effect=lambda scopes: [0] * len(scopes)):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+
+
+class SparseFieldsetTests(FreshCatalogSnapshotMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='sparse@example.com', password='pass12345', full_name='Sparse')
+        cls.category = ProductCategory.objects.create(
+            name='Sparse Category', created_by=cls.user, status='published', is_publish=True,
+        )
+        for index in range(3):
+            Product.objects.create(
+                name=f'Sparse Product {index}', price=Decimal('10.50') + index, mrp=20, stock=5,
+                category=cls.category, created_by=cls.user, status='published', is_publish=True,
+                description='Long description', specifications={'a': 1},
+            )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def _get(self, url, params):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(url, params)
+        return response, ' '.join(query['sql'] for query in queries)
+
+    def test_compact_profile_matches_serializer_without_running_it(self):
+        from .serializers import PublicProductListSerializer
+
+        url = '/api/public/products/products/'
+        full, _ = self._get(url, {'page': 1})
+        with mock.patch.object(PublicProductListSerializer, 'to_representation') as serialize:
+            compact, sql = self._get(url, {'page': 1, 'profile': 'compact'})
+        serialize.assert_not_called()
+        self.assertEqual(compact.status_code, status.HTTP_200_OK)
+        keys = ['id', 'name', 'slug', 'price', 'image', 'mrp']
+        self.assertEqual(
+            compact.data['results'],
+            [{key: item[key] for key in keys} for item in full.data['results']],
+        )
+        self.assertNotIn('"description"', sql)
+
+        cursor_page, _ = self._get(url, {'profile': 'compact', 'page_size': 2})
+        self.assertEqual([list(item) for item in cursor_page.data['results']], [keys, keys])
+        self.assertIsNotNone(cursor_page.data['next'])
+
+    def test_fields_and_exclude_narrow_the_query(self):
+        url = f'/api/public/products/categories/{self.category.id}/products/'
+        response, sql = self._get(url, {'fields': 'name,category'})
+        self.assertEqual(list(response.data['results'][0]), ['name', 'category'])
+        self.assertEqual(response.data['results'][0]['category']['name'], 'Sparse Category')
+        self.assertNotIn('"specifications"', sql)
+        self.assertNotIn('medicinedetails', sql)
+
+        response, _ = self._get('/api/public/products/featured/', {'exclude': 'description,specifications'})
+        self.assertNotIn('description', response.data['results'][0])
+        self.assertIn('medicine_details', response.data['results'][0])
+
+    def test_unknown_fields_are_rejected(self):
+        response, _ = self._get('/api/public/products/products/', {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response, _ = self._get('/api/public/products/products/', {'profile': 'huge'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,215 @@
+"""
+Precomputed variant selection matrices.
+
+Each product has one ProductVariantMatrix row holding its attribute axes
+(attribute -> values used by its public variants) and, keyed by the sorted,
+comma-joined attribute value ids of a variant, what the storefront needs to
+show once a combination is picked: variant id, SKU, price, MRP, stock and
+image. Selecting a variant is a dict lookup on the row; no M2M walk.
+
+Rows are rebuilt after commit by the signal handlers below (variant,
+variant attributes, attribute/value renames, variant images, product
+creation and price changes), a batch of products costing a fixed number
+of queries. Reads of a product without a row compute it in place.
+"""
+
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    Product, ProductAttribute, ProductAttributeValue, ProductImage, ProductVariant, ProductVariantMatrix,
+)
+
+PUBLIC_VARIANT_STATUSES = ('approved', 'published')
+ZERO = Decimal('0.00')
+
+VariantLink = ProductVariant.attributes.through
+
+
+def matrix_key(value_ids: Iterable[int]) -> str:
+    """Combination key of a set of attribute value ids (``"3,7,12"``)"""
+    return ','.join(str(pk) for pk in sorted({int(pk) for pk in value_ids}))
+
+
+def compute_matrices(product_ids: Iterable[int]) -> Dict[int, Dict]:
+    """
+    ``{product_id: {'attributes': [...], 'combinations': {...}}}`` for the
+    existing products among ``product_ids`` (five queries per call)
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
+    products = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'mrp'))
+    variants = list(ProductVariant.objects.filter(
+        product_id__in=products, status__in=PUBLIC_VARIANT_STATUSES, is_active=True,
+    ).order_by('id').values_list(
+        'pk', 'product_id', 'sku', 'price', 'mrp', 'additional_price', 'stock', 'image', 'product__price',
+    ))
+    variant_ids = [row[0] for row in variants]
+
+    value_ids_by_variant: Dict[int, List[int]] = {pk: [] for pk in variant_ids}
+    for variant_id, value_id in VariantLink.objects.filter(productvariant_id__in=variant_ids).values_list(
+        'productvariant_id', 'productattributevalue_id'
+    ):
+        value_ids_by_variant[variant_id].append(value_id)
+    used_value_ids = {value_id for ids in value_ids_by_variant.values() for value_id in ids}
+    values = {
+        pk: (value, attribute_id, attribute_name)
+        for pk, value, attribute_id, attribute_name in ProductAttributeValue.objects.filter(
+            pk__in=used_value_ids
+        ).values_list('pk', 'value', 'attribute_id', 'attribute__name')
+    }
+    images = {}
+    for variant_id, image in ProductImage.objects.filter(variant_id__in=variant_ids).order_by(
+        'variant_id', 'order', 'id'
+    ).values_list('variant_id', 'image'):
+        images.setdefault(variant_id, image)
+
+    matrices = {pk: {'attributes': {}, 'combinations': {}} for pk in products}
+    for pk, product_id, sku, price, mrp, additional_price, stock, image, product_price in variants:
+        matrix = matrices[product_id]
+        value_ids = value_ids_by_variant[pk]
+        for value_id in value_ids:
+            value, attribute_id, attribute_name = values[value_id]
+            axis = matrix['attributes'].setdefault(attribute_id, {'id': attribute_id, 'name': attribute_name, 'values': {}})
+            axis['values'][value_id] = {'id': value_id, 'value': value}
+        # Variants sharing a combination: the oldest one is selected
+        matrix['combinations'].setdefault(matrix_key(value_ids), {
+            'variant_id': pk,
+            'sku': sku,
+            # Same rules as ProductVariant.total_price / effective_mrp
+            'price': str(price if price and price != ZERO else (product_price or ZERO) + (additional_price or ZERO)),
+            'mrp': str(mrp if mrp and mrp != ZERO else (products[product_id] or ZERO)),
+            'stock': stock,
+            'image': image or images.get(pk) or None,
+            'attribute_value_ids': sorted(value_ids),
+        })
+
+    for matrix in matrices.values():
+        matrix['attributes'] = [
+            {**axis, 'values': [axis['values'][value_id] for value_id in sorted(axis['values'])]}
+            for axis in sorted(matrix['attributes'].values(), key=lambda axis: (axis['name'], axis['id']))
+        ]
+    return matrices
+
+
+def rebuild_variant_matrices(product_ids: Iterable[int], batch_size: int = 500) -> int:
+    """Recompute and store the matrices of ``product_ids``; returns the number written"""
+    product_ids = sorted(set(product_ids))
+    written = 0
+    for start in range(0, len(product_ids), batch_size):
+        matrices = compute_matrices(product_ids[start:start + batch_size])
+        now = timezone.now()
+        ProductVariantMatrix.objects.bulk_create(
+            [
+                ProductVariantMatrix(product_id=pk, built_at=now, **matrix)
+                for pk, matrix in matrices.items()
+            ],
+            update_conflicts=True, unique_fields=['product'], update_fields=['attributes', 'combinations', 'built_at'],
+        )
+        written += len(matrices)
+    return written
+
+
+def schedule_matrix_rebuild(product_ids: Iterable[int]) -> None:
+    """Rebuild the matrices of ``product_ids`` after the surrounding transaction commits"""
+    product_ids = {pk for pk in product_ids if pk}
+    if product_ids:
+        transaction.on_commit(lambda: rebuild_variant_matrices(product_ids))
+
+
+def get_variant_matrix(product) -> ProductVariantMatrix:
+    """
+    The stored matrix of ``product`` (select_related ``variant_matrix``);
+    computed in place and stored after commit when the row is missing
+    """
+    try:
+        return product.variant_matrix
+    except ProductVariantMatrix.DoesNotExist:
+        matrix = compute_matrices([product.pk]).get(product.pk, {'attributes': [], 'combinations': {}})
+        schedule_matrix_rebuild([product.pk])
+        return ProductVariantMatrix(product_id=product.pk, **matrix)
+
+
+def matrix_payload(matrix: ProductVariantMatrix) -> Dict:
+    return {
+        'product_id': matrix.product_id,
+        'attributes': matrix.attributes,
+        'combinations': matrix.combinations,
+        'built_at': matrix.built_at,
+    }
+
+
+def select_variant(matrix: ProductVariantMatrix, value_ids: Iterable[int]) -> Optional[Dict]:
+    """The matrix entry for exactly the attribute values ``value_ids``, if any"""
+    return matrix.combinations.get(matrix_key(value_ids))
+
+
+def _products_with_values(value_ids) -> List[int]:
+    return list(ProductVariant.objects.filter(attributes__in=value_ids).values_list('product_id', flat=True).distinct())
+
+
+# Signal handlers
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def rebuild_matrix_on_variant_change(sender, instance, **kwargs):
+    schedule_matrix_rebuild([instance.product_id])
+
+
+@receiver(m2m_changed, sender=VariantLink)
+def rebuild_matrix_on_variant_attributes_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        if action != 'pre_clear':
+            schedule_matrix_rebuild([instance.product_id])
+    elif action == 'pre_clear':
+        schedule_matrix_rebuild(_products_with_values([instance.pk]))
+    elif action != 'post_clear' and pk_set:
+        schedule_matrix_rebuild(
+            ProductVariant.objects.filter(pk__in=pk_set).values_list('product_id', flat=True).distinct()
+        )
+
+
+@receiver(post_save, sender=ProductAttributeValue)
+@receiver(pre_delete, sender=ProductAttributeValue)
+def rebuild_matrix_on_value_change(sender, instance, created=False, **kwargs):
+    if not created:
+        schedule_matrix_rebuild(_products_with_values([instance.pk]))
+
+
+@receiver(post_save, sender=ProductAttribute)
+@receiver(pre_delete, sender=ProductAttribute)
+def rebuild_matrix_on_attribute_change(sender, instance, created=False, **kwargs):
+    if not created:
+        schedule_matrix_rebuild(_products_with_values(instance.values.values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def rebuild_matrix_on_variant_image_change(sender, instance, **kwargs):
+    if instance.variant_id:
+        schedule_matrix_rebuild([instance.product_id])
+
+
+@receiver(post_init, sender=Product)
+def remember_matrix_prices(sender, instance, **kwargs):
+    # Field tracker: product price/MRP feed the variant prices in the matrix
+    if instance.pk and not instance.get_deferred_fields() & {'price', 'mrp'}:
+        instance._matrix_prices = (instance.price, instance.mrp)
+    else:
+        instance._matrix_prices = None
+
+
+@receiver(post_save, sender=Product)
+def rebuild_matrix_on_product_price_change(sender, instance, created, **kwargs):
+    current = (instance.price, instance.mrp)
+    if created or getattr(instance, '_matrix_prices', None) != current:
+        schedule_matrix_rebuild([instance.pk])
+    instance._matrix_prices = current
@@ -319,8 +319,8 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
         return get_product_serializer_class(instance.product_type)
 
     def perform_update(self, serializer):
-        instance = serializer.save()
-        instance._changed_by = self.request.user  # Used in audit logging
+        serializer.instance._changed_by = self.request.user  # Used in audit logging
+        serializer.save()
 
 
 # Product Attribute Views